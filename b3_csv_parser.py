@@ -0,0 +1,181 @@
+"""
+Parser vetorizado para os arquivos de carteira do dia da B3 (IBOVDia_dd-mm-yy.csv).
+
+O arquivo da B3 tem o seguinte formato:
+
+    IBOV - Carteira do Dia 22/07/25
+    Código;Ação;Tipo;Qtde. Teórica;Part. (%);
+    ALOS3;ALLOS;ON      NM;476.976.044;0,232;
+    ...
+    Quantidade Teórica Total;95.412.487.296;
+    Redutor;17.431.017,51480763;
+
+Em vez de usar o engine 'python' do pandas (necessário para skipfooter), o parser
+localiza os offsets da linha de título, do cabeçalho e do rodapé diretamente nos
+bytes do arquivo e entrega apenas o corpo ao leitor CSV em C++ do pyarrow. A
+limpeza dos números no padrão pt-BR e dos espaços é feita com pyarrow.compute.
+
+A tabela segue um esquema fixo (IBOV_SCHEMA): código, ação e tipo se repetem
+praticamente iguais todos os dias e são codificados como dicionário; a quantidade
+teórica é inteira (int64) e a data é date32.
+"""
+
+import re
+from datetime import date
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+# Colunas do arquivo (a última é vazia devido ao ; no final de cada linha)
+CSV_COLUMNS = ['codigo', 'acao', 'tipo', 'qtde_teorica', 'participacao', '_vazia']
+
+# Tipo das colunas de texto repetidas entre os dias (codificação de dicionário)
+DICTIONARY_STRING = pa.dictionary(pa.int32(), pa.string())
+
+# Esquema da tabela gerada, igual ao produzido pelos conversores
+IBOV_SCHEMA = pa.schema([
+    ('codigo', DICTIONARY_STRING),
+    ('acao', DICTIONARY_STRING),
+    ('tipo', DICTIONARY_STRING),
+    ('qtde_teorica', pa.int64()),
+    ('participacao', pa.float64()),
+    ('data', pa.date32()),
+])
+
+# Número de linhas de rodapé com informações agregadas
+FOOTER_LINES = 2
+
+TITLE_DATE_PATTERN = re.compile(rb'Carteira do Dia (\d{2})/(\d{2})/(\d{2})')
+
+_READ_OPTIONS = pa_csv.ReadOptions(column_names=CSV_COLUMNS, use_threads=False)
+_PARSE_OPTIONS = pa_csv.ParseOptions(delimiter=';')
+_CONVERT_OPTIONS = pa_csv.ConvertOptions(
+    column_types={
+        'codigo': pa.string(),
+        'acao': pa.string(),
+        'tipo': pa.string(),
+        # Separador de milhar não é suportado pelo leitor: tratado com pyarrow.compute
+        'qtde_teorica': pa.string(),
+        'participacao': pa.float64(),
+    },
+    include_columns=CSV_COLUMNS[:-1],
+    strings_can_be_null=False,
+    decimal_point=',',
+)
+
+
+def full_year(year):
+    """
+    Converte ano de 2 dígitos para 4 dígitos
+
+    Args:
+        year (str): Ano com 2 ou 4 dígitos
+
+    Returns:
+        str: Ano com 4 dígitos
+    """
+    if len(year) == 2:
+        return f"20{year}" if int(year) < 50 else f"19{year}"
+    return year
+
+
+def split_sections(raw):
+    """
+    Localiza os offsets do título, cabeçalho e rodapé do arquivo da B3
+
+    Args:
+        raw (bytes): Conteúdo bruto do arquivo
+
+    Returns:
+        tuple: (titulo, corpo) em bytes, sem as linhas de cabeçalho e rodapé
+    """
+    title_end = raw.find(b'\n')
+    header_end = raw.find(b'\n', title_end + 1) if title_end != -1 else -1
+    if header_end == -1:
+        raise ValueError("Arquivo sem linha de título e cabeçalho")
+
+    title = raw[:title_end].rstrip(b'\r')
+
+    # Ignorar linhas em branco no final e remover as linhas de rodapé
+    body_end = len(raw.rstrip())
+    for _ in range(FOOTER_LINES):
+        body_end = raw.rfind(b'\n', header_end, body_end)
+        if body_end == -1:
+            raise ValueError("Arquivo sem as linhas de rodapé esperadas")
+
+    return title, raw[header_end + 1:body_end]
+
+
+def extract_title_date(title):
+    """
+    Extrai a data da linha de título "IBOV - Carteira do Dia dd/mm/yy"
+
+    Args:
+        title (bytes): Primeira linha do arquivo
+
+    Returns:
+        tuple: (dia, mes, ano) com ano de 4 dígitos, ou None se não encontrar
+    """
+    match = TITLE_DATE_PATTERN.search(title)
+    if not match:
+        return None
+    day, month, year = (part.decode('ascii') for part in match.groups())
+    return day, month, full_year(year)
+
+
+def parse_ibov_csv(source, date_info=None, fallback_date=None):
+    """
+    Lê um arquivo de carteira do dia da B3 em uma única passada
+
+    Args:
+        source (str | bytes): Caminho do arquivo CSV ou seu conteúdo bruto
+        date_info (tuple): (dia, mes, ano) para a coluna data. Se None, usa a data do título
+        fallback_date (tuple): (dia, mes, ano) usado se o título também não tiver data
+
+    Returns:
+        tuple: (pyarrow.Table com o esquema IBOV_SCHEMA, (dia, mes, ano) ou None)
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        raw = bytes(source)
+    else:
+        with open(source, 'rb') as file:
+            raw = file.read()
+
+    title, body = split_sections(raw)
+    title_date = extract_title_date(title)
+    if date_info is None:
+        date_info = title_date or fallback_date
+    if date_info is None:
+        raise ValueError("Não foi possível determinar a data do arquivo")
+
+    try:
+        # latin1 -> utf8 é feito de uma vez no corpo inteiro, fora do leitor CSV
+        parsed = pa_csv.read_csv(
+            pa.py_buffer(body.decode('latin1').encode('utf-8')),
+            read_options=_READ_OPTIONS,
+            parse_options=_PARSE_OPTIONS,
+            convert_options=_CONVERT_OPTIONS,
+        )
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"Esperado 5 colunas após remoção da coluna vazia: {e}") from e
+
+    # Números no padrão pt-BR: "." como separador de milhar ("," decimal já tratado na leitura)
+    qtde_teorica = pc.cast(pc.replace_substring(parsed['qtde_teorica'], '.', ''), pa.int64())
+
+    day, month, year = date_info
+    trade_date = date(int(year), int(month), int(day))
+
+    table = pa.Table.from_arrays(
+        [
+            pc.dictionary_encode(pc.utf8_trim_whitespace(parsed['codigo'])),
+            pc.dictionary_encode(pc.utf8_trim_whitespace(parsed['acao'])),
+            pc.dictionary_encode(pc.utf8_trim_whitespace(parsed['tipo'])),
+            qtde_teorica,
+            parsed['participacao'],
+            pa.array(np.full(parsed.num_rows, np.datetime64(trade_date, 'D'))),
+        ],
+        schema=IBOV_SCHEMA,
+    )
+    return table, title_date
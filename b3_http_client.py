@@ -0,0 +1,190 @@
+"""
+Cliente HTTP para a API usada pela página indexPage da B3.
+
+A página https://sistemaswebb3-listados.b3.com.br/indexPage/day/IBOV é uma aplicação
+JavaScript que busca os dados em endpoints do tipo
+
+    /indexProxy/indexCall/<Operação>/<parâmetros em JSON codificados em base64>
+
+O download da carteira do dia (GetDownloadPortfolioDay) devolve o próprio CSV,
+codificado em base64. Chamando esse endpoint diretamente, o download passa a ser
+uma única requisição HTTP, sem abrir o navegador.
+"""
+
+import base64
+import binascii
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from b3_indices import PORTFOLIO_OPERATIONS
+from instrumentation import METRICS
+
+DEFAULT_BASE_URL = "https://sistemaswebb3-listados.b3.com.br"
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'application/json, text/plain, */*',
+    'Accept-Language': 'pt-BR,pt;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+
+def encode_params(params):
+    """
+    Codifica os parâmetros da chamada no formato usado pela página (JSON em base64)
+
+    Args:
+        params (dict): Parâmetros da operação
+
+    Returns:
+        str: JSON compacto codificado em base64
+    """
+    payload = json.dumps(params, separators=(',', ':')).encode('utf-8')
+    return base64.b64encode(payload).decode('ascii')
+
+
+class B3IndexClient:
+    def __init__(self, base_url=DEFAULT_BASE_URL, timeout=30, retries=3, backoff_factor=0.5, pool_size=10):
+        """
+        Cria uma sessão HTTP persistente com pool de conexões e novas tentativas
+
+        Args:
+            base_url (str): Endereço base dos sistemas da B3
+            timeout (float): Tempo limite de cada requisição em segundos
+            retries (int): Número de novas tentativas para erros de conexão e 429/5xx
+            backoff_factor (float): Fator de espera exponencial entre tentativas
+            pool_size (int): Número de conexões mantidas abertas por host
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def build_url(self, operation, params):
+        """
+        Monta a URL de uma operação do indexProxy
+
+        Args:
+            operation (str): Nome da operação (ex.: GetDownloadPortfolioDay)
+            params (dict): Parâmetros da operação
+
+        Returns:
+            str: URL completa
+        """
+        return f"{self.base_url}/indexProxy/indexCall/{operation}/{encode_params(params)}"
+
+    def get(self, operation, params, **kwargs):
+        """
+        Executa uma operação do indexProxy
+
+        Returns:
+            requests.Response: Resposta com status verificado
+        """
+        response = self.session.get(self.build_url(operation, params), timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def download_portfolio_csv(self, index="IBOV", language="pt-br", portfolio="day", trade_date=None):
+        """
+        Baixa o CSV de uma carteira do índice
+
+        Args:
+            index (str): Código do índice (ex.: IBOV)
+            language (str): Idioma do arquivo
+            portfolio (str): "day", "theoretical" ou "quarterly" (ver PORTFOLIO_OPERATIONS)
+            trade_date (date): Data da carteira; se None, a B3 devolve a mais recente
+
+        Returns:
+            bytes: Conteúdo do CSV em latin1, no mesmo formato do arquivo baixado pela página
+        """
+        if portfolio not in PORTFOLIO_OPERATIONS:
+            raise ValueError(f"Carteira inválida: {portfolio}. Use {', '.join(PORTFOLIO_OPERATIONS)}")
+        params = {"index": index, "language": language}
+        if trade_date is not None:
+            params["date"] = trade_date.isoformat()
+        with METRICS.timer("download"):
+            response = self.get(PORTFOLIO_OPERATIONS[portfolio], params)
+        METRICS.count("download_bytes", len(response.content))
+        return decode_csv_payload(response.content)
+
+    def check_portfolio_csv(self, index="IBOV", language="pt-br", portfolio="day", etag=None, last_modified=None):
+        """
+        Download condicional da carteira mais recente (para consultas periódicas)
+
+        Envia If-None-Match/If-Modified-Since com os validadores da resposta anterior: se a
+        carteira não mudou e o servidor os suporta, a resposta é um 304 sem conteúdo.
+
+        Args:
+            index (str): Código do índice
+            language (str): Idioma do arquivo
+            portfolio (str): "day", "theoretical" ou "quarterly"
+            etag (str): ETag da resposta anterior
+            last_modified (str): Last-Modified da resposta anterior
+
+        Returns:
+            dict: modified (bool), content (CSV, ou None se não mudou), etag e last_modified
+                da resposta (os anteriores, em um 304)
+        """
+        if portfolio not in PORTFOLIO_OPERATIONS:
+            raise ValueError(f"Carteira inválida: {portfolio}. Use {', '.join(PORTFOLIO_OPERATIONS)}")
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        with METRICS.timer("poll"):
+            response = self.get(PORTFOLIO_OPERATIONS[portfolio], {"index": index, "language": language},
+                                headers=headers)
+        if response.status_code == 304:
+            METRICS.count("poll_not_modified")
+            return {"modified": False, "content": None, "etag": etag, "last_modified": last_modified}
+        METRICS.count("download_bytes", len(response.content))
+        return {
+            "modified": True,
+            "content": decode_csv_payload(response.content),
+            "etag": response.headers.get('ETag'),
+            "last_modified": response.headers.get('Last-Modified'),
+        }
+
+    def close(self):
+        """Fecha as conexões da sessão"""
+        self.session.close()
+
+
+def decode_csv_payload(content):
+    """
+    Decodifica a resposta de download da B3 (CSV em base64, às vezes entre aspas)
+
+    Args:
+        content (bytes): Corpo da resposta HTTP
+
+    Returns:
+        bytes: Conteúdo do CSV
+
+    Raises:
+        ValueError: Se a resposta não contiver um CSV de carteira
+    """
+    payload = content.strip().strip(b'"')
+    try:
+        csv_bytes = base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        # Alguns ambientes devolvem o CSV diretamente, sem base64
+        csv_bytes = content
+    if b'Carteira' not in csv_bytes[:200]:
+        raise ValueError("Resposta da B3 não contém um CSV de carteira")
+    return csv_bytes
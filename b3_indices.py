@@ -0,0 +1,159 @@
+"""
+Índices da B3 acompanhados e convenções de nomes que dependem do código do índice.
+
+Os arquivos baixados pela página de cada índice seguem o padrão
+<ÍNDICE>Dia_dd-mm-yy.csv (ex.: IBOVDia_22-07-25.csv, SMLLDia_22-07-25.csv). As
+partições locais ficam em <índice>-data/ e, no S3, sob o prefixo <índice>_data/,
+de modo que o IBOV continua em ibov-data/ e ibov_data/. As carteiras teórica e
+prévia quadrimestral têm árvores próprias (ex.: ibov-theoretical-data/ e
+ibov_theoretical_data/), para não se misturarem às cargas da carteira do dia.
+"""
+
+import re
+
+DEFAULT_INDEX = "IBOV"
+
+# Índices acompanhados (modo multi-índice com --index all)
+TRACKED_INDICES = (
+    "IBOV", "IBXX", "IBXL", "IBRA", "SMLL", "MLCX", "IDIV", "IFIX",
+    "IGCX", "ITAG", "IGNM", "ICO2", "ISEE", "IMAT", "IFNC",
+)
+
+# Operações de download da API de cada tipo de carteira exposto pela página do índice
+# (aqui, e não em b3_http_client.py, para a linha de comando não importar o requests)
+PORTFOLIO_OPERATIONS = {
+    "day": "GetDownloadPortfolioDay",
+    "theoretical": "GetDownloadTheoricalPortfolio",
+    "quarterly": "GetDownloadQuartelyPreview",
+}
+
+# <ÍNDICE>Dia_dd-mm-yy (nome do download) e <ÍNDICE>Dia-yy-mm-dd (após renomear)
+FILENAME_PATTERN = re.compile(r'([A-Z0-9]+)Dia_(\d{2})-(\d{2})-(\d{2})')
+CSV_FILENAME_PATTERN = re.compile(r'([A-Z0-9]+)Dia_(\d{2})-(\d{2})-(\d{2})\.csv')
+RENAMED_FILENAME_PATTERN = re.compile(r'([A-Z0-9]+)Dia-(\d{2})-(\d{2})-(\d{2})')
+
+_INDEX_CODE_PATTERN = re.compile(r'^[A-Z0-9]{3,6}$')
+
+
+def normalize_index(index):
+    """
+    Valida e normaliza o código de um índice
+
+    Args:
+        index (str): Código do índice (ex.: "ibov", "SMLL")
+
+    Returns:
+        str: Código em maiúsculas
+
+    Raises:
+        ValueError: Se o código não tiver o formato dos índices da B3
+    """
+    code = index.strip().upper()
+    if not _INDEX_CODE_PATTERN.match(code):
+        raise ValueError(f"Código de índice inválido: {index}")
+    return code
+
+
+def parse_index_list(value):
+    """
+    Lê uma lista de índices separados por vírgula ("all" = todos os acompanhados)
+
+    Args:
+        value (str): Ex.: "IBOV,SMLL,IDIV" ou "all"
+
+    Returns:
+        list: Códigos normalizados, sem repetição e na ordem informada
+    """
+    if value.strip().lower() == "all":
+        return list(TRACKED_INDICES)
+    codes = []
+    for item in value.split(","):
+        if item.strip():
+            code = normalize_index(item)
+            if code not in codes:
+                codes.append(code)
+    return codes
+
+
+def local_folder_name(index, portfolio="day"):
+    """Nome da pasta local das partições do índice (ex.: ibov-data, ibov-theoretical-data)"""
+    if portfolio == "day":
+        return f"{index.lower()}-data"
+    return f"{index.lower()}-{portfolio}-data"
+
+
+def cdc_folder_name(index):
+    """Nome da pasta local do armazenamento CDC do índice (ex.: ibov-cdc)"""
+    return f"{index.lower()}-cdc"
+
+
+def changes_folder_name(index):
+    """Nome da pasta local das variações diárias do índice (ex.: ibov-changes)"""
+    return f"{index.lower()}-changes"
+
+
+def s3_prefix(index, portfolio="day"):
+    """Prefixo S3 das partições do índice (ex.: ibov_data/, ibov_theoretical_data/)"""
+    if portfolio == "day":
+        return f"{index.lower()}_data/"
+    return f"{index.lower()}_{portfolio}_data/"
+
+
+def parse_s3_prefix(prefix):
+    """
+    Identifica o índice e o tipo de carteira de um prefixo S3 de partições (inverso de s3_prefix)
+
+    Args:
+        prefix (str): Prefixo, com ou sem a barra final (ex.: "ibov_theoretical_data/")
+
+    Returns:
+        tuple: (código do índice, tipo de carteira), ou None se não for um prefixo de partições
+    """
+    prefix = prefix.rstrip('/') + '/'
+    # Os sufixos das outras carteiras terminam em "_data/": conferir a do dia por último
+    for portfolio in sorted(PORTFOLIO_OPERATIONS, key=lambda name: name == "day"):
+        suffix = s3_prefix("", portfolio)
+        index = prefix[:-len(suffix)].upper()
+        if prefix.endswith(suffix) and _INDEX_CODE_PATTERN.match(index):
+            return index, portfolio
+    return None
+
+
+def changes_s3_prefix(index):
+    """Prefixo S3 das variações diárias do índice (ex.: ibov_changes/)"""
+    return f"{index.lower()}_changes/"
+
+
+def csv_filename(index, day, month, year):
+    """Nome do CSV no formato do download da página (ex.: IBOVDia_22-07-25.csv)"""
+    return f"{index}Dia_{day}-{month}-{year[-2:]}.csv"
+
+
+def parquet_filename(index, timestamp, day, month, year):
+    """Nome do Parquet particionado (ex.: 20250722_183000_IBOVDia_22-07-25.parquet)"""
+    return f"{timestamp}_{index}Dia_{day}-{month}-{year[-2:]}.parquet"
+
+
+def index_from_filename(filename):
+    """
+    Identifica o índice pelo nome de um arquivo CSV ou Parquet
+
+    Returns:
+        str: Código do índice, ou None se o nome não seguir o padrão
+    """
+    match = FILENAME_PATTERN.search(filename) or RENAMED_FILENAME_PATTERN.search(filename)
+    return match.group(1) if match else None
+
+
+def belongs_to_index(filename, index):
+    """
+    Indica se o arquivo é de um índice (<ÍNDICE>Dia_..., <ÍNDICE>Dia-... ou <ÍNDICE>_...)
+
+    Args:
+        filename (str): Nome do arquivo
+        index (str): Código do índice
+
+    Returns:
+        bool: True se o nome começar pelo código do índice seguido do separador
+    """
+    return re.match(rf'{re.escape(index)}(Dia)?[_-]', filename) is not None
@@ -0,0 +1,301 @@
+"""
+Backfill histórico das carteiras de um índice da B3.
+
+Para cada dia útil do intervalo, baixa a carteira pela API (B3IndexClient), grava
+o Parquet na partição ano=/mes=/dia= do índice e, se houver um uploader, envia ao
+S3 em lote. Os downloads rodam com concorrência limitada e taxa máxima de
+requisições. O andamento é registrado em <índice>-data/_backfill_state.jsonl (ex.:
+ibov-data/), de modo que uma execução interrompida continua de onde parou. As
+carteiras teórica e prévia quadrimestral usam árvores próprias (ex.:
+ibov-theoretical-data/, ver b3_indices.local_folder_name).
+
+Estados de cada dia: "converted" (Parquet gravado, upload pendente ou com falha),
+"local" (gravado sem uploader, ex.: --no-upload), "done" (enviado ao S3) e "mismatch".
+Dias "converted" e "local" cujo Parquet ainda existe não são baixados de novo: uma
+execução com uploader apenas os envia. Dias em que a B3 devolve a carteira do dia de
+outra data (feriados fora da lista informada) ficam como "mismatch" e não são pedidos
+de novo ao retomar.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from b3_csv_parser import extract_title_date, parse_ibov_csv, split_sections
+from b3_indices import DEFAULT_INDEX
+from csv_to_parquet_converter import CSVToParquetConverter
+from instrumentation import METRICS, get_logger
+
+logger = get_logger("backfill")
+
+STATE_FILENAME = "_backfill_state.jsonl"
+
+
+def load_holidays(value):
+    """
+    Lê os feriados da B3 de um arquivo (uma data YYYY-MM-DD por linha, # para comentários)
+    ou de uma lista separada por vírgulas
+
+    Args:
+        value (str): Caminho do arquivo ou lista (ex.: "2024-01-01,2024-02-12")
+
+    Returns:
+        set: Datas dos feriados
+
+    Raises:
+        ValueError: Se alguma data for inválida
+    """
+    if os.path.isfile(value):
+        with open(value, 'r', encoding='utf-8') as file:
+            items = [line.split('#', 1)[0].strip() for line in file]
+    else:
+        items = [item.strip() for item in value.split(',')]
+    holidays = set()
+    for item in items:
+        if item:
+            try:
+                holidays.add(date.fromisoformat(item))
+            except ValueError:
+                raise ValueError(f"Feriado inválido: {item} (use YYYY-MM-DD)")
+    return holidays
+
+
+def business_days(start, end, holidays=()):
+    """
+    Enumera os dias úteis (segunda a sexta, exceto feriados) entre start e end, inclusive
+
+    Args:
+        start (date): Data inicial
+        end (date): Data final
+        holidays (iterable): Datas a ignorar (feriados da B3)
+
+    Returns:
+        list: Datas em ordem crescente
+    """
+    holidays = set(holidays)
+    days = []
+    current = start
+    while current <= end:
+        if current.weekday() < 5 and current not in holidays:
+            days.append(current)
+        current += timedelta(days=1)
+    return days
+
+
+class RateLimiter:
+    """Limita a taxa de requisições (token bucket) entre várias threads"""
+
+    def __init__(self, rate, burst=1):
+        """
+        Args:
+            rate (float): Requisições por segundo (0 ou None = sem limite)
+            burst (int): Número de requisições permitidas de uma vez
+        """
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Bloqueia até que uma requisição possa ser feita"""
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class BackfillState:
+    """Registro persistente (JSON lines) dos dias já processados"""
+
+    def __init__(self, output_folder):
+        self.path = os.path.join(str(output_folder), STATE_FILENAME)
+        self.entries = {}
+        self.lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.entries[self._key(entry["index"], entry["portfolio"], entry["date"])] = entry
+
+    @staticmethod
+    def _key(index, portfolio, day):
+        return f"{index}|{portfolio}|{day}"
+
+    def get(self, index, portfolio, day):
+        return self.entries.get(self._key(index, portfolio, day.isoformat()))
+
+    def record(self, index, portfolio, day, **fields):
+        """Registra (ou atualiza) o estado de um dia"""
+        entry = {"index": index, "portfolio": portfolio, "date": day.isoformat(), **fields}
+        with self.lock:
+            self.entries[self._key(index, portfolio, entry["date"])] = entry
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(entry) + "\n")
+
+
+class BackfillEngine:
+    def __init__(self, client, data_folder, uploader=None, max_workers=4, rate_limit=2.0,
+                 upload_batch_size=100, upload_workers=8):
+        """
+        Configura o backfill
+
+        Args:
+            client (B3IndexClient): Cliente HTTP da API da B3
+            data_folder (str): Pasta de dados; as partições ficam em <índice>-data/
+            uploader (B3DataDownloader): Se informado, envia os Parquet ao S3 em lote
+            max_workers (int): Número de downloads simultâneos
+            rate_limit (float): Requisições por segundo à B3 (0 = sem limite)
+            upload_batch_size (int): Quantidade de arquivos por lote de upload
+            upload_workers (int): Uploads simultâneos em cada lote
+        """
+        self.client = client
+        self.data_folder = data_folder
+        self.uploader = uploader
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(rate_limit, burst=max_workers)
+        self.upload_batch_size = upload_batch_size
+        self.upload_workers = upload_workers
+
+    def _fetch_day(self, converter, portfolio, day, load_timestamp):
+        """
+        Baixa e grava a carteira de um dia
+
+        Returns:
+            dict: Resultado do dia (status, caminho do Parquet, bytes e linhas)
+        """
+        self.rate_limiter.acquire()
+        try:
+            content = self.client.download_portfolio_csv(converter.index, portfolio=portfolio, trade_date=day)
+
+            # A data do título deve ser a pedida; caso contrário a B3 ignorou a data. Só a
+            # carteira do dia traz a data do pregão no título: as carteiras teórica e prévia
+            # trazem o período de vigência, e para elas a conferência não é feita
+            date_info = (f"{day.day:02d}", f"{day.month:02d}", str(day.year))
+            title_date = extract_title_date(split_sections(content)[0]) if portfolio == "day" else None
+            if title_date and title_date != date_info:
+                return {"status": "mismatch", "error": f"B3 devolveu a carteira de {'/'.join(title_date)}"}
+
+            with METRICS.timer("parse"):
+                table, _ = parse_ibov_csv(content, date_info)
+            METRICS.count("rows_parsed", table.num_rows)
+            parquet_path = converter.write_partition(table, *date_info, load_timestamp)
+            return {"status": "converted", "parquet": str(parquet_path),
+                    "bytes": len(content), "rows": table.num_rows}
+        except Exception as e:
+            return {"status": "failed", "error": str(e)}
+
+    def run(self, start, end, index=DEFAULT_INDEX, portfolio="day", holidays=()):
+        """
+        Executa o backfill do intervalo, ignorando dias já concluídos (ou com data divergente)
+        em execuções anteriores
+
+        Args:
+            start (date): Data inicial
+            end (date): Data final
+            index (str): Código do índice
+            portfolio (str): Tipo de carteira ("day", "theoretical" ou "quarterly")
+            holidays (iterable): Datas a ignorar
+
+        Returns:
+            dict: Métricas da execução (contagens, bytes, tempo e arquivos por segundo)
+        """
+        converter = CSVToParquetConverter(self.data_folder, index, portfolio=portfolio)
+        index = converter.index
+        partition_index = converter.partition_index
+        state = BackfillState(converter.index_data_folder)
+        days = business_days(start, end, holidays)
+        metrics = {"days": len(days), "skipped": 0, "converted": 0, "uploaded": 0,
+                   "failed": 0, "mismatch": 0, "bytes": 0, "rows": 0, "errors": {}}
+
+        # Retomar: dias concluídos ou com data divergente são ignorados; dias já gravados (e ainda
+        # no disco) não são baixados de novo, e só são enviados se houver uploader
+        pending_download = []
+        pending_upload = []
+        for day in days:
+            entry = state.get(index, portfolio, day)
+            if entry and entry["status"] in ("done", "mismatch"):
+                metrics["skipped"] += 1
+            elif entry and entry["status"] in ("converted", "local") and os.path.exists(entry["parquet"]):
+                if self.uploader:
+                    pending_upload.append((day, entry["parquet"]))
+                else:
+                    metrics["skipped"] += 1
+            else:
+                pending_download.append(day)
+
+        logger.info(f"Backfill {index}/{portfolio}: {len(days)} dia(s) útil(eis) de {start} a {end} "
+                    f"({metrics['skipped']} já concluído(s), {len(pending_download)} para baixar, "
+                    f"{len(pending_upload)} só para enviar)")
+
+        load_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                (day, executor.submit(self._fetch_day, converter, portfolio, day, load_timestamp))
+                for day in pending_download
+            ]
+            for day, future in futures:
+                result = future.result()
+                if result["status"] == "converted":
+                    metrics["converted"] += 1
+                    metrics["bytes"] += result["bytes"]
+                    metrics["rows"] += result["rows"]
+                    status = "converted" if self.uploader else "local"
+                    state.record(index, portfolio, day, status=status, parquet=result["parquet"])
+                    if self.uploader:
+                        pending_upload.append((day, result["parquet"]))
+                else:
+                    metrics[result["status"]] += 1
+                    metrics["errors"][day.isoformat()] = result["error"]
+                    logger.warning(f"  ✗ {day}: {result['error']}")
+                    if result["status"] == "mismatch":
+                        # Feriado ou dia sem pregão: a resposta não muda, então não é pedido de novo
+                        state.record(index, portfolio, day, status="mismatch", error=result["error"])
+
+                if len(pending_upload) >= self.upload_batch_size:
+                    metrics["uploaded"] += self._upload(state, index, portfolio, pending_upload)
+                    pending_upload = []
+
+        partition_index.flush()
+        if pending_upload:
+            metrics["uploaded"] += self._upload(state, index, portfolio, pending_upload)
+
+        elapsed = time.perf_counter() - started
+        metrics["seconds"] = round(elapsed, 3)
+        metrics["files_per_second"] = round(metrics["converted"] / elapsed, 2) if elapsed else 0.0
+        logger.info(f"Backfill concluído: {metrics['converted']} convertido(s), {metrics['uploaded']} enviado(s), "
+                    f"{metrics['failed']} falha(s), {metrics['mismatch']} data(s) divergente(s) "
+                    f"em {elapsed:.1f}s ({metrics['files_per_second']} arquivos/s)")
+        return metrics
+
+    def _upload(self, state, index, portfolio, pending):
+        """
+        Envia um lote de Parquet ao S3 e marca como concluídos os dias enviados
+
+        Returns:
+            int: Número de arquivos enviados com sucesso
+        """
+        items = [(parquet, day.strftime("%d-%m-%y")) for day, parquet in pending]
+        results = self.uploader.upload_batch_to_s3_partitioned(items, max_workers=self.upload_workers,
+                                                               portfolio=portfolio)
+        uploaded = 0
+        for (day, parquet), result in zip(pending, results):
+            if result["success"]:
+                uploaded += 1
+                state.record(index, portfolio, day, status="done", parquet=parquet)
+        return uploaded
@@ -0,0 +1 @@
+"""Benchmarks reprodutíveis do pipeline IBOV (executar a partir da raiz do projeto)."""
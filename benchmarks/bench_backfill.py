@@ -0,0 +1,79 @@
+"""
+Benchmark do backfill histórico (BackfillEngine) contra o servidor local da B3:
+arquivos por segundo com diferentes níveis de concorrência e tempo de uma
+segunda execução, que deve apenas retomar (nenhum dia baixado de novo).
+
+Uso:
+    python -m benchmarks.bench_backfill [--days 250] [--workers 1 4 8] [--latency 0.05] [--s3]
+
+Com --s3, os Parquet também são enviados ao S3 local (ver benchmarks/s3_local.py).
+"""
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from datetime import date
+
+from b3_http_client import B3IndexClient
+from backfill import BackfillEngine
+from benchmarks.fixture_server import FixtureServer
+from benchmarks.synthetic import business_days
+
+
+def run(days=250, worker_counts=(1, 4, 8), latency=0.05, s3=False):
+    """
+    Executa o backfill de `days` dias úteis para cada nível de concorrência
+
+    Returns:
+        dict: Arquivos por segundo de cada execução e tempo da execução retomada
+    """
+    trade_days = business_days(date(2020, 1, 2), days)
+    start, end = trade_days[0], trade_days[-1]
+    uploader = None
+    if s3:
+        from benchmarks.s3_local import empty_prefix, local_downloader
+        uploader = local_downloader()
+
+    results = {"days": days}
+    with FixtureServer(latency=latency) as server:
+        client = B3IndexClient(server.base_url, pool_size=max(worker_counts))
+        for workers in worker_counts:
+            if uploader:
+                empty_prefix(uploader)
+            with tempfile.TemporaryDirectory() as folder:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    engine = BackfillEngine(client, folder, uploader,
+                                            max_workers=workers, rate_limit=0)
+                    metrics = engine.run(start, end)
+                results[f"workers_{workers}_files_per_s"] = metrics["files_per_second"]
+                results[f"workers_{workers}_failed"] = metrics["failed"] + metrics["mismatch"]
+
+                # Segunda execução sobre a mesma pasta: tudo já concluído
+                requests_before = server.state.requests
+                begin = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    resumed = BackfillEngine(client, folder, uploader,
+                                             max_workers=workers, rate_limit=0).run(start, end)
+                results[f"workers_{workers}_resume_ms"] = round(1000 * (time.perf_counter() - begin), 1)
+                results[f"workers_{workers}_resume_requests"] = server.state.requests - requests_before
+                results[f"workers_{workers}_resume_skipped"] = resumed["skipped"]
+        client.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=250)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--s3", action="store_true")
+    args = parser.parse_args()
+
+    for name, value in run(args.days, args.workers, args.latency, args.s3).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Latência de obtenção do navegador: partida a frio vs. sessão aquecida (BrowserSession).
+
+Requer Chrome e chromedriver instalados.
+
+Uso:
+    python -m benchmarks.bench_browser [--uses 10] [--max-uses 5]
+"""
+
+import argparse
+import tempfile
+import time
+
+from browser_session import BrowserSession
+
+
+def run(uses=10, max_uses=5):
+    """
+    Abre uma página trivial `uses` vezes, reciclando o navegador a cada `max_uses`
+
+    Returns:
+        dict: Resumo das latências de partida a frio e reaproveitamento
+    """
+    with tempfile.TemporaryDirectory() as folder, BrowserSession(folder, max_uses=max_uses) as session:
+        start = time.perf_counter()
+        for _ in range(uses):
+            driver = session.acquire()
+            driver.get("data:text/html,<a>Download</a>")
+        summary = session.timing_summary()
+    summary["total_s"] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--uses", type=int, default=10)
+    parser.add_argument("--max-uses", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, value in run(args.uses, args.max_uses).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
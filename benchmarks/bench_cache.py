@@ -0,0 +1,127 @@
+"""
+Benchmark do cache de leitura (portfolio_cache.py): leituras repetidas das mesmas
+carteiras diárias sem cache, com o LRU de tabelas decodificadas e, no S3, com a cópia
+em disco validada pelo ETag.
+
+Simula uma rotina que lê `--days` pregões `--rounds` vezes (ex.: análise de
+rebalanceamento) e mede o tempo por rodada. No S3, a rodada "disk" usa um cache de
+tabelas vazio com a pasta de objetos já preenchida, como um novo processo da rotina.
+Ao final, uma carga nova de um dia é enviada e a leitura seguinte deve trazê-la.
+
+Uso:
+    python -m benchmarks.bench_cache [--days 250] [--rounds 5] [--s3]
+
+Com --s3, as partições são enviadas ao S3 local (ver benchmarks/s3_local.py).
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from datetime import date
+
+from benchmarks.synthetic import write_history
+from csv_to_parquet_converter import CSVToParquetConverter
+from portfolio_cache import PORTFOLIO_CACHE, S3ObjectCache, TableCache
+from portfolio_query import PortfolioQuery
+
+HISTORY_START = date(2020, 1, 2)
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def read_rounds(query, rounds):
+    """Lê o histórico inteiro `rounds` vezes e devolve o tempo de cada rodada"""
+    seconds = []
+    for _ in range(rounds):
+        tables, elapsed = _timed(query.portfolios)
+        seconds.append(round(elapsed, 4))
+    return seconds, len(tables)
+
+
+def bench_tree(make_query, rounds, results, prefix):
+    seconds, days = read_rounds(make_query(table_cache=None, object_cache=None), rounds)
+    results[f"{prefix}_days_read"] = days
+    results[f"{prefix}_no_cache_round_s"] = seconds
+
+    cache = TableCache()
+    seconds, _ = read_rounds(make_query(table_cache=cache, object_cache=None), rounds)
+    results[f"{prefix}_lru_round_s"] = seconds
+    results[f"{prefix}_lru_stats"] = cache.stats()
+    return cache
+
+
+def run(days=250, rounds=5, s3=False):
+    """
+    Mede leituras repetidas com e sem cache
+
+    Returns:
+        dict: Tempo de cada rodada (segundos), acertos/faltas e a verificação da invalidação
+    """
+    results = {"days": days, "rounds": rounds}
+    with tempfile.TemporaryDirectory() as folder:
+        paths = write_history(folder, days=days, start=HISTORY_START, drift=0.01)
+        with contextlib.redirect_stdout(io.StringIO()):
+            converter = CSVToParquetConverter(folder)
+            converter.convert_all_csv_files(workers=os.cpu_count())
+        root = str(converter.index_data_folder)
+        bench_tree(lambda **kwargs: PortfolioQuery(root, **kwargs), rounds, results, "local")
+
+        if s3:
+            from benchmarks.s3_local import empty_prefix, local_downloader
+
+            downloader = local_downloader()
+            empty_prefix(downloader)
+            items = [
+                (os.path.join(dirpath, name), name.split("_IBOVDia_")[1][:8])
+                for dirpath, _, names in os.walk(root) for name in names if name.endswith(".parquet")
+            ]
+            with contextlib.redirect_stdout(io.StringIO()):
+                downloader.upload_batch_to_s3_partitioned(items, max_workers=16, skip_unchanged=False)
+
+            bench_tree(lambda **kwargs: PortfolioQuery.s3(**kwargs), rounds, results, "s3")
+
+            # Cada rodada é um novo processo da rotina: tabelas fora da memória, objetos em disco
+            # (a primeira preenche a pasta; as demais fazem um GET condicional por arquivo)
+            object_cache = S3ObjectCache(downloader.s3_client, downloader.aws_bucket, os.path.join(folder, "s3-cache"))
+            results["s3_disk_round_s"] = [
+                read_rounds(PortfolioQuery.s3(object_cache=object_cache, table_cache=TableCache()), 1)[0][0]
+                for _ in range(rounds)
+            ]
+            results["s3_disk_stats"] = object_cache.stats()
+
+            # Carga nova de um dia pelo uploader: a próxima leitura deve trazê-la (cache do processo)
+            query = PortfolioQuery.s3(object_cache=object_cache)
+            day = date(2020, 1, 2)
+            query.portfolio(day)
+            with contextlib.redirect_stdout(io.StringIO()):
+                new_path = converter.convert_csv_to_parquet(paths[0], remove_original=False,
+                                                            load_timestamp="29991231_235959")
+                downloader.upload_to_s3_partitioned(str(new_path), "02-01-20", skip_unchanged=False)
+            misses = PORTFOLIO_CACHE.stats()["misses"]
+            query.portfolio(day)
+            reloaded = query._day_sources(day, day)[day.isoformat()][1] == "29991231_235959"
+            results["s3_invalidation_reloaded"] = reloaded and PORTFOLIO_CACHE.stats()["misses"] == misses + 1
+            downloader.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=250)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--s3", action="store_true")
+    args = parser.parse_args()
+
+    for name, value in run(args.days, args.rounds, args.s3).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Benchmark do armazenamento CDC (cdc.py) contra as partições de snapshots diários:
+espaço em disco, tempo de construção e tempo de reconstrução de datas e intervalos
+sobre um histórico sintético de vários anos, com troca de ativos nos rebalanceamentos.
+
+Com --drift 0 a participação só muda nos rebalanceamentos; com drift > 0 os preços
+variam todo dia e cada pregão registra uma atualização por ativo (pior caso do CDC).
+Cada valor de --checkpoint-every gera um cenário: menos pregões entre checkpoints
+deixam a reconstrução de uma data mais rápida e ocupam mais espaço. A abertura do CDC
+é medida com o _catalog.json e sem ele (leitura de todos os arquivos de mudanças).
+
+Uso:
+    python -m benchmarks.bench_cdc [--days 2500] [--churn 2] [--drift 0 0.01] [--samples 200]
+        [--checkpoint-every 5 10 20]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+from datetime import date
+
+import pyarrow as pa
+
+from benchmarks.synthetic import write_history
+from cdc import CATALOG_FILENAME, CHECKPOINT_EVERY, CDCStore, snapshot_tables, table_rows
+from compaction import LocalPartitionStore, classify
+from csv_to_parquet_converter import CSVToParquetConverter
+
+
+def folder_usage(folder):
+    """Número de arquivos Parquet e bytes na pasta"""
+    files = [os.path.join(dirpath, name) for dirpath, _, names in os.walk(folder)
+             for name in names if name.endswith(".parquet")]
+    return len(files), sum(os.path.getsize(path) for path in files)
+
+
+class CountingStore(LocalPartitionStore):
+    """LocalPartitionStore que conta as leituras (no S3, uma requisição cada)"""
+
+    reads = 0
+
+    def read(self, relative_path):
+        self.reads += 1
+        return super().read(relative_path)
+
+    def read_bytes(self, relative_path):
+        self.reads += 1
+        return super().read_bytes(relative_path)
+
+
+def open_cdc(folder, checkpoint_every):
+    """Abre o CDC do zero, devolvendo o tempo (ms) e o número de leituras"""
+    store = CountingStore(folder)
+    start = time.perf_counter()
+    CDCStore(store, checkpoint_every=checkpoint_every)
+    return round(1000 * (time.perf_counter() - start), 3), store.reads
+
+
+def run_scenario(days, churn, drift, samples, checkpoint_every=CHECKPOINT_EVERY, seed=0):
+    """
+    Gera o histórico, converte, constrói o CDC e compara leituras
+
+    Returns:
+        dict: Espaço, tempos de construção e de reconstrução (data e ano)
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        write_history(folder, days=days, churn=churn, drift=drift, start=date(2015, 1, 2))
+        with contextlib.redirect_stdout(io.StringIO()):
+            converter = CSVToParquetConverter(folder)
+            converter.convert_all_csv_files(workers=os.cpu_count(), skip_unchanged=False)
+
+        snapshots = LocalPartitionStore(converter.index_data_folder)
+        by_day = {}
+        for relative_path in snapshots.list_files():
+            info = classify(relative_path)
+            by_day[f"{info['year']}-{info['month']}-{info['day']}"] = relative_path
+
+        start = time.perf_counter()
+        cdc = CDCStore(LocalPartitionStore(converter.cdc_folder), checkpoint_every=checkpoint_every)
+        totals = cdc.rebuild(snapshot_tables(snapshots))
+        results["cdc_build_s"] = round(time.perf_counter() - start, 3)
+        results.update({f"cdc_{key}": value for key, value in totals.items()})
+
+        results["snapshot_files"], results["snapshot_bytes"] = folder_usage(converter.index_data_folder)
+        results["cdc_files"], results["cdc_bytes"] = folder_usage(converter.cdc_folder)
+        results["cdc_size_ratio"] = round(results["cdc_bytes"] / results["snapshot_bytes"], 3)
+
+        # Abertura com o catálogo e sem ele (o CDC regrava o catálogo ao abrir)
+        results["cdc_open_ms"], results["cdc_open_reads"] = open_cdc(converter.cdc_folder, checkpoint_every)
+        os.remove(os.path.join(converter.cdc_folder, CATALOG_FILENAME))
+        results["cdc_open_no_catalog_ms"], results["cdc_open_no_catalog_reads"] = open_cdc(
+            converter.cdc_folder, checkpoint_every)
+
+        # Reconstrução de datas aleatórias com o CDC aberto do zero (sem cache)
+        sample = sorted(random.Random(seed).sample(sorted(by_day), min(samples, len(by_day))))
+        cdc = CDCStore(LocalPartitionStore(converter.cdc_folder), checkpoint_every=checkpoint_every)
+        start = time.perf_counter()
+        rebuilt = [cdc.snapshot(date.fromisoformat(day)) for day in sample]
+        results["cdc_date_ms"] = round(1000 * (time.perf_counter() - start) / len(sample), 3)
+
+        start = time.perf_counter()
+        stored = [snapshots.read(by_day[day]) for day in sample]
+        results["snapshot_date_ms"] = round(1000 * (time.perf_counter() - start) / len(sample), 3)
+        results["mismatches"] = sum(1 for a, b in zip(rebuilt, stored) if table_rows(a) != table_rows(b))
+
+        # Um ano inteiro: aplicação sequencial das mudanças vs. leitura de todos os arquivos do ano
+        year = sample[len(sample) // 2][:4]
+        start = time.perf_counter()
+        cdc_year = cdc.read_range(date(int(year), 1, 1), date(int(year), 12, 31))
+        results["cdc_year_s"] = round(time.perf_counter() - start, 4)
+        start = time.perf_counter()
+        snapshot_year = pa.concat_tables(
+            [snapshots.read(path) for day, path in sorted(by_day.items()) if day.startswith(year)]
+        )
+        results["snapshot_year_s"] = round(time.perf_counter() - start, 4)
+        results["year_rows_match"] = cdc_year.num_rows == snapshot_year.num_rows
+    return results
+
+
+def run(days=2500, churn=2, drifts=(0.0, 0.01), samples=200, checkpoint_every=(CHECKPOINT_EVERY,)):
+    """
+    Executa um cenário por valor de drift e de checkpoint_every
+
+    Returns:
+        dict: Métricas de cada cenário, prefixadas por drift_<valor> (e every_<valor> com mais de um)
+    """
+    results = {"days": days, "churn": churn}
+    for drift in drifts:
+        for every in checkpoint_every:
+            prefix = f"drift_{drift}_every_{every}" if len(checkpoint_every) > 1 else f"drift_{drift}"
+            for key, value in run_scenario(days, churn, drift, samples, every).items():
+                results[f"{prefix}_{key}"] = value
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=2500)
+    parser.add_argument("--churn", type=int, default=2)
+    parser.add_argument("--drift", type=float, nargs="+", default=[0.0, 0.01])
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--checkpoint-every", type=int, nargs="+", default=[CHECKPOINT_EVERY])
+    args = parser.parse_args()
+
+    for name, value in run(args.days, args.churn, args.drift, args.samples, args.checkpoint_every).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
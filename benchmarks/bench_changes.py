@@ -0,0 +1,125 @@
+"""
+Benchmark das variações diárias (portfolio_changes.py): junção vetorizada do Arrow entre
+pregões consecutivos vs. o script anterior em pandas, que lia o histórico inteiro e
+comparava as carteiras linha a linha.
+
+Mede, sobre um histórico sintético com rebalanceamentos (entradas e saídas):
+
+    - pandas_rowwise: pd.read_parquet da árvore e, para cada par de dias, laço por ativo
+    - vectorized: compute_changes sobre as mesmas carteiras (só o cálculo)
+    - backfill: PortfolioChanges.backfill do histórico inteiro (leitura + cálculo + gravação)
+    - incremental: nova carga de um dia do meio do histórico e update (esse dia e o seguinte)
+
+e confere que o giro por dia é o mesmo nas duas implementações.
+
+Uso:
+    python -m benchmarks.bench_changes [--days 750]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import write_history
+from compaction import LocalPartitionStore
+from csv_to_parquet_converter import CSVToParquetConverter
+from portfolio_cache import TableCache
+from portfolio_changes import PortfolioChanges, compute_changes
+from portfolio_query import PortfolioQuery
+
+HISTORY_START = date(2020, 1, 2)
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def pandas_rowwise(root):
+    """Script anterior: histórico inteiro em um DataFrame e comparação ativo a ativo"""
+    frame = pd.read_parquet(root)
+    frame["codigo"] = frame["codigo"].astype(str)
+    days = sorted(frame["data"].unique())
+    by_day = {day: group for day, group in frame.groupby("data")}
+    turnovers = {}
+    for previous_day, day in zip(days, days[1:]):
+        previous = {row.codigo: row.participacao for row in by_day[previous_day].itertuples()}
+        current = {row.codigo: row.participacao for row in by_day[day].itertuples()}
+        total = 0.0
+        for code in set(previous) | set(current):
+            total += abs(current.get(code, 0.0) - previous.get(code, 0.0))
+        turnovers[pd.Timestamp(day).date()] = total / 2
+    return turnovers
+
+
+def vectorized(portfolios):
+    """Só o cálculo vetorizado, sobre carteiras já em memória"""
+    days = list(portfolios)
+    return [compute_changes(portfolios[previous_day], portfolios[day], previous_day, day)
+            for previous_day, day in zip(days, days[1:])]
+
+
+def run(days=750):
+    """
+    Mede o cálculo das variações pelo pandas linha a linha e pela junção vetorizada
+
+    Returns:
+        dict: Tempos (segundos), dias calculados e conferência do giro
+    """
+    results = {"days": days}
+    with tempfile.TemporaryDirectory() as folder:
+        paths = write_history(folder, days=days, start=HISTORY_START, churn=2, drift=0.01)
+        with contextlib.redirect_stdout(io.StringIO()):
+            converter = CSVToParquetConverter(folder)
+            converter.convert_all_csv_files(workers=os.cpu_count())
+        root = str(converter.index_data_folder)
+
+        expected, seconds = _timed(pandas_rowwise, root)
+        results["pandas_rowwise_s"] = round(seconds, 3)
+
+        portfolios = PortfolioQuery(root, table_cache=None).portfolios()
+        _, seconds = _timed(vectorized, portfolios)
+        results["vectorized_compute_s"] = round(seconds, 3)
+
+        changes = PortfolioChanges(PortfolioQuery(root, table_cache=TableCache()),
+                                   LocalPartitionStore(os.path.join(folder, "ibov-changes")))
+        report, seconds = _timed(changes.backfill)
+        results["backfill_s"] = round(seconds, 3)
+        results["backfill_days"] = report["days"]
+
+        table = changes.turnover()
+        computed = dict(zip(table["data"].to_pylist(), table["giro"].to_pylist()))
+        results["turnover_matches"] = (computed.keys() == expected.keys() and bool(np.allclose(
+            [computed[day] for day in expected], list(expected.values()))))
+        results["turnover_rebalance_days"] = int(sum(value > 1 for value in computed.values()))
+
+        # Nova carga de um dia do meio do histórico: só ele e o pregão seguinte são refeitos
+        with contextlib.redirect_stdout(io.StringIO()):
+            converter.convert_csv_to_parquet(paths[days // 2], remove_original=False,
+                                             load_timestamp="29991231_235959")
+        day = list(portfolios)[days // 2]
+        report, seconds = _timed(changes.update, [day])
+        results["incremental_s"] = round(seconds, 4)
+        results["incremental_days"] = report["days"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=750)
+    args = parser.parse_args()
+
+    for name, value in run(args.days).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
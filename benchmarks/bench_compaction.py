@@ -0,0 +1,106 @@
+"""
+Benchmark da compactação de partições: arquivos e tempo de leitura completa antes e
+depois de compactar um histórico sintético, com cargas repetidas de alguns dias.
+
+Uso:
+    python -m benchmarks.bench_compaction [--days 1000] [--repeat-every 10] [--period month] [--s3]
+
+Com --s3, as partições também são enviadas e compactadas no S3 local
+(ver benchmarks/s3_local.py).
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+
+import pyarrow.compute as pc
+
+from benchmarks.synthetic import write_history
+from compaction import LocalPartitionStore, PartitionCompactor, S3PartitionStore
+from csv_to_parquet_converter import CSVToParquetConverter
+
+
+def build_history(folder, days, repeat_every):
+    """
+    Gera `days` partições diárias e recarrega um a cada `repeat_every` dias
+    (a segunda carga tem timestamp posterior e deve ser a mantida)
+
+    Returns:
+        tuple: (conversor, arquivos convertidos, número de cargas repetidas)
+    """
+    paths = write_history(folder, days=days)
+    converter = CSVToParquetConverter(folder)
+    stats = converter.convert_all_csv_files(workers=os.cpu_count(), skip_unchanged=False)
+    repeated = 0
+    for path in paths[::repeat_every]:
+        converter.convert_csv_to_parquet(path, remove_original=False, load_timestamp="29991231_235959")
+        repeated += 1
+    return converter, stats["converted"], repeated
+
+
+def summarize(report, prefix, results):
+    for key in ("files_before", "files_after", "scan_before_seconds", "scan_after_seconds",
+                "scan_rows_before", "scan_rows_after", "loads_dropped", "seconds"):
+        results[f"{prefix}_{key}"] = report[key]
+    results[f"{prefix}_errors"] = len(report["errors"])
+
+
+def run(days=1000, repeat_every=10, period="month", s3=False):
+    """
+    Compacta o histórico localmente (e no S3 local, se pedido)
+
+    Returns:
+        dict: Contagens de arquivos e tempos de leitura antes e depois
+    """
+    results = {"days": days}
+    with tempfile.TemporaryDirectory() as folder:
+        with contextlib.redirect_stdout(io.StringIO()):
+            converter, _, repeated = build_history(folder, days, repeat_every)
+        results["repeated_loads"] = repeated
+
+        s3_store = None
+        if s3:
+            from benchmarks.s3_local import empty_prefix, local_downloader
+            downloader = local_downloader()
+            empty_prefix(downloader)
+            root = str(converter.index_data_folder)
+            items = [
+                (os.path.join(dirpath, name), name.split("_IBOVDia_")[1][:8])
+                for dirpath, _, names in os.walk(root) for name in names if name.endswith(".parquet")
+            ]
+            with contextlib.redirect_stdout(io.StringIO()):
+                downloader.upload_batch_to_s3_partitioned(items, max_workers=16, skip_unchanged=False)
+            s3_store = S3PartitionStore(downloader.s3_client, downloader.aws_bucket, "ibov_data/")
+
+        local_store = LocalPartitionStore(converter.index_data_folder)
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = PartitionCompactor(local_store, period=period).run(benchmark=True)
+        summarize(report, "local", results)
+
+        # Conferência: um conjunto de linhas por dia, vindo da carga mais recente
+        table = local_store.read(local_store.list_files()[0])
+        results["local_days_in_first_file"] = len(pc.unique(table["data"]))
+
+        if s3_store:
+            with contextlib.redirect_stdout(io.StringIO()):
+                report = PartitionCompactor(s3_store, period=period).run(benchmark=True)
+            summarize(report, "s3", results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=1000)
+    parser.add_argument("--repeat-every", type=int, default=10)
+    parser.add_argument("--period", choices=("month", "year"), default="month")
+    parser.add_argument("--s3", action="store_true")
+    args = parser.parse_args()
+
+    for name, value in run(args.days, args.repeat_every, args.period, args.s3).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark da leitura do histórico local completo: pd.read_parquet da árvore vs. o cache
+Arrow IPC mapeado em memória (history_cache.py).
+
+Cada forma de leitura roda em um processo novo, que mede o tempo de carga e o pico de
+memória residente (VmHWM, zerado depois dos imports) acima da memória do processo só
+com os imports:
+
+    - pandas: pd.read_parquet(<índice>-data) e um cálculo sobre participacao
+    - mmap_numpy: load_history + numpy_views (sem cópia) e o mesmo cálculo
+    - mmap_pandas: load_history + to_pandas (Categorical e datetime64)
+
+Uso:
+    python -m benchmarks.bench_history_load [--days 2500]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+from benchmarks.synthetic import write_history
+from csv_to_parquet_converter import CSVToParquetConverter
+
+HISTORY_START = date(2010, 1, 4)
+
+MODES = ("pandas", "mmap_numpy", "mmap_pandas")
+
+
+def _status_mb(field):
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _reset_peak_rss():
+    """Zera o pico de memória do processo (Linux 4.0+); sem suporte, o pico inclui os imports"""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def child(mode, root):
+    """Carrega o histórico de uma forma e devolve tempo, pico de memória e tamanho do resultado"""
+    import numpy as np
+    import pandas as pd
+
+    import history_cache
+
+    _reset_peak_rss()
+    baseline = _status_mb("VmRSS")
+    start = time.perf_counter()
+    if mode == "pandas":
+        frame = pd.read_parquet(root)
+        total = float(frame["participacao"].sum())
+        result_mb = frame.memory_usage(deep=True).sum() / 1024 / 1024
+    elif mode == "mmap_numpy":
+        views = history_cache.numpy_views(history_cache.load_history(root, rebuild_if_stale=False))
+        total = float(np.sum(views["participacao"]))
+        result_mb = sum(view.nbytes for view in views.values()) / 1024 / 1024
+    else:
+        frame = history_cache.to_pandas(history_cache.load_history(root, rebuild_if_stale=False))
+        total = float(frame["participacao"].sum())
+        result_mb = frame.memory_usage(deep=True).sum() / 1024 / 1024
+    seconds = time.perf_counter() - start
+    return {"seconds": round(seconds, 3), "rss_delta_mb": round(_status_mb("VmHWM") - baseline, 1),
+            "result_mb": round(result_mb, 1), "checksum": round(total, 3)}
+
+
+def run_child(mode, root):
+    output = subprocess.run([sys.executable, "-m", "benchmarks.bench_history_load", "--child", mode, root],
+                            capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def run(days=2500):
+    """
+    Mede tempo e memória de cada forma de leitura do histórico
+
+    Returns:
+        dict: Tempo (segundos), pico de memória acima dos imports e tamanho do resultado (MB)
+    """
+    import history_cache
+
+    results = {"days": days}
+    with tempfile.TemporaryDirectory() as folder:
+        write_history(folder, days=days, start=HISTORY_START, churn=2, drift=0.01)
+        with contextlib.redirect_stdout(io.StringIO()):
+            converter = CSVToParquetConverter(folder)
+            converter.convert_all_csv_files(workers=os.cpu_count())
+        root = str(converter.index_data_folder)
+
+        start = time.perf_counter()
+        report = history_cache.build_history_cache(root)
+        results["cache_build_s"] = round(time.perf_counter() - start, 3)
+        results["cache_rows"] = report["rows"]
+        results["cache_mb"] = round(report["bytes"] / 1024 / 1024, 1)
+
+        checksums = set()
+        for mode in MODES:
+            measured = run_child(mode, root)
+            checksums.add(measured.pop("checksum"))
+            for name, value in measured.items():
+                results[f"{mode}_{name}"] = value
+        results["checksums_match"] = len(checksums) == 1
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=2500)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "ROOT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(*args.child)))
+        return
+    for name, value in run(args.days).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark do download pela API (B3IndexClient) contra um servidor local com dados
+gravados: sessão persistente com pool de conexões vs. nova conexão por download.
+
+Uso:
+    python -m benchmarks.bench_http_download [--downloads 200] [--latency 0.02]
+"""
+
+import argparse
+import time
+
+import requests
+
+from b3_csv_parser import parse_ibov_csv
+from b3_http_client import B3IndexClient, decode_csv_payload
+from benchmarks.fixture_server import FixtureServer
+
+
+def run(downloads=200, latency=0.02):
+    """
+    Mede o tempo médio por download em cada modo
+
+    Returns:
+        dict: Tempos médios em milissegundos e verificação do conteúdo
+    """
+    results = {"downloads": downloads}
+    with FixtureServer(latency=latency, fail_first=2) as server:
+        client = B3IndexClient(server.base_url, backoff_factor=0.01)
+
+        # As duas primeiras respostas são 503: o cliente deve repetir e obter o CSV
+        content = client.download_portfolio_csv("IBOV")
+        table, title_date = parse_ibov_csv(content)
+        results["rows"] = table.num_rows
+        results["title_date"] = "/".join(title_date)
+        results["retried_requests"] = server.state.requests - 1
+
+        start = time.perf_counter()
+        for _ in range(downloads):
+            client.download_portfolio_csv("IBOV")
+        results["pooled_ms"] = round(1000 * (time.perf_counter() - start) / downloads, 2)
+        client.close()
+
+        url = client.build_url("GetDownloadPortfolioDay", {"index": "IBOV", "language": "pt-br"})
+        start = time.perf_counter()
+        for _ in range(downloads):
+            with requests.Session() as session:
+                decode_csv_payload(session.get(url, headers={"Connection": "close"}).content)
+        results["new_connection_ms"] = round(1000 * (time.perf_counter() - start) / downloads, 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--downloads", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    for name, value in run(args.downloads, args.latency).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
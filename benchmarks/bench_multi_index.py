@@ -0,0 +1,62 @@
+"""
+Benchmark do modo multi-índice (download_indices) contra o servidor local da B3 e
+um S3 local: índices processados um a um vs. em paralelo com recursos compartilhados.
+
+Uso:
+    python -m benchmarks.bench_multi_index [--indices all] [--workers 1 4 8] [--latency 0.2]
+"""
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+
+from b3_indices import parse_index_list, s3_prefix
+from benchmarks.fixture_server import FixtureServer
+from benchmarks.s3_local import empty_prefix, local_downloader
+
+
+def run(indices, worker_counts=(1, 4, 8), latency=0.2):
+    """
+    Mede o tempo total para baixar, converter e enviar os índices pela API
+
+    Returns:
+        dict: Tempo total por número de índices simultâneos e objetos enviados ao S3
+    """
+    downloader = local_downloader()
+    results = {"indices": len(indices)}
+    with FixtureServer(latency=latency) as server, tempfile.TemporaryDirectory() as folder:
+        downloader.base_url = server.base_url
+        downloader.data_folder = folder
+        for workers in worker_counts:
+            for index in indices:
+                empty_prefix(downloader, s3_prefix(index))
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                summaries = downloader.download_indices(indices, max_workers=workers, methods=("api",))
+            results[f"workers_{workers}_s"] = round(time.perf_counter() - start, 3)
+            results[f"workers_{workers}_failed"] = sum(1 for summary in summaries if not summary["success"])
+
+        uploaded = 0
+        for index in indices:
+            response = downloader.s3_client.list_objects_v2(Bucket=downloader.aws_bucket, Prefix=s3_prefix(index))
+            uploaded += response.get("KeyCount", 0)
+        results["objects_last_run"] = uploaded
+    downloader.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--indices", type=parse_index_list, default=parse_index_list("all"))
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    for name, value in run(args.indices, args.workers, args.latency).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
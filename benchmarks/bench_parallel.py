@@ -0,0 +1,60 @@
+"""
+Benchmark de escalabilidade de convert_all_csv_files com diferentes números de processos.
+
+Uso:
+    python -m benchmarks.bench_parallel [--days 2000] [--workers 1 2 4 8]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import write_history
+from csv_to_parquet_converter import CSVToParquetConverter
+
+
+def run(days=2000, worker_counts=(1, 2, 4, 8)):
+    """
+    Converte o mesmo histórico sintético com cada número de processos
+
+    Returns:
+        list: Um dicionário por número de processos com tempo e speedup
+    """
+    results = []
+    baseline = None
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as folder:
+            write_history(folder, days=days)
+            with contextlib.redirect_stdout(io.StringIO()):
+                converter = CSVToParquetConverter(folder)
+                start = time.perf_counter()
+                stats = converter.convert_all_csv_files(remove_originals=False, workers=workers)
+                elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        results.append({
+            "workers": workers,
+            "files": stats["converted"],
+            "wall_s": round(elapsed, 3),
+            "files_per_s": round(stats["converted"] / elapsed, 1),
+            "speedup": round(baseline / elapsed, 2),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    print(f"CPUs disponíveis: {os.cpu_count()}")
+    for result in run(args.days, args.workers):
+        print(f"{result['workers']:>3} processo(s): {result['wall_s']:>7.3f}s  "
+              f"{result['files_per_s']:>8.1f} arquivos/s  speedup {result['speedup']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
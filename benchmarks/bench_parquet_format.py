@@ -0,0 +1,113 @@
+"""
+Benchmark do formato Parquet: tamanho em disco e tempo de leitura da saída original
+(df.to_parquet com tipos inferidos e compressão padrão) contra o esquema fixo
+(IBOV_SCHEMA: dicionários, int64, date32) com diferentes opções de gravação.
+
+Mede arquivos diários (um por carga) e um arquivo único com todo o histórico
+(como após a compactação).
+
+Uso:
+    python -m benchmarks.bench_parquet_format [--days 500] [--codecs snappy zstd] [--reads 3]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from b3_csv_parser import parse_ibov_csv
+from benchmarks.bench_parser import legacy_parse
+from benchmarks.synthetic import write_history
+from parquet_options import ParquetWriteOptions
+
+
+def legacy_frame(table):
+    """DataFrame como o dos conversores originais: textos como object e qtde_teorica float"""
+    return table.to_pandas().astype({'codigo': object, 'acao': object, 'tipo': object, 'qtde_teorica': float})
+
+
+def legacy_write(df, path):
+    """Gravação original dos conversores: tipos inferidos do DataFrame, compressão padrão"""
+    df.to_parquet(path, index=False, engine='pyarrow')
+
+
+def measure(folder, items, write, reads):
+    """
+    Grava os itens (um arquivo por item) e lê todos os arquivos `reads` vezes
+
+    Returns:
+        dict: Bytes em disco, tempo de gravação e melhor tempo de leitura completa
+    """
+    os.makedirs(folder)
+    start = time.perf_counter()
+    paths = []
+    for position, item in enumerate(items):
+        path = os.path.join(folder, f"{position:05d}.parquet")
+        write(item, path)
+        paths.append(path)
+    write_seconds = time.perf_counter() - start
+
+    read_seconds = []
+    for _ in range(reads):
+        start = time.perf_counter()
+        for path in paths:
+            pq.read_table(path)
+        read_seconds.append(time.perf_counter() - start)
+    return {
+        "bytes": sum(os.path.getsize(path) for path in paths),
+        "write_s": round(write_seconds, 3),
+        "read_s": round(min(read_seconds), 4),
+    }
+
+
+def run(days=500, codecs=("snappy", "zstd"), reads=3):
+    """
+    Compara a saída original com o esquema fixo para cada codec
+
+    Returns:
+        dict: Métricas por formato, para arquivos diários e para o histórico em um arquivo
+    """
+    results = {"days": days}
+    with tempfile.TemporaryDirectory() as folder:
+        paths = write_history(os.path.join(folder, "csv"), days=days)
+        daily = [parse_ibov_csv(path)[0] for path in paths]
+        # Conferir que a leitura original gera os mesmos valores
+        assert legacy_parse(paths[0], *parse_ibov_csv(paths[0])[1])['qtde_teorica'].tolist() == \
+            daily[0]['qtde_teorica'].to_pylist()
+        history = [pa.concat_tables(daily).unify_dictionaries().combine_chunks()]
+
+        formats = {"legacy": legacy_write}
+        for codec in codecs:
+            formats[f"schema_{codec}"] = ParquetWriteOptions(compression=codec).write_table
+        formats["schema_zstd_no_stats"] = ParquetWriteOptions(write_statistics=False).write_table
+
+        for layout, tables in (("daily", daily), ("history", history)):
+            frames = [legacy_frame(table) for table in tables]
+            for name, write in formats.items():
+                items = frames if name == "legacy" else tables
+                metrics = measure(os.path.join(folder, layout, name), items, write, reads)
+                for key, value in metrics.items():
+                    results[f"{layout}_{name}_{key}"] = value
+            for name in formats:
+                results[f"{layout}_{name}_size_ratio"] = round(
+                    results[f"{layout}_{name}_bytes"] / results[f"{layout}_legacy_bytes"], 3
+                )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=500)
+    parser.add_argument("--codecs", nargs="+", default=["snappy", "zstd"])
+    parser.add_argument("--reads", type=int, default=3)
+    args = parser.parse_args()
+
+    for name, value in run(args.days, args.codecs, args.reads).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark do parser vetorizado (b3_csv_parser) contra a leitura original com
+pd.read_csv(engine='python', skipfooter=2) seguida das limpezas com .str.
+
+Uso:
+    python -m benchmarks.bench_parser [--days 500] [--rows 90]
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import date
+
+import pandas as pd
+
+from b3_csv_parser import parse_ibov_csv
+from benchmarks.synthetic import write_history
+
+
+def legacy_parse(csv_file_path, day, month, year):
+    """Reprodução da leitura original dos conversores (referência do benchmark)"""
+    df = pd.read_csv(csv_file_path, encoding='latin1', sep=';', skiprows=2,
+                     skipfooter=2, engine='python', header=None)
+    df = df.iloc[:, :-1]
+    df.columns = ['codigo', 'acao', 'tipo', 'qtde_teorica', 'participacao']
+    df['qtde_teorica'] = df['qtde_teorica'].astype(str).str.replace('.', '').astype(float)
+    df['participacao'] = df['participacao'].astype(str).str.replace(',', '.').astype(float)
+    df['codigo'] = df['codigo'].astype(str).str.strip()
+    df['acao'] = df['acao'].astype(str).str.strip()
+    df['tipo'] = df['tipo'].astype(str).str.strip()
+    df['data'] = pd.to_datetime(f"{year}-{month}-{day}").date()
+    return df
+
+
+def _cpu_time(func, paths):
+    start = time.process_time()
+    for path in paths:
+        func(path)
+    return time.process_time() - start
+
+
+def run(days=500, rows=90):
+    """
+    Executa o benchmark e retorna os tempos de CPU de cada implementação
+
+    Returns:
+        dict: Tempos em segundos e a razão vetorizado/original
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        paths = write_history(folder, days=days, rows=rows, start=date(2020, 1, 2))
+
+        # Conferir que as duas implementações geram os mesmos dados
+        expected = legacy_parse(paths[0], '02', '01', '2020')
+        table, _ = parse_ibov_csv(paths[0])
+        # Colunas de dicionário viram Categorical no pandas: comparar os valores como texto
+        got = table.to_pandas().astype({'codigo': str, 'acao': str, 'tipo': str})
+        pd.testing.assert_frame_equal(expected, got, check_dtype=False)
+
+        legacy = _cpu_time(lambda p: legacy_parse(p, '02', '01', '2020'), paths)
+        vectorized = _cpu_time(parse_ibov_csv, paths)
+
+    return {
+        "files": days,
+        "rows_per_file": rows,
+        "legacy_cpu_s": round(legacy, 4),
+        "vectorized_cpu_s": round(vectorized, 4),
+        "ratio": round(vectorized / legacy, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=90)
+    args = parser.parse_args()
+
+    result = run(args.days, args.rows)
+    print(f"Arquivos: {result['files']} x {result['rows_per_file']} linhas")
+    print(f"Original (engine python): {result['legacy_cpu_s']:.3f}s de CPU")
+    print(f"Vetorizado (pyarrow):     {result['vectorized_cpu_s']:.3f}s de CPU")
+    print(f"Razão: {result['ratio']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Benchmark do índice de partições: listagem, planejamento e abertura do dataset pelo
+_partitions.json/_metadata vs. percorrer a árvore, com 10.000+ partições diárias.
+
+Uso:
+    python -m benchmarks.bench_partition_index [--partitions 10000] [--s3] [--s3-partitions 2000]
+
+Com --s3, as partições (as primeiras --s3-partitions) também são enviadas ao S3 local
+(ver benchmarks/s3_local.py) e a listagem paginada é comparada com a leitura do índice.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from b3_indices import parquet_filename
+from benchmarks.synthetic import business_days, make_portfolio, render_ibov_csv
+from b3_csv_parser import parse_ibov_csv
+from compaction import LocalPartitionStore, PartitionCompactor, S3PartitionStore
+from parquet_options import ParquetWriteOptions
+from partition_index import METADATA_FILENAME, PartitionIndex
+
+LOAD_TIMESTAMP = "20250101_000000"
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def build_tree(root, partitions):
+    """
+    Grava uma partição ano=/mes=/dia= por pregão a partir de 1990 (mesma carteira,
+    data de cada dia), sem índice de partições
+
+    Returns:
+        list: Caminhos relativos gravados
+    """
+    days = business_days(date(1990, 1, 2), partitions)
+    content = render_ibov_csv(days[0], make_portfolio())
+    base, _ = parse_ibov_csv(content, (f"{days[0].day:02d}", f"{days[0].month:02d}", str(days[0].year)))
+    options = ParquetWriteOptions.from_env()
+    data_column = base.schema.get_field_index("data")
+    relative_paths = []
+    for day in days:
+        table = base.set_column(data_column, base.schema.field("data"),
+                                pa.array([day] * base.num_rows, pa.date32()))
+        dd, mm, yyyy = f"{day.day:02d}", f"{day.month:02d}", str(day.year)
+        relative = f"ano={yyyy}/mes={mm}/dia={dd}/{parquet_filename('IBOV', LOAD_TIMESTAMP, dd, mm, yyyy)}"
+        os.makedirs(os.path.join(root, os.path.dirname(relative)), exist_ok=True)
+        options.write_table(table, os.path.join(root, relative))
+        relative_paths.append(relative)
+    return relative_paths
+
+
+def rglob_structure(root):
+    """Listagem anterior ao índice: rglob da árvore e dicionários por partes do caminho"""
+    from pathlib import Path
+    structure = {}
+    for file in Path(root).rglob("*.parquet"):
+        parts = file.parts
+        ano, mes, dia = (part.split("=")[1] for part in parts[-4:-1])
+        structure.setdefault(ano, {}).setdefault(mes, {}).setdefault(dia, []).append(file.name)
+    return structure
+
+
+def bench_local(root, relative_paths, results):
+    store = LocalPartitionStore(root)
+
+    structure, seconds = _timed(rglob_structure, root)
+    results["rglob_structure_s"] = round(seconds, 4)
+    files, seconds = _timed(store.list_files)
+    results["walk_list_files_s"] = round(seconds, 4)
+
+    report, seconds = _timed(PartitionIndex(store).rebuild)
+    results["rebuild_s"] = round(seconds, 3)
+    results["rebuild_excluded"] = report["excluded"]
+    results["index_json_kb"] = round(os.path.getsize(os.path.join(root, "_partitions.json")) / 1024, 1)
+    results["metadata_kb"] = round(os.path.getsize(os.path.join(root, METADATA_FILENAME)) / 1024, 1)
+
+    index, seconds = _timed(PartitionIndex.load, store)
+    results["index_load_s"] = round(seconds, 4)
+    indexed_structure, seconds = _timed(lambda: PartitionIndex.load(store).structure())
+    results["index_structure_s"] = round(seconds, 4)
+    results["structure_matches"] = (
+        sum(len(names) for months in structure.values() for days in months.values() for names in days.values())
+        == sum(len(names) for months in indexed_structure.values() for days in months.values()
+               for names in days.values())
+        and index.files() == files
+    )
+
+    # Planejamento da compactação: listagem da árvore vs. índice
+    _, seconds = _timed(PartitionCompactor(store).plan)
+    results["plan_walk_s"] = round(seconds, 4)
+    _, seconds = _timed(lambda: PartitionCompactor(store, partition_index=PartitionIndex.load(store)).plan())
+    results["plan_index_s"] = round(seconds, 4)
+
+    # Um novo arquivo: rodapé já disponível na gravação, _metadata acrescentado
+    last = relative_paths[-1]
+    new_relative = last.replace(LOAD_TIMESTAMP, "20250102_000000")
+    footers = []
+    table = store.read(last)
+    ParquetWriteOptions.from_env().write_table(table, os.path.join(root, new_relative), metadata_collector=footers)
+
+    def add_and_flush():
+        index.add(new_relative, footers[0], os.path.getsize(os.path.join(root, new_relative)))
+        index.flush()
+    _, seconds = _timed(add_and_flush)
+    results["incremental_flush_s"] = round(seconds, 4)
+
+    # Remoção: o _metadata é refeito a partir dele mesmo, sem ler os rodapés dos arquivos restantes
+    footer_reads = []
+    read_footer = store.file_metadata
+    store.file_metadata = lambda path: footer_reads.append(path) or read_footer(path)
+
+    def remove_and_flush():
+        os.remove(os.path.join(root, new_relative))
+        index.remove([new_relative])
+        index.flush()
+    _, seconds = _timed(remove_and_flush)
+    store.file_metadata = read_footer
+    results["remove_flush_s"] = round(seconds, 4)
+    results["remove_footer_reads"] = len(footer_reads)
+
+    # Leitores: descoberta da árvore vs. dataset montado pelo _metadata
+    def discover():
+        dataset = ds.dataset(root, format="parquet", partitioning="hive")
+        return dataset.count_rows()
+    rows, seconds = _timed(discover)
+    results["dataset_discovery_count_s"] = round(seconds, 3)
+
+    def from_metadata():
+        dataset = ds.parquet_dataset(os.path.join(root, METADATA_FILENAME), partitioning="hive")
+        return dataset.count_rows()
+    metadata_rows, seconds = _timed(from_metadata)
+    results["dataset_metadata_count_s"] = round(seconds, 3)
+    results["rows_match"] = rows == metadata_rows
+
+
+def bench_s3(root, relative_paths, results):
+    from benchmarks.s3_local import empty_prefix, local_downloader
+
+    downloader = local_downloader()
+    empty_prefix(downloader)
+    store = S3PartitionStore(downloader.s3_client, downloader.aws_bucket, "ibov_data/")
+    items = [(os.path.join(root, path), path.rsplit("_IBOVDia_", 1)[1][:8]) for path in relative_paths]
+    with contextlib.redirect_stdout(io.StringIO()):
+        downloader.upload_batch_to_s3_partitioned(items, max_workers=16, skip_unchanged=False)
+    results["s3_objects"] = len(items)
+
+    files, seconds = _timed(store.list_files)
+    results["s3_list_files_s"] = round(seconds, 3)
+    _, seconds = _timed(PartitionIndex(store).rebuild, max_workers=16)
+    results["s3_rebuild_s"] = round(seconds, 3)
+    index, seconds = _timed(PartitionIndex.load, store, rebuild_if_missing=False)
+    results["s3_index_load_s"] = round(seconds, 3)
+    results["s3_index_matches"] = index.files() == files
+    downloader.close()
+
+
+def run(partitions=10000, s3=False, s3_partitions=2000):
+    """
+    Mede listagem, planejamento, atualização e leitura com e sem o índice
+
+    Returns:
+        dict: Tempos (segundos), tamanhos do índice/_metadata e conferências
+    """
+    results = {"partitions": partitions}
+    with tempfile.TemporaryDirectory() as folder:
+        root = os.path.join(folder, "ibov-data")
+        relative_paths, seconds = _timed(build_tree, root, partitions)
+        results["generate_s"] = round(seconds, 2)
+        bench_local(root, relative_paths, results)
+        if s3:
+            bench_s3(root, relative_paths[:s3_partitions], results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--partitions", type=int, default=10000)
+    parser.add_argument("--s3", action="store_true")
+    parser.add_argument("--s3-partitions", type=int, default=2000)
+    args = parser.parse_args()
+
+    for name, value in run(args.partitions, args.s3, args.s3_partitions).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark do pipeline assíncrono (PortfolioPipeline) contra o processamento em
+sequência de cada carteira (download → parse → gravação → upload), usando o servidor
+local da B3 e um S3 local.
+
+Uso:
+    python -m benchmarks.bench_pipeline [--jobs 120] [--latency 0.05] [--workers 4]
+"""
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from datetime import date
+
+from b3_http_client import B3IndexClient
+from benchmarks.fixture_server import FixtureServer
+from benchmarks.s3_local import empty_prefix, local_downloader
+from benchmarks.synthetic import business_days
+from csv_to_parquet_converter import CSVToParquetConverter
+from pipeline import PortfolioPipeline, parse_portfolio
+
+
+def run_sequential(client, folder, uploader, jobs):
+    """Processa cada job inteiro antes do próximo, somando o tempo de cada etapa"""
+    converter = CSVToParquetConverter(folder)
+    stage_seconds = {"download": 0.0, "parse": 0.0, "write": 0.0, "upload": 0.0}
+    for index, trade_date in jobs:
+        begin = time.perf_counter()
+        content = client.download_portfolio_csv(index, trade_date=trade_date)
+        stage_seconds["download"] += time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        table, (day, month, year) = parse_portfolio(content, trade_date)
+        stage_seconds["parse"] += time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        path = converter.write_partition(table, day, month, year)
+        stage_seconds["write"] += time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        uploader.upload_to_s3_partitioned(str(path), f"{day}-{month}-{year[-2:]}")
+        stage_seconds["upload"] += time.perf_counter() - begin
+    return stage_seconds
+
+
+def run(jobs=120, latency=0.05, workers=4):
+    """
+    Mede o tempo total em sequência e com o pipeline
+
+    Returns:
+        dict: Tempo total de cada modo e tempo por etapa do pipeline
+    """
+    uploader = local_downloader()
+    job_list = [("IBOV", day) for day in business_days(date(2021, 1, 4), jobs)]
+    results = {"jobs": jobs}
+    with FixtureServer(latency=latency) as server:
+        client = B3IndexClient(server.base_url, pool_size=workers)
+
+        empty_prefix(uploader)
+        with tempfile.TemporaryDirectory() as folder, contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            stage_seconds = run_sequential(client, folder, uploader, job_list)
+            results["sequential_s"] = round(time.perf_counter() - start, 3)
+        for stage, seconds in stage_seconds.items():
+            results[f"sequential_{stage}_s"] = round(seconds, 3)
+
+        empty_prefix(uploader)
+        with tempfile.TemporaryDirectory() as folder, contextlib.redirect_stdout(io.StringIO()):
+            pipeline = PortfolioPipeline(client, folder, uploader, download_workers=workers,
+                                         upload_workers=workers, queue_size=2 * workers)
+            report = pipeline.run(job_list)
+        results["pipeline_s"] = report["seconds"]
+        results["pipeline_failed"] = sum(1 for result in report["results"] if not result["success"])
+        for stage, stats in report["stages"].items():
+            results[f"pipeline_{stage}_stage_s"] = stats["stage_seconds"]
+        client.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=120)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    for name, value in run(args.jobs, args.latency, args.workers).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmark das consultas (portfolio_query.py): descarte de partições pelo intervalo de
+datas vs. leitura completa do histórico.
+
+Para um histórico sintético convertido, mede três consultas — carteira de uma data,
+participação de um ativo em um mês e os 10 maiores por dia em um mês — de três formas:
+
+    - pandas: pd.read_parquet da árvore inteira e filtro no DataFrame (como era feito)
+    - full_scan: o mesmo dataset, só com os filtros de linha (todos os arquivos abertos)
+    - pruned: PortfolioQuery, com o dataset montado pela listagem da árvore e pelo _metadata
+
+Uso:
+    python -m benchmarks.bench_query [--days 2500] [--s3]
+
+Com --s3, as partições também são enviadas ao S3 local (ver benchmarks/s3_local.py),
+onde a diferença por arquivo aberto é maior.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from benchmarks.synthetic import write_history
+from csv_to_parquet_converter import CSVToParquetConverter
+from portfolio_query import PortfolioQuery, date_filter
+
+HISTORY_START = date(2015, 1, 2)
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def build_history(folder, days):
+    """Converte `days` pregões sintéticos (o conversor mantém o índice e o _metadata)"""
+    write_history(folder, days=days, start=HISTORY_START, churn=1, drift=0.01)
+    with contextlib.redirect_stdout(io.StringIO()):
+        converter = CSVToParquetConverter(folder)
+        converter.convert_all_csv_files(workers=os.cpu_count())
+    return str(converter.index_data_folder)
+
+
+def queries(query, day, month_start, month_end, ticker):
+    """Executa as três consultas e devolve o número de linhas de cada uma"""
+    return (
+        query.portfolio(day).num_rows,
+        query.weight_history(ticker, month_start, month_end).num_rows,
+        query.top_constituents(month_start, month_end, 10).num_rows,
+    )
+
+
+def full_scan(query, day, month_start, month_end, ticker):
+    """As mesmas consultas sem o filtro de partições: todos os arquivos são abertos"""
+    dataset = query.dataset
+    day_rows = dataset.to_table(filter=date_filter(day, day)).num_rows
+    ticker_rows = dataset.to_table(columns=["data", "participacao"],
+                                   filter=date_filter(month_start, month_end) & (ds.field("codigo") == ticker)).num_rows
+    month_rows = dataset.to_table(columns=["data", "codigo", "participacao"],
+                                  filter=date_filter(month_start, month_end)).num_rows
+    return day_rows, ticker_rows, month_rows
+
+
+def pandas_scan(root, day, month_start, month_end, ticker, filesystem=None):
+    """Leitura anterior: o histórico inteiro em um DataFrame, filtrado depois"""
+    frame = pd.read_parquet(root, filesystem=filesystem)
+    dates = pd.to_datetime(frame["data"])
+    month = frame[(dates >= pd.Timestamp(month_start)) & (dates <= pd.Timestamp(month_end))]
+    return (
+        int((dates == pd.Timestamp(day)).sum()),
+        int((month["codigo"] == ticker).sum()),
+        len(month),
+    )
+
+
+def bench_tree(make_query, root, filesystem, results, prefix):
+    probe = make_query(use_partition_index=True)
+    day = pc.max(probe.dataset.to_table(columns=["data"])["data"]).as_py()
+    # Último mês completo do histórico
+    month_end = day.replace(day=1) - timedelta(days=1)
+    month_start = month_end.replace(day=1)
+    ticker = probe.portfolio(day)["codigo"][0].as_py()
+    results[f"{prefix}_files_total"] = len(probe.files())
+    results[f"{prefix}_files_month"] = len(probe.files(month_start, month_end))
+
+    _, seconds = _timed(pandas_scan, root, day, month_start, month_end, ticker, filesystem)
+    results[f"{prefix}_pandas_s"] = round(seconds, 3)
+
+    for use_partition_index in (False, True):
+        query = make_query(use_partition_index=use_partition_index)
+        _, open_seconds = _timed(lambda: query.dataset)
+        label = query.source
+        results[f"{prefix}_{label}_open_s"] = round(open_seconds, 4)
+        _, seconds = _timed(full_scan, query, day, month_start, month_end, ticker)
+        results[f"{prefix}_{label}_full_scan_s"] = round(seconds, 3)
+        rows, seconds = _timed(queries, query, day, month_start, month_end, ticker)
+        results[f"{prefix}_{label}_pruned_s"] = round(seconds, 4)
+        results[f"{prefix}_{label}_rows"] = list(rows)
+
+
+def run(days=2500, s3=False):
+    """
+    Mede as consultas com e sem descarte de partições
+
+    Returns:
+        dict: Arquivos lidos e tempos (segundos) de cada forma de leitura
+    """
+    results = {"days": days}
+    with tempfile.TemporaryDirectory() as folder:
+        root, seconds = _timed(build_history, folder, days)
+        results["generate_s"] = round(seconds, 2)
+        bench_tree(lambda **kwargs: PortfolioQuery(root, **kwargs), root, None, results, "local")
+
+        if s3:
+            from benchmarks.s3_local import empty_prefix, local_downloader
+            from compaction import S3PartitionStore
+            from partition_index import PartitionIndex
+
+            downloader = local_downloader()
+            empty_prefix(downloader)
+            items = [
+                (os.path.join(dirpath, name), name.split("_IBOVDia_")[1][:8])
+                for dirpath, _, names in os.walk(root) for name in names if name.endswith(".parquet")
+            ]
+            with contextlib.redirect_stdout(io.StringIO()):
+                downloader.upload_batch_to_s3_partitioned(items, max_workers=16, skip_unchanged=False)
+            PartitionIndex(S3PartitionStore(downloader.s3_client, downloader.aws_bucket, "ibov_data/")).rebuild(16)
+            probe = PortfolioQuery.s3()
+            bench_tree(lambda **kwargs: PortfolioQuery.s3(**kwargs), probe.root, probe.filesystem, results, "s3")
+            downloader.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=2500)
+    parser.add_argument("--s3", action="store_true")
+    args = parser.parse_args()
+
+    for name, value in run(args.days, args.s3).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
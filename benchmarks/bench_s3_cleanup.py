@@ -0,0 +1,117 @@
+"""
+Benchmark da limpeza de duplicados (clean_s3_bucket) com dezenas de milhares de
+chaves em um S3 local.
+
+Gera `--days` partições com `--copies` cópias idênticas cada (nomes com timestamps
+diferentes e o SHA-256 no metadado content-sha256, como nos uploads), mais chaves
+planas antigas "IBOVDia_dd-mm-yy (n).csv" sem o metadado, e mede o dry-run e a
+remoção real. A cada 10 dias, uma cópia a mais é enviada por upload multipart (ETag
+diferente para o mesmo conteúdo) e só é reconhecida pelo SHA-256.
+
+Uso:
+    python -m benchmarks.bench_s3_cleanup [--days 5000] [--copies 4]
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from benchmarks.s3_local import empty_prefix, local_downloader
+from benchmarks.synthetic import business_days
+from main import CONTENT_DIGEST_METADATA
+
+
+def populate(downloader, days, copies, workers=32):
+    """
+    Cria as chaves sintéticas no bucket
+
+    Returns:
+        int: Número de objetos criados
+    """
+    keys = []
+    multipart = []
+    for trade_date in business_days(date(2000, 1, 3), days):
+        partition = f"ibov_data/ano={trade_date:%Y}/mes={trade_date:%m}/dia={trade_date:%d}"
+        name = f"IBOVDia_{trade_date:%d-%m-%y}"
+        digest = {CONTENT_DIGEST_METADATA: hashlib.sha256(name.encode()).hexdigest()}
+        for copy in range(copies):
+            keys.append((f"{partition}/2024010{copy % 10}_0000{copy:02d}_{name}.parquet", name.encode(), digest))
+        keys.append((f"ibov_data/2024010{copies}_000000_{name} (1).csv", (name + "csv").encode(), {}))
+        if trade_date.toordinal() % 10 == 0:
+            multipart.append((f"{partition}/20240201_000000_{name}.parquet", name.encode(), digest))
+
+    client = downloader.get_transfer_client(workers)
+
+    def put_multipart(key, body, metadata):
+        upload_id = client.create_multipart_upload(Bucket=downloader.aws_bucket, Key=key,
+                                                   Metadata=metadata)["UploadId"]
+        part = client.upload_part(Bucket=downloader.aws_bucket, Key=key, UploadId=upload_id, PartNumber=1, Body=body)
+        client.complete_multipart_upload(Bucket=downloader.aws_bucket, Key=key, UploadId=upload_id,
+                                         MultipartUpload={"Parts": [{"ETag": part["ETag"], "PartNumber": 1}]})
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(
+            lambda item: client.put_object(Bucket=downloader.aws_bucket, Key=item[0], Body=item[1],
+                                           Metadata=item[2]),
+            keys
+        ))
+        list(executor.map(lambda item: put_multipart(*item), multipart))
+    return len(keys) + len(multipart)
+
+
+def run(days=5000, copies=4):
+    """
+    Popula o bucket e mede o dry-run e a limpeza real
+
+    Returns:
+        dict: Contagens e tempos
+    """
+    downloader = local_downloader()
+    empty_prefix(downloader)
+
+    start = time.perf_counter()
+    total = populate(downloader, days, copies)
+    populate_s = time.perf_counter() - start
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        dry_run = downloader.clean_s3_bucket(dry_run=True)
+        dry_run_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        cleanup = downloader.clean_s3_bucket(max_workers=8)
+        cleanup_s = time.perf_counter() - start
+
+        remaining = downloader.clean_s3_bucket(dry_run=True)
+
+    return {
+        "objects": total,
+        "populate_s": round(populate_s, 2),
+        "dry_run_s": round(dry_run_s, 2),
+        "duplicates_found": dry_run["duplicates"],
+        "cleanup_s": round(cleanup_s, 2),
+        "list_s": cleanup["list_seconds"],
+        "heads": cleanup["heads"],
+        "delete_s": cleanup["delete_seconds"],
+        "deleted": cleanup["deleted"],
+        "remaining_objects": remaining["scanned"],
+        "remaining_duplicates": remaining["duplicates"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=5000)
+    parser.add_argument("--copies", type=int, default=4)
+    args = parser.parse_args()
+
+    for name, value in run(args.days, args.copies).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
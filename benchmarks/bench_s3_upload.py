@@ -0,0 +1,69 @@
+"""
+Benchmark do upload em lote (upload_batch_to_s3_partitioned) contra uploads
+sequenciais com upload_to_s3_partitioned, usando um S3 local.
+
+Uso:
+    python -m benchmarks.bench_s3_upload [--files 500] [--workers 1 4 16]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.s3_local import empty_prefix, local_downloader
+from benchmarks.synthetic import write_history
+from csv_to_parquet_converter import CSVToParquetConverter
+
+
+def make_parquet_files(folder, files):
+    """Gera `files` Parquet particionados a partir de CSVs sintéticos"""
+    write_history(folder, days=files)
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = CSVToParquetConverter(folder).convert_all_csv_files()
+    return [(path, os.path.basename(path).split("_IBOVDia_")[1][:8]) for path in stats["converted_files"]]
+
+
+def run(files=500, worker_counts=(1, 4, 16)):
+    """
+    Mede o tempo de upload sequencial e em lote para cada número de uploads simultâneos
+
+    Returns:
+        dict: Tempos em segundos por modo
+    """
+    downloader = local_downloader()
+    results = {"files": files}
+    with tempfile.TemporaryDirectory() as folder:
+        items = make_parquet_files(folder, files)
+
+        empty_prefix(downloader)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for file_path, date_str in items:
+                downloader.upload_to_s3_partitioned(file_path, date_str)
+        results["serial_s"] = round(time.perf_counter() - start, 3)
+
+        for workers in worker_counts:
+            empty_prefix(downloader)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                batch = downloader.upload_batch_to_s3_partitioned(items, max_workers=workers)
+            results[f"batch_{workers}_s"] = round(time.perf_counter() - start, 3)
+            results[f"batch_{workers}_failed"] = sum(1 for r in batch if not r["success"])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    for name, value in run(args.files, args.workers).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
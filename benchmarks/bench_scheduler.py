@@ -0,0 +1,130 @@
+"""
+Benchmark do modo agendador (scheduler.py) contra o servidor local da B3 e o S3 local.
+
+Mede:
+
+    - cron_start_s: uma execução nova de src/main.py até o primeiro download (partida do
+      Python, imports, cliente S3 com head_bucket e sessão HTTP), como no cron
+    - poll_*: uma consulta do agendador aquecido sem carteira nova (304 pelo ETag) e, com
+      o servidor sem validadores, pela comparação do conteúdo; e um download completo
+    - detect_s: da publicação de uma carteira nova no servidor até o Parquet gravado e
+      enviado, com o agendador consultando a cada --interval segundos
+    - restart_reprocessed: carteiras reprocessadas por um novo agendador com o mesmo estado
+
+Uso:
+    python -m benchmarks.bench_scheduler [--polls 50] [--interval 0.5] [--latency 0.05]
+
+Requer AWS_ENDPOINT_URL apontando para um S3 local (ver benchmarks/s3_local.py).
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.fixture_server import FixtureServer
+from benchmarks.s3_local import empty_prefix, local_downloader
+from scheduler import B3_TIMEZONE, PortfolioScheduler, PublishSchedule
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Execução nova do downloader até o primeiro download (o tempo inclui a partida do Python)
+CRON_SCRIPT = """
+import sys
+sys.path.insert(0, "src")
+from main import B3DataDownloader
+downloader = B3DataDownloader()
+downloader.base_url = sys.argv[1]
+downloader.get_http_client().download_portfolio_csv("IBOV")
+"""
+
+
+def cron_start(base_url):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", CRON_SCRIPT, base_url], cwd=ROOT, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def median_ms(func, polls):
+    seconds = []
+    for _ in range(polls):
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    return round(1000 * statistics.median(seconds), 2)
+
+
+def run(polls=50, interval=0.5, latency=0.05):
+    """
+    Mede a partida do cron, as consultas do agendador e o tempo até detectar uma carteira nova
+
+    Returns:
+        dict: Tempos (segundos ou ms) e contagens
+    """
+    results = {"polls": polls, "interval_s": interval, "latency_s": latency}
+    today = datetime.now(B3_TIMEZONE).date()
+    # Janela o dia todo, todos os dias: o benchmark não depende do horário em que roda
+    schedule = PublishSchedule(window="00:00-23:59", interval=interval, weekdays="0-6")
+    downloader = local_downloader()
+    empty_prefix(downloader)
+    with FixtureServer(trade_date=today - timedelta(days=1), latency=latency) as server, \
+            tempfile.TemporaryDirectory() as folder, contextlib.redirect_stdout(io.StringIO()):
+        downloader.base_url = server.base_url
+        downloader.data_folder = folder
+        results["cron_start_s"] = round(statistics.median(cron_start(server.base_url) for _ in range(3)), 3)
+
+        scheduler = PortfolioScheduler(downloader, ["IBOV"], schedule)
+        # Primeira consulta: a carteira do dia anterior é processada e os validadores guardados
+        scheduler.poll_once(today)
+        results["poll_304_ms"] = median_ms(lambda: scheduler.poll_once(today), polls)
+        results["poll_full_download_ms"] = median_ms(
+            lambda: downloader.get_http_client().download_portfolio_csv("IBOV"), polls)
+
+        server.state.validators = False
+        results["poll_fingerprint_ms"] = median_ms(lambda: scheduler.poll_once(today), polls)
+        server.state.validators = True
+        results["server_304_responses"] = server.state.not_modified
+
+        # Carteira nova publicada com o agendador rodando
+        worker = threading.Thread(target=scheduler.run, daemon=True)
+        worker.start()
+        time.sleep(interval * 1.5)
+        published = time.perf_counter()
+        server.state.publish(today)
+        while scheduler.state.get("IBOV/day").get("trade_date") != today.isoformat():
+            if time.perf_counter() - published > 30:
+                break
+            time.sleep(0.01)
+        results["detect_s"] = round(time.perf_counter() - published, 3)
+        scheduler.stop()
+        worker.join()
+        results["scheduler_stats"] = scheduler.stats
+        results["s3_objects"] = downloader.s3_client.list_objects_v2(
+            Bucket=downloader.aws_bucket, Prefix="ibov_data/").get("KeyCount", 0)
+
+        restarted = PortfolioScheduler(downloader, ["IBOV"], schedule)
+        results["restart_reprocessed"] = len(restarted.poll_once(today))
+    downloader.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--polls", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    for name, value in run(args.polls, args.interval, args.latency).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
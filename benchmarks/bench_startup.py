@@ -0,0 +1,107 @@
+"""
+Benchmark da partida da linha de comando: src/main.py e convert_all_csv.py em processos novos.
+
+Para cada comando, mede em um processo novo (mediana de --runs execuções):
+
+    - <comando>_s: tempo total até o fim do --help (partida do Python, imports e argparse)
+    - <comando>_import_ms: soma dos imports medida por `python -X importtime`
+    - <comando>_heavy: módulos pesados carregados (boto3, selenium, requests, pyarrow, pandas)
+
+e, com AWS_ENDPOINT_URL apontando para um S3 local, o tempo de construir o
+B3DataDownloader (init_s3_s) e de fazer a primeira operação no S3 (first_s3_call_s).
+
+Uso:
+    python -m benchmarks.bench_startup [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("boto3", "selenium", "requests", "pyarrow", "pandas")
+
+COMMANDS = {
+    "main_help": ["src/main.py", "--help"],
+    "download_help": ["src/main.py", "download", "--help"],
+    "convert_help": ["src/main.py", "convert", "--help"],
+    "upload_help": ["src/main.py", "upload", "--help"],
+    "clean_help": ["src/main.py", "clean", "--help"],
+    "backfill_help": ["src/main.py", "backfill", "--help"],
+    "convert_all_csv_help": ["convert_all_csv.py", "--help"],
+}
+
+# Construção do downloader e primeira operação no S3, em um processo novo
+S3_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, "src")
+from main import B3DataDownloader
+start = time.perf_counter()
+downloader = B3DataDownloader()
+built = time.perf_counter()
+downloader.s3_client.list_objects_v2(Bucket=downloader.aws_bucket, Prefix="ibov_data/", MaxKeys=1)
+print(json.dumps({"init_s3_s": built - start, "first_s3_call_s": time.perf_counter() - built}))
+"""
+
+
+def import_profile(args):
+    """Soma dos imports (ms) e módulos pesados carregados, pelo -X importtime"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=ROOT, capture_output=True,
+                            text=True).stderr
+    total_us, names = 0, set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        names.add(name.strip().split(".")[0])
+        if not name[1:].startswith(" "):
+            # Import de nível superior: o cumulativo já inclui os imports internos
+            total_us += int(cumulative)
+    return round(total_us / 1000, 1), [module for module in HEAVY_MODULES if module in names]
+
+
+def wall_time(args, runs):
+    seconds = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True)
+        seconds.append(time.perf_counter() - start)
+    return round(statistics.median(seconds), 3)
+
+
+def run(runs=5):
+    """
+    Mede a partida de cada comando da linha de comando
+
+    Returns:
+        dict: Tempos (segundos), soma dos imports (ms) e módulos pesados por comando
+    """
+    results = {"runs": runs, "python_s": wall_time(["-c", "pass"], runs)}
+    for name, args in COMMANDS.items():
+        results[f"{name}_s"] = wall_time(args, runs)
+        results[f"{name}_import_ms"], results[f"{name}_heavy"] = import_profile(args)
+    if os.getenv("AWS_ENDPOINT_URL"):
+        measured = [json.loads(subprocess.run([sys.executable, "-c", S3_SCRIPT], cwd=ROOT, capture_output=True,
+                                              text=True, check=True).stdout.splitlines()[-1])
+                    for _ in range(runs)]
+        for key in ("init_s3_s", "first_s3_call_s"):
+            results[key] = round(statistics.median(item[key] for item in measured), 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, value in run(args.runs).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
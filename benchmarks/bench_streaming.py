@@ -0,0 +1,74 @@
+"""
+Benchmark do modo sem disco (download_streaming) contra o caminho com arquivos
+(download_with_api: CSV em disco → Parquet em disco → upload), usando o servidor local
+da B3 e um S3 local.
+
+Uso:
+    python -m benchmarks.bench_streaming [--indices all] [--rounds 3] [--latency 0]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from b3_indices import parse_index_list, s3_prefix
+from benchmarks.fixture_server import FixtureServer
+from benchmarks.s3_local import empty_prefix, local_downloader
+
+
+def folder_usage(folder):
+    """Número de arquivos e bytes deixados na pasta de dados"""
+    files = [os.path.join(dirpath, name) for dirpath, _, names in os.walk(folder) for name in names]
+    return len(files), sum(os.path.getsize(path) for path in files)
+
+
+def run(indices, rounds=3, latency=0.0):
+    """
+    Processa cada índice pelos dois caminhos, esvaziando o bucket antes de cada rodada
+
+    Returns:
+        dict: Tempo total, falhas e uso de disco de cada caminho
+    """
+    downloader = local_downloader()
+    results = {"indices": len(indices), "rounds": rounds}
+    modes = {
+        "disk": downloader.download_with_api,
+        "stream": lambda index: downloader.download_streaming(index, archive_csv=False),
+    }
+    with FixtureServer(latency=latency) as server:
+        downloader.base_url = server.base_url
+        for mode, download in modes.items():
+            with tempfile.TemporaryDirectory() as folder:
+                downloader.data_folder = folder
+                elapsed, failed = 0.0, 0
+                for _ in range(rounds):
+                    for index in indices:
+                        empty_prefix(downloader, s3_prefix(index))
+                    start = time.perf_counter()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        failed += sum(1 for index in indices if not download(index))
+                    elapsed += time.perf_counter() - start
+                results[f"{mode}_s"] = round(elapsed, 3)
+                results[f"{mode}_ms_per_file"] = round(1000 * elapsed / (rounds * len(indices)), 2)
+                results[f"{mode}_failed"] = failed
+                results[f"{mode}_files_on_disk"], results[f"{mode}_bytes_on_disk"] = folder_usage(folder)
+    downloader.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--indices", type=parse_index_list, default=parse_index_list("all"))
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    for name, value in run(args.indices, args.rounds, args.latency).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
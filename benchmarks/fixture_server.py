@@ -0,0 +1,127 @@
+"""
+Servidor HTTP local que reproduz os endpoints indexProxy da B3 com dados gravados
+(sintéticos), para exercitar o cliente HTTP sem acessar a B3.
+
+    GET /indexProxy/indexCall/GetDownloadPortfolioDay/<params em base64>
+
+responde o CSV da carteira codificado em base64, com suporte a gzip, ETag e
+Last-Modified (respostas 304 para If-None-Match/If-Modified-Since). O parâmetro
+opcional "fail_first" faz as primeiras N requisições responderem 503, para testar as
+novas tentativas. publish(data) troca a carteira mais recente (como a publicação do
+pregão pela B3) e, com validators=False, o servidor não envia validadores (o cliente
+precisa comparar o conteúdo).
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import threading
+from datetime import date, datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import make_portfolio, render_ibov_csv
+
+
+class FixtureState:
+    def __init__(self, trade_date=date(2025, 7, 22), fail_first=0, latency=0.0, validators=True):
+        self.trade_date = trade_date
+        self.fail_first = fail_first
+        self.latency = latency
+        self.validators = validators
+        self.published_at = datetime.now(timezone.utc).replace(microsecond=0)
+        self.requests = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+
+    def publish(self, trade_date):
+        """Passa a servir a carteira de outra data como a mais recente"""
+        with self.lock:
+            self.trade_date = trade_date
+            self.published_at = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def body_for(self, params):
+        """CSV em base64 da carteira pedida (índice e, opcionalmente, data)"""
+        index = params.get("index", "IBOV")
+        trade_date = date.fromisoformat(params["date"]) if params.get("date") else self.trade_date
+        portfolio = make_portfolio(rows=90, seed=sum(map(ord, index)))
+        return base64.b64encode(render_ibov_csv(trade_date, portfolio, index))
+
+
+def _make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with state.lock:
+                state.requests += 1
+                failing = state.requests <= state.fail_first
+            if state.latency:
+                threading.Event().wait(state.latency)
+            if failing:
+                return self._send(503, b"indisponivel")
+
+            parts = self.path.split("?")[0].strip("/").split("/")
+            if len(parts) != 4 or parts[:2] != ["indexProxy", "indexCall"]:
+                return self._send(404, b"not found")
+            try:
+                params = json.loads(base64.b64decode(parts[3]))
+            except ValueError:
+                return self._send(400, b"bad params")
+
+            body = state.body_for(params)
+            headers = {"Content-Type": "application/json"}
+            if state.validators:
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                last_modified = format_datetime(state.published_at, usegmt=True)
+                if self._not_modified(etag, state.published_at):
+                    with state.lock:
+                        state.not_modified += 1
+                    return self._send(304, b"", {"ETag": etag, "Last-Modified": last_modified})
+                headers.update({"ETag": etag, "Last-Modified": last_modified})
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body)
+                headers["Content-Encoding"] = "gzip"
+            self._send(200, body, headers)
+
+        def _not_modified(self, etag, published_at):
+            if self.headers.get("If-None-Match"):
+                return self.headers["If-None-Match"] == etag
+            since = self.headers.get("If-Modified-Since")
+            try:
+                return since is not None and published_at <= parsedate_to_datetime(since)
+            except (TypeError, ValueError):
+                return False
+
+        def _send(self, status, body, headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+class FixtureServer:
+    """Context manager que sobe o servidor em uma thread e expõe base_url"""
+
+    def __init__(self, **state_kwargs):
+        self.state = FixtureState(**state_kwargs)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self.state))
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.server.shutdown()
+        self.server.server_close()
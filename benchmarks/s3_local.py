@@ -0,0 +1,54 @@
+"""
+Utilitários para rodar benchmarks contra um S3 local (moto_server ou MinIO).
+
+O endpoint é lido da variável AWS_ENDPOINT_URL, que o boto3 usa automaticamente:
+
+    moto_server -p 5000 &
+    export AWS_ENDPOINT_URL=http://localhost:5000 AWS_BUCKET=bench-bucket
+    export AWS_ACCESS_KEY=test AWS_SECRET=test AWS_REGION=us-east-1
+"""
+
+import contextlib
+import io
+import os
+import sys
+
+import boto3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+def local_downloader():
+    """
+    Cria um B3DataDownloader apontando para o S3 local, criando o bucket se necessário
+
+    Returns:
+        B3DataDownloader: Instância com s3_client configurado
+    """
+    if not os.getenv("AWS_ENDPOINT_URL"):
+        raise SystemExit("Defina AWS_ENDPOINT_URL com o endereço do S3 local (moto_server/MinIO).")
+
+    bucket = os.getenv("AWS_BUCKET", "bench-bucket")
+    os.environ["AWS_BUCKET"] = bucket
+    client = boto3.client(
+        "s3",
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
+        aws_secret_access_key=os.getenv("AWS_SECRET"),
+        region_name=os.getenv("AWS_REGION", "us-east-1"),
+    )
+    with contextlib.suppress(client.exceptions.BucketAlreadyOwnedByYou):
+        client.create_bucket(Bucket=bucket)
+
+    from main import B3DataDownloader
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return B3DataDownloader()
+
+
+def empty_prefix(downloader, prefix="ibov_data/"):
+    """Remove todos os objetos do prefixo no bucket local"""
+    paginator = downloader.s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=downloader.aws_bucket, Prefix=prefix):
+        keys = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+        if keys:
+            downloader.s3_client.delete_objects(Bucket=downloader.aws_bucket, Delete={"Objects": keys})
@@ -0,0 +1,253 @@
+"""
+Suíte de benchmarks reprodutível do conversor e do S3, com resultados em JSON para
+comparar execuções entre commits.
+
+Para cada tamanho de histórico (1 a 10.000 pregões), gera arquivos IBOVDia_dd-mm-yy.csv
+sintéticos (título, cabeçalho, ";" no fim das linhas, acentos em latin1, números pt-BR
+e rodapé; ver benchmarks/synthetic.py) e mede:
+
+    - convert_csv_to_parquet por arquivo
+    - convert_all_csv_files com cada número de processos e a reexecução incremental
+    - _list_index_structure sobre a árvore particionada
+    - com --s3: upload em lote, reenvio de arquivos inalterados e limpeza de duplicados
+      (dry-run e remoção) em um S3 local (ver benchmarks/s3_local.py)
+
+Uso:
+    python -m benchmarks.suite [--days 1 100 1000 10000] [--workers 1 8] [--s3]
+                               [--output resultados.json] [--compare anterior.json]
+
+Sem --output, o resultado é gravado em benchmarks/results/<data>_<commit>.json. Com
+--compare, as métricas de tempo que pioraram mais que --threshold são listadas e o
+comando termina com código 1.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+import pyarrow as pa
+
+from benchmarks.synthetic import write_history
+from csv_to_parquet_converter import CSVToParquetConverter
+
+RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Início do histórico sintético: 10.000 pregões terminam antes de 2050 (anos de 2 dígitos)
+HISTORY_START = date(2000, 1, 3)
+
+# Arquivos usados na medição de convert_csv_to_parquet por arquivo
+SINGLE_FILE_SAMPLE = 50
+
+# Diferenças absolutas menores que isso são ruído de medição, não regressão (segundos)
+NOISE_FLOOR_SECONDS = 0.005
+
+
+def git_commit():
+    """Commit atual (curto) e se há alterações não commitadas, ou None fora de um repositório git"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def environment():
+    """Metadados da execução gravados junto com os resultados"""
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pyarrow": pa.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _timed(func, *args, **kwargs):
+    """Executa com a saída suprimida e devolve (resultado, segundos)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        return result, time.perf_counter() - start
+
+
+def bench_single_file(folder, days):
+    """Tempo médio de convert_csv_to_parquet em uma amostra de arquivos"""
+    sample = min(days, SINGLE_FILE_SAMPLE)
+    paths = write_history(folder, days=sample, start=HISTORY_START)
+    with contextlib.redirect_stdout(io.StringIO()):
+        converter = CSVToParquetConverter(folder)
+        # Aquecimento (imports tardios do pyarrow/pandas), fora da medição
+        converter.convert_csv_to_parquet(paths[0], remove_original=False)
+    _, seconds = _timed(lambda: [converter.convert_csv_to_parquet(path, remove_original=False) for path in paths])
+    return {"convert_one_ms": round(1000 * seconds / sample, 3), "convert_one_files": sample}
+
+
+def bench_convert_all(folder, worker_counts):
+    """
+    convert_all_csv_files do histórico inteiro com cada número de processos (a árvore é
+    apagada entre as execuções) e uma reexecução incremental, que ignora tudo pelo manifesto
+    """
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        converter = CSVToParquetConverter(folder)
+    for workers in worker_counts:
+        shutil.rmtree(converter.index_data_folder)
+        converter.index_data_folder.mkdir()
+        stats, seconds = _timed(converter.convert_all_csv_files, workers=workers)
+        results[f"convert_all_w{workers}_s"] = round(seconds, 3)
+        results[f"convert_all_w{workers}_failed"] = stats["failed"]
+    stats, seconds = _timed(converter.convert_all_csv_files, workers=max(worker_counts))
+    results["convert_all_incremental_s"] = round(seconds, 3)
+    results["convert_all_incremental_skipped"] = stats["skipped"]
+
+    _, seconds = _timed(converter._list_index_structure)
+    results["list_structure_s"] = round(seconds, 4)
+    return results, converter
+
+
+def bench_s3(converter, workers=16):
+    """Upload em lote, reenvio inalterado e limpeza de duplicados no S3 local"""
+    from benchmarks.s3_local import empty_prefix, local_downloader
+
+    downloader = local_downloader()
+    empty_prefix(downloader)
+    items = [
+        (os.path.join(dirpath, name), name.split("_IBOVDia_")[1][:8])
+        for dirpath, _, names in os.walk(converter.index_data_folder) for name in names if name.endswith(".parquet")
+    ]
+    results = {"s3_objects": len(items)}
+
+    batch, seconds = _timed(downloader.upload_batch_to_s3_partitioned, items, max_workers=workers)
+    results["s3_upload_s"] = round(seconds, 3)
+    results["s3_upload_failed"] = sum(1 for result in batch if not result["success"])
+    batch, seconds = _timed(downloader.upload_batch_to_s3_partitioned, items, max_workers=workers)
+    results["s3_reupload_unchanged_s"] = round(seconds, 3)
+    results["s3_reupload_skipped"] = sum(1 for result in batch if result["skipped"])
+
+    # Uma cópia de cada objeto com outro timestamp de carga: duplicados para a limpeza
+    client = downloader.get_transfer_client(workers)
+    keys = [item["Key"] for page in client.get_paginator("list_objects_v2").paginate(
+        Bucket=downloader.aws_bucket, Prefix="ibov_data/") for item in page.get("Contents", [])]
+    for key in keys:
+        folder, name = key.rsplit("/", 1)
+        client.copy_object(Bucket=downloader.aws_bucket, Key=f"{folder}/19990101_000000_{name.split('_', 2)[2]}",
+                           CopySource={"Bucket": downloader.aws_bucket, "Key": key})
+
+    report, seconds = _timed(downloader.clean_s3_bucket, dry_run=True)
+    results["s3_cleanup_dry_run_s"] = round(seconds, 3)
+    results["s3_duplicates_found"] = report["duplicates"]
+    report, seconds = _timed(downloader.clean_s3_bucket, max_workers=8)
+    results["s3_cleanup_s"] = round(seconds, 3)
+    results["s3_deleted"] = report["deleted"]
+    downloader.close()
+    return results
+
+
+def run(days_list=(1, 100, 1000), worker_counts=(1, os.cpu_count() or 1), s3=False):
+    """
+    Executa a suíte para cada tamanho de histórico
+
+    Returns:
+        dict: {"environment": {...}, "parameters": {...}, "results": {"days_<n>": {...}}}
+    """
+    report = {
+        "environment": environment(),
+        "parameters": {"days": list(days_list), "workers": list(worker_counts), "s3": s3},
+        "results": {},
+    }
+    for days in days_list:
+        results = {}
+        with tempfile.TemporaryDirectory() as folder:
+            results.update(bench_single_file(os.path.join(folder, "single"), days))
+
+            history_folder = os.path.join(folder, "history")
+            _, seconds = _timed(write_history, history_folder, days=days, start=HISTORY_START)
+            results["generate_s"] = round(seconds, 3)
+            converted, converter = bench_convert_all(history_folder, worker_counts)
+            results.update(converted)
+            if s3:
+                results.update(bench_s3(converter))
+        report["results"][f"days_{days}"] = results
+        print(f"days={days}: " + ", ".join(f"{key}={value}" for key, value in results.items()))
+    return report
+
+
+def compare(current, previous, threshold=0.1):
+    """
+    Compara as métricas de tempo (sufixos _s e _ms) de duas execuções
+
+    Args:
+        current (dict): Resultado de run
+        previous (dict): Resultado anterior (lido do JSON)
+        threshold (float): Piora relativa tolerada (0.1 = 10%)
+
+    Returns:
+        list: Tuplas (tamanho, métrica, anterior, atual, razão) das métricas que pioraram
+    """
+    regressions = []
+    for scale, metrics in current["results"].items():
+        for name, value in metrics.items():
+            before = previous.get("results", {}).get(scale, {}).get(name)
+            if not name.endswith(("_s", "_ms")) or not before or name == "generate_s":
+                continue
+            ratio = value / before
+            print(f"  {scale:<12} {name:<32} {before:>10} -> {value:<10} x{ratio:.2f}")
+            delta_seconds = (value - before) / (1000 if name.endswith("_ms") else 1)
+            if ratio > 1 + threshold and delta_seconds > NOISE_FLOOR_SECONDS:
+                regressions.append((scale, name, before, value, round(ratio, 2)))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--s3", action="store_true", help="Medir também upload e limpeza no S3 local")
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: benchmarks/results/<data>_<commit>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Piora relativa tolerada (padrão: 0.1)")
+    args = parser.parse_args()
+
+    if any(days < 1 or days > 10000 for days in args.days):
+        parser.error("--days deve estar entre 1 e 10000")
+
+    report = run(args.days, sorted(set(args.workers)), args.s3)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(RESULTS_FOLDER, f"{stamp}_{report['environment']['commit'] or 'sem-git'}.json")
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    print(f"Resultados gravados em {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            previous = json.load(file)
+        print(f"Comparação com {args.compare} (commit {previous.get('environment', {}).get('commit')}):")
+        regressions = compare(report, previous, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} métrica(s) pioraram mais de {args.threshold:.0%}:")
+            for scale, name, before, value, ratio in regressions:
+                print(f"  ✗ {scale} {name}: {before} -> {value} (x{ratio})")
+            sys.exit(1)
+        print("Nenhuma regressão acima do limite.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Gerador de arquivos sintéticos no formato IBOVDia_dd-mm-yy.csv da B3.
+"""
+
+import os
+import random
+from datetime import date, timedelta
+
+# Ações com nomes acentuados para exercitar o encoding latin1
+_NAMES = ['ALLOS', 'AMBEV S/A', 'BRASKEM', 'BRADESCO', 'COPEL', 'ELETROBRÁS', 'EMBRAER',
+          'GERDAU', 'ITAÚUNIBANCO', 'LOCALIZA', 'MAGAZ LUIZA', 'PETROBRAS', 'SABESP',
+          'SÃO MARTINHO', 'TELEF BRASIL', 'VALE', 'WEG', 'AÇÚCAR GUARANI']
+_TYPES = ['ON      NM', 'PN      N1', 'ON      N2', 'UNT     N2', 'ON  EJ  NM', 'PNA     N1']
+
+
+def make_portfolio(rows=90, seed=0):
+    """
+    Gera uma carteira sintética com código, ação, tipo e quantidade teórica
+
+    Args:
+        rows (int): Número de ativos
+        seed (int): Semente para reprodutibilidade
+
+    Returns:
+        list: Lista de tuplas (codigo, acao, tipo, qtde_teorica)
+    """
+    rng = random.Random(seed)
+    portfolio = []
+    for i in range(rows):
+        codigo = f"{chr(65 + i % 26)}{chr(65 + (i // 26) % 26)}{chr(65 + (i * 7) % 26)}{chr(65 + (i * 3) % 26)}{rng.choice('3456')}"
+        portfolio.append((codigo, rng.choice(_NAMES), rng.choice(_TYPES), rng.randint(10**6, 6 * 10**9)))
+    return portfolio
+
+
+def _pt_br_int(value):
+    return f"{value:,}".replace(',', '.')
+
+
+def _pt_br_float(value, digits=3):
+    return f"{value:.{digits}f}".replace('.', ',')
+
+
+def render_ibov_csv(trade_date, portfolio, index="IBOV", prices=None):
+    """
+    Gera o conteúdo de um arquivo de carteira do dia, em latin1
+
+    Args:
+        trade_date (date): Data da carteira
+        portfolio (list): Saída de make_portfolio
+        index (str): Código do índice
+        prices (dict): Preço por código, usado na participação (padrão: 1 para todos)
+
+    Returns:
+        bytes: Conteúdo do arquivo
+    """
+    prices = prices or {}
+    values = [qtde * prices.get(codigo, 1.0) for codigo, _, _, qtde in portfolio]
+    total_value = sum(values)
+    total = sum(qtde for _, _, _, qtde in portfolio)
+    lines = [
+        f"{index} - Carteira do Dia {trade_date.strftime('%d/%m/%y')}",
+        "Código;Ação;Tipo;Qtde. Teórica;Part. (%);",
+    ]
+    for (codigo, acao, tipo, qtde), value in zip(portfolio, values):
+        lines.append(f"{codigo};{acao};{tipo};{_pt_br_int(qtde)};{_pt_br_float(100 * value / total_value)};")
+    lines.append(f"Quantidade Teórica Total;{_pt_br_int(total)};;")
+    lines.append(f"Redutor;{_pt_br_float(total / 5473.0, 8)};;")
+    return ("\n".join(lines) + "\n").encode('latin1')
+
+
+def business_days(start, count):
+    """
+    Retorna os próximos `count` dias úteis (seg-sex) a partir de `start`
+    """
+    days = []
+    current = start
+    while len(days) < count:
+        if current.weekday() < 5:
+            days.append(current)
+        current += timedelta(days=1)
+    return days
+
+
+def write_history(folder, days=10, rows=90, start=date(2020, 1, 2), seed=0, index="IBOV", churn=0, drift=0.0):
+    """
+    Escreve `days` arquivos {index}Dia_dd-mm-yy.csv em `folder`
+
+    Args:
+        churn (int): Ativos trocados em cada rebalanceamento (entradas e saídas da carteira)
+        drift (float): Volatilidade diária dos preços; com 0 a participação só muda nos rebalanceamentos
+
+    Returns:
+        list: Caminhos dos arquivos gerados
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    portfolio = make_portfolio(rows, seed)
+    candidates = make_portfolio(2 * rows, seed + 1)
+    prices = {}
+    paths = []
+    for i, trade_date in enumerate(business_days(start, days)):
+        # Quantidades ajustadas (e ativos trocados) no rebalanceamento a cada ~63 pregões
+        if i and i % 63 == 0:
+            portfolio = [(c, a, t, int(q * rng.uniform(0.9, 1.1))) for c, a, t, q in portfolio]
+            current = {c for c, _, _, _ in portfolio}
+            for _ in range(churn):
+                portfolio.pop(rng.randrange(len(portfolio)))
+                entrant = next(item for item in candidates if item[0] not in current)
+                current.add(entrant[0])
+                portfolio.append(entrant)
+        if drift:
+            prices = {c: prices.get(c, 1.0) * (1 + rng.gauss(0, drift)) for c, _, _, _ in portfolio}
+        path = os.path.join(folder, f"{index}Dia_{trade_date.strftime('%d-%m-%y')}.csv")
+        with open(path, 'wb') as file:
+            file.write(render_ibov_csv(trade_date, portfolio, index, prices))
+        paths.append(path)
+    return paths
@@ -0,0 +1,129 @@
+"""
+Sessão de navegador headless reutilizável entre downloads.
+
+Abrir o Chrome domina a latência de cada download com Selenium. A BrowserSession
+mantém um único webdriver.Chrome aquecido, verifica se ele continua respondendo
+antes de cada uso e o recicla após um número máximo de usos ou após uma falha.
+Os tempos de partida a frio e de reaproveitamento são registrados para comparação.
+"""
+
+import time
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+from instrumentation import get_logger
+
+logger = get_logger("browser")
+
+
+class BrowserSession:
+    def __init__(self, download_path, max_uses=50, headless=True):
+        """
+        Configura a sessão; o navegador só é aberto no primeiro uso
+
+        Args:
+            download_path (str): Pasta de download do Chrome
+            max_uses (int): Número de usos antes de reciclar o navegador
+            headless (bool): Se True, executa o Chrome sem interface
+        """
+        self.download_path = download_path
+        self.max_uses = max_uses
+        self.headless = headless
+        self.driver = None
+        self.uses = 0
+        self.timings = {"cold": [], "warm": []}
+
+    def _build_options(self):
+        """Configurações do Chrome para download automático"""
+        chrome_options = Options()
+        if self.headless:
+            chrome_options.add_argument("--headless")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        prefs = {
+            "download.default_directory": self.download_path,
+            "download.prompt_for_download": False,
+            "download.directory_upgrade": True,
+            "safebrowsing.enabled": True
+        }
+        chrome_options.add_experimental_option("prefs", prefs)
+        return chrome_options
+
+    def is_healthy(self):
+        """
+        Verifica se o navegador ainda responde
+
+        Returns:
+            bool: True se o driver está aberto e respondendo
+        """
+        if self.driver is None:
+            return False
+        try:
+            # Chamada barata ao WebDriver; falha se o Chrome ou o chromedriver morreram
+            self.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _start(self):
+        self.quit()
+        self.driver = webdriver.Chrome(options=self._build_options())
+        self.uses = 0
+
+    def acquire(self):
+        """
+        Retorna um driver pronto, abrindo ou reciclando o navegador se necessário
+
+        Returns:
+            webdriver.Chrome: Driver aquecido
+        """
+        start = time.perf_counter()
+        if self.uses >= self.max_uses or not self.is_healthy():
+            if self.driver is not None:
+                reason = "limite de usos atingido" if self.uses >= self.max_uses else "navegador não responde"
+                logger.info(f"Reciclando navegador ({reason})...")
+            self._start()
+            kind = "cold"
+        else:
+            kind = "warm"
+        self.uses += 1
+        elapsed = time.perf_counter() - start
+        self.timings[kind].append(elapsed)
+        logger.info(f"Navegador pronto em {elapsed * 1000:.0f} ms ({'partida a frio' if kind == 'cold' else 'reaproveitado'})")
+        return self.driver
+
+    def warm(self):
+        """Abre o navegador antes do primeiro uso (ex.: no início do agendador), se ainda não estiver aberto"""
+        if not self.is_healthy():
+            start = time.perf_counter()
+            self._start()
+            self.timings["cold"].append(time.perf_counter() - start)
+
+    def quit(self):
+        """Fecha o navegador, se estiver aberto"""
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+
+    def timing_summary(self):
+        """
+        Resume as latências de obtenção do navegador
+
+        Returns:
+            dict: Quantidade e média (ms) de partidas a frio e reaproveitamentos
+        """
+        summary = {}
+        for kind, values in self.timings.items():
+            summary[f"{kind}_count"] = len(values)
+            summary[f"{kind}_avg_ms"] = round(1000 * sum(values) / len(values), 1) if values else None
+        return summary
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.quit()
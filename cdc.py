@@ -0,0 +1,489 @@
+"""
+Armazenamento CDC (change data capture) das carteiras de um índice.
+
+A carteira muda pouco de um dia para o outro: a quantidade teórica só muda nos
+rebalanceamentos e a composição muda raramente. Em vez de guardar o snapshot completo
+de cada dia, o CDC guarda um snapshot base e, para cada pregão, apenas as mudanças em
+relação ao anterior. Fica ao lado das partições de snapshots (ex.: src/data/ibov-cdc/):
+
+    checkpoints/<ÍNDICE>_checkpoint_YYYY-MM-DD.parquet   carteira completa (o primeiro é o snapshot base)
+    changes/ano=YYYY/<ÍNDICE>_changes_YYYY-MM.parquet    mudanças de cada pregão do mês
+    _catalog.json                                        checkpoints e pregões de cada mês
+
+Cada linha de mudança tem a data, a operação (insert, delete ou update) e o código do
+ativo. Inserções trazem a linha completa, remoções só o código e atualizações só as
+colunas que mudaram (as demais ficam nulas). Os pregões do mês, inclusive os sem
+nenhuma mudança, ficam nos metadados do arquivo (b3_days).
+
+O catálogo é atualizado a cada pregão acrescentado, de modo que abrir o CDC lê um único
+arquivo em vez de todos os arquivos de mudanças (no S3, um GET por mês de histórico). Se
+ele faltar ou não bater com a listagem (checkpoints e meses), os pregões são lidos dos
+arquivos de mudanças e o catálogo é regravado.
+
+A cada `checkpoint_every` pregões um novo checkpoint é gravado, de modo que reconstruir
+qualquer data lê um checkpoint e aplica no máximo esse número de dias de mudanças. Para
+intervalos, as mudanças são aplicadas em sequência a partir do primeiro dia. Com 10
+pregões, a reconstrução de uma data lê no máximo um checkpoint e dois meses de mudanças;
+os checkpoints custam um arquivo completo a cada duas semanas (ver benchmarks/bench_cdc.py).
+
+Os dias devem ser acrescentados em ordem. Cargas repetidas ou datas antigas exigem
+reconstruir o CDC a partir das partições de snapshots (CDCStore.rebuild), o que o
+conversor faz automaticamente.
+
+Uso:
+    python cdc.py --index IBOV --rebuild
+    python cdc.py --index IBOV --date 2024-05-02
+"""
+
+import argparse
+import bisect
+import io
+import json
+import re
+from datetime import date
+
+import numpy as np
+import pyarrow as pa
+
+from b3_csv_parser import DICTIONARY_STRING, IBOV_SCHEMA
+from b3_indices import DEFAULT_INDEX, cdc_folder_name, local_folder_name, normalize_index
+from compaction import LocalPartitionStore, classify, merge_period
+from parquet_options import ParquetWriteOptions
+
+# Pregões entre checkpoints completos
+CHECKPOINT_EVERY = 10
+
+CATALOG_FILENAME = "_catalog.json"
+
+# Metadado dos arquivos de mudanças com os pregões do mês
+DAYS_METADATA_KEY = b"b3_days"
+
+# Colunas comparadas entre os dias (o código é a chave)
+VALUE_COLUMNS = ("acao", "tipo", "qtde_teorica", "participacao")
+
+CHANGES_SCHEMA = pa.schema([
+    ("data", pa.date32()),
+    ("op", DICTIONARY_STRING),
+    ("codigo", DICTIONARY_STRING),
+    ("acao", DICTIONARY_STRING),
+    ("tipo", DICTIONARY_STRING),
+    ("qtde_teorica", pa.int64()),
+    ("participacao", pa.float64()),
+])
+
+_CHECKPOINT_PATTERN = re.compile(r'^checkpoints/[A-Z0-9]+_checkpoint_(\d{4}-\d{2}-\d{2})\.parquet$')
+_CHANGES_PATTERN = re.compile(r'^changes/ano=\d{4}/[A-Z0-9]+_changes_(\d{4}-\d{2})\.parquet$')
+
+
+def table_rows(table):
+    """
+    Indexa a carteira pelo código do ativo
+
+    Returns:
+        dict: código -> (acao, tipo, qtde_teorica, participacao)
+    """
+    columns = [table[column].to_pylist() for column in ("codigo",) + VALUE_COLUMNS]
+    return {row[0]: row[1:] for row in zip(*columns)}
+
+
+def rows_to_table(rows, day):
+    """
+    Monta a carteira de um dia (ordenada por código) no esquema IBOV_SCHEMA
+
+    Args:
+        rows (dict): Saída de table_rows (ou de apply_changes)
+        day (date): Data da carteira
+
+    Returns:
+        pyarrow.Table: Carteira do dia
+    """
+    codes = sorted(rows)
+    columns = {"codigo": codes}
+    for position, column in enumerate(VALUE_COLUMNS):
+        columns[column] = [rows[code][position] for code in codes]
+    columns["data"] = [day] * len(codes)
+    return pa.Table.from_pydict(columns, schema=IBOV_SCHEMA)
+
+
+def diff_rows(previous, current, day):
+    """
+    Calcula as mudanças de um dia em relação ao anterior
+
+    Args:
+        previous (dict): Carteira anterior (table_rows)
+        current (dict): Carteira do dia (table_rows)
+        day (date): Data do dia
+
+    Returns:
+        list: Registros no formato de CHANGES_SCHEMA
+    """
+    changes = []
+    for code in sorted(current.keys() - previous.keys()):
+        changes.append({"data": day, "op": "insert", "codigo": code, **dict(zip(VALUE_COLUMNS, current[code]))})
+    for code in sorted(previous.keys() - current.keys()):
+        changes.append({"data": day, "op": "delete", "codigo": code})
+    for code in sorted(current.keys() & previous.keys()):
+        old, new = previous[code], current[code]
+        if old != new:
+            changes.append({
+                "data": day, "op": "update", "codigo": code,
+                **{column: value for column, value, before in zip(VALUE_COLUMNS, new, old) if value != before},
+            })
+    return changes
+
+
+def apply_changes(rows, changes):
+    """
+    Aplica as mudanças de um dia à carteira anterior
+
+    Args:
+        rows (dict): Carteira anterior (table_rows); não é alterada
+        changes (list): Registros de mudança do dia
+
+    Returns:
+        dict: Carteira do dia
+    """
+    rows = dict(rows)
+    for change in changes:
+        code = change["codigo"]
+        if change["op"] == "delete":
+            rows.pop(code, None)
+        elif change["op"] == "insert":
+            rows[code] = tuple(change[column] for column in VALUE_COLUMNS)
+        else:
+            rows[code] = tuple(
+                before if change.get(column) is None else change[column]
+                for column, before in zip(VALUE_COLUMNS, rows[code])
+            )
+    return rows
+
+
+def snapshot_tables(partition_store):
+    """
+    Lê as partições de snapshots (diárias ou compactadas) e devolve a carga mais recente
+    de cada dia, em ordem de data
+
+    Args:
+        partition_store (LocalPartitionStore | S3PartitionStore): Partições do índice
+
+    Yields:
+        pyarrow.Table: Carteira de cada dia
+    """
+    sources = []
+    for relative_path in partition_store.list_files():
+        info = classify(relative_path)
+        if info is not None:
+            sources.append((partition_store.read(relative_path), info))
+    if not sources:
+        return
+    merged, _, _ = merge_period(sources)
+    # merge_period ordena por data: cada dia é um trecho contínuo da tabela
+    days = merged["data"].to_numpy()
+    boundaries = [0, *(np.flatnonzero(days[1:] != days[:-1]) + 1), len(days)]
+    for start, end in zip(boundaries, boundaries[1:]):
+        yield merged.slice(start, end - start)
+
+
+class CDCStore:
+    def __init__(self, store, index=DEFAULT_INDEX, checkpoint_every=CHECKPOINT_EVERY, write_options=None):
+        """
+        Abre o armazenamento CDC de um índice
+
+        Args:
+            store (LocalPartitionStore | S3PartitionStore): Onde ficam os arquivos do CDC
+            index (str): Código do índice (usado no nome dos arquivos)
+            checkpoint_every (int): Pregões entre checkpoints completos
+            write_options (ParquetWriteOptions): Opções de gravação; se None, lidas das variáveis PARQUET_*
+        """
+        if checkpoint_every < 1:
+            raise ValueError("checkpoint_every deve ser pelo menos 1")
+        self.store = store
+        self.index = normalize_index(index)
+        self.checkpoint_every = checkpoint_every
+        self.write_options = write_options or ParquetWriteOptions.from_env()
+        self._load_catalog()
+
+    def _load_catalog(self):
+        """Lê a lista de checkpoints, arquivos de mudanças e pregões registrados (pelo _catalog.json)"""
+        self.checkpoints = []
+        self.change_files = {}
+        # Cache dos arquivos de mudanças: mês -> (tabela, pregões)
+        self._months = {}
+        # Meses inteiros já decodificados (leituras de intervalos): mês -> {data ISO: registros}
+        self._month_changes = {}
+        # Última carteira acrescentada: (data ISO, linhas)
+        self._latest = None
+        for relative_path in self.store.list_files():
+            match = _CHECKPOINT_PATTERN.match(relative_path)
+            if match:
+                self.checkpoints.append(match.group(1))
+                continue
+            match = _CHANGES_PATTERN.match(relative_path)
+            if match:
+                self.change_files[match.group(1)] = relative_path
+        self.checkpoints.sort()
+
+        payload = self.store.read_bytes(CATALOG_FILENAME)
+        catalog = json.loads(payload) if payload else None
+        if (catalog and catalog["checkpoints"] == self.checkpoints
+                and catalog["months"].keys() == self.change_files.keys()):
+            self.month_days = catalog["months"]
+        else:
+            # Catálogo ausente ou desatualizado: os pregões vêm dos metadados dos arquivos de mudanças
+            self.month_days = {month: self._month(month)[1] for month in sorted(self.change_files)}
+            if self.change_files:
+                self._save_catalog()
+        days = set(self.checkpoints)
+        for month_days in self.month_days.values():
+            days.update(month_days)
+        self.days = sorted(days)
+        self._day_set = set(self.days)
+
+    def _save_catalog(self):
+        catalog = {"checkpoints": self.checkpoints, "months": self.month_days}
+        self.store.write(CATALOG_FILENAME, json.dumps(catalog, separators=(",", ":")).encode("utf-8"))
+
+    def _checkpoint_path(self, day_iso):
+        return f"checkpoints/{self.index}_checkpoint_{day_iso}.parquet"
+
+    def _changes_path(self, month):
+        return f"changes/ano={month[:4]}/{self.index}_changes_{month}.parquet"
+
+    def _month(self, month):
+        """Tabela de mudanças e pregões de um mês (YYYY-MM), com cache"""
+        if month not in self._months:
+            if month in self.change_files:
+                table = self.store.read(self.change_files[month])
+                days = json.loads((table.schema.metadata or {}).get(DAYS_METADATA_KEY, b"[]"))
+                table = table.replace_schema_metadata(None)
+            else:
+                table, days = CHANGES_SCHEMA.empty_table(), []
+            self._months[month] = (table, days)
+        return self._months[month]
+
+    def _serialize(self, table):
+        buffer = io.BytesIO()
+        self.write_options.write_table(table, buffer)
+        return buffer.getvalue()
+
+    def last_day(self):
+        """Último pregão registrado (date), ou None se o CDC está vazio"""
+        return date.fromisoformat(self.days[-1]) if self.days else None
+
+    def append(self, table, save_catalog=True):
+        """
+        Acrescenta a carteira de um dia posterior ao último registrado
+
+        Args:
+            table (pyarrow.Table): Carteira de um único dia (esquema IBOV_SCHEMA)
+            save_catalog (bool): Se True, regrava o _catalog.json (extend grava uma vez ao final)
+
+        Returns:
+            dict: Data, número de inserções, remoções e atualizações e se gerou checkpoint
+
+        Raises:
+            ValueError: Se a tabela tiver mais de uma data ou a data não for posterior à última
+        """
+        day_values = table["data"].unique().to_pylist()
+        if len(day_values) != 1:
+            raise ValueError("A tabela deve conter a carteira de um único dia")
+        day = day_values[0]
+        day_iso = day.isoformat()
+        if self.days and day_iso <= self.days[-1]:
+            raise ValueError(f"{day_iso} não é posterior ao último dia do CDC ({self.days[-1]}); use rebuild")
+
+        current = table_rows(table)
+        changes = diff_rows(self._rows_at(self.days[-1]), current, day) if self.days else []
+
+        month = day_iso[:7]
+        month_table, month_days = self._month(month)
+        if changes:
+            month_table = pa.concat_tables([month_table, pa.Table.from_pylist(changes, schema=CHANGES_SCHEMA)])
+            month_table = month_table.unify_dictionaries().combine_chunks()
+        month_days = month_days + [day_iso]
+        payload = self._serialize(month_table.replace_schema_metadata(
+            {DAYS_METADATA_KEY: json.dumps(month_days).encode()}
+        ))
+        self.store.write(self._changes_path(month), payload)
+        self.change_files[month] = self._changes_path(month)
+        self._months[month] = (month_table, month_days)
+        self.month_days[month] = month_days
+        self._month_changes.pop(month, None)
+
+        since_checkpoint = len(self.days) - bisect.bisect_right(self.days, self.checkpoints[-1]) + 1 \
+            if self.checkpoints else None
+        checkpoint = since_checkpoint is None or since_checkpoint >= self.checkpoint_every
+        if checkpoint:
+            self.store.write(self._checkpoint_path(day_iso), self._serialize(rows_to_table(current, day)))
+            self.checkpoints.append(day_iso)
+
+        self.days.append(day_iso)
+        self._day_set.add(day_iso)
+        self._latest = (day_iso, current)
+        if save_catalog:
+            self._save_catalog()
+        counts = {op: sum(1 for change in changes if change["op"] == op) for op in ("insert", "delete", "update")}
+        return {"day": day_iso, **counts, "checkpoint": checkpoint}
+
+    def extend(self, tables):
+        """
+        Acrescenta várias carteiras diárias, em ordem de data
+
+        Returns:
+            dict: Dias acrescentados e totais de inserções, remoções, atualizações e checkpoints
+        """
+        totals = {"days": 0, "insert": 0, "delete": 0, "update": 0, "checkpoints": 0}
+        try:
+            for table in tables:
+                stats = self.append(table, save_catalog=False)
+                totals["days"] += 1
+                totals["checkpoints"] += stats["checkpoint"]
+                for op in ("insert", "delete", "update"):
+                    totals[op] += stats[op]
+        finally:
+            if totals["days"]:
+                self._save_catalog()
+        return totals
+
+    def rebuild(self, tables):
+        """
+        Apaga o CDC e o reconstrói a partir de carteiras diárias
+
+        Args:
+            tables (iterable): Carteiras de cada dia em ordem de data (ex.: snapshot_tables)
+
+        Returns:
+            dict: Totais de extend
+        """
+        existing = self.store.list_files()
+        if existing:
+            self.store.delete(existing)
+        self._load_catalog()
+        return self.extend(tables)
+
+    def _changes_between(self, after_iso, until_iso):
+        """
+        Mudanças dos pregões no intervalo (after_iso, until_iso], agrupadas por dia
+
+        Returns:
+            list: Pares (data ISO, registros de mudança), em ordem de data
+        """
+        days = self.days[bisect.bisect_right(self.days, after_iso):bisect.bisect_right(self.days, until_iso)]
+        grouped = {}
+        for month in sorted({day_iso[:7] for day_iso in days}):
+            grouped.update(self._changes_of_month(month, after_iso, until_iso))
+        return [(day_iso, grouped.get(day_iso, [])) for day_iso in days]
+
+    def _changes_of_month(self, month, after_iso, until_iso):
+        """Registros de mudança de um mês no intervalo (after_iso, until_iso], agrupados por dia"""
+        if month in self._month_changes:
+            return {day_iso: changes for day_iso, changes in self._month_changes[month].items()
+                    if after_iso < day_iso <= until_iso}
+        table = self._month(month)[0]
+        whole = table.num_rows
+        # As mudanças ficam em ordem de data: só o trecho do intervalo é decodificado (no máximo
+        # checkpoint_every pregões ao reconstruir uma data, e não o mês inteiro)
+        dates = table["data"].to_numpy()
+        start = np.searchsorted(dates, np.datetime64(after_iso), side="right")
+        end = np.searchsorted(dates, np.datetime64(until_iso), side="right")
+        table = table.slice(start, end - start)
+        # Decodificar coluna a coluna é bem mais rápido que table.to_pylist()
+        columns = [table[name].to_pylist() for name in CHANGES_SCHEMA.names]
+        grouped = {}
+        for values in zip(*columns):
+            change = dict(zip(CHANGES_SCHEMA.names, values))
+            grouped.setdefault(change["data"].isoformat(), []).append(change)
+        if table.num_rows == whole:
+            self._month_changes[month] = grouped
+        return grouped
+
+    def _rows_at(self, day_iso):
+        """Carteira de um pregão registrado: checkpoint anterior + mudanças até o dia"""
+        if self._latest and self._latest[0] == day_iso:
+            return self._latest[1]
+        checkpoint = self.checkpoints[bisect.bisect_right(self.checkpoints, day_iso) - 1]
+        rows = table_rows(self.store.read(self._checkpoint_path(checkpoint)))
+        for _, changes in self._changes_between(checkpoint, day_iso):
+            rows = apply_changes(rows, changes)
+        return rows
+
+    def snapshot(self, day):
+        """
+        Reconstrói a carteira de uma data
+
+        Args:
+            day (date): Data do pregão
+
+        Returns:
+            pyarrow.Table: Carteira do dia, ordenada por código
+
+        Raises:
+            KeyError: Se a data não é um pregão registrado no CDC
+        """
+        day_iso = day.isoformat()
+        if day_iso not in self._day_set:
+            raise KeyError(f"Sem carteira do {self.index} em {day_iso}")
+        return rows_to_table(self._rows_at(day_iso), day)
+
+    def snapshots(self, start, end):
+        """
+        Reconstrói as carteiras de um intervalo, aplicando as mudanças em sequência
+
+        Args:
+            start (date): Primeira data (inclusive)
+            end (date): Última data (inclusive)
+
+        Yields:
+            tuple: (data, pyarrow.Table) de cada pregão registrado no intervalo
+        """
+        position = bisect.bisect_left(self.days, start.isoformat())
+        if position == len(self.days) or self.days[position] > end.isoformat():
+            return
+        first = self.days[position]
+        rows = self._rows_at(first)
+        yield date.fromisoformat(first), rows_to_table(rows, date.fromisoformat(first))
+        for day_iso, changes in self._changes_between(first, end.isoformat()):
+            rows = apply_changes(rows, changes)
+            yield date.fromisoformat(day_iso), rows_to_table(rows, date.fromisoformat(day_iso))
+
+    def read_range(self, start, end):
+        """
+        Carteiras de um intervalo em uma única tabela (como a leitura das partições de snapshots)
+
+        Returns:
+            pyarrow.Table: Linhas de todos os pregões do intervalo, em ordem de data e código
+        """
+        tables = [table for _, table in self.snapshots(start, end)]
+        if not tables:
+            return IBOV_SCHEMA.empty_table()
+        return pa.concat_tables(tables).unify_dictionaries().combine_chunks()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Armazenamento CDC das carteiras de um índice")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="Código do índice (padrão: IBOV)")
+    parser.add_argument("--data-folder", default="src/data", help="Pasta de dados (padrão: src/data)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Reconstruir o CDC a partir das partições de snapshots")
+    parser.add_argument("--date", type=date.fromisoformat, help="Mostrar a carteira reconstruída de uma data")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY,
+                        help=f"Pregões entre checkpoints (padrão: {CHECKPOINT_EVERY})")
+    args = parser.parse_args()
+
+    index = normalize_index(args.index)
+    cdc = CDCStore(LocalPartitionStore(f"{args.data_folder}/{cdc_folder_name(index)}"), index,
+                   checkpoint_every=args.checkpoint_every)
+    if args.rebuild:
+        partitions = LocalPartitionStore(f"{args.data_folder}/{local_folder_name(index)}")
+        totals = cdc.rebuild(snapshot_tables(partitions))
+        print(f"CDC do {index} reconstruído: {totals['days']} pregões, {totals['checkpoints']} checkpoint(s), "
+              f"{totals['insert']} inserções, {totals['delete']} remoções, {totals['update']} atualizações")
+    if args.date:
+        print(cdc.snapshot(args.date).to_pandas().to_string(index=False))
+    if not args.rebuild and not args.date:
+        print(f"CDC do {index}: {len(cdc.days)} pregões ({cdc.days[0] if cdc.days else '-'} a "
+              f"{cdc.days[-1] if cdc.days else '-'}), {len(cdc.checkpoints)} checkpoint(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+Compactação das partições diárias de um índice em arquivos mensais ou anuais.
+
+Cada carga grava um Parquet pequeno (~90 linhas) em ano=YYYY/mes=MM/dia=DD/, e com
+os anos o custo de leitura passa a ser dominado pela abertura de arquivos. A
+compactação reescreve os dias de cada mês (ou ano) em um único arquivo:
+
+    ano=YYYY/mes=MM/<ÍNDICE>_YYYY-MM.parquet    (period="month")
+    ano=YYYY/<ÍNDICE>_YYYY.parquet              (period="year")
+
+com as linhas ordenadas por data e código e um row group por mês. Cargas repetidas
+do mesmo dia são deduplicadas, mantendo a de timestamp mais recente; os timestamps
+de carga de cada dia ficam nos metadados do arquivo, para que uma nova compactação
+(ex.: após novas cargas diárias) continue deduplicando corretamente.
+
+A troca é segura: o arquivo compactado é gerado em memória e conferido, gravado de
+forma atômica (os.replace no disco local; put_object no S3) e só então os arquivos
+de origem são removidos. Uma falha no meio do caminho deixa, no pior caso, dados
+repetidos que a próxima execução resolve — nunca dados perdidos.
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import time
+from collections import defaultdict
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from b3_csv_parser import IBOV_SCHEMA
+from b3_indices import DEFAULT_INDEX
+from instrumentation import get_logger
+from parquet_options import ParquetWriteOptions
+
+logger = get_logger("compaction")
+
+PERIODS = ("month", "year")
+
+# Metadado do Parquet compactado com o timestamp de carga de cada dia
+LOADS_METADATA_KEY = b"b3_loads"
+
+# Caminho relativo à pasta/prefixo do índice: diário, mensal ou anual
+_RELATIVE_PATH_PATTERN = re.compile(
+    r'^ano=(\d{4})/(?:mes=(\d{2})/(?:dia=(\d{2})/)?)?([^/]+\.parquet)$'
+)
+_LOAD_TIMESTAMP_PATTERN = re.compile(r'^(\d{8}_\d{6})_')
+
+# Timestamp atribuído a arquivos diários sem timestamp no nome (cargas antigas)
+_UNKNOWN_LOAD = "00000000_000000"
+
+
+class LocalPartitionStore:
+    """Partições de um índice no disco local (ex.: src/data/ibov-data)"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(str(root))
+
+    def describe(self):
+        return self.root
+
+    def list_files(self):
+        files = []
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".parquet"):
+                    path = os.path.join(folder, name)
+                    files.append(os.path.relpath(path, self.root).replace(os.sep, "/"))
+        return sorted(files)
+
+    def read(self, relative_path):
+        return pq.read_table(os.path.join(self.root, relative_path))
+
+    def read_bytes(self, relative_path):
+        """Conteúdo de um arquivo auxiliar (ex.: _partitions.json), ou None se não existir"""
+        try:
+            with open(os.path.join(self.root, relative_path), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def file_metadata(self, relative_path):
+        """Rodapé Parquet e tamanho de um arquivo"""
+        path = os.path.join(self.root, relative_path)
+        return pq.read_metadata(path), os.path.getsize(path)
+
+    def write(self, relative_path, payload):
+        """Grava em um arquivo temporário na mesma pasta e troca com os.replace (atômico)"""
+        path = os.path.join(self.root, relative_path)
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".compact-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(payload)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return os.path.getsize(path)
+
+    def delete(self, relative_paths):
+        for relative_path in relative_paths:
+            path = os.path.join(self.root, relative_path)
+            os.remove(path)
+            # Remover pastas dia=/mes= que ficaram vazias
+            folder = os.path.dirname(path)
+            while folder != self.root and not os.listdir(folder):
+                os.rmdir(folder)
+                folder = os.path.dirname(folder)
+
+
+class S3PartitionStore:
+    """Partições de um índice no S3 (ex.: s3://bucket/ibov_data/)"""
+
+    def __init__(self, client, bucket, prefix, content_digest_metadata=None):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.content_digest_metadata = content_digest_metadata
+
+    def describe(self):
+        return f"s3://{self.bucket}/{self.prefix}"
+
+    def list_files(self):
+        files = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                if item["Key"].endswith(".parquet"):
+                    files.append(item["Key"][len(self.prefix):])
+        return sorted(files)
+
+    def read(self, relative_path):
+        body = self.client.get_object(Bucket=self.bucket, Key=self.prefix + relative_path)["Body"].read()
+        return pq.read_table(pa.BufferReader(body))
+
+    def read_bytes(self, relative_path):
+        """Conteúdo de um objeto auxiliar (ex.: _partitions.json), ou None se não existir"""
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.prefix + relative_path)["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def file_metadata(self, relative_path):
+        """Rodapé Parquet e tamanho de um objeto (os arquivos diários têm poucos KB: um GET inteiro)"""
+        body = self.client.get_object(Bucket=self.bucket, Key=self.prefix + relative_path)["Body"].read()
+        return pq.read_metadata(pa.BufferReader(body)), len(body)
+
+    def write(self, relative_path, payload):
+        """put_object é atômico: o objeto antigo segue visível até o novo estar completo"""
+        extra = {}
+        if self.content_digest_metadata:
+            extra["Metadata"] = {self.content_digest_metadata: hashlib.sha256(payload).hexdigest()}
+        key = self.prefix + relative_path
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=payload, **extra)
+        return self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+
+    def delete(self, relative_paths):
+        keys = [self.prefix + relative_path for relative_path in relative_paths]
+        for start in range(0, len(keys), 1000):
+            response = self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in keys[start:start + 1000]], "Quiet": True},
+            )
+            if response.get("Errors"):
+                raise RuntimeError(f"Falha ao remover {len(response['Errors'])} objeto(s) de origem")
+
+
+def compacted_path(index, period, year, month=None):
+    """Caminho relativo do arquivo compactado de um mês ou ano"""
+    if period == "month":
+        return f"ano={year}/mes={month}/{index}_{year}-{month}.parquet"
+    return f"ano={year}/{index}_{year}.parquet"
+
+
+def classify(relative_path):
+    """
+    Identifica um arquivo da árvore particionada
+
+    Returns:
+        dict: year, month, day (ou None) e load (timestamp da carga, para diários),
+              ou None se o caminho não seguir o layout
+    """
+    match = _RELATIVE_PATH_PATTERN.match(relative_path)
+    if not match:
+        return None
+    year, month, day, filename = match.groups()
+    load = None
+    if day:
+        load_match = _LOAD_TIMESTAMP_PATTERN.match(filename)
+        load = load_match.group(1) if load_match else _UNKNOWN_LOAD
+    return {"year": year, "month": month, "day": day, "load": load}
+
+
+def _day_tables(table, info):
+    """
+    Separa uma tabela de origem por dia
+
+    Returns:
+        list: Tuplas (data ISO, timestamp da carga, tabela do dia)
+    """
+    if info["day"]:
+        return [(f"{info['year']}-{info['month']}-{info['day']}", info["load"], table)]
+
+    metadata = table.schema.metadata or {}
+    loads = json.loads(metadata.get(LOADS_METADATA_KEY, b"{}"))
+    days = []
+    for day_value in pc.unique(table["data"]).to_pylist():
+        day_iso = day_value.isoformat()
+        days.append((day_iso, loads.get(day_iso, _UNKNOWN_LOAD),
+                     table.filter(pc.equal(table["data"], pa.scalar(day_value, pa.date32())))))
+    return days
+
+
+def merge_period(sources):
+    """
+    Junta as tabelas de um período mantendo, para cada dia, apenas a carga mais recente
+
+    Args:
+        sources (list): Pares (tabela, classify(caminho))
+
+    Returns:
+        tuple: (tabela ordenada por data e código, {data: carga}, cargas descartadas)
+    """
+    best = {}
+    dropped = 0
+    for table, info in sources:
+        for day_iso, load, day_table in _day_tables(table, info):
+            day_table = day_table.select(IBOV_SCHEMA.names).cast(IBOV_SCHEMA).replace_schema_metadata(None)
+            current = best.get(day_iso)
+            if current is None:
+                best[day_iso] = (load, day_table)
+            else:
+                dropped += 1
+                if load > current[0]:
+                    best[day_iso] = (load, day_table)
+
+    days = sorted(best)
+    merged = pa.concat_tables([best[day][1] for day in days])
+    # O pyarrow não ordena colunas de dicionário: a chave de ordenação usa o código decodificado
+    sort_keys = pa.table({"data": merged["data"], "codigo": merged["codigo"].cast(pa.string())})
+    order = pc.sort_indices(sort_keys, sort_keys=[("data", "ascending"), ("codigo", "ascending")])
+    merged = merged.take(order).unify_dictionaries().combine_chunks()
+    return merged, {day: best[day][0] for day in days}, dropped
+
+
+def write_compacted(table, loads, write_options=None):
+    """
+    Serializa a tabela compactada em Parquet, com um row group por mês
+
+    Args:
+        table (pyarrow.Table): Saída de merge_period
+        loads (dict): Timestamp de carga de cada dia
+        write_options (ParquetWriteOptions): Compressão e estatísticas (o row group é sempre o mês)
+
+    Returns:
+        bytes: Conteúdo do arquivo
+    """
+    write_options = write_options or ParquetWriteOptions.from_env()
+    schema = table.schema.with_metadata({LOADS_METADATA_KEY: json.dumps(loads, sort_keys=True).encode()})
+    months = pc.strftime(table["data"], format="%Y-%m")
+    buffer = io.BytesIO()
+    with pq.ParquetWriter(buffer, schema, **write_options.writer_kwargs()) as writer:
+        for month in pc.unique(months).to_pylist():
+            writer.write_table(table.filter(pc.equal(months, month)).replace_schema_metadata(schema.metadata))
+    return buffer.getvalue()
+
+
+def scan_seconds(store):
+    """
+    Mede o tempo de leitura completa das partições (um acesso por arquivo)
+
+    Returns:
+        tuple: (segundos, número de linhas)
+    """
+    start = time.perf_counter()
+    rows = 0
+    for relative_path in store.list_files():
+        if classify(relative_path):
+            rows += store.read(relative_path).num_rows
+    return time.perf_counter() - start, rows
+
+
+class PartitionCompactor:
+    def __init__(self, store, index=DEFAULT_INDEX, period="month", min_files=1, write_options=None,
+                 partition_index=None):
+        """
+        Configura a compactação
+
+        Args:
+            store (LocalPartitionStore | S3PartitionStore): Onde estão as partições do índice
+            index (str): Código do índice (usado no nome dos arquivos compactados)
+            period (str): "month" ou "year"
+            min_files (int): Número mínimo de arquivos de origem para compactar um período
+                (períodos já compactados em um único arquivo são sempre ignorados)
+            write_options (ParquetWriteOptions): Opções de gravação; se None, lidas das variáveis PARQUET_*
+            partition_index (PartitionIndex): Índice da árvore; se informado, substitui a listagem
+                e é atualizado com os arquivos compactados e removidos
+        """
+        if period not in PERIODS:
+            raise ValueError(f"Período inválido: {period}. Use {', '.join(PERIODS)}")
+        self.store = store
+        self.index = index
+        self.period = period
+        self.min_files = min_files
+        self.write_options = write_options or ParquetWriteOptions.from_env()
+        self.partition_index = partition_index
+
+    def list_files(self):
+        """Arquivos da árvore, pelo índice de partições quando disponível"""
+        if self.partition_index is not None:
+            return self.partition_index.files()
+        return self.store.list_files()
+
+    def plan(self):
+        """
+        Agrupa os arquivos por período de destino
+
+        Returns:
+            dict: Caminho do arquivo compactado -> caminhos de origem
+        """
+        groups = defaultdict(list)
+        for relative_path in self.list_files():
+            info = classify(relative_path)
+            if info is None:
+                continue
+            if self.period == "month":
+                # Arquivos anuais não são desmontados em meses
+                if info["month"] is None:
+                    continue
+                target = compacted_path(self.index, "month", info["year"], info["month"])
+            else:
+                target = compacted_path(self.index, "year", info["year"])
+            groups[target].append(relative_path)
+        return {
+            target: sources for target, sources in sorted(groups.items())
+            if sources != [target] and len(sources) >= self.min_files
+        }
+
+    def run(self, dry_run=False, benchmark=False):
+        """
+        Compacta todos os períodos com arquivos a juntar
+
+        Args:
+            dry_run (bool): Se True, apenas relata o que seria feito
+            benchmark (bool): Se True, mede o tempo de leitura completa antes e depois
+
+        Returns:
+            dict: Relatório com contagens de arquivos, linhas, cargas descartadas e tempos
+        """
+        report = {"store": self.store.describe(), "period": self.period, "dry_run": dry_run,
+                  "files_before": len(self.list_files()), "files_after": None, "periods": 0,
+                  "compacted": 0, "rows_written": 0, "loads_dropped": 0, "errors": {}, "seconds": 0.0}
+        if benchmark:
+            seconds, report["scan_rows_before"] = scan_seconds(self.store)
+            report["scan_before_seconds"] = round(seconds, 3)
+
+        start = time.perf_counter()
+        groups = self.plan()
+        report["periods"] = len(groups)
+        logger.info(f"Compactação {self.period} em {report['store']}: {report['files_before']} arquivo(s), "
+                    f"{len(groups)} período(s) a compactar")
+
+        for target, sources in groups.items():
+            if dry_run:
+                logger.info(f"  [dry-run] {target} <- {len(sources)} arquivo(s)")
+                continue
+            try:
+                merged, loads, dropped = merge_period(
+                    [(self.store.read(source), classify(source)) for source in sources]
+                )
+                payload = write_compacted(merged, loads, self.write_options)
+
+                # Conferir o arquivo gerado antes de trocar
+                written = pq.read_table(pa.BufferReader(payload))
+                if written.num_rows != merged.num_rows or written.schema.names != merged.schema.names:
+                    raise RuntimeError("Arquivo compactado não confere com os dados de origem")
+
+                size = self.store.write(target, payload)
+                if size != len(payload):
+                    raise RuntimeError(f"Tamanho gravado ({size}) difere do gerado ({len(payload)})")
+
+                # Só remover as origens depois que o arquivo compactado está no lugar
+                removed = [source for source in sources if source != target]
+                self.store.delete(removed)
+                if self.partition_index is not None:
+                    self.partition_index.remove(removed)
+                    self.partition_index.add(target, pq.read_metadata(pa.BufferReader(payload)), size)
+
+                report["compacted"] += 1
+                report["rows_written"] += merged.num_rows
+                report["loads_dropped"] += dropped
+                logger.debug(f"  ✓ {target}: {len(sources)} arquivo(s) -> 1 ({merged.num_rows} linhas, "
+                             f"{len(loads)} dia(s), {dropped} carga(s) repetida(s) descartada(s))")
+            except Exception as e:
+                report["errors"][target] = str(e)
+                logger.warning(f"  ✗ {target}: {e}")
+
+        if self.partition_index is not None and not dry_run:
+            self.partition_index.flush()
+        report["seconds"] = round(time.perf_counter() - start, 3)
+        report["files_after"] = len(self.list_files())
+        if benchmark:
+            seconds, report["scan_rows_after"] = scan_seconds(self.store)
+            report["scan_after_seconds"] = round(seconds, 3)
+        logger.info(f"Compactação concluída em {report['seconds']:.1f}s: "
+                    f"{report['files_before']} -> {report['files_after']} arquivo(s)")
+        if benchmark:
+            logger.info(f"Leitura completa: {report['scan_before_seconds']:.3f}s -> {report['scan_after_seconds']:.3f}s")
+        return report
@@ -0,0 +1,191 @@
+"""
+Manifesto persistente das conversões CSV -> Parquet.
+
+Cada conversão bem-sucedida é registrada como uma linha JSON em
+ibov-data/_manifest.jsonl com nome, tamanho, mtime e hash SHA-256 do CSV de
+origem e o caminho do Parquet gerado. Na próxima execução, arquivos com o mesmo
+nome, tamanho e mtime são ignorados sem serem lidos; se apenas o mtime mudou, o
+hash do conteúdo decide se é necessário reconverter.
+
+Depois da compactação (compaction.py), o Parquet diário registrado deixa de existir; a
+conversão continua valendo se o arquivo mensal ou anual do índice contiver o dia (pelas
+cargas gravadas nos metadados do arquivo compactado).
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+MANIFEST_FILENAME = "_manifest.jsonl"
+
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """
+    Calcula o hash SHA-256 do conteúdo de um arquivo
+
+    Args:
+        file_path (str): Caminho do arquivo
+        chunk_size (int): Tamanho dos blocos de leitura
+
+    Returns:
+        str: Hash em hexadecimal
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConversionManifest:
+    def __init__(self, output_folder, index=None):
+        """
+        Carrega o manifesto da pasta de saída (ibov-data)
+
+        Args:
+            output_folder (str): Pasta onde os Parquet são gravados
+            index (str): Código do índice (nome dos arquivos compactados); se None, apenas
+                o Parquet diário registrado vale como saída existente
+        """
+        self.output_folder = str(output_folder)
+        self.index = index
+        self._compacted_days = {}
+        self.path = os.path.join(self.output_folder, MANIFEST_FILENAME)
+        self.by_source = {}
+        self.by_hash = {}
+        self._lines = 0
+        self._load()
+
+    def _load(self):
+        """Lê o manifesto; a última linha de cada arquivo de origem prevalece"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Linha truncada por uma execução interrompida
+                    continue
+                self._lines += 1
+                self._index(entry)
+
+    def _index(self, entry):
+        self.by_source[entry["source"]] = entry
+        self.by_hash[entry["sha256"]] = entry
+
+    def _output_exists(self, entry):
+        if os.path.exists(os.path.join(self.output_folder, entry["parquet"])):
+            return True
+        return self.index is not None and self._compacted(entry["parquet"])
+
+    def _compacted(self, relative_path):
+        """Verifica se o dia do Parquet diário está em um arquivo compactado (mensal ou anual)"""
+        from compaction import classify, compacted_path
+
+        info = classify(relative_path.replace(os.sep, "/"))
+        if info is None or info["day"] is None:
+            return False
+        day_iso = f"{info['year']}-{info['month']}-{info['day']}"
+        return any(day_iso in self._days_in(compacted_path(self.index, period, info["year"], info["month"]))
+                   for period in ("month", "year"))
+
+    def _days_in(self, relative_path):
+        """Dias contidos em um arquivo compactado (lidos do rodapé uma vez por arquivo)"""
+        if relative_path not in self._compacted_days:
+            import pyarrow.parquet as pq
+            from compaction import LOADS_METADATA_KEY
+
+            path = os.path.join(self.output_folder, relative_path)
+            days = set()
+            if os.path.exists(path):
+                metadata = pq.read_schema(path).metadata or {}
+                days = set(json.loads(metadata.get(LOADS_METADATA_KEY, b"{}")))
+            self._compacted_days[relative_path] = days
+        return self._compacted_days[relative_path]
+
+    def check(self, csv_file_path):
+        """
+        Verifica se o CSV já foi convertido e não mudou desde então
+
+        Args:
+            csv_file_path (str): Caminho do arquivo CSV
+
+        Returns:
+            tuple: (True se pode ser ignorado, fingerprint do arquivo para record())
+        """
+        stat = os.stat(csv_file_path)
+        fingerprint = {
+            "source": os.path.basename(csv_file_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": None,
+        }
+
+        # Caminho rápido: mesmo nome, tamanho e mtime, sem ler o arquivo
+        entry = self.by_source.get(fingerprint["source"])
+        if (entry and entry["size"] == fingerprint["size"]
+                and entry["mtime_ns"] == fingerprint["mtime_ns"]
+                and self._output_exists(entry)):
+            return True, fingerprint
+
+        # Metadados mudaram (ou nome novo): comparar pelo conteúdo
+        fingerprint["sha256"] = file_sha256(csv_file_path)
+        entry = self.by_hash.get(fingerprint["sha256"])
+        if entry and self._output_exists(entry):
+            # Mesmo conteúdo já convertido: apenas atualizar os metadados
+            self.record(fingerprint, os.path.join(self.output_folder, entry["parquet"]))
+            return True, fingerprint
+
+        return False, fingerprint
+
+    def previous_output(self, source):
+        """
+        Retorna o caminho do Parquet gerado anteriormente para o arquivo de origem
+
+        Args:
+            source (str): Nome do arquivo CSV
+
+        Returns:
+            str: Caminho do Parquet, ou None se nunca foi convertido
+        """
+        entry = self.by_source.get(source)
+        if not entry:
+            return None
+        return os.path.join(self.output_folder, entry["parquet"])
+
+    def record(self, fingerprint, parquet_path):
+        """
+        Registra uma conversão concluída no manifesto
+
+        Args:
+            fingerprint (dict): Retornado por check()
+            parquet_path (str): Caminho do Parquet gerado
+        """
+        entry = dict(fingerprint)
+        if entry["sha256"] is None:
+            entry["sha256"] = self.by_source[entry["source"]]["sha256"]
+        entry["parquet"] = os.path.relpath(parquet_path, self.output_folder)
+        entry["converted_at"] = datetime.now().isoformat(timespec="seconds")
+
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._lines += 1
+        self._index(entry)
+
+        # Reescrever o arquivo quando as linhas substituídas dominarem o manifesto
+        if self._lines > 2 * len(self.by_source) + 100:
+            self.compact()
+
+    def compact(self):
+        """Reescreve o manifesto mantendo apenas a última linha de cada arquivo de origem"""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            for entry in self.by_source.values():
+                file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(temp_path, self.path)
+        self._lines = len(self.by_source)
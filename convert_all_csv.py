@@ -4,42 +4,60 @@ Script para conversão automática de todos os arquivos CSV para Parquet
 sem interação do usuário.
 """
 
-from csv_to_parquet_converter import CSVToParquetConverter
+from csv_to_parquet_converter import CSVToParquetConverter, parse_args
+from instrumentation import write_metrics
 
 def main():
     """
     Executa a conversão de forma automática
     """
+    args = parse_args("Conversão automática de CSV para Parquet")
+    
     # Caminho para a pasta de dados
     data_folder = "src/data"
     
     try:
-        # Criar instância do conversor
-        converter = CSVToParquetConverter(data_folder)
+        # Um conversor por índice (as partições de cada índice ficam em pastas separadas)
+        converters = [
+            CSVToParquetConverter(data_folder, index, args.write_options, cdc=args.cdc, changes=args.changes)
+            for index in args.index
+        ]
         
         print("Conversão Automática CSV para Parquet")
         print("=" * 50)
+        print(f"Parquet: {args.write_options.describe()}")
         
         # Listar arquivos antes da conversão
         print("ANTES DA CONVERSÃO:")
-        converter.list_files_in_folder()
+        for converter in converters:
+            converter.list_files_in_folder()
         print()
         
         # Executar conversão (removendo arquivos originais por padrão)
         print("Iniciando conversão automática (removendo arquivos CSV originais)...\n")
-        stats = converter.convert_all_csv_files(remove_originals=True)
+        converted = 0
+        for converter in converters:
+            stats = converter.convert_all_csv_files(
+                remove_originals=True, workers=args.workers, skip_unchanged=not args.force
+            )
+            converted += stats["converted"]
         
         print()
         
         # Listar arquivos após a conversão
         print("APÓS A CONVERSÃO:")
-        converter.list_files_in_folder()
+        for converter in converters:
+            converter.list_files_in_folder()
         
         # Verificar se houve alguma conversão
-        if stats["converted"] > 0:
-            print(f"\n🎉 Conversão concluída! {stats['converted']} arquivo(s) convertido(s) com sucesso.")
+        if converted > 0:
+            print(f"\n🎉 Conversão concluída! {converted} arquivo(s) convertido(s) com sucesso.")
         else:
             print("\n⚠️  Nenhum arquivo foi convertido.")
+        
+        if args.metrics_file:
+            write_metrics(args.metrics_file, job="converter")
+            print(f"Métricas gravadas em {args.metrics_file}")
             
     except FileNotFoundError as e:
         print(f"Erro: {e}")
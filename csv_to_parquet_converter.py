@@ -1,33 +1,91 @@
 import os
-import pandas as pd
-import pyarrow as pa
-import pyarrow.parquet as pq
 from pathlib import Path
 import glob
-import re
+import io
+import argparse
+import contextlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from b3_indices import (CSV_FILENAME_PATTERN, DEFAULT_INDEX, PORTFOLIO_OPERATIONS, belongs_to_index,
+                        cdc_folder_name, changes_folder_name, local_folder_name, normalize_index,
+                        parquet_filename, parse_index_list)
+from conversion_manifest import ConversionManifest
+from instrumentation import (METRICS, add_instrumentation_arguments, collect_in_worker, configure_from_args,
+                             get_logger, write_metrics)
+from parquet_options import ParquetWriteOptions, add_write_option_arguments, write_options_from_args
+
+# Os módulos que carregam o pyarrow (parser, índice de partições, CDC, compactação e cache
+# das consultas) são importados nos métodos que os usam: o --help dos scripts de conversão
+# (parse_args) não os carrega
+
+logger = get_logger("converter")
+
 class CSVToParquetConverter:
-    def __init__(self, data_folder_path):
+    def __init__(self, data_folder_path, index=DEFAULT_INDEX, write_options=None, cdc=False, changes=False,
+                 portfolio="day"):
         """
         Inicializa o conversor com o caminho da pasta de dados
         
         Args:
             data_folder_path (str): Caminho para a pasta contendo os arquivos CSV
+            index (str): Código do índice cujos arquivos serão convertidos (ex.: IBOV, SMLL)
+            write_options (ParquetWriteOptions): Opções de gravação; se None, lidas das variáveis PARQUET_*
+            cdc (bool): Se True, mantém também o armazenamento CDC (<índice>-cdc/) a cada conversão
+            changes (bool): Se True, atualiza também as variações diárias (<índice>-changes/) a cada conversão
+            portfolio (str): Tipo de carteira; "theoretical" e "quarterly" ficam em árvores próprias
+                (ex.: ibov-theoretical-data/), separadas das cargas da carteira do dia
+        
+        Raises:
+            ValueError: Se o tipo de carteira for inválido, ou se cdc/changes forem pedidos para
+                uma carteira que não é a do dia
         """
+        if portfolio not in PORTFOLIO_OPERATIONS:
+            raise ValueError(f"Carteira inválida: {portfolio}. Use {', '.join(PORTFOLIO_OPERATIONS)}")
+        if portfolio != "day" and (cdc or changes):
+            raise ValueError("CDC e variações diárias existem apenas para a carteira do dia")
         self.data_folder = Path(data_folder_path)
-        self.ibov_data_folder = self.data_folder / "ibov-data"
+        self.index = normalize_index(index)
+        self.portfolio = portfolio
+        self.write_options = write_options or ParquetWriteOptions.from_env()
+        self.cdc = cdc
+        self.changes = changes
+        self.index_data_folder = self.data_folder / local_folder_name(self.index, portfolio)
+        self.cdc_folder = self.data_folder / cdc_folder_name(self.index)
+        self.changes_folder = self.data_folder / changes_folder_name(self.index)
         
         if not self.data_folder.exists():
             raise FileNotFoundError(f"Pasta não encontrada: {data_folder_path}")
         
-        # Criar pasta ibov-data se não existir
-        self.ibov_data_folder.mkdir(exist_ok=True)
-        print(f"Pasta de destino: {self.ibov_data_folder}")
+        # Criar pasta de partições do índice (ex.: ibov-data) se não existir
+        self.index_data_folder.mkdir(exist_ok=True)
+        logger.debug(f"Pasta de destino: {self.index_data_folder}")
+        self._partition_index = None
+    
+    def __getstate__(self):
+        # O índice de partições fica no processo principal (os workers do pool não o recebem)
+        state = dict(self.__dict__)
+        state["_partition_index"] = None
+        return state
+    
+    @property
+    def partition_index(self):
+        """Índice de partições da pasta do índice (_partitions.json), carregado no primeiro uso"""
+        if self._partition_index is None:
+            from compaction import LocalPartitionStore
+            from partition_index import PartitionIndex
+            
+            self._partition_index = PartitionIndex.load(LocalPartitionStore(self.index_data_folder))
+        return self._partition_index
+    
+    def relative_partition_path(self, parquet_path):
+        """Caminho do Parquet relativo à pasta do índice, no formato do índice de partições"""
+        return os.path.relpath(parquet_path, self.index_data_folder).replace(os.sep, "/")
     
     def extract_date_from_filename(self, filename):
         """
-        Extrai a data do nome do arquivo no formato IBOVDia_dd-mm-yy.csv
+        Extrai a data do nome do arquivo no formato <ÍNDICE>Dia_dd-mm-yy.csv
         
         Args:
             filename (str): Nome do arquivo
@@ -35,12 +93,11 @@ class CSVToParquetConverter:
         Returns:
             tuple: (dia, mes, ano) ou None se não conseguir extrair
         """
-        # Padrão para IBOVDia_dd-mm-yy.csv
-        pattern = r'IBOVDia_(\d{2})-(\d{2})-(\d{2})\.csv'
-        match = re.search(pattern, filename)
+        # Padrão para IBOVDia_dd-mm-yy.csv (e equivalentes dos demais índices)
+        match = CSV_FILENAME_PATTERN.search(filename)
         
         if match:
-            day, month, year = match.groups()
+            _, day, month, year = match.groups()
             # Converter ano de 2 dígitos para 4 dígitos
             full_year = f"20{year}" if int(year) < 50 else f"19{year}"
             return day, month, full_year
@@ -59,172 +116,345 @@ class CSVToParquetConverter:
         Returns:
             Path: Caminho da pasta particionada
         """
-        partition_path = self.ibov_data_folder / f"ano={year}" / f"mes={month.zfill(2)}" / f"dia={day.zfill(2)}"
+        partition_path = self.index_data_folder / f"ano={year}" / f"mes={month.zfill(2)}" / f"dia={day.zfill(2)}"
         partition_path.mkdir(parents=True, exist_ok=True)
         return partition_path
     
-    def convert_csv_to_parquet(self, csv_file_path, remove_original=True):
+    def write_partition(self, table, day, month, year, load_timestamp=None, record=True):
+        """
+        Grava uma tabela da carteira na partição ano=YYYY/mes=MM/dia=DD
+        
+        Args:
+            table (pyarrow.Table): Carteira do dia
+            day (str): Dia (DD)
+            month (str): Mês (MM)
+            year (str): Ano (YYYY)
+            load_timestamp (str): Timestamp de carga (YYYYMMDD_HHMMSS). Se None, usa o horário atual
+            record (bool): Se True, registra o arquivo no índice de partições (gravado em flush)
+            
+        Returns:
+            Path: Caminho do arquivo Parquet gerado
+        """
+        # Criar timestamp de carga (formato: YYYYMMDD_HHMMSS)
+        timestamp = load_timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+        
+        # Criar caminho particionado
+        partition_path = self.create_partitioned_path(day, month, year)
+        
+        # Nome do arquivo com timestamp
+        parquet_path = partition_path / parquet_filename(self.index, timestamp, day, month, year)
+        
+        # Converter para Parquet
+        footers = []
+        with METRICS.timer("write"):
+            self.write_options.write_table(table, parquet_path, metadata_collector=footers)
+        size = parquet_path.stat().st_size
+        METRICS.count("parquet_bytes", size)
+        if record:
+            self.partition_index.add(self.relative_partition_path(parquet_path), footers[0], size)
+            if self.portfolio == "day":
+                # O cache das consultas (portfolio_query.py) só guarda carteiras do dia
+                from portfolio_cache import invalidate_paths
+                
+                invalidate_paths(self.index, [self.relative_partition_path(parquet_path)])
+        return parquet_path
+    
+    def convert_csv_to_parquet(self, csv_file_path, remove_original=True, load_timestamp=None):
         """
         Converte um arquivo CSV específico para formato Parquet com estrutura particionada
         
         Args:
             csv_file_path (str): Caminho do arquivo CSV
             remove_original (bool): Se True, remove o arquivo CSV original após conversão
+            load_timestamp (str): Timestamp de carga (YYYYMMDD_HHMMSS). Se None, usa o horário atual
             
         Returns:
             str: Caminho do arquivo Parquet gerado, ou None se falhar
         """
+        parquet_path, _ = self._convert_file(csv_file_path, remove_original, load_timestamp)
+        self.partition_index.flush()
+        return parquet_path
+    
+    def _convert_file(self, csv_file_path, remove_original, load_timestamp, record=True):
+        """
+        Executa a conversão de um arquivo, devolvendo também a mensagem de erro
+        
+        Args:
+            record (bool): Se True, registra o Parquet no índice de partições
+        
+        Returns:
+            tuple: (caminho do Parquet ou None, mensagem de erro ou None)
+        """
+        from b3_csv_parser import parse_ibov_csv
+        
         try:
             filename = os.path.basename(csv_file_path)
-            print(f"Convertendo: {filename}")
+            logger.debug(f"Convertendo: {filename}")
             
             # Extrair data do nome do arquivo
             date_info = self.extract_date_from_filename(filename)
             if not date_info:
-                print(f"✗ Não foi possível extrair a data do arquivo: {filename}")
-                return None
+                error = f"Não foi possível extrair a data do arquivo: {filename}"
+                logger.error(f"✗ {error}", extra={"file": filename})
+                return None, error
             
             day, month, year = date_info
-            print(f"  Data extraída: {day}/{month}/{year}")
-            
-            # Ler CSV ignorando as 2 primeiras linhas e sem header
-            df = pd.read_csv(
-                csv_file_path, 
-                encoding='latin1', 
-                sep=';', 
-                skiprows=2,  # Pular as duas primeiras linhas
-                skipfooter=2,  # Pular as duas últimas linhas com informações agregadas
-                engine='python',  # Necessário para skipfooter
-                header=None  # Não há header
-            )
-            
-            print(f"  Colunas encontradas: {len(df.columns)}")
-            
-            # Remover a última coluna (que é vazia devido ao ; no final de cada linha)
-            df = df.iloc[:, :-1]
-            print(f"  Removida última coluna vazia. Colunas restantes: {len(df.columns)}")
-            
-            # Verificar se temos exatamente 5 colunas após remoção
-            if len(df.columns) != 5:
-                raise ValueError(f"Esperado 5 colunas após remoção da coluna vazia, mas encontrado {len(df.columns)}")
-            
-            # Definir nomes das colunas conforme especificado
-            df.columns = ['codigo', 'acao', 'tipo', 'qtde_teorica', 'participacao']
-            
-            print(f"  Primeiras linhas após processamento:\n{df.head(2)}")
-            
-            # Limpar dados
-            # Converter qtde_teorica para numérico (remover pontos de milhares)
-            df['qtde_teorica'] = df['qtde_teorica'].astype(str).str.replace('.', '').astype(float)
-            
-            # Converter participacao para numérico (trocar vírgula por ponto)
-            df['participacao'] = df['participacao'].astype(str).str.replace(',', '.').astype(float)
-            
-            # Limpar espaços em branco das colunas de texto
-            df['codigo'] = df['codigo'].astype(str).str.strip()
-            df['acao'] = df['acao'].astype(str).str.strip()
-            df['tipo'] = df['tipo'].astype(str).str.strip()
+            logger.debug(f"  Data extraída: {day}/{month}/{year}")
             
-            # Criar coluna data do tipo date no formato yyyy-mm-dd
-            data_str = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-            df['data'] = pd.to_datetime(data_str).date()
+            # Ler CSV em uma única passada (título, cabeçalho e rodapé localizados pelo parser)
+            with METRICS.timer("parse"):
+                table, _ = parse_ibov_csv(csv_file_path, date_info)
+            METRICS.count("rows_parsed", table.num_rows)
+            METRICS.count("csv_bytes", os.path.getsize(csv_file_path))
             
-            print(f"  Data adicionada: {data_str}")
+            logger.debug(f"  Linhas lidas: {table.num_rows}")
+            # A amostra exige converter para pandas: só é montada com -v (nível DEBUG)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"  Primeiras linhas após processamento:\n{table.slice(0, 2).to_pandas()}")
             
-            # Criar timestamp de carga (formato: YYYYMMDD_HHMMSS)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # Gravar o Parquet na partição ano=/mes=/dia= com o timestamp de carga
+            parquet_path = self.write_partition(table, day, month, year, load_timestamp, record)
             
-            # Criar caminho particionado
-            partition_path = self.create_partitioned_path(day, month, year)
-            
-            # Nome do arquivo com timestamp
-            parquet_filename = f"{timestamp}_IBOVDia_{day}-{month}-{year[-2:]}.parquet"
-            parquet_path = partition_path / parquet_filename
-            
-            # Converter para Parquet
-            df.to_parquet(parquet_path, index=False, engine='pyarrow')
-            
-            print(f"✓ Convertido para: {parquet_path.relative_to(self.ibov_data_folder)}")
+            logger.info(f"✓ Convertido para: {parquet_path.relative_to(self.index_data_folder)}",
+                        extra={"file": filename, "rows": table.num_rows})
             
             # Remover arquivo CSV original se solicitado
             if remove_original:
                 os.remove(csv_file_path)
-                print(f"✓ Arquivo CSV original removido: {filename}")
+                logger.debug(f"✓ Arquivo CSV original removido: {filename}")
             
-            return str(parquet_path)
+            return str(parquet_path), None
             
         except Exception as e:
-            print(f"✗ Erro ao converter {os.path.basename(csv_file_path)}: {str(e)}")
-            return None
+            logger.error(f"✗ Erro ao converter {os.path.basename(csv_file_path)}: {str(e)}",
+                         extra={"file": os.path.basename(csv_file_path)})
+            return None, str(e)
     
-    def convert_all_csv_files(self, remove_originals=False):
+    def convert_all_csv_files(self, remove_originals=False, workers=1, skip_unchanged=True):
         """
         Converte todos os arquivos CSV da pasta para Parquet
         
         Args:
             remove_originals (bool): Se True, remove os arquivos CSV originais após conversão
+            workers (int): Número de processos para conversão em paralelo (1 = sequencial)
+            skip_unchanged (bool): Se True, ignora arquivos já convertidos e inalterados (manifesto)
             
         Returns:
             dict: Dicionário com estatísticas da conversão
         """
-        # Encontrar todos os arquivos CSV na pasta
+        # Encontrar os arquivos CSV do índice na pasta (ordenados para saída determinística)
         csv_pattern = os.path.join(self.data_folder, "*.csv")
-        csv_files = glob.glob(csv_pattern)
+        csv_files = sorted(
+            path for path in glob.glob(csv_pattern) if belongs_to_index(os.path.basename(path), self.index)
+        )
         
         if not csv_files:
-            print("Nenhum arquivo CSV encontrado na pasta.")
-            return {"total": 0, "converted": 0, "failed": 0}
+            logger.info(f"Nenhum arquivo CSV do {self.index} encontrado na pasta.")
+            return {"total": 0, "converted": 0, "failed": 0, "skipped": 0, "errors": {}}
         
-        print(f"Encontrados {len(csv_files)} arquivo(s) CSV para conversão:")
+        logger.info(f"Encontrados {len(csv_files)} arquivo(s) CSV do {self.index} para conversão")
         for csv_file in csv_files:
-            print(f"  - {os.path.basename(csv_file)}")
+            logger.debug(f"  - {os.path.basename(csv_file)}")
+        
+        # Consultar o manifesto para ignorar arquivos já convertidos e inalterados
+        manifest = ConversionManifest(self.index_data_folder, self.index) if skip_unchanged else None
+        fingerprints = {}
+        skipped_files = []
+        if manifest:
+            pending_files = []
+            for csv_file in csv_files:
+                unchanged, fingerprints[csv_file] = manifest.check(csv_file)
+                if unchanged:
+                    skipped_files.append(csv_file)
+                else:
+                    pending_files.append(csv_file)
+            if skipped_files:
+                logger.info(f"{len(skipped_files)} arquivo(s) já convertido(s) e inalterado(s) serão ignorados.")
+            csv_files_to_convert = pending_files
+        else:
+            csv_files_to_convert = csv_files
+        
+        workers = max(1, min(workers or 1, len(csv_files_to_convert)))
+        if workers > 1:
+            logger.info(f"Iniciando conversão em paralelo com {workers} processos...")
+        else:
+            logger.info("Iniciando conversão...")
         
-        print("\nIniciando conversão...\n")
+        # Um único timestamp de carga por execução, compartilhado por todos os arquivos
+        load_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         converted_count = 0
         failed_count = 0
         converted_files = []
         failed_files = []
+        errors = {}
         
-        for csv_file in csv_files:
-            result = self.convert_csv_to_parquet(csv_file, remove_originals)
+        if workers > 1:
+            outcomes = self._convert_in_pool(csv_files_to_convert, remove_originals, load_timestamp, workers)
+        else:
+            outcomes = (
+                (csv_file, *self._convert_file(csv_file, remove_originals, load_timestamp))
+                for csv_file in csv_files_to_convert
+            )
+        
+        for csv_file, result, error in outcomes:
             if result:
                 converted_count += 1
                 converted_files.append(result)
+                if manifest:
+                    self._record_conversion(manifest, fingerprints[csv_file], result)
             else:
                 failed_count += 1
                 failed_files.append(csv_file)
-            print()  # Linha em branco para separar
+                errors[os.path.basename(csv_file)] = error
+        
+        self.partition_index.flush()
+        cdc_stats = self.update_cdc(converted_files) if self.cdc and converted_files else None
+        changes_stats = self.update_changes(converted_files) if self.changes and converted_files else None
         
         # Resumo da conversão
-        print("=" * 50)
-        print("RESUMO DA CONVERSÃO")
-        print("=" * 50)
-        print(f"Total de arquivos CSV encontrados: {len(csv_files)}")
-        print(f"Convertidos com sucesso: {converted_count}")
-        print(f"Falhas na conversão: {failed_count}")
+        logger.info("=" * 50)
+        logger.info("RESUMO DA CONVERSÃO")
+        logger.info("=" * 50)
+        logger.info(f"Total de arquivos CSV encontrados: {len(csv_files)}")
+        logger.info(f"Convertidos com sucesso: {converted_count}")
+        logger.info(f"Ignorados (inalterados): {len(skipped_files)}")
+        logger.info(f"Falhas na conversão: {failed_count}",
+                    extra={"index": self.index, "total": len(csv_files), "converted": converted_count,
+                           "skipped": len(skipped_files), "failed": failed_count})
+        if cdc_stats:
+            logger.info(f"CDC: {cdc_stats['days']} pregão(ões) registrado(s), {cdc_stats['insert']} inserções, "
+                        f"{cdc_stats['delete']} remoções, {cdc_stats['update']} atualizações")
+        if changes_stats:
+            logger.info(f"Variações: {changes_stats['days']} pregão(ões) calculado(s)")
         
         if converted_files:
-            print("\nArquivos convertidos:")
+            logger.debug("Arquivos convertidos:")
             for file in converted_files:
-                print(f"  ✓ {os.path.basename(file)}")
+                logger.debug(f"  ✓ {os.path.basename(file)}")
         
         if failed_files:
-            print("\nArquivos com falha:")
+            logger.warning("Arquivos com falha:")
             for file in failed_files:
-                print(f"  ✗ {os.path.basename(file)}")
+                logger.warning(f"  ✗ {os.path.basename(file)}")
         
         return {
             "total": len(csv_files),
             "converted": converted_count,
             "failed": failed_count,
+            "skipped": len(skipped_files),
             "converted_files": converted_files,
-            "failed_files": failed_files
+            "failed_files": failed_files,
+            "skipped_files": skipped_files,
+            "errors": errors,
+            "cdc": cdc_stats,
+            "changes": changes_stats
         }
     
+    def update_cdc(self, parquet_paths):
+        """
+        Acrescenta ao armazenamento CDC os dias recém-convertidos
+        
+        Se o CDC estiver vazio ou algum dia não for posterior ao último registrado (carga
+        repetida ou conversão de datas antigas), o CDC é reconstruído a partir de todas as
+        partições de snapshots do índice.
+        
+        Args:
+            parquet_paths (list): Arquivos Parquet gerados na conversão
+            
+        Returns:
+            dict: Pregões acrescentados e totais de inserções, remoções e atualizações
+        """
+        import pyarrow.parquet as pq
+        from cdc import CDCStore, snapshot_tables
+        from compaction import LocalPartitionStore
+        
+        cdc = CDCStore(LocalPartitionStore(self.cdc_folder), self.index, write_options=self.write_options)
+        tables = sorted((pq.read_table(path) for path in parquet_paths), key=lambda table: table["data"][0].as_py())
+        last_day = cdc.last_day()
+        
+        if last_day is None or tables[0]["data"][0].as_py() <= last_day:
+            logger.info(f"Reconstruindo o CDC do {self.index} a partir das partições de snapshots...")
+            return cdc.rebuild(snapshot_tables(LocalPartitionStore(self.index_data_folder)))
+        return cdc.extend(tables)
+    
+    def update_changes(self, parquet_paths):
+        """
+        Refaz as variações diárias dos dias recém-convertidos e dos pregões seguintes
+        
+        Só as carteiras desses dias e dos pregões vizinhos são lidas (ver portfolio_changes.py).
+        
+        Args:
+            parquet_paths (list): Arquivos Parquet gerados na conversão
+            
+        Returns:
+            dict: Dias calculados e linhas gravadas
+        """
+        # pyarrow.dataset (e, com ele, o pandas) só é carregado quando as variações são pedidas
+        from compaction import LocalPartitionStore, classify
+        from portfolio_changes import PortfolioChanges
+        from portfolio_query import PortfolioQuery
+
+        days = []
+        for path in parquet_paths:
+            info = classify(self.relative_partition_path(path))
+            if info and info["day"]:
+                days.append(f"{info['year']}-{info['month']}-{info['day']}")
+        changes = PortfolioChanges(PortfolioQuery(self.index_data_folder, index=self.index),
+                                   LocalPartitionStore(self.changes_folder), self.index,
+                                   write_options=self.write_options)
+        return changes.update(days)
+    
+    def _record_conversion(self, manifest, fingerprint, parquet_path):
+        """
+        Registra a conversão no manifesto e remove o Parquet de uma conversão anterior
+        do mesmo arquivo, evitando partições duplicadas quando a origem muda
+        """
+        previous = manifest.previous_output(fingerprint["source"])
+        manifest.record(fingerprint, parquet_path)
+        if previous and os.path.abspath(previous) != os.path.abspath(parquet_path) and os.path.exists(previous):
+            os.remove(previous)
+            self.partition_index.remove([self.relative_partition_path(previous)])
+            logger.debug(f"✓ Parquet anterior substituído: {os.path.relpath(previous, self.index_data_folder)}")
+    
+    def _convert_in_pool(self, csv_files, remove_originals, load_timestamp, workers):
+        """
+        Distribui os arquivos entre processos e devolve os resultados na ordem de entrada
+        
+        A saída de cada processo é capturada e impressa na mesma ordem dos arquivos,
+        para que o log não fique intercalado, e as métricas coletadas nos processos
+        são somadas às do processo principal.
+        
+        Yields:
+            tuple: (arquivo CSV, caminho do Parquet ou None, mensagem de erro ou None)
+        """
+        from portfolio_cache import invalidate_paths
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(collect_in_worker, _convert_file_worker, self, csv_file, remove_originals,
+                                load_timestamp)
+                for csv_file in csv_files
+            ]
+            for csv_file, future in zip(csv_files, futures):
+                try:
+                    (result, error, output), metrics = future.result()
+                    METRICS.merge(metrics)
+                    if result:
+                        # O rodapé é lido aqui: o índice de partições só existe no processo principal
+                        self.partition_index.add(self.relative_partition_path(result))
+                        if self.portfolio == "day":
+                            invalidate_paths(self.index, [self.relative_partition_path(result)])
+                except Exception as e:
+                    # Falha do próprio processo (ex.: BrokenProcessPool)
+                    result, error, output = None, str(e), ""
+                    logger.error(f"✗ Erro ao converter {os.path.basename(csv_file)}: {e}")
+                print(output, end="")
+                yield csv_file, result, error
+    
     def list_files_in_folder(self):
         """
-        Lista todos os arquivos na pasta de dados e na estrutura ibov-data
+        Lista todos os arquivos na pasta de dados e na estrutura particionada do índice
         """
         print(f"Arquivos na pasta {self.data_folder}:")
         
@@ -248,78 +478,130 @@ class CSVToParquetConverter:
             for file in sorted(other_files):
                 print(f"  - {file.name}")
         
-        # Listar estrutura da pasta ibov-data se existir
-        if self.ibov_data_folder.exists():
-            print(f"\nEstrutura da pasta {self.ibov_data_folder.name}:")
-            self._list_ibov_structure()
+        # Listar estrutura da pasta do índice (ex.: ibov-data) se existir
+        if self.index_data_folder.exists():
+            print(f"\nEstrutura da pasta {self.index_data_folder.name}:")
+            self._list_index_structure()
         
-        if not csv_files and not parquet_files and not other_files and not self.ibov_data_folder.exists():
+        if not csv_files and not parquet_files and not other_files and not self.index_data_folder.exists():
             print("  (pasta vazia)")
     
-    def _list_ibov_structure(self):
+    def _list_index_structure(self):
         """
-        Lista a estrutura hierárquica da pasta ibov-data
+        Lista a estrutura hierárquica da pasta de partições do índice
+        
+        A estrutura vem do índice de partições (_partitions.json), sem percorrer a árvore.
         """
-        if not self.ibov_data_folder.exists():
-            print("  (pasta ibov-data não existe)")
+        if not self.index_data_folder.exists():
+            print(f"  (pasta {self.index_data_folder.name} não existe)")
             return
         
-        # Encontrar todos os arquivos parquet na estrutura
-        parquet_files = list(self.ibov_data_folder.rglob("*.parquet"))
-        
-        if not parquet_files:
-            print("  (pasta ibov-data vazia)")
+        structure = self.partition_index.structure()
+        if not structure:
+            print(f"  (pasta {self.index_data_folder.name} vazia)")
             return
         
-        # Organizar por ano/mês/dia
-        structure = {}
-        for file in parquet_files:
-            # Extrair ano, mês, dia do caminho
-            parts = file.parts
-            if len(parts) >= 4:  # ibov-data/ano=YYYY/mes=MM/dia=DD/arquivo.parquet
-                try:
-                    ano = parts[-4].split('=')[1] if '=' in parts[-4] else parts[-4]
-                    mes = parts[-3].split('=')[1] if '=' in parts[-3] else parts[-3]
-                    dia = parts[-2].split('=')[1] if '=' in parts[-2] else parts[-2]
-                    
-                    if ano not in structure:
-                        structure[ano] = {}
-                    if mes not in structure[ano]:
-                        structure[ano][mes] = {}
-                    if dia not in structure[ano][mes]:
-                        structure[ano][mes][dia] = []
-                    
-                    structure[ano][mes][dia].append(file.name)
-                except:
-                    continue
-        
-        # Exibir estrutura organizada
-        for ano in sorted(structure.keys()):
+        # Exibir estrutura organizada (arquivos compactados ficam no nível do mês ou do ano)
+        for ano in sorted(structure):
             print(f"  ano={ano}/")
-            for mes in sorted(structure[ano].keys()):
+            months = structure[ano]
+            for arquivo in sorted(months.get(None, {}).get(None, [])):
+                print(f"    - {arquivo}")
+            for mes in sorted(mes for mes in months if mes is not None):
                 print(f"    mes={mes}/")
-                for dia in sorted(structure[ano][mes].keys()):
+                days = months[mes]
+                for arquivo in sorted(days.get(None, [])):
+                    print(f"      - {arquivo}")
+                for dia in sorted(dia for dia in days if dia is not None):
                     print(f"      dia={dia}/")
-                    for arquivo in sorted(structure[ano][mes][dia]):
+                    for arquivo in sorted(days[dia]):
                         print(f"        - {arquivo}")
 
+def table_to_parquet_bytes(table, write_options=None):
+    """
+    Serializa a tabela em Parquet na memória, sem arquivo temporário
+    
+    Args:
+        table (pyarrow.Table): Carteira do dia
+        write_options (ParquetWriteOptions): Opções de gravação; se None, lidas das variáveis PARQUET_*
+        
+    Returns:
+        bytes: Conteúdo do arquivo Parquet
+    """
+    buffer = io.BytesIO()
+    with METRICS.timer("write"):
+        (write_options or ParquetWriteOptions.from_env()).write_table(table, buffer)
+    METRICS.count("parquet_bytes", buffer.tell())
+    return buffer.getvalue()
+
+def _convert_file_worker(converter, csv_file_path, remove_original, load_timestamp):
+    """
+    Executa a conversão de um arquivo em um processo do pool, capturando a saída
+
+    Returns:
+        tuple: (caminho do Parquet ou None, mensagem de erro ou None, saída impressa)
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result, error = converter._convert_file(csv_file_path, remove_original, load_timestamp, record=False)
+    return result, error, output.getvalue()
+
+def parse_args(description):
+    """
+    Lê os argumentos de linha de comando comuns aos scripts de conversão
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1,
+        help="Número de processos para conversão em paralelo (padrão: número de CPUs)"
+    )
+    parser.add_argument(
+        "--index", type=parse_index_list, default=[DEFAULT_INDEX],
+        help="Índices a converter, separados por vírgula, ou 'all' (padrão: IBOV)"
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Reconverter todos os arquivos, ignorando o manifesto de conversões"
+    )
+    parser.add_argument(
+        "--cdc", action="store_true",
+        help="Manter também o armazenamento CDC (snapshot base + mudanças diárias) em <índice>-cdc/"
+    )
+    parser.add_argument(
+        "--changes", action="store_true",
+        help="Calcular também as variações diárias (entradas, saídas, giro) em <índice>-changes/"
+    )
+    add_write_option_arguments(parser)
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args()
+    args.write_options = write_options_from_args(args)
+    configure_from_args(args)
+    return args
+
 def main():
     """
     Função principal para executar a conversão
     """
+    args = parse_args("Conversão interativa de CSV para Parquet")
+    
     # Caminho para a pasta de dados
     data_folder = "src/data"
     
     try:
-        # Criar instância do conversor
-        converter = CSVToParquetConverter(data_folder)
+        # Um conversor por índice (as partições de cada índice ficam em pastas separadas)
+        converters = [
+            CSVToParquetConverter(data_folder, index, args.write_options, cdc=args.cdc, changes=args.changes)
+            for index in args.index
+        ]
         
         print("CSV to Parquet Converter")
         print("=" * 50)
+        print(f"Parquet: {args.write_options.describe()}")
         
         # Listar arquivos antes da conversão
         print("ANTES DA CONVERSÃO:")
-        converter.list_files_in_folder()
+        for converter in converters:
+            converter.list_files_in_folder()
         print()
         
         # Perguntar se deve remover os arquivos originais
@@ -337,19 +619,29 @@ def main():
         print()
         
         # Executar conversão
-        stats = converter.convert_all_csv_files(remove_originals)
+        converted = 0
+        for converter in converters:
+            stats = converter.convert_all_csv_files(
+                remove_originals, workers=args.workers, skip_unchanged=not args.force
+            )
+            converted += stats["converted"]
         
         print()
         
         # Listar arquivos após a conversão
         print("APÓS A CONVERSÃO:")
-        converter.list_files_in_folder()
+        for converter in converters:
+            converter.list_files_in_folder()
         
         # Verificar se houve alguma conversão
-        if stats["converted"] > 0:
-            print(f"\n🎉 Conversão concluída! {stats['converted']} arquivo(s) convertido(s) com sucesso.")
+        if converted > 0:
+            print(f"\n🎉 Conversão concluída! {converted} arquivo(s) convertido(s) com sucesso.")
         else:
             print("\n⚠️  Nenhum arquivo foi convertido.")
+        
+        if args.metrics_file:
+            write_metrics(args.metrics_file, job="converter")
+            print(f"Métricas gravadas em {args.metrics_file}")
             
     except FileNotFoundError as e:
         print(f"Erro: {e}")
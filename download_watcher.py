@@ -0,0 +1,143 @@
+"""
+Detecção de fim de download na pasta de dados.
+
+Em vez de esperar um tempo fixo após o clique, wait_for_download retorna assim que
+um arquivo CSV/ZIP novo (ou modificado) aparece na pasta, completamente escrito e
+sem downloads parciais (.crdownload) pendentes. No Linux, o inotify (via ctypes)
+acorda a espera imediatamente quando o Chrome renomeia o arquivo parcial para o
+nome final; nos demais sistemas, a pasta é verificada por polling.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import time
+
+# Extensões de arquivos temporários de download (Chrome, Firefox e genéricos)
+PARTIAL_SUFFIXES = ('.crdownload', '.part', '.tmp')
+
+# Máscara do inotify: arquivo fechado após escrita ou movido para a pasta
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+
+class _InotifyWatch:
+    """Observa uma pasta com inotify; levanta OSError se não estiver disponível"""
+
+    def __init__(self, folder):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError("libc não encontrada")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify não disponível")
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        mask = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch falhou")
+
+    def wait(self, timeout):
+        """Espera até `timeout` segundos por algum evento na pasta e descarta os eventos lidos"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if readable:
+            try:
+                while os.read(self.fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _PollingWatch:
+    """Alternativa portátil ao inotify: apenas dorme entre as verificações"""
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+
+    def close(self):
+        pass
+
+
+def snapshot_folder(folder, extensions=('.csv', '.zip')):
+    """
+    Registra os arquivos existentes na pasta antes de iniciar o download
+
+    Args:
+        folder (str): Pasta de download
+        extensions (tuple): Extensões de interesse
+
+    Returns:
+        dict: Nome do arquivo -> (mtime_ns, tamanho)
+    """
+    snapshot = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(extensions):
+                stat = entry.stat()
+                snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def wait_for_download(folder, before, timeout=60, poll_interval=0.1, extensions=('.csv', '.zip')):
+    """
+    Espera um arquivo novo e completo aparecer na pasta de download
+
+    O arquivo é considerado completo quando não há downloads parciais na pasta e seu
+    tamanho é o mesmo em duas verificações consecutivas.
+
+    Args:
+        folder (str): Pasta de download
+        before (dict): Retorno de snapshot_folder antes do clique
+        timeout (float): Tempo máximo de espera em segundos
+        poll_interval (float): Intervalo máximo entre verificações em segundos
+        extensions (tuple): Extensões aceitas
+
+    Returns:
+        str: Caminho do arquivo baixado, ou None se nada apareceu dentro do tempo limite
+    """
+    try:
+        watch = _InotifyWatch(folder)
+    except (OSError, AttributeError):
+        watch = _PollingWatch()
+
+    deadline = time.monotonic() + timeout
+    last_sizes = {}
+    try:
+        while True:
+            current = {}
+            partial_pending = False
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    name = entry.name.lower()
+                    if name.endswith(PARTIAL_SUFFIXES):
+                        partial_pending = True
+                    elif name.endswith(extensions):
+                        stat = entry.stat()
+                        if before.get(entry.name) != (stat.st_mtime_ns, stat.st_size):
+                            current[entry.path] = (stat.st_mtime_ns, stat.st_size)
+
+            if current and not partial_pending:
+                # Mais recente entre os arquivos novos cujo tamanho já estabilizou
+                stable = [path for path, (mtime, size) in current.items()
+                          if size > 0 and last_sizes.get(path) == size]
+                if stable:
+                    return max(stable, key=lambda path: current[path][0])
+            last_sizes = {path: size for path, (_, size) in current.items()}
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            watch.wait(min(poll_interval, remaining))
+    finally:
+        watch.close()
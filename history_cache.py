@@ -0,0 +1,237 @@
+"""
+Leitura do histórico local completo de um índice por um arquivo Arrow IPC mapeado em memória.
+
+Carregar a árvore <índice>-data/ inteira com pd.read_parquet decodifica cada arquivo e
+copia tudo para objetos Python: a coluna data vira um objeto date por linha e os
+códigos, nomes e tipos viram strings repetidas. Este módulo mantém, ao lado das
+partições, um único arquivo Arrow IPC (Feather v2) com o histórico já deduplicado (uma
+carga por dia, como em portfolio_query.py), ordenado por data e código:
+
+    <índice>-data/_history.arrow
+
+O arquivo é gravado sem compressão e em um único record batch, de modo que a leitura é
+um mmap: load_history devolve uma tabela Arrow cujos buffers apontam para as páginas do
+arquivo (nada é copiado; o sistema operacional só carrega o que for acessado), e
+numpy_views expõe as colunas como arrays NumPy sobre esses mesmos buffers. codigo, acao e
+tipo são colunas de dicionário (índices int32 + valores únicos), e to_pandas as converte
+em Categorical e a data em datetime64, sem objetos por linha.
+
+O cache guarda uma impressão digital das partições de origem (o _partitions.json, ou a
+listagem da árvore com tamanhos e datas de modificação) e é refeito quando elas mudam.
+Os arquivos com prefixo "_" são ignorados pelos leitores do dataset, então o cache não
+interfere nas consultas nem na compactação.
+
+Uso:
+    python history_cache.py --index IBOV [--rebuild]
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from b3_csv_parser import IBOV_SCHEMA
+from b3_indices import DEFAULT_INDEX, local_folder_name, normalize_index
+from compaction import LocalPartitionStore
+from instrumentation import METRICS, get_logger
+from partition_index import INDEX_FILENAME
+from portfolio_query import PortfolioQuery
+
+logger = get_logger("history")
+
+CACHE_FILENAME = "_history.arrow"
+
+# Metadado do arquivo com a impressão digital das partições de origem
+FINGERPRINT_METADATA_KEY = b"b3_source_fingerprint"
+
+_EPOCH = date(1970, 1, 1)
+
+
+def source_fingerprint(root):
+    """
+    Impressão digital das partições de um índice
+
+    Usa o _partitions.json, que muda a cada arquivo gravado ou removido; sem ele, a
+    listagem da árvore com o tamanho e a data de modificação de cada arquivo.
+
+    Args:
+        root (str): Pasta das partições (ex.: src/data/ibov-data)
+
+    Returns:
+        str: SHA-256 em hexadecimal
+    """
+    digest = hashlib.sha256()
+    store = LocalPartitionStore(root)
+    payload = store.read_bytes(INDEX_FILENAME)
+    if payload is not None:
+        digest.update(payload)
+        return digest.hexdigest()
+    for relative_path in store.list_files():
+        stat = os.stat(os.path.join(store.root, relative_path))
+        digest.update(f"{relative_path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def cache_path(root):
+    """Caminho do arquivo Arrow do histórico"""
+    return os.path.join(os.path.abspath(str(root)), CACHE_FILENAME)
+
+
+def cached_fingerprint(root):
+    """Impressão digital gravada no cache, ou None se ele não existir"""
+    path = cache_path(root)
+    if not os.path.exists(path):
+        return None
+    with pa.memory_map(path) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    value = metadata.get(FINGERPRINT_METADATA_KEY)
+    return value.decode("utf-8") if value else None
+
+
+def build_history_cache(root, index=DEFAULT_INDEX):
+    """
+    Grava o histórico completo e deduplicado em <root>/_history.arrow
+
+    Args:
+        root (str): Pasta das partições
+        index (str): Código do índice
+
+    Returns:
+        dict: Linhas, tamanho do arquivo (bytes) e tempo (segundos)
+    """
+    start = time.perf_counter()
+    fingerprint = source_fingerprint(root)
+    table = PortfolioQuery(root, index=index, table_cache=None).scan()
+    # Ordem por data e código (chave do dicionário decodificada) e dicionários únicos por coluna
+    order = pc.sort_indices(pa.table({"data": table["data"], "codigo": table["codigo"].cast(pa.string())}),
+                            sort_keys=[("data", "ascending"), ("codigo", "ascending")])
+    table = table.take(order).unify_dictionaries().combine_chunks()
+    table = table.replace_schema_metadata({FINGERPRINT_METADATA_KEY: fingerprint.encode("utf-8")})
+
+    path = cache_path(root)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".history-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file, pa.ipc.new_file(file, table.schema) as writer:
+            # Um único record batch e sem compressão: a leitura pelo mmap não copia nem descomprime
+            writer.write_table(table, max_chunksize=max(table.num_rows, 1))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    report = {"rows": table.num_rows, "bytes": os.path.getsize(path),
+              "seconds": round(time.perf_counter() - start, 3)}
+    logger.info(f"Cache do histórico do {index} gravado: {report['rows']} linhas, "
+                f"{report['bytes'] / 1024 / 1024:.1f} MB em {report['seconds']}s", extra={"index": index, **report})
+    return report
+
+
+def load_history(root, index=DEFAULT_INDEX, start=None, end=None, columns=None, rebuild_if_stale=True):
+    """
+    Histórico do índice mapeado em memória (sem cópia)
+
+    Args:
+        root (str): Pasta das partições
+        index (str): Código do índice
+        start (date): Primeira data (inclusive); se None, desde o início
+        end (date): Última data (inclusive); se None, até o fim
+        columns (list): Colunas (padrão: todas as de IBOV_SCHEMA)
+        rebuild_if_stale (bool): Se True, refaz o cache ausente ou desatualizado; se False,
+            usa o existente
+
+    Returns:
+        pyarrow.Table: Linhas do intervalo (IBOV_SCHEMA), em ordem de data e código
+
+    Raises:
+        FileNotFoundError: Se o cache não existir e rebuild_if_stale=False
+    """
+    path = cache_path(root)
+    if rebuild_if_stale and cached_fingerprint(root) != source_fingerprint(root):
+        logger.info(f"Cache do histórico ausente ou desatualizado em {root}; gravando...")
+        build_history_cache(root, index)
+
+    with METRICS.timer("history_load"):
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+        if start is not None or end is not None:
+            # Linhas em ordem de data: o intervalo é uma fatia (também sem cópia)
+            days = _day_numbers(table["data"].chunk(0)) if table.num_rows else np.array([], np.int32)
+            first = np.searchsorted(days, (start - _EPOCH).days, "left") if start else 0
+            last = np.searchsorted(days, (end - _EPOCH).days, "right") if end else table.num_rows
+            table = table.slice(first, last - first)
+    return table.select(list(columns or IBOV_SCHEMA.names))
+
+
+def _day_numbers(dates):
+    """Datas date32 como int32 de dias desde 1970-01-01 (mesmo buffer, sem cópia)"""
+    return dates.view(pa.int32()).to_numpy(zero_copy_only=True)
+
+
+def numpy_views(table):
+    """
+    Colunas como arrays NumPy sobre os buffers da tabela (sem cópia)
+
+    Colunas de dicionário viram dois arrays: <coluna> com os índices (int32) e
+    <coluna>_valores com os valores únicos (strings, pequenos). A data fica em int32 de
+    dias desde 1970-01-01 (o datetime64[D] do NumPy tem 64 bits e exigiria cópia; use
+    .astype("datetime64[D]") quando precisar).
+
+    Args:
+        table (pyarrow.Table): Tabela de load_history (um chunk por coluna, sem nulos)
+
+    Returns:
+        dict: {nome: numpy.ndarray}
+    """
+    views = {}
+    for name in table.column_names:
+        column = table[name]
+        chunk = column.chunk(0) if column.num_chunks else pa.array([], column.type)
+        if pa.types.is_dictionary(chunk.type):
+            views[name] = chunk.indices.to_numpy(zero_copy_only=True)
+            views[f"{name}_valores"] = chunk.dictionary.to_numpy(zero_copy_only=False)
+        elif pa.types.is_date32(chunk.type):
+            views[name] = _day_numbers(chunk)
+        else:
+            views[name] = chunk.to_numpy(zero_copy_only=True)
+    return views
+
+
+def to_pandas(table):
+    """
+    DataFrame com codigo, acao e tipo como Categorical e data como datetime64
+
+    Returns:
+        pandas.DataFrame: Histórico sem objetos Python por linha
+    """
+    return table.to_pandas(date_as_object=False, split_blocks=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache Arrow IPC do histórico local de um índice")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="Código do índice (padrão: IBOV)")
+    parser.add_argument("--data-folder", default="src/data", help="Pasta de dados (padrão: src/data)")
+    parser.add_argument("--rebuild", action="store_true", help="Regravar o cache mesmo se estiver atualizado")
+    args = parser.parse_args()
+
+    index = normalize_index(args.index)
+    root = os.path.join(args.data_folder, local_folder_name(index))
+    if args.rebuild:
+        build_history_cache(root, index)
+    table = load_history(root, index)
+    if table.num_rows:
+        days = table["data"]
+        print(f"Histórico do {index}: {table.num_rows} linhas, {pc.min(days).as_py()} a {pc.max(days).as_py()}, "
+              f"{os.path.getsize(cache_path(root)) / 1024 / 1024:.1f} MB em {cache_path(root)}")
+    else:
+        print(f"Histórico do {index} vazio em {root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Instrumentação: logging estruturado, tempos por etapa e contadores.
+
+- Logging: get_logger(nome) devolve um logger do pacote "b3". O nível vem de
+  configure_logging (argumentos -v/-q dos scripts) ou da variável LOG_LEVEL (padrão:
+  INFO). O formato "text" mantém as mensagens como antes (uma por linha em stdout);
+  o formato "json" (LOG_FORMAT=json ou --log-format json) grava um objeto JSON por
+  linha, com os campos passados em extra={...}. A saída vai para o sys.stdout do
+  momento da escrita, então contextlib.redirect_stdout continua capturando as mensagens.
+
+- Métricas: METRICS.timer("download") mede uma etapa (contagem, soma e máximo dos
+  tempos) e METRICS.count("download_bytes", n) acumula contadores. As etapas usadas
+  são download, parse, write, s3_list, upload e delete. Ao final da execução,
+  write_metrics(caminho) exporta em JSON ou no formato textfile do Prometheus
+  (node_exporter), conforme a extensão (.json ou .prom).
+
+Em pools de processos, cada tarefa coleta as métricas do próprio processo com
+collect_in_worker e o processo principal as soma com METRICS.merge.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+LOGGER_NAME = "b3"
+
+LOG_FORMATS = ("text", "json")
+
+# Etapas medidas com METRICS.timer
+STAGES = ("download", "parse", "write", "s3_list", "upload", "delete")
+
+# Campos padrão de um LogRecord (o que sobra são os campos de extra={...})
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """StreamHandler que escreve sempre no sys.stdout atual (respeita redirect_stdout)"""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class JSONFormatter(logging.Formatter):
+    """Um objeto JSON por linha: horário, nível, logger, mensagem e campos extras"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def get_logger(name):
+    """
+    Logger do pacote, configurado na primeira chamada a partir do ambiente
+
+    Args:
+        name (str): Nome do módulo (ex.: "converter", "main")
+
+    Returns:
+        logging.Logger: Logger "b3.<name>"
+    """
+    root = logging.getLogger(LOGGER_NAME)
+    if not root.handlers:
+        configure_logging(export=False)
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def configure_logging(level=None, log_format=None, export=True):
+    """
+    Configura o nível e o formato do logging do pacote
+
+    Args:
+        level (str | int): Nível (DEBUG, INFO, WARNING, ERROR); se None, LOG_LEVEL ou INFO
+        log_format (str): "text" ou "json"; se None, LOG_FORMAT ou "text"
+        export (bool): Se True, grava os valores em LOG_LEVEL/LOG_FORMAT, para que processos
+            filhos (pools de conversão e de parse) usem a mesma configuração
+    """
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    if isinstance(level, int):
+        level = logging.getLevelName(level)
+    level = level.upper()
+    log_format = (log_format or os.getenv("LOG_FORMAT", "text")).lower()
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Formato de log inválido: {log_format}. Use {', '.join(LOG_FORMATS)}")
+    if export:
+        os.environ["LOG_LEVEL"] = level
+        os.environ["LOG_FORMAT"] = log_format
+
+    root = logging.getLogger(LOGGER_NAME)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = _StdoutHandler()
+    handler.setFormatter(JSONFormatter() if log_format == "json" else logging.Formatter("%(message)s"))
+    root.addHandler(handler)
+    root.setLevel(level)
+    root.propagate = False
+
+
+class Metrics:
+    """Registro de tempos por etapa e contadores, seguro para uso entre threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.timers = {}
+            self.counters = {}
+            self.started = time.time()
+
+    def observe(self, stage, seconds, count=1):
+        """Registra `count` execuções de uma etapa que somaram `seconds`"""
+        with self._lock:
+            timer = self.timers.setdefault(stage, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            timer["count"] += count
+            timer["seconds"] += seconds
+            timer["max_seconds"] = max(timer["max_seconds"], seconds / count if count else 0.0)
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        """Mede o bloco como uma execução da etapa (também quando ele termina com erro)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count(self, name, value=1):
+        """Soma `value` ao contador (ex.: download_bytes, rows_parsed, objects_deleted)"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def state(self):
+        """Cópia dos tempos e contadores (serializável, para enviar entre processos)"""
+        with self._lock:
+            return {
+                "timers": {stage: dict(timer) for stage, timer in self.timers.items()},
+                "counters": dict(self.counters),
+            }
+
+    def merge(self, state):
+        """Soma o estado coletado em outro processo"""
+        with self._lock:
+            for stage, other in state["timers"].items():
+                timer = self.timers.setdefault(stage, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+                timer["count"] += other["count"]
+                timer["seconds"] += other["seconds"]
+                timer["max_seconds"] = max(timer["max_seconds"], other["max_seconds"])
+            for name, value in state["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        """
+        Resumo da execução
+
+        Returns:
+            dict: Duração, tempos por etapa (com média) e contadores
+        """
+        state = self.state()
+        for timer in state["timers"].values():
+            timer["mean_seconds"] = timer["seconds"] / timer["count"] if timer["count"] else 0.0
+            for key in ("seconds", "max_seconds", "mean_seconds"):
+                timer[key] = round(timer[key], 6)
+        return {"run_seconds": round(time.time() - self.started, 3), **state}
+
+    def to_prometheus(self, job="b3"):
+        """
+        Formato texto do Prometheus (para o textfile collector do node_exporter)
+
+        Args:
+            job (str): Valor do rótulo job
+
+        Returns:
+            str: Métricas b3_stage_seconds_total, b3_stage_runs_total, b3_stage_max_seconds,
+                 b3_<contador>_total e b3_last_run_timestamp_seconds
+        """
+        state = self.state()
+        lines = [
+            "# HELP b3_stage_seconds_total Tempo total gasto em cada etapa.",
+            "# TYPE b3_stage_seconds_total counter",
+        ]
+        for stage, timer in sorted(state["timers"].items()):
+            lines.append(f'b3_stage_seconds_total{{job="{job}",stage="{stage}"}} {timer["seconds"]:.6f}')
+        lines += ["# HELP b3_stage_runs_total Execuções de cada etapa.", "# TYPE b3_stage_runs_total counter"]
+        for stage, timer in sorted(state["timers"].items()):
+            lines.append(f'b3_stage_runs_total{{job="{job}",stage="{stage}"}} {timer["count"]}')
+        lines += ["# HELP b3_stage_max_seconds Execução mais lenta de cada etapa.", "# TYPE b3_stage_max_seconds gauge"]
+        for stage, timer in sorted(state["timers"].items()):
+            lines.append(f'b3_stage_max_seconds{{job="{job}",stage="{stage}"}} {timer["max_seconds"]:.6f}')
+        for name, value in sorted(state["counters"].items()):
+            lines += [f"# TYPE b3_{name}_total counter", f'b3_{name}_total{{job="{job}"}} {value}']
+        lines += ["# TYPE b3_last_run_timestamp_seconds gauge",
+                  f'b3_last_run_timestamp_seconds{{job="{job}"}} {time.time():.0f}']
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def write_metrics(path, job="b3"):
+    """
+    Exporta as métricas da execução: Prometheus (.prom) ou JSON (demais extensões)
+
+    A escrita é atômica (arquivo temporário + os.replace), como o textfile collector exige.
+
+    Args:
+        path (str): Arquivo de destino
+        job (str): Rótulo job das métricas do Prometheus
+    """
+    if path.endswith(".prom"):
+        content = METRICS.to_prometheus(job)
+    else:
+        content = json.dumps({"job": job, **METRICS.snapshot()}, indent=2, ensure_ascii=False)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        file.write(content)
+    os.replace(temp_path, path)
+
+
+def collect_in_worker(func, *args):
+    """
+    Executa uma tarefa em um processo do pool coletando apenas as métricas dela
+
+    Returns:
+        tuple: (resultado, estado das métricas para METRICS.merge)
+    """
+    METRICS.reset()
+    result = func(*args)
+    return result, METRICS.state()
+
+
+def add_instrumentation_arguments(parser):
+    """
+    Adiciona os argumentos de verbosidade, formato de log e exportação de métricas
+
+    Args:
+        parser (argparse.ArgumentParser): Parser do script
+    """
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Mostrar detalhes de cada arquivo (nível DEBUG)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="Mostrar apenas avisos e erros")
+    parser.add_argument("--log-format", choices=LOG_FORMATS, default=None,
+                        help="Formato do log: text ou json (padrão: LOG_FORMAT ou text)")
+    parser.add_argument("--metrics-file", default=os.getenv("METRICS_FILE"),
+                        help="Exportar tempos e contadores ao final (.prom para Prometheus, .json para JSON)")
+
+
+def configure_from_args(args):
+    """Aplica os argumentos de add_instrumentation_arguments ao logging"""
+    level = "DEBUG" if args.verbose else "WARNING" if args.quiet else None
+    configure_logging(level, args.log_format)
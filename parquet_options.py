@@ -0,0 +1,141 @@
+"""
+Opções de gravação dos arquivos Parquet das carteiras.
+
+Os valores padrão vêm das variáveis de ambiente abaixo e podem ser sobrescritos na
+criação de ParquetWriteOptions (ou nos argumentos --compression, --compression-level,
+--row-group-size e --no-statistics dos scripts de conversão):
+
+    PARQUET_COMPRESSION         Codec: zstd (padrão), snappy, gzip, brotli, lz4 ou none
+    PARQUET_COMPRESSION_LEVEL   Nível do codec (padrão: 3; ignorado por snappy, lz4 e none)
+    PARQUET_ROW_GROUP_SIZE      Linhas por row group (padrão: vazio = um row group por arquivo)
+    PARQUET_WRITE_STATISTICS    Gravar min/max por coluna (padrão: true)
+
+As colunas de texto são gravadas com codificação de dicionário, preservando no arquivo
+o esquema Arrow (b3_csv_parser.IBOV_SCHEMA).
+"""
+
+import os
+
+CODECS = ("zstd", "snappy", "gzip", "brotli", "lz4", "none")
+
+# Codecs que aceitam nível de compressão
+LEVELED_CODECS = ("zstd", "gzip", "brotli")
+
+DEFAULT_COMPRESSION = "zstd"
+DEFAULT_COMPRESSION_LEVEL = 3
+
+
+class ParquetWriteOptions:
+    def __init__(self, compression=DEFAULT_COMPRESSION, compression_level=DEFAULT_COMPRESSION_LEVEL,
+                 row_group_size=None, write_statistics=True):
+        """
+        Configura a gravação dos arquivos Parquet
+
+        Args:
+            compression (str): Codec de compressão (ver CODECS)
+            compression_level (int): Nível do codec; None usa o padrão do codec
+            row_group_size (int): Linhas por row group; None grava um row group por arquivo
+            write_statistics (bool): Se True, grava estatísticas min/max por coluna
+
+        Raises:
+            ValueError: Se o codec não for suportado ou o tamanho do row group não for positivo
+        """
+        compression = compression.lower()
+        if compression not in CODECS:
+            raise ValueError(f"Codec '{compression}' não suportado. Use um de: {', '.join(CODECS)}")
+        if row_group_size is not None and row_group_size <= 0:
+            raise ValueError("O tamanho do row group deve ser positivo")
+        self.compression = compression
+        self.compression_level = compression_level if compression in LEVELED_CODECS else None
+        self.row_group_size = row_group_size
+        self.write_statistics = write_statistics
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """
+        Cria as opções a partir das variáveis PARQUET_*
+
+        Args:
+            **overrides: Valores que substituem os do ambiente (None é ignorado)
+
+        Returns:
+            ParquetWriteOptions: Opções configuradas
+        """
+        level = os.getenv("PARQUET_COMPRESSION_LEVEL", str(DEFAULT_COMPRESSION_LEVEL))
+        row_group_size = os.getenv("PARQUET_ROW_GROUP_SIZE", "")
+        options = {
+            "compression": os.getenv("PARQUET_COMPRESSION", DEFAULT_COMPRESSION),
+            "compression_level": int(level) if level else None,
+            "row_group_size": int(row_group_size) if row_group_size else None,
+            "write_statistics": os.getenv("PARQUET_WRITE_STATISTICS", "true").lower() in ("1", "true", "sim", "yes"),
+        }
+        options.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**options)
+
+    def writer_kwargs(self):
+        """
+        Argumentos para pq.write_table / pq.ParquetWriter
+
+        Returns:
+            dict: compression, compression_level, write_statistics e use_dictionary
+        """
+        return {
+            "compression": self.compression,
+            "compression_level": self.compression_level,
+            "write_statistics": self.write_statistics,
+            "use_dictionary": True,
+        }
+
+    def write_table(self, table, where, metadata_collector=None):
+        """
+        Grava a tabela em Parquet com estas opções
+
+        Args:
+            table (pyarrow.Table): Tabela a gravar
+            where (str | Path | file): Caminho ou objeto de arquivo de destino
+            metadata_collector (list): Se informada, recebe o rodapé (FileMetaData) do arquivo gravado
+        """
+        # Importado só na gravação: as opções também são lidas por comandos que não gravam Parquet
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, where, row_group_size=self.row_group_size, metadata_collector=metadata_collector,
+                       **self.writer_kwargs())
+
+    def describe(self):
+        """Resumo legível das opções (ex.: zstd(3), row group 64000, estatísticas)"""
+        codec = f"{self.compression}({self.compression_level})" if self.compression_level is not None else self.compression
+        row_group = f"row group {self.row_group_size}" if self.row_group_size else "um row group por arquivo"
+        statistics = "com estatísticas" if self.write_statistics else "sem estatísticas"
+        return f"{codec}, {row_group}, {statistics}"
+
+
+def add_write_option_arguments(parser):
+    """
+    Adiciona ao parser os argumentos de linha de comando das opções de gravação
+
+    Args:
+        parser (argparse.ArgumentParser): Parser dos scripts de conversão
+    """
+    parser.add_argument("--compression", choices=CODECS, default=None,
+                        help=f"Codec de compressão do Parquet (padrão: PARQUET_COMPRESSION ou {DEFAULT_COMPRESSION})")
+    parser.add_argument("--compression-level", type=int, default=None,
+                        help=f"Nível de compressão (padrão: PARQUET_COMPRESSION_LEVEL ou {DEFAULT_COMPRESSION_LEVEL})")
+    parser.add_argument("--row-group-size", type=int, default=None,
+                        help="Linhas por row group (padrão: um row group por arquivo)")
+    parser.add_argument("--no-statistics", dest="write_statistics", action="store_false", default=None,
+                        help="Não gravar estatísticas min/max por coluna")
+
+
+def write_options_from_args(args):
+    """
+    Cria as opções de gravação a partir dos argumentos lidos (com o ambiente como padrão)
+
+    Returns:
+        ParquetWriteOptions: Opções configuradas
+    """
+    return ParquetWriteOptions.from_env(
+        compression=args.compression,
+        compression_level=args.compression_level,
+        row_group_size=args.row_group_size,
+        write_statistics=args.write_statistics,
+    )
@@ -0,0 +1,299 @@
+"""
+Índice das partições de um índice da B3 e resumo Parquet (_metadata/_common_metadata).
+
+Listar a árvore ano=YYYY/mes=MM/dia=DD/ (os.walk no disco, list_objects_v2 paginado
+no S3) custa proporcionalmente ao histórico. Em vez disso, a raiz de cada árvore
+guarda três arquivos, atualizados por quem grava ou remove partições (conversor,
+pipeline, backfill, uploads, limpeza e compactação):
+
+    _partitions.json    arquivos da árvore com linhas, tamanho, row groups e datas
+                        mínima/máxima (estatísticas da coluna data)
+    _metadata           rodapés Parquet de todos os arquivos, com o caminho de cada
+                        um, para leitores (pyarrow.dataset.parquet_dataset) montarem
+                        o dataset sem listar nem abrir os arquivos
+    _common_metadata    apenas o esquema (b3_csv_parser.IBOV_SCHEMA)
+
+Listagem e planejamento passam a ler um único arquivo. Novos arquivos são acrescentados
+ao _metadata com os rodapés já disponíveis na gravação; quando arquivos são removidos
+(compactação, limpeza de duplicados, reconversão), o _metadata atual é lido uma vez,
+separado por arquivo e refeito sem os row groups dos removidos, sem abrir os arquivos
+restantes (no S3, seria um GET por objeto). Só arquivos ausentes do _metadata têm o
+rodapé lido. Arquivos com esquema diferente (cargas anteriores ao esquema fixo) ficam
+no índice, mas fora do _metadata ("in_metadata": false).
+
+Alterações feitas por fora (arquivos copiados ou apagados à mão) exigem reconstruir:
+
+    python src/main.py index --target local|s3|both [--index IBOV]
+"""
+
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from b3_csv_parser import IBOV_SCHEMA
+from compaction import classify
+from instrumentation import METRICS, get_logger
+
+logger = get_logger("partition_index")
+
+INDEX_FILENAME = "_partitions.json"
+METADATA_FILENAME = "_metadata"
+COMMON_METADATA_FILENAME = "_common_metadata"
+
+INDEX_VERSION = 1
+
+
+def _serialize_metadata(metadata):
+    sink = pa.BufferOutputStream()
+    metadata.write_metadata_file(sink)
+    return sink.getvalue().to_pybytes()
+
+
+def empty_metadata(schema=IBOV_SCHEMA):
+    """FileMetaData sem row groups com o esquema das carteiras (base do _metadata)"""
+    sink = pa.BufferOutputStream()
+    pq.write_metadata(schema, sink)
+    return pq.read_metadata(pa.BufferReader(sink.getvalue()))
+
+
+def file_entry(metadata, size):
+    """
+    Resumo de um arquivo para o índice
+
+    Args:
+        metadata (pyarrow.parquet.FileMetaData): Rodapé do arquivo
+        size (int): Tamanho em bytes
+
+    Returns:
+        dict: rows, size, row_groups, min_date e max_date (None sem estatísticas)
+    """
+    entry = {"rows": metadata.num_rows, "size": size, "row_groups": metadata.num_row_groups,
+             "min_date": None, "max_date": None}
+    names = metadata.schema.names
+    if "data" in names:
+        column = names.index("data")
+        for position in range(metadata.num_row_groups):
+            statistics = metadata.row_group(position).column(column).statistics
+            if statistics is None or not statistics.has_min_max:
+                return entry
+            low, high = statistics.min.isoformat(), statistics.max.isoformat()
+            entry["min_date"] = min(entry["min_date"] or low, low)
+            entry["max_date"] = max(entry["max_date"] or high, high)
+    return entry
+
+
+class PartitionIndex:
+    def __init__(self, store, schema=IBOV_SCHEMA):
+        """
+        Índice vazio de uma árvore de partições (use load para ler o existente)
+
+        Args:
+            store (LocalPartitionStore | S3PartitionStore): Árvore de partições do índice
+            schema (pyarrow.Schema): Esquema dos arquivos (gravado em _common_metadata)
+        """
+        self.store = store
+        self.schema = schema
+        self.entries = {}
+        self.updated_at = None
+        self._lock = threading.Lock()
+        self._added = {}
+        self._removed = False
+        self._dirty = False
+
+    @classmethod
+    def load(cls, store, rebuild_if_missing=True):
+        """
+        Lê o índice da árvore (uma leitura)
+
+        Args:
+            store (LocalPartitionStore | S3PartitionStore): Árvore de partições do índice
+            rebuild_if_missing (bool): Se True e o índice não existir, reconstrói a partir da
+                listagem da árvore; se False, devolve None
+
+        Returns:
+            PartitionIndex: Índice carregado, ou None
+        """
+        index = cls(store)
+        payload = store.read_bytes(INDEX_FILENAME)
+        if payload is None:
+            if not rebuild_if_missing:
+                return None
+            logger.info(f"Índice de partições ausente em {store.describe()}; reconstruindo...")
+            index.rebuild()
+            return index
+        content = json.loads(payload)
+        index.entries = content["files"]
+        index.updated_at = content.get("updated_at")
+        return index
+
+    def files(self):
+        """Caminhos relativos dos arquivos, em ordem"""
+        return sorted(self.entries)
+
+    def structure(self):
+        """
+        Arquivos organizados por partição
+
+        Returns:
+            dict: {ano: {mes: {dia: [arquivos]}}}; arquivos compactados ficam em dia None
+                  (mensais) ou em mes e dia None (anuais)
+        """
+        structure = {}
+        for relative_path in self.files():
+            info = classify(relative_path)
+            if info is None:
+                continue
+            days = structure.setdefault(info["year"], {}).setdefault(info["month"], {})
+            days.setdefault(info["day"], []).append(relative_path.rsplit("/", 1)[-1])
+        return structure
+
+    def total_rows(self):
+        return sum(entry["rows"] for entry in self.entries.values())
+
+    def add(self, relative_path, metadata=None, size=None):
+        """
+        Registra um arquivo gravado na árvore (persistido em flush)
+
+        Args:
+            relative_path (str): Caminho relativo à raiz da árvore (separador "/")
+            metadata (pyarrow.parquet.FileMetaData): Rodapé do arquivo; se None, é lido do arquivo
+            size (int): Tamanho em bytes; obrigatório quando metadata é informado
+        """
+        if metadata is None:
+            metadata, size = self.store.file_metadata(relative_path)
+        with self._lock:
+            if relative_path in self.entries and relative_path not in self._added:
+                # Arquivo substituído: o rodapé anterior precisa sair do _metadata
+                self._removed = True
+            self.entries[relative_path] = file_entry(metadata, size)
+            self._added[relative_path] = metadata
+            self._dirty = True
+
+    def remove(self, relative_paths):
+        """Retira arquivos removidos da árvore (persistido em flush)"""
+        with self._lock:
+            for relative_path in relative_paths:
+                if self.entries.pop(relative_path, None) is not None:
+                    self._removed = True
+                    self._dirty = True
+                self._added.pop(relative_path, None)
+
+    def flush(self):
+        """
+        Grava o índice e atualiza o _metadata, se houve alterações desde a última gravação
+
+        Returns:
+            bool: True se algo foi gravado
+        """
+        with self._lock:
+            if not self._dirty:
+                return False
+            with METRICS.timer("index_flush"):
+                if self._removed:
+                    self._write_metadata(self._metadata_from_footers(self.files()))
+                else:
+                    self._append_metadata()
+                self._write_index()
+            self._added = {}
+            self._removed = False
+            self._dirty = False
+        return True
+
+    def rebuild(self, max_workers=8):
+        """
+        Reconstrói o índice e o resumo a partir da listagem da árvore e dos rodapés
+
+        Args:
+            max_workers (int): Leituras de rodapé simultâneas
+
+        Returns:
+            dict: Arquivos, linhas e arquivos fora do _metadata
+        """
+        files = self.store.list_files()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            footers = dict(zip(files, executor.map(self.store.file_metadata, files)))
+        with self._lock:
+            self.entries = {path: file_entry(metadata, size) for path, (metadata, size) in footers.items()}
+            self._write_metadata(self._merge({path: metadata for path, (metadata, _) in footers.items()}))
+            self.store.write(COMMON_METADATA_FILENAME, _serialize_metadata(empty_metadata(self.schema)))
+            self._write_index()
+            self._added = {}
+            self._removed = False
+            self._dirty = False
+        excluded = sum(1 for entry in self.entries.values() if not entry.get("in_metadata", True))
+        return {"files": len(self.entries), "rows": self.total_rows(), "excluded": excluded}
+
+    def _merge(self, footers, base=None):
+        """Acrescenta os rodapés ao _metadata; esquemas diferentes ficam de fora"""
+        merged = base if base is not None else empty_metadata(self.schema)
+        for relative_path in sorted(footers):
+            metadata = footers[relative_path]
+            metadata.set_file_path(relative_path)
+            try:
+                merged.append_row_groups(metadata)
+                self.entries[relative_path]["in_metadata"] = True
+            except RuntimeError:
+                self.entries[relative_path]["in_metadata"] = False
+                logger.warning(f"Esquema diferente, fora do {METADATA_FILENAME}: {relative_path}")
+        return merged
+
+    def _append_metadata(self):
+        payload = self.store.read_bytes(METADATA_FILENAME)
+        if payload is None:
+            self._write_metadata(self._metadata_from_footers(self.files()))
+            return
+        base = pq.read_metadata(pa.BufferReader(payload))
+        self._write_metadata(self._merge(self._added, base))
+
+    def _summary_footers(self):
+        """
+        Rodapés por arquivo a partir do _metadata atual, sem abrir os arquivos da árvore
+
+        Returns:
+            dict: {caminho relativo: FileMetaData}; vazio se o _metadata não existir
+        """
+        payload = self.store.read_bytes(METADATA_FILENAME)
+        if payload is None:
+            return {}
+        # O pyarrow não separa um FileMetaData por arquivo; o dataset montado pelo _metadata
+        # separa (um fragmento por arquivo, com os row groups dele) sem ler os arquivos
+        import pyarrow.dataset as ds
+
+        footers = {}
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, METADATA_FILENAME)
+            with open(path, "wb") as file:
+                file.write(payload)
+            for fragment in ds.parquet_dataset(path).get_fragments():
+                metadata = fragment.metadata
+                if metadata.num_row_groups:
+                    footers[metadata.row_group(0).column(0).file_path] = metadata
+        return footers
+
+    def _metadata_from_footers(self, files):
+        footers = {path: metadata for path, metadata in self._added.items() if path in self.entries}
+        if len(footers) < len(files):
+            for path, metadata in self._summary_footers().items():
+                if path in self.entries and path not in footers:
+                    footers[path] = metadata
+        # Arquivos com esquema diferente continuam fora do _metadata sem nova leitura
+        pending = [path for path in files
+                   if path not in footers and self.entries[path].get("in_metadata", True)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for path, (metadata, _) in zip(pending, executor.map(self.store.file_metadata, pending)):
+                footers[path] = metadata
+        return self._merge(footers)
+
+    def _write_metadata(self, metadata):
+        self.store.write(METADATA_FILENAME, _serialize_metadata(metadata))
+
+    def _write_index(self):
+        self.updated_at = datetime.now().isoformat(timespec="seconds")
+        content = {"version": INDEX_VERSION, "updated_at": self.updated_at, "files": self.entries}
+        self.store.write(INDEX_FILENAME, json.dumps(content, separators=(",", ":")).encode("utf-8"))
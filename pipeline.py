@@ -0,0 +1,299 @@
+"""
+Pipeline assíncrono de carteiras da B3: download → parse → gravação → upload.
+
+Cada etapa tem seus próprios workers e as etapas são ligadas por filas limitadas
+(asyncio.Queue com maxsize), de modo que vários índices/datas ficam em andamento ao
+mesmo tempo e uma etapa lenta segura as anteriores (backpressure) em vez de acumular
+dados em memória. As etapas de E/S (HTTP, disco e S3) rodam em um pool de threads; o
+parse do CSV, que usa CPU, roda em um pool de processos. Com as etapas sobrepostas, o
+tempo total se aproxima do tempo da etapa mais lenta, e não da soma de todas.
+
+Com in_memory=True (modo sem disco), a etapa de gravação serializa o Parquet em um
+buffer na memória e a etapa de upload o envia com put_object; nada é gravado em disco.
+
+Com changes=True, depois das gravações o pipeline refaz as variações diárias
+(portfolio_changes.py) dos dias gravados e dos pregões seguintes de cada índice. A
+etapa roda ao final, e não por item, porque as variações de um dia dependem da carteira
+do pregão anterior, que pode estar sendo gravada por outro worker.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+from b3_csv_parser import extract_title_date, parse_ibov_csv, split_sections
+from b3_indices import parquet_filename
+from csv_to_parquet_converter import CSVToParquetConverter, table_to_parquet_bytes
+from instrumentation import METRICS, collect_in_worker
+from parquet_options import ParquetWriteOptions
+
+STAGES = ("download", "parse", "write", "upload")
+
+# Marcador de fim de fila (um por worker da etapa seguinte)
+_DONE = None
+
+
+def parse_portfolio(content, trade_date=None, fallback_date=None):
+    """
+    Lê o CSV de uma carteira, conferindo a data do título com a data pedida
+
+    Args:
+        content (bytes): CSV baixado
+        trade_date (date): Data pedida; se None, vale a data do título
+        fallback_date (tuple): (dia, mes, ano) usado se nem a data pedida nem o título tiverem
+            data (carteiras teórica e quadrimestral, sem "Carteira do Dia" no título)
+
+    Returns:
+        tuple: (pyarrow.Table, (dia, mes, ano))
+
+    Raises:
+        ValueError: Se a B3 devolveu a carteira de outra data ou não há data para a carteira
+    """
+    title_date = extract_title_date(split_sections(content)[0])
+    if trade_date is not None:
+        date_info = (f"{trade_date.day:02d}", f"{trade_date.month:02d}", str(trade_date.year))
+        if title_date and title_date != date_info:
+            raise ValueError(f"B3 devolveu a carteira de {'/'.join(title_date)}")
+    elif title_date or fallback_date:
+        date_info = title_date or fallback_date
+    else:
+        raise ValueError("Data da carteira não encontrada no título do CSV")
+    with METRICS.timer("parse"):
+        table, _ = parse_ibov_csv(content, date_info)
+    METRICS.count("rows_parsed", table.num_rows)
+    return table, date_info
+
+
+class PortfolioPipeline:
+    def __init__(self, client, data_folder, uploader=None, download_workers=4, parse_workers=2,
+                 write_workers=2, upload_workers=4, queue_size=8, portfolio="day", in_memory=False,
+                 write_options=None, changes=False):
+        """
+        Configura o pipeline
+
+        Args:
+            client (B3IndexClient): Cliente HTTP da API da B3 (compartilhado entre os downloads)
+            data_folder (str): Pasta de dados; as partições ficam em <índice>-data/ (carteira do dia)
+                ou <índice>-<carteira>-data/ (ver b3_indices.local_folder_name)
+            uploader (B3DataDownloader): Se informado, envia cada Parquet ao S3
+            download_workers (int): Downloads simultâneos
+            parse_workers (int): Processos para o parse dos CSV
+            write_workers (int): Gravações de Parquet simultâneas
+            upload_workers (int): Uploads simultâneos
+            queue_size (int): Capacidade de cada fila entre etapas
+            portfolio (str): Tipo de carteira ("day", "theoretical" ou "quarterly")
+            in_memory (bool): Se True, o Parquet é gerado em memória e enviado direto ao S3 (exige uploader)
+            write_options (ParquetWriteOptions): Opções de gravação; se None, lidas das variáveis PARQUET_*
+            changes (bool): Se True, atualiza as variações diárias (<índice>-changes/) após as gravações
+
+        Raises:
+            ValueError: Se in_memory=True sem uploader (os dados não seriam gravados em lugar nenhum)
+                ou com changes=True (as variações são calculadas a partir das partições locais), ou
+                se changes=True para uma carteira que não é a do dia
+        """
+        if in_memory and uploader is None:
+            raise ValueError("O modo sem disco (in_memory) exige um uploader para o S3")
+        if in_memory and changes:
+            raise ValueError("As variações diárias exigem as partições locais (incompatível com in_memory)")
+        if changes and portfolio != "day":
+            raise ValueError("As variações diárias existem apenas para a carteira do dia")
+        self.client = client
+        self.data_folder = data_folder
+        self.uploader = uploader
+        self.workers = {
+            "download": download_workers,
+            "parse": parse_workers,
+            "write": write_workers,
+            "upload": upload_workers if uploader else 0,
+        }
+        self.queue_size = queue_size
+        self.portfolio = portfolio
+        self.in_memory = in_memory
+        self.write_options = write_options or ParquetWriteOptions.from_env()
+        self.changes = changes
+        self.converters = {}
+
+    def _converter(self, index):
+        """Conversor do índice (um por índice, criado antes de iniciar as etapas)"""
+        if index not in self.converters:
+            converter = CSVToParquetConverter(self.data_folder, index, self.write_options, portfolio=self.portfolio)
+            # Carregar o índice de partições antes das etapas, fora das threads de gravação
+            converter.partition_index
+            self.converters[index] = converter
+        return self.converters[index]
+
+    def run(self, jobs, prefetched=None):
+        """
+        Executa o pipeline de forma síncrona
+
+        Args:
+            jobs (list): Pares (índice, data); data None = carteira mais recente
+            prefetched (dict): CSV já baixado de alguns jobs, {(índice, data): bytes}; esses
+                jobs não passam pelo download (ex.: conteúdo obtido pelo agendador)
+
+        Returns:
+            dict: Resultados por job (na ordem de entrada) e métricas por etapa
+        """
+        return asyncio.run(self.run_async(jobs, prefetched))
+
+    async def run_async(self, jobs, prefetched=None):
+        """
+        Executa o pipeline dentro de um event loop existente
+
+        Returns:
+            dict: {"results": [...], "stages": {...}, "seconds": tempo total}
+        """
+        prefetched = prefetched or {}
+        results = [
+            {"index": index, "date": trade_date, "success": False, "parquet": None, "uploaded": False,
+             "error": None, "failed_stage": None, "seconds": {}, "content": prefetched.get((index, trade_date))}
+            for index, trade_date in jobs
+        ]
+        if not self.in_memory:
+            for index, _ in jobs:
+                self._converter(index)
+
+        stages = [stage for stage in STAGES if self.workers[stage]]
+        stats = {stage: {"items": 0, "busy_seconds": 0.0, "workers": self.workers[stage]} for stage in stages}
+        requested_at = datetime.now()
+        load_timestamp = requested_at.strftime("%Y%m%d_%H%M%S")
+        # Carteiras sem data no título (teórica e quadrimestral) pedidas sem data ficam na data do pedido
+        fallback_date = None if self.portfolio == "day" else (
+            requested_at.strftime("%d"), requested_at.strftime("%m"), requested_at.strftime("%Y"))
+        handlers = {
+            "download": self._download,
+            "parse": lambda loop, item: self._parse(loop, item, fallback_date),
+            "write": lambda loop, item: self._write(loop, item, load_timestamp),
+            "upload": self._upload,
+        }
+
+        io_workers = sum(self.workers[stage] for stage in ("download", "write", "upload"))
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=io_workers) as self._io_executor, \
+                ProcessPoolExecutor(max_workers=self.workers["parse"]) as self._cpu_executor:
+            queues = [asyncio.Queue(maxsize=self.queue_size) for _ in stages]
+            tasks = [asyncio.create_task(self._feed(queues[0], results, self.workers[stages[0]]))]
+            for position, stage in enumerate(stages):
+                output = queues[position + 1] if position + 1 < len(stages) else None
+                next_workers = self.workers[stages[position + 1]] if output else 0
+                tasks.append(asyncio.create_task(
+                    self._run_stage(stage, handlers[stage], queues[position], output, next_workers, stats[stage])
+                ))
+            await asyncio.gather(*tasks)
+        for converter in self.converters.values():
+            converter.partition_index.flush()
+        if self.changes:
+            stats["changes"] = self._update_changes(results)
+        elapsed = time.perf_counter() - start
+
+        for result in results:
+            result["success"] = result["error"] is None
+        for stage, stage_stats in stats.items():
+            stage_stats["busy_seconds"] = round(stage_stats["busy_seconds"], 3)
+            # Tempo da etapa se ela rodasse sozinha com seus workers
+            stage_stats["stage_seconds"] = round(stage_stats["busy_seconds"] / stage_stats["workers"], 3)
+        return {"results": results, "stages": stats, "seconds": round(elapsed, 3)}
+
+    def _update_changes(self, results):
+        """Refaz as variações diárias dos dias gravados, por índice (etapa final, sequencial)"""
+        begin = time.perf_counter()
+        written = {}
+        for result in results:
+            if result["parquet"] and result["failed_stage"] in (None, "upload"):
+                written.setdefault(result["index"], []).append(result["parquet"])
+        days = 0
+        for index, paths in written.items():
+            days += self.converters[index].update_changes(paths)["days"]
+        elapsed = time.perf_counter() - begin
+        return {"items": days, "busy_seconds": elapsed, "workers": 1}
+
+    async def _feed(self, queue, results, consumers):
+        """Coloca os jobs na primeira fila (bloqueia quando ela está cheia)"""
+        for result in results:
+            await queue.put(result)
+        for _ in range(consumers):
+            await queue.put(_DONE)
+
+    async def _run_stage(self, stage, handler, input_queue, output_queue, next_workers, stage_stats):
+        """
+        Sobe os workers de uma etapa e, quando todos terminam, sinaliza o fim à etapa seguinte
+        """
+        async def worker():
+            loop = asyncio.get_running_loop()
+            while True:
+                item = await input_queue.get()
+                if item is _DONE:
+                    return
+                begin = time.perf_counter()
+                try:
+                    await handler(loop, item)
+                except Exception as e:
+                    item["error"] = str(e)
+                    item["failed_stage"] = stage
+                elapsed = time.perf_counter() - begin
+                item["seconds"][stage] = round(elapsed, 4)
+                stage_stats["items"] += 1
+                stage_stats["busy_seconds"] += elapsed
+                if output_queue is not None and item["error"] is None:
+                    await output_queue.put(item)
+
+        await asyncio.gather(*(worker() for _ in range(stage_stats["workers"])))
+        if output_queue is not None:
+            for _ in range(next_workers):
+                await output_queue.put(_DONE)
+
+    async def _download(self, loop, item):
+        if item["content"] is not None:
+            return
+        item["content"] = await loop.run_in_executor(
+            self._io_executor,
+            lambda: self.client.download_portfolio_csv(item["index"], portfolio=self.portfolio,
+                                                       trade_date=item["date"]),
+        )
+
+    async def _parse(self, loop, item, fallback_date=None):
+        content = item.pop("content")
+        (item["table"], item["date_info"]), metrics = await loop.run_in_executor(
+            self._cpu_executor, collect_in_worker, parse_portfolio, content, item["date"], fallback_date
+        )
+        METRICS.merge(metrics)
+
+    async def _write(self, loop, item, load_timestamp):
+        if self.in_memory:
+            table = item.pop("table")
+            item["payload"] = await loop.run_in_executor(
+                self._io_executor, table_to_parquet_bytes, table, self.write_options
+            )
+            item["parquet"] = parquet_filename(item["index"], load_timestamp, *item["date_info"])
+            return
+        converter = self.converters[item["index"]]
+        table = item.pop("table")
+        path = await loop.run_in_executor(
+            self._io_executor, converter.write_partition, table, *item["date_info"], load_timestamp
+        )
+        item["parquet"] = str(path)
+
+    async def _upload(self, loop, item):
+        day, month, year = item["date_info"]
+        date_str = f"{day}-{month}-{year[-2:]}"
+        if self.in_memory:
+            payload = item.pop("payload")
+            s3_key = await loop.run_in_executor(
+                self._io_executor,
+                lambda: self.uploader.upload_parquet_bytes(payload, item["parquet"], date_str, index=item["index"],
+                                                           portfolio=self.portfolio),
+            )
+            if not s3_key:
+                raise RuntimeError("Falha no upload para o S3")
+            item["parquet"] = f"s3://{self.uploader.aws_bucket}/{s3_key}"
+            item["uploaded"] = True
+            return
+        uploaded = await loop.run_in_executor(
+            self._io_executor,
+            lambda: self.uploader.upload_to_s3_partitioned(item["parquet"], date_str, index=item["index"],
+                                                           portfolio=self.portfolio),
+        )
+        if not uploaded:
+            raise RuntimeError("Falha no upload para o S3")
+        item["uploaded"] = True
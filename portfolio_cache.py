@@ -0,0 +1,286 @@
+"""
+Caches da leitura das carteiras diárias (ver portfolio_query.py).
+
+Rotinas que consultam as mesmas datas várias vezes (análise de rebalanceamento,
+replicação do índice) baixavam e decodificavam o Parquet a cada leitura. Dois níveis
+evitam isso:
+
+    TableCache       LRU em memória de tabelas Arrow já decodificadas, com a chave
+                     (índice, data, timestamp da carga) e limite em bytes
+                     (PORTFOLIO_CACHE_MB, padrão 256). Uma carga nova do mesmo dia tem
+                     outra chave, então uma tabela em cache nunca é de uma carga antiga.
+    S3ObjectCache    Cópia em disco dos objetos lidos do S3 (S3_CACHE_FOLDER), validada
+                     a cada leitura por GET condicional com o ETag (If-None-Match: um 304
+                     não transfere o conteúdo), com limite de tamanho (S3_CACHE_MB,
+                     padrão 1024) e descarte dos arquivos usados há mais tempo.
+
+Quem grava partições (conversor, uploads, limpeza e compactação) chama
+invalidate_paths(índice, caminhos) ou PORTFOLIO_CACHE.invalidate(índice, data): as
+tabelas da data saem do cache e as consultas abertas no processo voltam a montar o
+dataset para enxergar a carga nova.
+
+Acertos e faltas ficam em stats() de cada cache e nos contadores table_cache_hits,
+table_cache_misses, s3_cache_hits e s3_cache_misses das métricas (instrumentation.py).
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from compaction import classify
+from instrumentation import METRICS, get_logger
+
+logger = get_logger("cache")
+
+DEFAULT_TABLE_CACHE_MB = 256
+DEFAULT_S3_CACHE_MB = 1024
+
+_ETAG_SUFFIX = ".etag"
+
+
+class TableCache:
+    def __init__(self, max_bytes=DEFAULT_TABLE_CACHE_MB * 1024 * 1024):
+        """
+        LRU de tabelas Arrow decodificadas
+
+        Args:
+            max_bytes (int): Memória máxima ocupada pelas tabelas (Table.nbytes); 0 desativa o cache
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._tables = OrderedDict()
+        self._bytes = 0
+        self._generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls):
+        """Cache com o limite de PORTFOLIO_CACHE_MB"""
+        return cls(int(float(os.getenv("PORTFOLIO_CACHE_MB", DEFAULT_TABLE_CACHE_MB)) * 1024 * 1024))
+
+    def get(self, key):
+        """
+        Tabela em cache
+
+        Args:
+            key (tuple): (índice, data ISO, timestamp da carga)
+
+        Returns:
+            pyarrow.Table: Tabela, ou None se não estiver em cache
+        """
+        with self._lock:
+            table = self._tables.get(key)
+            if table is None:
+                self.misses += 1
+            else:
+                self._tables.move_to_end(key)
+                self.hits += 1
+        METRICS.count("table_cache_misses" if table is None else "table_cache_hits")
+        return table
+
+    def put(self, key, table):
+        """Guarda uma tabela, descartando as usadas há mais tempo se o limite for excedido"""
+        size = table.nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._tables.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._tables[key] = table
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._tables.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def invalidate(self, index, day=None):
+        """
+        Retira as tabelas de um índice (de uma data, ou todas) e avisa as consultas abertas
+
+        Args:
+            index (str): Código do índice
+            day (str | date): Data (ISO ou date); se None, todas as datas do índice
+
+        Returns:
+            int: Tabelas retiradas
+        """
+        day_iso = day if day is None or isinstance(day, str) else day.isoformat()
+        with self._lock:
+            keys = [key for key in self._tables if key[0] == index and (day_iso is None or key[1] == day_iso)]
+            for key in keys:
+                self._bytes -= self._tables.pop(key).nbytes
+            self._generations[index] = self._generations.get(index, 0) + 1
+        return len(keys)
+
+    def generation(self, index):
+        """Contador de invalidações do índice (muda a cada gravação registrada)"""
+        return self._generations.get(index, 0)
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Acertos, faltas, descartes, tabelas e bytes em cache"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._tables), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+PORTFOLIO_CACHE = TableCache.from_env()
+
+
+def invalidate_paths(index, relative_paths, cache=PORTFOLIO_CACHE):
+    """
+    Invalida as datas de arquivos gravados ou removidos na árvore de um índice
+
+    Args:
+        index (str): Código do índice
+        relative_paths (list): Caminhos relativos à raiz da árvore (ano=YYYY/...); um arquivo
+            compactado invalida todas as datas do índice
+        cache (TableCache): Cache a invalidar
+    """
+    for relative_path in relative_paths:
+        info = classify(relative_path)
+        if info is None:
+            continue
+        day_iso = f"{info['year']}-{info['month']}-{info['day']}" if info["day"] else None
+        cache.invalidate(index, day_iso)
+
+
+class S3ObjectCache:
+    def __init__(self, client, bucket, folder, max_bytes=DEFAULT_S3_CACHE_MB * 1024 * 1024):
+        """
+        Cópia em disco de objetos do S3, validada pelo ETag a cada leitura
+
+        Args:
+            client (boto3.client): Cliente S3
+            bucket (str): Bucket dos objetos
+            folder (str): Pasta do cache (criada se não existir)
+            max_bytes (int): Tamanho máximo da pasta; os arquivos lidos há mais tempo são removidos
+        """
+        self.client = client
+        self.bucket = bucket
+        self.folder = os.path.abspath(folder)
+        self.max_bytes = max_bytes
+        os.makedirs(self.folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._bytes = sum(os.path.getsize(path) for path in self._cached_files())
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls, client, bucket):
+        """
+        Cache em S3_CACHE_FOLDER com o limite de S3_CACHE_MB
+
+        Returns:
+            S3ObjectCache: Cache configurado, ou None se S3_CACHE_FOLDER não estiver definido
+        """
+        folder = os.getenv("S3_CACHE_FOLDER")
+        if not folder:
+            return None
+        return cls(client, bucket, folder, int(float(os.getenv("S3_CACHE_MB", DEFAULT_S3_CACHE_MB)) * 1024 * 1024))
+
+    def _path(self, key):
+        return os.path.join(self.folder, hashlib.sha256(f"{self.bucket}/{key}".encode("utf-8")).hexdigest())
+
+    def _cached_files(self):
+        return [entry.path for entry in os.scandir(self.folder)
+                if entry.is_file() and not entry.name.endswith((_ETAG_SUFFIX, ".tmp"))]
+
+    def get(self, key):
+        """
+        Conteúdo de um objeto: a cópia em disco, se o ETag ainda for o mesmo, ou o objeto baixado
+
+        Args:
+            key (str): Chave do objeto
+
+        Returns:
+            bytes: Conteúdo do objeto
+
+        Raises:
+            FileNotFoundError: Se o objeto não existe no bucket
+        """
+        from botocore.exceptions import ClientError
+
+        path = self._path(key)
+        etag = None
+        try:
+            with open(path + _ETAG_SUFFIX, encoding="utf-8") as file:
+                etag = file.read()
+        except FileNotFoundError:
+            pass
+
+        request = {"Bucket": self.bucket, "Key": key}
+        if etag:
+            request["IfNoneMatch"] = etag
+        try:
+            response = self.client.get_object(**request)
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(f"s3://{self.bucket}/{key}")
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("304", "NotModified"):
+                raise
+            try:
+                with open(path, "rb") as file:
+                    payload = file.read()
+                os.utime(path)
+                with self._lock:
+                    self.hits += 1
+                METRICS.count("s3_cache_hits")
+                return payload
+            except FileNotFoundError:
+                # Cópia removida por outro processo entre a validação e a leitura
+                response = self.client.get_object(Bucket=self.bucket, Key=key)
+
+        payload = response["Body"].read()
+        with self._lock:
+            self.misses += 1
+        METRICS.count("s3_cache_misses")
+        self._store(path, payload, response["ETag"])
+        return payload
+
+    def _store(self, path, payload, etag):
+        if len(payload) > self.max_bytes:
+            return
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+        fd, temp_path = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            file.write(payload)
+        os.replace(temp_path, path)
+        with open(path + _ETAG_SUFFIX, "w", encoding="utf-8") as file:
+            file.write(etag)
+        with self._lock:
+            self._bytes += len(payload) - previous
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Remove os arquivos lidos há mais tempo até caber no limite"""
+        files = sorted(self._cached_files(), key=os.path.getmtime)
+        for path in files:
+            if self._bytes <= self.max_bytes:
+                break
+            size = os.path.getsize(path)
+            for stale in (path, path + _ETAG_SUFFIX):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            self._bytes -= size
+            self.evictions += 1
+        logger.debug(f"Cache do S3 em {self.folder}: {self._bytes} bytes após descartes")
+
+    def stats(self):
+        """Acertos (304), faltas (download), descartes e bytes em disco"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "bytes": self._bytes, "max_bytes": self.max_bytes}
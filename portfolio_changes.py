@@ -0,0 +1,326 @@
+"""
+Variações diárias da carteira de um índice: mudança de participação de cada ativo,
+entradas, saídas e giro (turnover) de um pregão para o anterior.
+
+Para cada pregão D com um pregão anterior P, as carteiras de P e D são unidas pelo
+código do ativo (junção externa do Arrow, sem laço por linha) e o resultado vai para
+um dataset próprio, com um arquivo por dia:
+
+    <índice>-changes/ano=YYYY/mes=MM/dia=DD/<ÍNDICE>_changes_YYYY-MM-DD.parquet   (local)
+    s3://<bucket>/<índice>_changes/ano=YYYY/mes=MM/dia=DD/...                      (S3)
+
+Cada linha tem o código, a situação (entrada, saida ou mantido), as participações e
+quantidades teóricas nos dois dias e a variação de participação (ativos que entraram ou
+saíram contam com participação zero no outro dia). O giro do dia é metade da soma das
+variações absolutas, em pontos percentuais (ver turnover).
+
+A atualização é incremental e só lê partições vizinhas: uma carga nova do dia D refaz
+as variações de D (contra o pregão anterior) e do pregão seguinte a D, se já existir.
+O backfill calcula apenas os dias sem arquivo de variações (ou todos, com rebuild),
+lendo cada dia e o pregão anterior pelo cache de carteiras de portfolio_query.py; a
+lista de pregões vem dos nomes das partições, sem ler os dados.
+
+Uso:
+    python portfolio_changes.py --index IBOV --backfill [--start 2024-01-01] [--end 2024-12-31] [--rebuild]
+    python portfolio_changes.py --date 2024-05-02
+    python portfolio_changes.py --turnover --start 2024-01-01 --end 2024-06-30 [--s3]
+"""
+
+import argparse
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from b3_csv_parser import DICTIONARY_STRING
+from b3_indices import DEFAULT_INDEX, changes_folder_name, changes_s3_prefix, normalize_index
+from compaction import LocalPartitionStore, S3PartitionStore, classify
+from instrumentation import METRICS, get_logger
+from parquet_options import ParquetWriteOptions
+from portfolio_query import PortfolioQuery
+
+logger = get_logger("changes")
+
+ENTRANT, LEAVER, KEPT = "entrada", "saida", "mantido"
+
+CHANGES_SCHEMA = pa.schema([
+    ("data", pa.date32()),
+    ("data_anterior", pa.date32()),
+    ("codigo", DICTIONARY_STRING),
+    ("acao", DICTIONARY_STRING),
+    ("tipo", DICTIONARY_STRING),
+    ("situacao", DICTIONARY_STRING),
+    ("qtde_teorica_anterior", pa.int64()),
+    ("qtde_teorica", pa.int64()),
+    ("participacao_anterior", pa.float64()),
+    ("participacao", pa.float64()),
+    ("variacao", pa.float64()),
+])
+
+TURNOVER_SCHEMA = pa.schema([
+    ("data", pa.date32()),
+    ("giro", pa.float64()),
+    ("entradas", pa.int64()),
+    ("saidas", pa.int64()),
+    ("qtde_alteradas", pa.int64()),
+])
+
+# Pregões lidos por vez no backfill (um mês de carteiras decodificadas em memória)
+BACKFILL_BATCH_DAYS = 25
+
+
+def changes_path(index, day):
+    """Caminho relativo do arquivo de variações de um dia"""
+    return (f"ano={day.year}/mes={day.month:02d}/dia={day.day:02d}/"
+            f"{index}_changes_{day.isoformat()}.parquet")
+
+
+def _keyed(table, suffix=""):
+    """Colunas da carteira com texto decodificado (a junção não aceita chaves de dicionário)"""
+    return pa.table({
+        "codigo": table["codigo"].cast(pa.string()),
+        f"acao{suffix}": table["acao"].cast(pa.string()),
+        f"tipo{suffix}": table["tipo"].cast(pa.string()),
+        f"qtde_teorica{suffix}": table["qtde_teorica"],
+        f"participacao{suffix}": table["participacao"],
+    })
+
+
+def compute_changes(previous, current, previous_day, day):
+    """
+    Variações de um pregão em relação ao anterior
+
+    Args:
+        previous (pyarrow.Table): Carteira do pregão anterior (IBOV_SCHEMA)
+        current (pyarrow.Table): Carteira do dia (IBOV_SCHEMA)
+        previous_day (date): Data do pregão anterior
+        day (date): Data do dia
+
+    Returns:
+        pyarrow.Table: Uma linha por ativo presente em algum dos dias (CHANGES_SCHEMA), em ordem de código
+    """
+    joined = _keyed(current).join(_keyed(previous, "_anterior"), keys="codigo", join_type="full outer")
+    joined = joined.take(pc.sort_indices(joined["codigo"]))
+
+    weight, previous_weight = joined["participacao"], joined["participacao_anterior"]
+    status = pc.if_else(pc.is_null(weight), LEAVER, pc.if_else(pc.is_null(previous_weight), ENTRANT, KEPT))
+    rows = joined.num_rows
+    return pa.table({
+        "data": pa.array([day] * rows, pa.date32()),
+        "data_anterior": pa.array([previous_day] * rows, pa.date32()),
+        "codigo": joined["codigo"],
+        "acao": pc.coalesce(joined["acao"], joined["acao_anterior"]),
+        "tipo": pc.coalesce(joined["tipo"], joined["tipo_anterior"]),
+        "situacao": status,
+        "qtde_teorica_anterior": joined["qtde_teorica_anterior"],
+        "qtde_teorica": joined["qtde_teorica"],
+        "participacao_anterior": previous_weight,
+        "participacao": weight,
+        "variacao": pc.subtract(pc.fill_null(weight, 0.0), pc.fill_null(previous_weight, 0.0)),
+    }).cast(CHANGES_SCHEMA)
+
+
+def turnover(changes):
+    """
+    Giro, entradas, saídas e ativos com quantidade teórica alterada por dia
+
+    O giro é o de um lado: metade da soma de |variação| das participações, em pontos
+    percentuais (0 = carteira idêntica, 100 = carteira totalmente trocada).
+
+    Args:
+        changes (pyarrow.Table): Variações de um ou mais dias (CHANGES_SCHEMA)
+
+    Returns:
+        pyarrow.Table: Uma linha por dia (TURNOVER_SCHEMA), em ordem de data
+    """
+    status = changes["situacao"].cast(pa.string())
+    quantity_changed = pc.and_(pc.equal(status, KEPT),
+                               pc.not_equal(changes["qtde_teorica"], changes["qtde_teorica_anterior"]))
+    grouped = pa.table({
+        "data": changes["data"],
+        "variacao_absoluta": pc.abs(changes["variacao"]),
+        "entrada": pc.equal(status, ENTRANT).cast(pa.int64()),
+        "saida": pc.equal(status, LEAVER).cast(pa.int64()),
+        "alterada": quantity_changed.cast(pa.int64()),
+    }).group_by("data").aggregate([
+        ("variacao_absoluta", "sum"), ("entrada", "sum"), ("saida", "sum"), ("alterada", "sum"),
+    ])
+    table = pa.table({
+        "data": grouped["data"],
+        "giro": pc.multiply(grouped["variacao_absoluta_sum"], 0.5),
+        "entradas": grouped["entrada_sum"],
+        "saidas": grouped["saida_sum"],
+        "qtde_alteradas": grouped["alterada_sum"],
+    }, schema=TURNOVER_SCHEMA)
+    return table.take(pc.sort_indices(table["data"]))
+
+
+class PortfolioChanges:
+    def __init__(self, query, store, index=DEFAULT_INDEX, write_options=None, max_workers=8):
+        """
+        Dataset de variações diárias de um índice
+
+        Args:
+            query (PortfolioQuery): Consultas às carteiras do índice (origem dos snapshots)
+            store (LocalPartitionStore | S3PartitionStore): Destino dos arquivos de variações
+            index (str): Código do índice
+            write_options (ParquetWriteOptions): Opções de gravação; se None, lidas das variáveis PARQUET_*
+            max_workers (int): Gravações simultâneas no backfill
+        """
+        self.query = query
+        self.store = store
+        self.index = index
+        self.write_options = write_options or ParquetWriteOptions.from_env()
+        self.max_workers = max_workers
+
+    @classmethod
+    def local(cls, index=DEFAULT_INDEX, data_folder="src/data", **kwargs):
+        """Variações em src/data/<índice>-changes, a partir de src/data/<índice>-data"""
+        return cls(PortfolioQuery.local(index, data_folder),
+                   LocalPartitionStore(os.path.join(data_folder, changes_folder_name(index))), index, **kwargs)
+
+    @classmethod
+    def s3(cls, client, bucket, index=DEFAULT_INDEX, **kwargs):
+        """Variações em s3://<bucket>/<índice>_changes/, a partir de s3://<bucket>/<índice>_data/"""
+        return cls(PortfolioQuery.s3(index, bucket),
+                   S3PartitionStore(client, bucket, changes_s3_prefix(index)), index, **kwargs)
+
+    def days(self):
+        """Dias que já têm arquivo de variações"""
+        days = set()
+        for relative_path in self.store.list_files():
+            info = classify(relative_path)
+            if info and info["day"]:
+                days.add(date(int(info["year"]), int(info["month"]), int(info["day"])))
+        return days
+
+    def update(self, days):
+        """
+        Refaz as variações após a carga de alguns dias: as de cada dia e as do pregão seguinte
+
+        Args:
+            days (list): Datas carregadas (date ou ISO)
+
+        Returns:
+            dict: Dias calculados e gravados
+        """
+        days = {date.fromisoformat(day) if isinstance(day, str) else day for day in days}
+        trading_days = self.query.trading_days()
+        targets = set()
+        for position, day in enumerate(trading_days):
+            if day in days:
+                targets.add(day)
+                if position + 1 < len(trading_days):
+                    targets.add(trading_days[position + 1])
+        return self._compute(trading_days, sorted(targets))
+
+    def backfill(self, start=None, end=None, rebuild=False):
+        """
+        Calcula as variações do histórico que ainda não têm arquivo
+
+        Args:
+            start (date): Primeiro dia (inclusive); se None, o início do histórico
+            end (date): Último dia (inclusive); se None, o fim do histórico
+            rebuild (bool): Se True, recalcula também os dias que já têm arquivo
+
+        Returns:
+            dict: Dias calculados e gravados
+        """
+        trading_days = self.query.trading_days()
+        targets = [day for day in trading_days if (start is None or day >= start) and (end is None or day <= end)]
+        if not rebuild:
+            existing = self.days()
+            targets = [day for day in targets if day not in existing]
+        return self._compute(trading_days, targets)
+
+    def _compute(self, trading_days, targets):
+        """Calcula e grava as variações dos dias alvo, lendo cada um e o pregão anterior"""
+        previous_of = dict(zip(trading_days[1:], trading_days))
+        # O primeiro pregão do histórico não tem com o que comparar
+        targets = [day for day in targets if day in previous_of]
+        report = {"days": 0, "rows": 0}
+        if not targets:
+            return report
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = []
+            for batch_start in range(0, len(targets), BACKFILL_BATCH_DAYS):
+                batch = targets[batch_start:batch_start + BACKFILL_BATCH_DAYS]
+                portfolios = self.query.portfolios(previous_of[batch[0]], batch[-1])
+                for day in batch:
+                    previous_day = previous_of[day]
+                    if day not in portfolios or previous_day not in portfolios:
+                        continue
+                    with METRICS.timer("changes"):
+                        changes = compute_changes(portfolios[previous_day], portfolios[day], previous_day, day)
+                    futures.append(executor.submit(self._write, day, changes))
+                    report["rows"] += changes.num_rows
+            for future in futures:
+                future.result()
+                report["days"] += 1
+        logger.info(f"Variações do {self.index}: {report['days']} dia(s) gravado(s) em {self.store.describe()}",
+                    extra={"index": self.index, **report})
+        return report
+
+    def _write(self, day, changes):
+        buffer = io.BytesIO()
+        self.write_options.write_table(changes, buffer)
+        self.store.write(changes_path(self.index, day), buffer.getvalue())
+
+    def read(self, start=None, end=None):
+        """
+        Variações gravadas no intervalo (os arquivos fora dele não são abertos)
+
+        Returns:
+            pyarrow.Table: Variações (CHANGES_SCHEMA), em ordem de data e código
+        """
+        days = sorted(day for day in self.days() if (start is None or day >= start) and (end is None or day <= end))
+        if not days:
+            return CHANGES_SCHEMA.empty_table()
+        return pa.concat_tables(self.store.read(changes_path(self.index, day)).cast(CHANGES_SCHEMA) for day in days)
+
+    def turnover(self, start=None, end=None):
+        """Giro, entradas e saídas por dia no intervalo (ver turnover)"""
+        return turnover(self.read(start, end))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Variações diárias das carteiras de um índice")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="Código do índice (padrão: IBOV)")
+    parser.add_argument("--data-folder", default="src/data", help="Pasta de dados (padrão: src/data)")
+    parser.add_argument("--s3", action="store_true", help="Ler e gravar no S3 (credenciais do .env) em vez do disco")
+    parser.add_argument("--backfill", action="store_true", help="Calcular os dias do histórico ainda sem variações")
+    parser.add_argument("--rebuild", action="store_true", help="Com --backfill, recalcular também os dias já calculados")
+    parser.add_argument("--date", type=date.fromisoformat, help="Mostrar as variações de uma data")
+    parser.add_argument("--turnover", action="store_true", help="Mostrar o giro por dia no intervalo --start/--end")
+    parser.add_argument("--start", type=date.fromisoformat, help="Primeira data (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Última data (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    index = normalize_index(args.index)
+    if args.s3:
+        import boto3
+        from dotenv import load_dotenv
+        load_dotenv()
+        client = boto3.client("s3", aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
+                              aws_secret_access_key=os.getenv("AWS_SECRET"), region_name=os.getenv("AWS_REGION"))
+        changes = PortfolioChanges.s3(client, os.getenv("AWS_BUCKET", "zambra-ibovespa"), index)
+    else:
+        changes = PortfolioChanges.local(index, args.data_folder)
+
+    if args.backfill:
+        report = changes.backfill(args.start, args.end, rebuild=args.rebuild)
+        print(f"Variações do {index}: {report['days']} dia(s) calculado(s), {report['rows']} linha(s)")
+    if args.date:
+        print(changes.read(args.date, args.date).to_pandas().to_string(index=False))
+    if args.turnover:
+        print(changes.turnover(args.start, args.end).to_pandas().to_string(index=False))
+    if not (args.backfill or args.date or args.turnover):
+        parser.error("Informe --backfill, --date ou --turnover")
+
+
+if __name__ == "__main__":
+    main()
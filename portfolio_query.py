@@ -0,0 +1,466 @@
+"""
+Consultas às carteiras gravadas nas partições de um índice (disco local ou S3).
+
+As consultas usam pyarrow.dataset com particionamento hive em ano=/mes=/dia=:
+
+    - o intervalo de datas vira um filtro sobre ano, mes e dia, e os arquivos fora dele
+      são descartados sem serem abertos (inclusive os compactados mensais e anuais, que
+      não têm dia ou mês no caminho)
+    - as colunas pedidas e os filtros de linha (data, código) são passados à leitura, que
+      lê apenas essas colunas e pula row groups pelas estatísticas da coluna data
+
+O dataset é montado, nesta ordem, a partir do _metadata (sem listar nem abrir os
+arquivos), da lista de arquivos do _partitions.json (sem listar) ou da listagem da
+árvore (ver partition_index.py). Cargas repetidas de um dia são resolvidas como na
+compactação: vale a de timestamp mais recente, e um arquivo diário prevalece sobre o
+compactado que contém o mesmo dia.
+
+portfolio(data) e portfolios(início, fim) passam pelo cache de tabelas decodificadas
+(portfolio_cache.PORTFOLIO_CACHE, chave índice + data + carga) e, no S3, opcionalmente
+pela cópia em disco dos objetos validada pelo ETag (S3_CACHE_FOLDER).
+
+Uso:
+    python portfolio_query.py --date 2024-05-02
+    python portfolio_query.py --ticker PETR4 --start 2024-01-01 --end 2024-06-30
+    python portfolio_query.py --top 10 --start 2024-05-01 --end 2024-05-31 [--s3] [--index SMLL]
+"""
+
+import argparse
+import json
+import os
+from datetime import date
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from b3_csv_parser import IBOV_SCHEMA
+from b3_indices import DEFAULT_INDEX, local_folder_name, normalize_index, s3_prefix
+from compaction import LOADS_METADATA_KEY, classify
+from instrumentation import METRICS, get_logger
+from partition_index import INDEX_FILENAME, METADATA_FILENAME
+from portfolio_cache import PORTFOLIO_CACHE, S3ObjectCache
+
+logger = get_logger("query")
+
+# Campos do particionamento hive (ano=YYYY/mes=MM/dia=DD)
+PARTITION_SCHEMA = pa.schema([("ano", pa.int32()), ("mes", pa.int32()), ("dia", pa.int32())])
+
+# Esquema do dataset: colunas dos arquivos (cargas antigas são convertidas) e da partição
+DATASET_SCHEMA = pa.unify_schemas([IBOV_SCHEMA, PARTITION_SCHEMA])
+
+# Coluna especial do scanner com o caminho do arquivo de cada linha (usada na deduplicação)
+_FILENAME_FIELD = "__filename"
+
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def partition_filter(start=None, end=None):
+    """
+    Filtro sobre ano, mes e dia que descarta os arquivos fora do intervalo
+
+    Arquivos compactados não têm dia (mensais) ou mês e dia (anuais) no caminho; para
+    eles, o campo ausente é nulo e apenas os níveis presentes são comparados.
+
+    Args:
+        start (date): Primeira data (inclusive); se None, sem limite inferior
+        end (date): Última data (inclusive); se None, sem limite superior
+
+    Returns:
+        pyarrow.dataset.Expression: Filtro, ou None se o intervalo for aberto
+    """
+    if start is None and end is None:
+        return None
+    ano, mes, dia = ds.field("ano"), ds.field("mes"), ds.field("dia")
+    month_key = ano * 100 + mes
+    day_key = ano * 10000 + mes * 100 + dia
+    years, months, days = [], [], []
+    if start is not None:
+        years.append(ano >= start.year)
+        months.append(month_key >= start.year * 100 + start.month)
+        days.append(day_key >= start.year * 10000 + start.month * 100 + start.day)
+    if end is not None:
+        years.append(ano <= end.year)
+        months.append(month_key <= end.year * 100 + end.month)
+        days.append(day_key <= end.year * 10000 + end.month * 100 + end.day)
+
+    expression = years[0]
+    for condition in years[1:]:
+        expression = expression & condition
+    for field, conditions in ((mes, months), (dia, days)):
+        level = conditions[0]
+        for condition in conditions[1:]:
+            level = level & condition
+        expression = expression & (field.is_null() | level)
+    return expression
+
+
+def date_filter(start=None, end=None):
+    """Filtro de linhas pela coluna data (também pula row groups pelas estatísticas)"""
+    expression = None
+    if start is not None:
+        expression = ds.field("data") >= pa.scalar(start, pa.date32())
+    if end is not None:
+        condition = ds.field("data") <= pa.scalar(end, pa.date32())
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _combine(*expressions):
+    combined = None
+    for expression in expressions:
+        if expression is not None:
+            combined = expression if combined is None else combined & expression
+    return combined
+
+
+class PortfolioQuery:
+    def __init__(self, root, filesystem=None, index=DEFAULT_INDEX, use_partition_index=True,
+                 table_cache=PORTFOLIO_CACHE, object_cache=None):
+        """
+        Consultas sobre a árvore de partições de um índice
+
+        Args:
+            root (str): Raiz da árvore (ex.: src/data/ibov-data, ou bucket/ibov_data no S3)
+            filesystem (pyarrow.fs.FileSystem): Sistema de arquivos; se None, o disco local
+            index (str): Código do índice (chave do cache e das invalidações)
+            use_partition_index (bool): Se True, usa _metadata/_partitions.json quando existirem;
+                se False, sempre lista a árvore
+            table_cache (TableCache): Cache das carteiras decodificadas; None desativa
+            object_cache (S3ObjectCache): Cópia em disco dos objetos do S3 (root sem o bucket
+                é o prefixo das chaves); se None, os arquivos são lidos pelo filesystem
+        """
+        self.filesystem = filesystem or pafs.LocalFileSystem()
+        self.root = os.path.abspath(str(root)) if filesystem is None else str(root).rstrip("/")
+        self.index = index
+        self.use_partition_index = use_partition_index
+        self.source = None
+        self.table_cache = table_cache
+        self.object_cache = object_cache
+        self._dataset = None
+        self._generation = None
+        self._compacted_loads = {}
+        self._partitioning = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+
+    @classmethod
+    def local(cls, index=DEFAULT_INDEX, data_folder="src/data", **kwargs):
+        """Consultas sobre src/data/<índice>-data"""
+        return cls(os.path.join(data_folder, local_folder_name(index)), index=index, **kwargs)
+
+    @classmethod
+    def s3(cls, index=DEFAULT_INDEX, bucket=None, **kwargs):
+        """
+        Consultas sobre s3://<bucket>/<índice>_data/, com as credenciais do .env
+        (AWS_ACCESS_KEY, AWS_SECRET, AWS_REGION, AWS_BUCKET e, para um S3 local, AWS_ENDPOINT_URL)
+
+        Com S3_CACHE_FOLDER definido (e sem object_cache em kwargs), os objetos lidos ficam
+        em disco e são validados pelo ETag.
+        """
+        filesystem = pafs.S3FileSystem(
+            access_key=os.getenv("AWS_ACCESS_KEY"),
+            secret_key=os.getenv("AWS_SECRET"),
+            region=os.getenv("AWS_REGION"),
+            endpoint_override=os.getenv("AWS_ENDPOINT_URL"),
+        )
+        bucket = bucket or os.getenv("AWS_BUCKET", "zambra-ibovespa")
+        if "object_cache" not in kwargs and os.getenv("S3_CACHE_FOLDER"):
+            import boto3
+            client = boto3.client("s3", aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
+                                  aws_secret_access_key=os.getenv("AWS_SECRET"), region_name=os.getenv("AWS_REGION"))
+            kwargs["object_cache"] = S3ObjectCache.from_env(client, bucket)
+        return cls(f"{bucket}/{s3_prefix(index)}", filesystem=filesystem, index=index, **kwargs)
+
+    @property
+    def dataset(self):
+        """Dataset da árvore (montado no primeiro uso e de novo após gravações no índice)"""
+        if self.table_cache is not None and self._generation != self.table_cache.generation(self.index):
+            self.refresh()
+        if self._dataset is None:
+            self._dataset = self._open_dataset()
+            logger.debug(f"Dataset de {self.root} montado a partir de: {self.source}")
+        return self._dataset
+
+    def refresh(self):
+        """Descarta o dataset montado (a próxima consulta enxerga arquivos novos ou removidos)"""
+        self._dataset = None
+        self._compacted_loads = {}
+        if self.table_cache is not None:
+            self._generation = self.table_cache.generation(self.index)
+
+    def _read_auxiliary(self, name):
+        try:
+            with self.filesystem.open_input_stream(f"{self.root}/{name}") as stream:
+                return stream.read()
+        except OSError:
+            return None
+
+    def _open_dataset(self):
+        if self.use_partition_index:
+            payload = self._read_auxiliary(INDEX_FILENAME)
+            if payload is not None:
+                entries = json.loads(payload)["files"]
+                in_metadata = all(entry.get("in_metadata", True) for entry in entries.values())
+                metadata_path = f"{self.root}/{METADATA_FILENAME}"
+                if entries and in_metadata and self.filesystem.get_file_info(metadata_path).is_file:
+                    self.source = "metadata"
+                    return ds.parquet_dataset(metadata_path, filesystem=self.filesystem,
+                                              partitioning=self._partitioning)
+                # Arquivos de esquema antigo ficam fora do _metadata: lista do índice, com conversão
+                self.source = "partition_index"
+                return ds.dataset([f"{self.root}/{path}" for path in sorted(entries)], schema=DATASET_SCHEMA,
+                                  format="parquet", filesystem=self.filesystem,
+                                  partitioning=self._partitioning, partition_base_dir=self.root)
+        self.source = "listing"
+        return ds.dataset(self.root, schema=DATASET_SCHEMA, format="parquet", filesystem=self.filesystem,
+                          partitioning=self._partitioning)
+
+    def files(self, start=None, end=None):
+        """
+        Arquivos que uma consulta no intervalo lê (os demais são descartados pelo caminho)
+
+        Returns:
+            list: Caminhos relativos à raiz da árvore
+        """
+        start, end = _as_date(start), _as_date(end)
+        fragments = self.dataset.get_fragments(filter=partition_filter(start, end))
+        return sorted(fragment.path[len(self.root) + 1:] for fragment in fragments)
+
+    def scan(self, start=None, end=None, columns=None, filter=None):
+        """
+        Lê as linhas do intervalo, com uma carga por dia
+
+        Args:
+            start (date | str): Primeira data (inclusive); se None, desde o início
+            end (date | str): Última data (inclusive); se None, até o fim
+            columns (list): Colunas a ler (padrão: todas as de IBOV_SCHEMA)
+            filter (pyarrow.dataset.Expression): Filtro adicional sobre as colunas
+
+        Returns:
+            pyarrow.Table: Linhas encontradas, nas colunas pedidas
+        """
+        start, end = _as_date(start), _as_date(end)
+        columns = list(columns or IBOV_SCHEMA.names)
+        read_columns = list(dict.fromkeys(columns + ["data"])) + [_FILENAME_FIELD]
+        with METRICS.timer("query"):
+            table = self.dataset.to_table(
+                columns=read_columns,
+                filter=_combine(partition_filter(start, end), date_filter(start, end), filter),
+            )
+            table = self._latest_loads(table)
+        METRICS.count("query_rows", table.num_rows)
+        return table.select(columns)
+
+    def _latest_loads(self, table):
+        """Mantém, em cada dia, apenas as linhas do arquivo de carga mais recente"""
+        if table.num_rows == 0:
+            return table
+        filenames = table[_FILENAME_FIELD]
+        unique = pc.unique(filenames)
+        if len(unique) == 1:
+            return table
+        # Compactados (sem timestamp no nome) perdem para qualquer carga diária do mesmo dia
+        loads = pa.array([(classify(path[len(self.root) + 1:]) or {}).get("load") or "" for path in unique.to_pylist()])
+        row_loads = pc.take(loads, pc.index_in(filenames, unique))
+        keys = pa.table({"data": table["data"], "load": row_loads})
+        latest = keys.group_by("data").aggregate([("load", "max")])
+        latest_per_row = pc.take(latest["load_max"], pc.index_in(table["data"], latest["data"]))
+        return table.filter(pc.equal(row_loads, latest_per_row))
+
+    def weight_history(self, ticker, start=None, end=None):
+        """
+        Participação e quantidade teórica de um ativo ao longo de um intervalo
+
+        Args:
+            ticker (str): Código do ativo (ex.: PETR4)
+            start (date | str): Primeira data (inclusive)
+            end (date | str): Última data (inclusive)
+
+        Returns:
+            pyarrow.Table: data, codigo, participacao e qtde_teorica, em ordem de data
+        """
+        table = self.scan(start, end, columns=["data", "codigo", "participacao", "qtde_teorica"],
+                          filter=ds.field("codigo") == ticker.strip().upper())
+        return table.take(pc.sort_indices(table["data"]))
+
+    def portfolio(self, day):
+        """
+        Carteira completa de uma data
+
+        Args:
+            day (date | str): Data do pregão
+
+        Returns:
+            pyarrow.Table: Linhas do dia (IBOV_SCHEMA), em ordem de código; vazia se não houver carga
+        """
+        day = _as_date(day)
+        return self.portfolios(day, day).get(day, IBOV_SCHEMA.empty_table())
+
+    def portfolios(self, start=None, end=None):
+        """
+        Carteiras completas de cada dia do intervalo, pelo cache de tabelas decodificadas
+
+        Os dias que não estão em cache são lidos agrupados por arquivo (um compactado mensal
+        é lido uma vez para todos os seus dias) e guardados no cache.
+
+        Args:
+            start (date | str): Primeira data (inclusive)
+            end (date | str): Última data (inclusive)
+
+        Returns:
+            dict: {date: pyarrow.Table (IBOV_SCHEMA, em ordem de código)}, em ordem de data
+        """
+        start, end = _as_date(start), _as_date(end)
+        try:
+            return self._portfolios(start, end)
+        except FileNotFoundError:
+            # Arquivo removido desde a montagem do dataset (ex.: compactação em outro processo)
+            self.refresh()
+            return self._portfolios(start, end)
+
+    def trading_days(self, start=None, end=None):
+        """
+        Pregões com carga no intervalo, pelos caminhos das partições (sem ler os dados)
+
+        Returns:
+            list: Datas (date), em ordem
+        """
+        return [date.fromisoformat(day_iso) for day_iso in sorted(self._day_sources(_as_date(start), _as_date(end)))]
+
+    def _portfolios(self, start, end):
+        sources = self._day_sources(start, end)
+        tables, missing = {}, {}
+        for day_iso, (relative_path, load) in sorted(sources.items()):
+            key = (self.index, day_iso, load)
+            table = self.table_cache.get(key) if self.table_cache is not None else None
+            if table is None:
+                missing.setdefault(relative_path, []).append(key)
+            else:
+                tables[day_iso] = table
+
+        for relative_path, keys in missing.items():
+            with METRICS.timer("query"):
+                file_table = self._read_file(relative_path)
+            for key in keys:
+                day_value = date.fromisoformat(key[1])
+                table = file_table.filter(pc.equal(file_table["data"], pa.scalar(day_value, pa.date32())))
+                # O pyarrow não ordena colunas de dicionário: a chave de ordenação usa o código decodificado
+                table = table.take(pc.sort_indices(table["codigo"].cast(pa.string())))
+                if self.table_cache is not None:
+                    self.table_cache.put(key, table)
+                tables[key[1]] = table
+        return {date.fromisoformat(day_iso): tables[day_iso] for day_iso in sorted(tables)}
+
+    def _day_sources(self, start, end):
+        """
+        Arquivo e carga que valem para cada dia do intervalo (sem ler os dados)
+
+        Returns:
+            dict: {data ISO: (caminho relativo, timestamp da carga)}
+        """
+        start_iso = start.isoformat() if start else "0000-00-00"
+        end_iso = end.isoformat() if end else "9999-99-99"
+        best = {}
+        for fragment in self.dataset.get_fragments(filter=partition_filter(start, end)):
+            relative_path = fragment.path[len(self.root) + 1:]
+            info = classify(relative_path)
+            if info is None:
+                continue
+            if info["day"]:
+                days = {f"{info['year']}-{info['month']}-{info['day']}": info["load"]}
+            else:
+                days = self._loads_of(relative_path)
+            for day_iso, load in days.items():
+                if not start_iso <= day_iso <= end_iso:
+                    continue
+                # Arquivo diário prevalece sobre o compactado; entre diários, a carga mais recente
+                rank = (info["day"] is not None, load)
+                if day_iso not in best or rank > best[day_iso][0]:
+                    best[day_iso] = (rank, relative_path, load)
+        return {day_iso: (relative_path, load) for day_iso, (_, relative_path, load) in best.items()}
+
+    def _loads_of(self, relative_path):
+        """Timestamp de carga de cada dia de um arquivo compactado (metadados do rodapé)"""
+        if relative_path not in self._compacted_loads:
+            schema = pq.read_schema(f"{self.root}/{relative_path}", filesystem=self.filesystem)
+            self._compacted_loads[relative_path] = json.loads((schema.metadata or {}).get(LOADS_METADATA_KEY, b"{}"))
+        return self._compacted_loads[relative_path]
+
+    def _read_file(self, relative_path):
+        """Tabela completa de um arquivo, no esquema IBOV_SCHEMA"""
+        if self.object_cache is not None:
+            prefix = self.root.split("/", 1)[1] if "/" in self.root else ""
+            payload = self.object_cache.get(f"{prefix}/{relative_path}" if prefix else relative_path)
+            table = pq.read_table(pa.BufferReader(payload))
+        else:
+            table = pq.read_table(f"{self.root}/{relative_path}", filesystem=self.filesystem, partitioning=None)
+        return table.select(IBOV_SCHEMA.names).cast(IBOV_SCHEMA).replace_schema_metadata(None)
+
+    def top_constituents(self, start=None, end=None, n=10):
+        """
+        Os `n` ativos de maior participação em cada dia do intervalo
+
+        Args:
+            start (date | str): Primeira data (inclusive)
+            end (date | str): Última data (inclusive)
+            n (int): Ativos por dia
+
+        Returns:
+            pyarrow.Table: data, rank (1 = maior participação), codigo, acao e participacao
+        """
+        table = self.scan(start, end, columns=["data", "codigo", "acao", "participacao"])
+        table = table.take(pc.sort_indices(table, sort_keys=[("data", "ascending"), ("participacao", "descending")]))
+        days = table["data"].to_numpy()
+        positions = np.arange(len(days))
+        # Posição do primeiro registro do dia de cada linha (a tabela está ordenada por data)
+        first = np.maximum.accumulate(np.where(np.r_[True, days[1:] != days[:-1]], positions, 0))
+        rank = positions - first + 1
+        table = table.filter(pa.array(rank <= n))
+        return pa.table({
+            "data": table["data"],
+            "rank": pa.array(rank[rank <= n], pa.int32()),
+            "codigo": table["codigo"],
+            "acao": table["acao"],
+            "participacao": table["participacao"],
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas às carteiras particionadas de um índice")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="Código do índice (padrão: IBOV)")
+    parser.add_argument("--data-folder", default="src/data", help="Pasta de dados (padrão: src/data)")
+    parser.add_argument("--s3", action="store_true", help="Consultar o S3 (credenciais do .env) em vez do disco")
+    parser.add_argument("--date", type=date.fromisoformat, help="Carteira completa de uma data")
+    parser.add_argument("--ticker", help="Participação de um ativo no intervalo --start/--end")
+    parser.add_argument("--top", type=int, help="Os N ativos de maior participação por dia no intervalo")
+    parser.add_argument("--start", type=date.fromisoformat, help="Primeira data (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Última data (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    index = normalize_index(args.index)
+    if args.s3:
+        from dotenv import load_dotenv
+        load_dotenv()
+        query = PortfolioQuery.s3(index)
+    else:
+        query = PortfolioQuery.local(index, args.data_folder)
+
+    if args.date:
+        table = query.portfolio(args.date)
+    elif args.ticker:
+        table = query.weight_history(args.ticker, args.start, args.end)
+    elif args.top:
+        table = query.top_constituents(args.start, args.end, args.top)
+    else:
+        parser.error("Informe --date, --ticker ou --top")
+    print(table.to_pandas().to_string(index=False))
+    print(f"{table.num_rows} linha(s), {len(query.files(args.start or args.date, args.end or args.date))} "
+          f"arquivo(s) lido(s) de {query.root} ({query.source})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+Modo agendador: um processo de longa duração que consulta a B3 durante o horário de
+publicação e dispara o pipeline só quando a carteira nova aparece.
+
+Rodar src/main.py pelo cron em um horário chutado paga a partida a cada execução
+(imports, conexão ao S3, navegador) e, se a B3 ainda não publicou, o dia é perdido. O
+agendador mantém aquecidos a sessão HTTP, o cliente S3 e, opcionalmente, o navegador,
+e a cada `interval` segundos dentro da janela de publicação faz uma requisição
+condicional por índice:
+
+    - com os validadores da resposta anterior (If-None-Match/If-Modified-Since), a B3
+      responde 304 sem conteúdo enquanto nada mudou
+    - sem validadores no servidor, o SHA-256 do CSV é comparado com o último processado
+
+Uma carteira nova (ou corrigida) é enviada ao pipeline com o CSV já baixado, sem um
+segundo download. Os validadores e a impressão digital só são gravados depois que o
+pipeline conclui, de modo que uma falha é tentada de novo na consulta seguinte; se só o
+upload falhou, o Parquet já gravado fica no estado e apenas o upload é repetido. O estado
+fica em src/data/_scheduler_state.json, e um reinício não reprocessa o que já foi feito.
+
+As carteiras teórica e quadrimestral não têm data no título: a mudança é detectada só
+pela impressão digital e a carteira nova fica na data da consulta.
+Quando todos os índices já têm a carteira do dia, o agendador dorme até a próxima janela.
+
+Configuração (argumentos de `python src/main.py daemon` ou variáveis do .env):
+
+    SCHEDULER_WINDOW      janela de publicação no horário de Brasília (padrão: 18:00-22:00)
+    SCHEDULER_INTERVAL    segundos entre consultas dentro da janela (padrão: 300)
+    SCHEDULER_WEEKDAYS    dias da semana, 0 = segunda (padrão: 0-4)
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, time as dtime, timedelta, timezone
+
+from instrumentation import METRICS, get_logger
+
+logger = get_logger("scheduler")
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+    B3_TIMEZONE = ZoneInfo("America/Sao_Paulo")
+except (ImportError, ZoneInfoNotFoundError):
+    # Sem base de fusos no sistema: Brasília não tem horário de verão desde 2019
+    B3_TIMEZONE = timezone(timedelta(hours=-3))
+
+DEFAULT_WINDOW = "18:00-22:00"
+DEFAULT_INTERVAL = 300
+DEFAULT_WEEKDAYS = "0-4"
+
+STATE_FILENAME = "_scheduler_state.json"
+
+
+def parse_window(value):
+    """
+    Lê uma janela "HH:MM-HH:MM"
+
+    Returns:
+        tuple: (início, fim) como datetime.time
+
+    Raises:
+        ValueError: Se o formato for inválido ou o fim não for posterior ao início
+    """
+    try:
+        start, end = (dtime.fromisoformat(part.strip()) for part in value.split("-"))
+    except ValueError:
+        raise ValueError(f"Janela inválida: {value} (use HH:MM-HH:MM)")
+    if end <= start:
+        raise ValueError(f"Janela inválida: {value} (o fim deve ser posterior ao início)")
+    return start, end
+
+
+def parse_weekdays(value):
+    """
+    Lê dias da semana como "0-4" ou "0,2,4" (0 = segunda)
+
+    Returns:
+        frozenset: Dias da semana (0 a 6)
+    """
+    days = set()
+    for item in value.split(","):
+        first, _, last = item.strip().partition("-")
+        days.update(range(int(first), int(last or first) + 1))
+    if not days or not days <= set(range(7)):
+        raise ValueError(f"Dias da semana inválidos: {value} (use 0 a 6, 0 = segunda)")
+    return frozenset(days)
+
+
+class PublishSchedule:
+    def __init__(self, window=DEFAULT_WINDOW, interval=DEFAULT_INTERVAL, weekdays=DEFAULT_WEEKDAYS, tz=B3_TIMEZONE):
+        """
+        Janela de publicação da B3 e intervalo entre consultas
+
+        Args:
+            window (str): "HH:MM-HH:MM" no fuso tz
+            interval (float): Segundos entre consultas dentro da janela
+            weekdays (str): Dias da semana com consulta (ex.: "0-4")
+            tz (tzinfo): Fuso da janela (padrão: America/Sao_Paulo)
+        """
+        if interval <= 0:
+            raise ValueError("O intervalo entre consultas deve ser positivo")
+        self.start, self.end = parse_window(window)
+        self.interval = interval
+        self.weekdays = parse_weekdays(weekdays)
+        self.tz = tz
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """
+        Agenda a partir das variáveis SCHEDULER_*
+
+        Args:
+            **overrides: Valores que substituem os do ambiente (None é ignorado)
+        """
+        options = {
+            "window": os.getenv("SCHEDULER_WINDOW", DEFAULT_WINDOW),
+            "interval": float(os.getenv("SCHEDULER_INTERVAL", DEFAULT_INTERVAL)),
+            "weekdays": os.getenv("SCHEDULER_WEEKDAYS", DEFAULT_WEEKDAYS),
+        }
+        options.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**options)
+
+    def now(self):
+        return datetime.now(self.tz)
+
+    def in_window(self, moment):
+        """Indica se o momento está dentro da janela de um dia com consulta"""
+        moment = moment.astimezone(self.tz)
+        return moment.weekday() in self.weekdays and self.start <= moment.time() < self.end
+
+    def next_window_start(self, moment, skip_today=False):
+        """
+        Início da próxima janela (a de hoje, se ainda não começou)
+
+        Args:
+            moment (datetime): Momento de referência (com fuso)
+            skip_today (bool): Se True, ignora a janela do dia de moment
+        """
+        moment = moment.astimezone(self.tz)
+        for offset in range(1 if skip_today else 0, 8):
+            day = moment.date() + timedelta(days=offset)
+            start = datetime.combine(day, self.start, tzinfo=self.tz)
+            if day.weekday() in self.weekdays and (offset or moment < start):
+                return start
+        raise RuntimeError("Nenhum dia da semana configurado")
+
+    def describe(self):
+        days = ",".join(str(day) for day in sorted(self.weekdays))
+        return f"{self.start:%H:%M}-{self.end:%H:%M} ({self.tz}), a cada {self.interval:g}s, dias {days}"
+
+
+class PollState:
+    """Validadores e última carteira processada por índice, em um arquivo JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                self.entries = json.load(file)
+
+    def get(self, key):
+        return self.entries.get(key, {})
+
+    def record(self, key, **fields):
+        self.entries.setdefault(key, {}).update(fields)
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".scheduler-", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(self.entries, file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+
+class PortfolioScheduler:
+    def __init__(self, downloader, indices, schedule=None, portfolio="day", upload=True, warm_browser=False,
+                 state_path=None):
+        """
+        Agendador das consultas à B3
+
+        Args:
+            downloader (B3DataDownloader): Mantém a sessão HTTP, o cliente S3 e o navegador entre as consultas
+            indices (list): Códigos dos índices acompanhados
+            schedule (PublishSchedule): Janela e intervalo (padrão: variáveis SCHEDULER_*)
+            portfolio (str): "day", "theoretical" ou "quarterly"
+            upload (bool): Se False, apenas grava os Parquet locais
+            warm_browser (bool): Se True, abre o navegador na partida e o usa quando a API falha
+            state_path (str): Arquivo de estado (padrão: <pasta de dados>/_scheduler_state.json)
+        """
+        self.downloader = downloader
+        self.indices = list(indices)
+        self.schedule = schedule or PublishSchedule.from_env()
+        self.portfolio = portfolio
+        self.upload = upload
+        self.warm_browser = warm_browser
+        self.state = PollState(state_path or os.path.join(downloader.data_folder, STATE_FILENAME))
+        self.stop_event = threading.Event()
+        self.stats = {"polls": 0, "not_modified": 0, "unchanged": 0, "new": 0, "failed": 0}
+
+    def _key(self, index):
+        return f"{index}/{self.portfolio}"
+
+    def stop(self):
+        """Pede o fim do laço (ex.: no SIGTERM); a espera em andamento é interrompida"""
+        self.stop_event.set()
+
+    def pending_indices(self, today):
+        """Índices que ainda não têm a carteira do dia (ou uma posterior) processada"""
+        return [index for index in self.indices
+                if self.state.get(self._key(index)).get("trade_date", "") < today.isoformat()]
+
+    def poll_once(self, today=None):
+        """
+        Consulta cada índice pendente e processa as carteiras novas
+
+        Args:
+            today (date): Data do pregão esperado (padrão: hoje, no fuso da agenda)
+
+        Returns:
+            list: Índices com carteira nova processada
+        """
+        # O parser (pyarrow) só é carregado na consulta: src/main.py importa este módulo na partida
+        from b3_csv_parser import extract_title_date, split_sections
+
+        today = today or self.schedule.now().date()
+        found, prefetched, fingerprints = [], {}, {}
+        for index in self.indices:
+            if self.state.get(self._key(index)).get("pending_upload") and self._retry_upload(index):
+                found.append(index)
+        for index in self.pending_indices(today):
+            key = self._key(index)
+            previous = self.state.get(key)
+            self.stats["polls"] += 1
+            try:
+                check = self.downloader.get_http_client().check_portfolio_csv(
+                    index, portfolio=self.portfolio, etag=previous.get("etag"),
+                    last_modified=previous.get("last_modified"))
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.warning(f"Consulta ao {index} falhou: {e}")
+                if self.warm_browser:
+                    self._browser_fallback(index, today)
+                continue
+            if not check["modified"]:
+                self.stats["not_modified"] += 1
+                continue
+            fingerprint = hashlib.sha256(check["content"]).hexdigest()
+            if self.portfolio == "day":
+                title_date = extract_title_date(split_sections(check["content"])[0])
+            else:
+                # Sem data no título: vale a data da consulta
+                title_date = (f"{today.day:02d}", f"{today.month:02d}", str(today.year))
+            if fingerprint == previous.get("fingerprint") or title_date is None:
+                # Servidor sem validadores (ou que os mudou sem mudar a carteira)
+                self.stats["unchanged"] += 1
+                METRICS.count("poll_unchanged")
+                if title_date is not None:
+                    self.state.record(key, etag=check["etag"], last_modified=check["last_modified"])
+                continue
+            day, month, year = title_date
+            trade_date = date(int(year), int(month), int(day))
+            prefetched[(index, trade_date)] = check["content"]
+            fingerprints[(index, trade_date)] = (fingerprint, check)
+
+        if prefetched:
+            logger.info(f"Carteira nova: {', '.join(f'{index} ({day:%d/%m/%Y})' for index, day in prefetched)}")
+            report = self.downloader.run_pipeline(list(prefetched), upload=self.upload, portfolio=self.portfolio,
+                                                  prefetched=prefetched)
+            for result in report["results"]:
+                job = (result["index"], result["date"])
+                fingerprint, check = fingerprints[job]
+                if not result["success"]:
+                    self.stats["failed"] += 1
+                    logger.error(f"  ✗ {result['index']} ({result['failed_stage']}): {result['error']}")
+                    if result["failed_stage"] == "upload":
+                        # Parquet gravado: a próxima consulta só repete o upload
+                        self.state.record(self._key(result["index"]), fingerprint=fingerprint,
+                                          etag=check["etag"], last_modified=check["last_modified"],
+                                          pending_upload={"parquet": result["parquet"],
+                                                          "trade_date": result["date"].isoformat()})
+                    continue
+                self._record_processed(result["index"], result["date"].isoformat(), result["parquet"],
+                                       fingerprint=fingerprint, etag=check["etag"],
+                                       last_modified=check["last_modified"])
+                found.append(result["index"])
+        return found
+
+    def _record_processed(self, index, trade_date, parquet, **fields):
+        self.state.record(self._key(index), trade_date=trade_date, parquet=parquet, pending_upload=None,
+                          processed_at=datetime.now(self.schedule.tz).isoformat(timespec="seconds"), **fields)
+        self.stats["new"] += 1
+        METRICS.count("poll_new")
+
+    def _retry_upload(self, index):
+        """
+        Repete o upload de uma carteira já convertida cujo envio falhou
+
+        Returns:
+            bool: True se a carteira foi enviada
+        """
+        key = self._key(index)
+        pending = self.state.get(key)["pending_upload"]
+        if not os.path.exists(pending["parquet"]):
+            # Parquet removido: baixar e converter de novo na consulta seguinte
+            logger.warning(f"Parquet pendente de upload não encontrado: {pending['parquet']}")
+            self.state.record(key, pending_upload=None, fingerprint=None, etag=None, last_modified=None)
+            return False
+        trade_date = date.fromisoformat(pending["trade_date"])
+        if not self.downloader.upload_to_s3_partitioned(pending["parquet"], f"{trade_date:%d-%m-%y}", index=index,
+                                                        portfolio=self.portfolio):
+            self.stats["failed"] += 1
+            logger.error(f"  ✗ {index} (upload): falha ao reenviar {pending['parquet']}")
+            return False
+        self._record_processed(index, pending["trade_date"], pending["parquet"])
+        return True
+
+    def _browser_fallback(self, index, today):
+        """
+        Download pelo navegador aquecido quando a API falha (uma vez por dia e índice: a
+        página não informa se a carteira mudou, e as consultas pela API continuam)
+        """
+        key = self._key(index)
+        if self.state.get(key).get("browser_date") == today.isoformat():
+            return
+        summary = self.downloader.download_with_fallback(index, ("selenium",))
+        if summary["success"]:
+            self.state.record(key, browser_date=today.isoformat(), parquet=summary["file"],
+                              processed_at=datetime.now(self.schedule.tz).isoformat(timespec="seconds"))
+            self.stats["new"] += 1
+
+    def run(self, max_polls=None):
+        """
+        Laço do agendador: consulta dentro da janela e dorme fora dela
+
+        Args:
+            max_polls (int): Número máximo de rodadas de consulta (None = até stop())
+
+        Returns:
+            dict: Consultas, respostas 304, conteúdos repetidos, carteiras novas e falhas
+        """
+        logger.info(f"Agendador iniciado: {', '.join(self.indices)}, {self.schedule.describe()}")
+        if self.warm_browser:
+            self.downloader.get_browser_session().warm()
+        rounds = 0
+        while not self.stop_event.is_set() and (max_polls is None or rounds < max_polls):
+            now = self.schedule.now()
+            if not self.schedule.in_window(now):
+                self._sleep_until(self.schedule.next_window_start(now))
+                continue
+            if not self.pending_indices(now.date()):
+                logger.info("Carteiras do dia processadas; aguardando a próxima janela")
+                self._sleep_until(self.schedule.next_window_start(now, skip_today=True))
+                continue
+            started = time.monotonic()
+            self.poll_once(now.date())
+            rounds += 1
+            self.stop_event.wait(max(0.0, self.schedule.interval - (time.monotonic() - started)))
+        logger.info(f"Agendador encerrado: {self.stats}", extra=self.stats)
+        return dict(self.stats)
+
+    def _sleep_until(self, moment):
+        seconds = (moment - self.schedule.now()).total_seconds()
+        if seconds > 0:
+            logger.info(f"Próxima consulta em {moment:%d/%m/%Y %H:%M} ({seconds / 3600:.1f}h)")
+            self.stop_event.wait(seconds)
@@ -1,19 +1,39 @@
-import requests
 import os
-from datetime import datetime
+from datetime import datetime, date
 import time
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
 import zipfile
 from dotenv import load_dotenv
-import boto3
+from concurrent.futures import ThreadPoolExecutor
 import re
-import pandas as pd
-import pyarrow as pa
-import pyarrow.parquet as pq
+import sys
+import hashlib
+import argparse
+import logging
+import signal
+import threading
+
+# Permitir importar os módulos compartilhados da raiz do projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Na partida só entram módulos leves: boto3, selenium, requests e pyarrow (e, com o
+# pyarrow.dataset, o pandas) são importados no primeiro uso, dentro dos métodos, para que
+# --help, clean e os demais subcomandos não paguem pelo que não usam
+from b3_indices import (CSV_FILENAME_PATTERN, DEFAULT_INDEX, FILENAME_PATTERN, PORTFOLIO_OPERATIONS,
+                        RENAMED_FILENAME_PATTERN, csv_filename, index_from_filename, local_folder_name,
+                        normalize_index, parquet_filename, parse_index_list, parse_s3_prefix, s3_prefix)
+from download_watcher import snapshot_folder, wait_for_download
+from instrumentation import (METRICS, add_instrumentation_arguments, configure_from_args, get_logger,
+                             write_metrics)
+from parquet_options import ParquetWriteOptions, add_write_option_arguments, write_options_from_args
+from scheduler import DEFAULT_INTERVAL, DEFAULT_WEEKDAYS, DEFAULT_WINDOW
+
+# Metadado do objeto S3 com o hash SHA-256 do conteúdo enviado
+CONTENT_DIGEST_METADATA = 'content-sha256'
+
+# Chaves no layout particionado <índice>_data/ano=YYYY/mes=MM/dia=DD/ (ex.: ibov_data/)
+PARTITION_KEY_PATTERN = re.compile(r'/ano=(\d{4})/mes=(\d{2})/dia=(\d{2})/')
+
+logger = get_logger("main")
 
 class B3DataDownloader:
     def __init__(self):
@@ -21,7 +41,7 @@ class B3DataDownloader:
         load_dotenv()
         
         self.base_url = "https://sistemaswebb3-listados.b3.com.br"
-        self.page_url = f"{self.base_url}/indexPage/day/IBOV?language=pt-br"
+        self.page_url = self.index_page_url(DEFAULT_INDEX)
         # Criar pasta data na raiz do projeto de forma dinâmica
         project_root = os.path.dirname(os.path.abspath(__file__))
         self.data_folder = os.path.join(project_root, "data")
@@ -32,107 +52,111 @@ class B3DataDownloader:
         self.aws_secret = os.getenv('AWS_SECRET')
         self.aws_region = os.getenv('AWS_REGION')
         self.aws_bucket = os.getenv('AWS_BUCKET', 'zambra-ibovespa')
+        # Confirmar o acesso ao bucket (head_bucket) ao criar o cliente S3; desligado por padrão
+        # para que execuções pelo cron ou serverless não paguem uma requisição a mais
+        self.check_s3_bucket = os.getenv('S3_CHECK_BUCKET', 'false').lower() in ('1', 'true', 'sim', 'yes')
+        
+        # Recursos compartilhados entre downloads simultâneos de vários índices
+        self._lock = threading.Lock()
+        self._browser_lock = threading.Lock()
+        # Alterações pendentes dos índices de partições do S3 (chave -> origem, ou None se removida)
+        self._partition_index_lock = threading.Lock()
+        self._pending_index_updates = {}
         
-        # Initialize S3 client
-        self.s3_client = self.init_s3_client()
+        # Cliente S3 (criado no primeiro uso, ver a propriedade s3_client)
+        self._s3_lock = threading.Lock()
+        self._s3_client = None
+        self._s3_initialized = False
+        # Cliente com pool de conexões maior para uploads em lote (criado sob demanda)
+        self._transfer_client = None
+        self._transfer_pool_size = 0
+        
+        # Sessão HTTP da API da B3 (criada no primeiro uso)
+        self.http_client = None
+        
+        # Navegador headless reaproveitado entre downloads (aberto no primeiro uso)
+        self.browser = None
+        self.browser_max_uses = int(os.getenv('BROWSER_MAX_USES', '50'))
+        # Tempo máximo de espera pelo fim do download, em segundos
+        self.download_timeout = float(os.getenv('DOWNLOAD_TIMEOUT', '60'))
+        # Modo sem disco: gravar também o CSV baixado em src/data (arquivo de histórico)
+        self.stream_archive_csv = os.getenv('STREAM_ARCHIVE_CSV', 'false').lower() in ('1', 'true', 'sim', 'yes')
+        # Compressão, row groups e estatísticas dos Parquet gerados (variáveis PARQUET_*)
+        self.parquet_options = ParquetWriteOptions.from_env()
     
-    def convert_csv_to_parquet(self, csv_file_path):
+    def convert_csv_to_parquet(self, csv_file_path, index=None):
         """
         Converte arquivo CSV da B3 para formato Parquet usando a mesma lógica do conversor padrão
         IMPORTANTE: O arquivo CSV original NUNCA é removido, apenas convertido.
         
         Args:
             csv_file_path (str): Caminho do arquivo CSV
+            index (str): Código do índice; se None, é identificado pelo nome do arquivo
             
         Returns:
             str: Caminho do arquivo Parquet gerado, ou None se falhar
         """
         try:
-            filename = os.path.basename(csv_file_path)
-            print(f"Convertendo: {filename}")
-            
-            # Ler CSV ignorando as 2 primeiras linhas e sem header (seguindo lógica do conversor)
-            df = pd.read_csv(
-                csv_file_path, 
-                encoding='latin1', 
-                sep=';', 
-                skiprows=2,  # Pular as duas primeiras linhas (título e cabeçalho)
-                skipfooter=2,  # Pular as duas últimas linhas com informações agregadas
-                engine='python',  # Necessário para skipfooter
-                header=None  # Não há header
-            )
-            
-            print(f"  Colunas encontradas: {len(df.columns)}")
-            
-            # Remover a última coluna (que é vazia devido ao ; no final de cada linha)
-            df = df.iloc[:, :-1]
-            print(f"  Removida última coluna vazia. Colunas restantes: {len(df.columns)}")
+            from b3_csv_parser import parse_ibov_csv
+            from compaction import LocalPartitionStore
+            from partition_index import PartitionIndex
+            from portfolio_cache import invalidate_paths
             
-            # Verificar se temos exatamente 5 colunas após remoção
-            if len(df.columns) != 5:
-                raise ValueError(f"Esperado 5 colunas após remoção da coluna vazia, mas encontrado {len(df.columns)}")
-            
-            # Definir nomes das colunas conforme especificado no conversor padrão
-            df.columns = ['codigo', 'acao', 'tipo', 'qtde_teorica', 'participacao']
-            
-            print(f"  Primeiras linhas após processamento:\n{df.head(2)}")
-            
-            # Limpar dados seguindo a mesma lógica do conversor
-            # Converter qtde_teorica para numérico (remover pontos de milhares)
-            df['qtde_teorica'] = df['qtde_teorica'].astype(str).str.replace('.', '').astype(float)
+            filename = os.path.basename(csv_file_path)
+            index = index or index_from_filename(filename) or DEFAULT_INDEX
+            logger.debug(f"Convertendo: {filename}")
             
-            # Converter participacao para numérico (trocar vírgula por ponto)
-            df['participacao'] = df['participacao'].astype(str).str.replace(',', '.').astype(float)
+            # Data pelo nome do arquivo; senão, pela linha de título lida na mesma passada
+            date_info = self.extract_date_from_filename(filename)
+            today = datetime.now()
+            today_info = (today.strftime("%d"), today.strftime("%m"), today.strftime("%Y"))
             
-            # Limpar espaços em branco das colunas de texto
-            df['codigo'] = df['codigo'].astype(str).str.strip()
-            df['acao'] = df['acao'].astype(str).str.strip()
-            df['tipo'] = df['tipo'].astype(str).str.strip()
+            # Ler CSV em uma única passada (título, cabeçalho e rodapé localizados pelo parser)
+            with METRICS.timer("parse"):
+                table, title_date = parse_ibov_csv(csv_file_path, date_info, fallback_date=today_info)
+            METRICS.count("rows_parsed", table.num_rows)
             
-            # Extrair data para adicionar como coluna (SEMPRE criar a coluna data)
-            date_info = self.extract_date_from_filename(filename)
-            if not date_info:
-                # Fallback: tentar extrair do conteúdo do CSV
-                date_str_from_csv = self.extract_date_from_csv(csv_file_path)
-                if date_str_from_csv:
-                    day, month, year = date_str_from_csv.split('-')
-                    # Converter ano de 2 dígitos para 4 dígitos
-                    full_year = f"20{year}" if int(year) < 50 else f"19{year}"
-                    date_info = (day, month, full_year)
+            logger.debug(f"  Linhas lidas: {table.num_rows}")
+            # A amostra exige converter para pandas: só é montada com -v (nível DEBUG)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"  Primeiras linhas após processamento:\n{table.slice(0, 2).to_pandas()}")
             
+            date_info = date_info or title_date
             if date_info:
                 day, month, year = date_info
-                # Criar coluna data do tipo date no formato yyyy-mm-dd
                 data_str = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-                df['data'] = pd.to_datetime(data_str).date()
-                print(f"  Data adicionada: {data_str}")
+                logger.debug(f"  Data adicionada: {data_str}")
                 
                 # Criar timestamp de carga (formato: YYYYMMDD_HHMMSS)
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 
-                # Criar caminho particionado na pasta local ibov-data
-                partition_path = self.create_partitioned_path(day, month, year)
+                # Criar caminho particionado na pasta local do índice (ex.: ibov-data)
+                partition_path = self.create_partitioned_path(day, month, year, index)
                 
                 # Nome do arquivo com timestamp na pasta particionada
-                parquet_filename = f"{timestamp}_IBOVDia_{day}-{month}-{year[-2:]}.parquet"
-                parquet_path = os.path.join(partition_path, parquet_filename)
+                parquet_path = os.path.join(partition_path, parquet_filename(index, timestamp, day, month, year))
                 
-                print(f"  Salvando na estrutura particionada: ano={year}/mes={month.zfill(2)}/dia={day.zfill(2)}")
+                logger.debug(f"  Salvando na estrutura particionada: {local_folder_name(index)}/ano={year}/mes={month.zfill(2)}/dia={day.zfill(2)}")
             else:
-                # Fallback: usar data atual se não conseguir extrair
-                today = datetime.now()
-                data_str = today.strftime("%Y-%m-%d")
-                df['data'] = pd.to_datetime(data_str).date()
-                print(f"  Data atual adicionada (fallback): {data_str}")
-                
-                # Salvar na pasta data normal se não conseguir extrair data
+                # Fallback: data atual na coluna data e arquivo salvo na pasta data normal
+                logger.debug(f"  Data atual adicionada (fallback): {today.strftime('%Y-%m-%d')}")
                 parquet_path = csv_file_path.replace('.csv', '.parquet')
             
             # Converter para Parquet
-            df.to_parquet(parquet_path, index=False, engine='pyarrow')
+            footers = []
+            with METRICS.timer("write"):
+                self.parquet_options.write_table(table, parquet_path, metadata_collector=footers)
+            METRICS.count("parquet_bytes", os.path.getsize(parquet_path))
+            if date_info:
+                index_folder = os.path.join(self.data_folder, local_folder_name(index))
+                partition_index = PartitionIndex.load(LocalPartitionStore(index_folder))
+                relative_path = os.path.relpath(parquet_path, index_folder).replace(os.sep, "/")
+                partition_index.add(relative_path, footers[0], os.path.getsize(parquet_path))
+                partition_index.flush()
+                invalidate_paths(index, [relative_path])
             
-            print(f"✓ Convertido para: {os.path.relpath(parquet_path, self.data_folder)}")
-            print(f"  Linhas processadas: {len(df)}")
+            logger.info(f"✓ Convertido para: {os.path.relpath(parquet_path, self.data_folder)}")
+            logger.debug(f"  Linhas processadas: {table.num_rows}")
             
             # NUNCA remover o arquivo CSV original - conforme solicitado
             # O arquivo CSV original deve ser mantido sempre
@@ -140,35 +164,37 @@ class B3DataDownloader:
             return parquet_path
             
         except Exception as e:
-            print(f"✗ Erro ao converter {os.path.basename(csv_file_path)}: {str(e)}")
+            logger.error(f"✗ Erro ao converter {os.path.basename(csv_file_path)}: {str(e)}")
             return None
     
     def ensure_data_folder(self):
         """Cria a pasta /data se ela não existir"""
         if not os.path.exists(self.data_folder):
             os.makedirs(self.data_folder)
-            print(f"Pasta '{self.data_folder}' criada.")
+            logger.info(f"Pasta '{self.data_folder}' criada.")
         
         # Criar também a pasta ibov-data para estrutura particionada
-        self.ibov_data_folder = os.path.join(self.data_folder, "ibov-data")
+        self.ibov_data_folder = os.path.join(self.data_folder, local_folder_name(DEFAULT_INDEX))
         if not os.path.exists(self.ibov_data_folder):
             os.makedirs(self.ibov_data_folder)
-            print(f"Pasta '{self.ibov_data_folder}' criada.")
+            logger.info(f"Pasta '{self.ibov_data_folder}' criada.")
     
-    def create_partitioned_path(self, day, month, year):
+    def create_partitioned_path(self, day, month, year, index=DEFAULT_INDEX):
         """
-        Cria o caminho particionado ano=YYYY/mes=MM/dia=DD na pasta local ibov-data
+        Cria o caminho particionado ano=YYYY/mes=MM/dia=DD na pasta local do índice (ex.: ibov-data)
         
         Args:
             day (str): Dia (DD)
             month (str): Mês (MM)
             year (str): Ano (YYYY)
+            index (str): Código do índice
             
         Returns:
             str: Caminho da pasta particionada
         """
         partition_path = os.path.join(
-            self.ibov_data_folder, 
+            self.data_folder,
+            local_folder_name(index),
             f"ano={year}", 
             f"mes={month.zfill(2)}", 
             f"dia={day.zfill(2)}"
@@ -176,48 +202,192 @@ class B3DataDownloader:
         os.makedirs(partition_path, exist_ok=True)
         return partition_path
     
+    @property
+    def s3_client(self):
+        """
+        Cliente S3 compartilhado, criado no primeiro uso (ver init_s3_client)
+        
+        Returns:
+            boto3.client: Cliente S3, ou None se o S3 não estiver configurado
+        """
+        if not self._s3_initialized:
+            with self._s3_lock:
+                if not self._s3_initialized:
+                    self._s3_client = self.init_s3_client()
+                    self._s3_initialized = True
+        return self._s3_client
+    
     def init_s3_client(self):
-        """Inicializa o cliente S3"""
+        """
+        Inicializa o cliente S3
+        
+        Criar o cliente não acessa a rede: o bucket só é testado com head_bucket quando
+        check_s3_bucket está ligado (S3_CHECK_BUCKET ou --check-s3). Sem credenciais (.env,
+        variáveis padrão da AWS, ~/.aws ou perfil da instância), o cliente não é criado.
+        
+        Returns:
+            boto3.client: Cliente S3, ou None se não houver credenciais ou o teste falhar
+        """
         try:
-            s3_client = boto3.client(
-                's3',
+            import boto3
+            
+            session = boto3.session.Session(
                 aws_access_key_id=self.aws_access_key,
                 aws_secret_access_key=self.aws_secret,
                 region_name=self.aws_region
             )
-            # Test connection
-            s3_client.head_bucket(Bucket=self.aws_bucket)
-            print(f"Conectado ao bucket S3: {self.aws_bucket}")
+            if session.get_credentials() is None:
+                logger.error("Erro ao conectar ao S3: credenciais da AWS não encontradas")
+                return None
+            s3_client = session.client('s3')
+            if self.check_s3_bucket:
+                s3_client.head_bucket(Bucket=self.aws_bucket)
+                logger.info(f"Conectado ao bucket S3: {self.aws_bucket}")
             return s3_client
         except Exception as e:
-            print(f"Erro ao conectar ao S3: {str(e)}")
+            logger.error(f"Erro ao conectar ao S3: {str(e)}")
+            return None
+    
+    def index_page_url(self, index):
+        """URL da página do índice na B3 (ex.: .../indexPage/day/IBOV?language=pt-br)"""
+        return f"{self.base_url}/indexPage/day/{index}?language=pt-br"
+    
+    def download_with_api(self, index=DEFAULT_INDEX):
+        """
+        Método sem navegador: chama diretamente o endpoint usado pela página da B3
+        
+        Args:
+            index (str): Código do índice
+        """
+        try:
+            client = self.get_http_client()
+            logger.info(f"Baixando a carteira do {index} pela API da B3...")
+            start = time.perf_counter()
+            content = client.download_portfolio_csv(index)
+            logger.info(f"Resposta recebida em {time.perf_counter() - start:.2f}s ({len(content)} bytes)")
+            
+            from b3_csv_parser import extract_title_date, split_sections
+            
+            # Nomear o arquivo com a data do título, como o download feito pela página
+            title_date = extract_title_date(split_sections(content)[0])
+            if title_date:
+                day, month, year = title_date
+                filename = csv_filename(index, day, month, year)
+            else:
+                filename = f"{index}_{datetime.now().strftime('%Y%m%d')}.csv"
+            filepath = os.path.join(self.data_folder, filename)
+            
+            with open(filepath, 'wb') as f:
+                f.write(content)
+            logger.info(f"Arquivo baixado com sucesso: {filepath}")
+            
+            return self.process_downloaded_csv(filepath, index)
+            
+        except Exception as e:
+            logger.error(f"Erro ao baixar pela API: {str(e)}")
+            return None
+    
+    def download_streaming(self, index=DEFAULT_INDEX, trade_date=None, archive_csv=None, skip_unchanged=True):
+        """
+        Modo sem disco: baixa o CSV pela API, lê os bytes uma única vez (a data vem do
+        título, na mesma passada), gera o Parquet em memória e envia com put_object
+        
+        Args:
+            index (str): Código do índice
+            trade_date (date): Data da carteira; se None, a mais recente
+            archive_csv (bool): Se True, grava também o CSV em src/data (padrão: STREAM_ARCHIVE_CSV)
+            skip_unchanged (bool): Se True, não envia se a partição já tem um objeto com o mesmo conteúdo
+            
+        Returns:
+            str: URI s3:// do objeto enviado (ou já presente), ou None se falhar
+        """
+        if not self.s3_client:
+            logger.warning("Cliente S3 não está configurado.")
             return None
+        archive_csv = self.stream_archive_csv if archive_csv is None else archive_csv
+        
+        try:
+            from csv_to_parquet_converter import table_to_parquet_bytes
+            from pipeline import parse_portfolio
+            
+            start = time.perf_counter()
+            content = self.get_http_client().download_portfolio_csv(index, trade_date=trade_date)
+            table, (day, month, year) = parse_portfolio(content, trade_date)
+            payload = table_to_parquet_bytes(table, self.parquet_options)
+            logger.info(f"Carteira do {index} de {day}/{month}/{year}: {table.num_rows} linhas, "
+                        f"{len(content)} bytes de CSV -> {len(payload)} bytes de Parquet em memória")
+            
+            if archive_csv:
+                archive_path = os.path.join(self.data_folder, csv_filename(index, day, month, year))
+                with open(archive_path, 'wb') as f:
+                    f.write(content)
+                logger.info(f"CSV arquivado em: {archive_path}")
+            
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            s3_key = self.upload_parquet_bytes(payload, parquet_filename(index, timestamp, day, month, year),
+                                               f"{day}-{month}-{year[-2:]}", index, skip_unchanged)
+            if not s3_key:
+                return None
+            logger.info(f"Concluído em {time.perf_counter() - start:.2f}s, sem arquivos temporários")
+            return f"s3://{self.aws_bucket}/{s3_key}"
+        except Exception as e:
+            logger.error(f"Erro no modo sem disco: {str(e)}")
+            return None
+    
+    def get_http_client(self):
+        """
+        Retorna o cliente HTTP compartilhado (sessão com pool de conexões e novas tentativas)
+        
+        Returns:
+            B3IndexClient: Cliente da API da B3
+        """
+        with self._lock:
+            if self.http_client is None:
+                from b3_http_client import B3IndexClient
+                self.http_client = B3IndexClient(self.base_url)
+        return self.http_client
     
-    def download_with_selenium(self):
+    def download_with_selenium(self, index=DEFAULT_INDEX):
         """
         Método usando Selenium para lidar com JavaScript
+        
+        O navegador é compartilhado: com vários índices em paralelo, apenas um download
+        usa o navegador por vez; a conversão e o upload seguem fora do bloqueio.
+        
+        Args:
+            index (str): Código do índice
         """
-        # Configurações do Chrome para download automático
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")  # Executar em modo headless
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        
-        # Configurar pasta de download
-        download_path = os.path.abspath(self.data_folder)
-        prefs = {
-            "download.default_directory": download_path,
-            "download.prompt_for_download": False,
-            "download.directory_upgrade": True,
-            "safebrowsing.enabled": True
-        }
-        chrome_options.add_experimental_option("prefs", prefs)
+        with self._browser_lock, METRICS.timer("download"):
+            latest_file = self._fetch_with_selenium(index)
+        if not latest_file:
+            return None
+        
+        # Se for um arquivo ZIP, precisamos extrair primeiro
+        if latest_file.endswith('.zip'):
+            # Implementar extração de ZIP se necessário
+            logger.info("Arquivo ZIP encontrado. Extração não implementada.")
+            self.upload_to_s3(latest_file, index)
+            return latest_file
+        
+        return self.process_downloaded_csv(latest_file, index)
+    
+    def _fetch_with_selenium(self, index):
+        """
+        Abre a página do índice no navegador aquecido e espera o download terminar
+        
+        Returns:
+            str: Caminho do arquivo baixado, ou None se falhar
+        """
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
         
-        driver = None
+        browser = self.get_browser_session()
         try:
-            driver = webdriver.Chrome(options=chrome_options)
-            print("Acessando a página...")
-            driver.get(self.page_url)
+            # Reaproveitar o navegador aquecido entre downloads
+            driver = browser.acquire()
+            logger.debug(f"Acessando a página do {index}...")
+            driver.get(self.index_page_url(index))
             
             # Aguardar página carregar
             wait = WebDriverWait(driver, 20)
@@ -231,9 +401,9 @@ class B3DataDownloader:
                 download_link = wait.until(
                     EC.element_to_be_clickable((By.XPATH, "//a[contains(text(), 'Download')]"))
                 )
-                print("Link de download encontrado!")
+                logger.debug("Link de download encontrado!")
             except:
-                print("Link de download com texto 'Download' não encontrado.")
+                logger.debug("Link de download com texto 'Download' não encontrado.")
             
             # Estratégia 2: Procurar por elementos com ícone de download
             if not download_link:
@@ -241,98 +411,149 @@ class B3DataDownloader:
                     download_elements = driver.find_elements(By.XPATH, "//img[contains(@src, 'download')]/..")
                     if download_elements:
                         download_link = download_elements[0]
-                        print("Elemento com ícone de download encontrado!")
+                        logger.debug("Elemento com ícone de download encontrado!")
                 except:
-                    print("Elemento com ícone de download não encontrado.")
+                    logger.debug("Elemento com ícone de download não encontrado.")
             
             # Estratégia 3: Procurar por qualquer link que possa ser de download
             if not download_link:
                 try:
-                    # Procurar por links que contenham IBOV na URL
+                    # Procurar por links que contenham o código do índice na URL
                     links = driver.find_elements(By.TAG_NAME, "a")
                     for link in links:
                         href = link.get_attribute("href")
-                        if href and ("download" in href.lower() or "IBOV" in href):
+                        if href and ("download" in href.lower() or index in href):
                             download_link = link
-                            print(f"Link potencial encontrado: {href}")
+                            logger.debug(f"Link potencial encontrado: {href}")
                             break
                 except:
                     pass
             
             if download_link:
-                print("Clicando no link de download...")
+                # Registrar os arquivos existentes para identificar exatamente o novo download
+                before = snapshot_folder(self.data_folder)
+                
+                logger.debug("Clicando no link de download...")
                 driver.execute_script("arguments[0].click();", download_link)
                 
-                # Aguardar download iniciar/completar
-                time.sleep(10)
+                # Aguardar o download terminar (retorna assim que o arquivo estiver completo)
+                start = time.perf_counter()
+                latest_file = wait_for_download(self.data_folder, before, timeout=self.download_timeout)
+                if latest_file:
+                    logger.info(f"Download concluído em {time.perf_counter() - start:.2f}s")
                 
                 # Limpar downloads duplicados
                 self.remove_duplicate_downloads()
                 
-                # Verificar se arquivo foi baixado
-                files = os.listdir(self.data_folder)
-                csv_files = [f for f in files if f.endswith('.csv') or f.endswith('.zip')]
+                if latest_file and not os.path.exists(latest_file):
+                    # O novo download era uma cópia "(n)" de um arquivo já existente
+                    latest_file = re.sub(r' \(\d+\)(\.\w+)$', r'\1', latest_file)
                 
-                if csv_files:
-                    latest_file = max([os.path.join(self.data_folder, f) for f in csv_files], 
-                                    key=os.path.getctime)
-                    print(f"Arquivo baixado com sucesso: {latest_file}")
-                    
-                    # Se for um arquivo ZIP, precisamos extrair primeiro
-                    if latest_file.endswith('.zip'):
-                        # Implementar extração de ZIP se necessário
-                        print("Arquivo ZIP encontrado. Extração não implementada.")
-                        self.upload_to_s3(latest_file)
-                        return latest_file
-                    
-                    # Primeiro, tentar renomear o arquivo para o formato padrão se necessário
-                    renamed_file = self.rename_file_with_date_format(latest_file)
-                    if renamed_file:
-                        latest_file = renamed_file
-                    
-                    # Converter CSV para Parquet
-                    parquet_file = self.convert_csv_to_parquet(latest_file)
-                    if parquet_file:
-                        print(f"Arquivo convertido para Parquet: {parquet_file}")
-                        
-                        # Extrair a data do arquivo para o particionamento
-                        date_part = self.extract_date_from_csv(latest_file)
-                        if not date_part:
-                            # Fallback: tentar extrair do nome do arquivo
-                            filename = os.path.basename(parquet_file)
-                            if "IBOVDia" in filename and filename.endswith(".parquet"):
-                                date_match = re.search(r'(\d{2}-\d{2}-\d{2})', filename)
-                                if date_match:
-                                    date_part = date_match.group(1)
-                                    print(f"Data extraída do nome do arquivo: {date_part}")
-                        
-                        if date_part:
-                            # Upload para S3 com particionamento
-                            self.upload_to_s3_partitioned(parquet_file, date_part)
-                            print(f"Data utilizada para particionamento: {date_part}")
-                        else:
-                            # Fallback para upload padrão se não conseguir extrair a data
-                            print("Não foi possível extrair a data, usando upload padrão")
-                            self.upload_to_s3(parquet_file)
-                        return parquet_file
-                    else:
-                        # Se falhar na conversão, fazer upload do CSV original
-                        print("Falha na conversão, fazendo upload do CSV original")
-                        self.upload_to_s3(latest_file)
-                        return latest_file
+                if latest_file and os.path.exists(latest_file):
+                    logger.info(f"Arquivo baixado com sucesso: {latest_file}")
+                    return latest_file
                 else:
-                    print("Nenhum arquivo CSV/ZIP foi encontrado na pasta de download.")
+                    logger.warning(f"Nenhum arquivo CSV/ZIP novo apareceu na pasta de download em {self.download_timeout}s.")
                     return None
             else:
-                print("Não foi possível encontrar o link de download.")
+                logger.warning("Não foi possível encontrar o link de download.")
                 return None
                 
         except Exception as e:
-            print(f"Erro ao baixar com Selenium: {str(e)}")
+            logger.error(f"Erro ao baixar com Selenium: {str(e)}")
+            # Estado do navegador é incerto após uma falha: abrir um novo no próximo uso
+            browser.quit()
             return None
-        finally:
-            if driver:
-                driver.quit()
+    
+    def process_downloaded_csv(self, latest_file, index=DEFAULT_INDEX):
+        """
+        Renomeia, converte para Parquet e envia ao S3 um CSV recém-baixado
+        
+        Args:
+            latest_file (str): Caminho do CSV baixado
+            index (str): Código do índice
+            
+        Returns:
+            str: Caminho do Parquet gerado (ou do CSV, se a conversão falhar)
+        """
+        # Primeiro, tentar renomear o arquivo para o formato padrão se necessário
+        renamed_file = self.rename_file_with_date_format(latest_file, index)
+        if renamed_file:
+            latest_file = renamed_file
+        
+        # Converter CSV para Parquet
+        parquet_file = self.convert_csv_to_parquet(latest_file, index)
+        if parquet_file:
+            logger.info(f"Arquivo convertido para Parquet: {parquet_file}")
+            
+            # Extrair a data do arquivo para o particionamento
+            date_part = self.extract_date_from_csv(latest_file)
+            if not date_part:
+                # Fallback: tentar extrair do nome do arquivo
+                filename = os.path.basename(parquet_file)
+                if f"{index}Dia" in filename and filename.endswith(".parquet"):
+                    date_match = re.search(r'(\d{2}-\d{2}-\d{2})', filename)
+                    if date_match:
+                        date_part = date_match.group(1)
+                        logger.debug(f"Data extraída do nome do arquivo: {date_part}")
+                elif filename.startswith(f"{index}_") and filename.endswith(".parquet"):
+                    # Nome gerado pelo download via requests: <ÍNDICE>_yyyymmdd
+                    date_str = filename[len(index) + 1:-8]  # Remove "<ÍNDICE>_" e ".parquet"
+                    if len(date_str) == 8 and date_str.isdigit():
+                        # Converter yyyymmdd para dd-mm-yy
+                        date_part = f"{date_str[6:8]}-{date_str[4:6]}-{date_str[2:4]}"
+                        logger.debug(f"Data extraída e convertida: {date_part}")
+            
+            if date_part:
+                # Upload para S3 com particionamento
+                self.upload_to_s3_partitioned(parquet_file, date_part, index=index)
+                logger.debug(f"Data utilizada para particionamento: {date_part}")
+            else:
+                # Fallback para upload padrão se não conseguir extrair a data
+                logger.warning("Não foi possível extrair a data, usando upload padrão")
+                self.upload_to_s3(parquet_file, index)
+            return parquet_file
+        else:
+            # Se falhar na conversão, fazer upload do CSV original
+            logger.error("Falha na conversão, fazendo upload do CSV original")
+            self.upload_to_s3(latest_file, index)
+            return latest_file
+    
+    def get_browser_session(self):
+        """
+        Retorna a sessão de navegador compartilhada, criando-a no primeiro uso
+        
+        Returns:
+            BrowserSession: Sessão com o Chrome headless aquecido
+        """
+        with self._lock:
+            if self.browser is None:
+                from browser_session import BrowserSession
+                self.browser = BrowserSession(os.path.abspath(self.data_folder), max_uses=self.browser_max_uses)
+        return self.browser
+    
+    def close(self):
+        """
+        Grava as alterações pendentes do índice de partições do S3, fecha o navegador
+        aquecido e exibe as latências de partida a frio e reaproveitamento
+        """
+        self.flush_s3_partition_index()
+        if self.http_client is not None:
+            self.http_client.close()
+            self.http_client = None
+        if self.browser is not None:
+            summary = self.browser.timing_summary()
+            if summary["cold_count"] or summary["warm_count"]:
+                logger.info(f"Navegador: {summary['cold_count']} partida(s) a frio (média {summary['cold_avg_ms']} ms), "
+                            f"{summary['warm_count']} reaproveitamento(s) (média {summary['warm_avg_ms']} ms)")
+            self.browser.quit()
+            self.browser = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
     
     def remove_duplicate_downloads(self):
         """
@@ -340,11 +561,11 @@ class B3DataDownloader:
         Ex: IBOVDia_22-07-25.csv (original)
             IBOVDia_22-07-25 (1).csv (duplicado)
         """
-        print("Verificando arquivos duplicados...")
+        logger.info("Verificando arquivos duplicados...")
         files = os.listdir(self.data_folder)
         
-        # Regex para encontrar arquivos duplicados como "IBOVDia_dd-mm-yy (n).csv"
-        duplicate_pattern = re.compile(r"(IBOVDia_\d{2}-\d{2}-\d{2}) \(\d+\)\.csv")
+        # Regex para encontrar arquivos duplicados como "<ÍNDICE>Dia_dd-mm-yy (n).csv"
+        duplicate_pattern = re.compile(r"([A-Z0-9]+Dia_\d{2}-\d{2}-\d{2}) \(\d+\)\.csv")
         
         originals = set()
         duplicates = []
@@ -354,25 +575,25 @@ class B3DataDownloader:
             if match:
                 # É um arquivo duplicado
                 duplicates.append(f)
-            elif f.startswith("IBOVDia_") and f.endswith(".csv"):
+            elif CSV_FILENAME_PATTERN.match(f):
                 # É um arquivo original
                 originals.add(f)
                 
         if not duplicates:
-            print("Nenhum arquivo duplicado encontrado.")
+            logger.info("Nenhum arquivo duplicado encontrado.")
             return
             
         for dup in duplicates:
             try:
                 dup_path = os.path.join(self.data_folder, dup)
                 os.remove(dup_path)
-                print(f"Arquivo duplicado removido: {dup}")
+                logger.info(f"Arquivo duplicado removido: {dup}")
             except OSError as e:
-                print(f"Erro ao remover {dup}: {e}")
+                logger.error(f"Erro ao remover {dup}: {e}")
 
     def extract_date_from_filename(self, filename):
         """
-        Extrai a data do nome do arquivo no formato IBOVDia_dd-mm-yy.csv
+        Extrai a data do nome do arquivo no formato <ÍNDICE>Dia_dd-mm-yy.csv
         
         Args:
             filename (str): Nome do arquivo
@@ -380,12 +601,11 @@ class B3DataDownloader:
         Returns:
             tuple: (dia, mes, ano) ou None se não conseguir extrair
         """
-        # Padrão para IBOVDia_dd-mm-yy.csv
-        pattern = r'IBOVDia_(\d{2})-(\d{2})-(\d{2})\.csv'
-        match = re.search(pattern, filename)
+        # Padrão para IBOVDia_dd-mm-yy.csv (e equivalentes dos demais índices)
+        match = CSV_FILENAME_PATTERN.search(filename)
         
         if match:
-            day, month, year = match.groups()
+            _, day, month, year = match.groups()
             # Converter ano de 2 dígitos para 4 dígitos
             full_year = f"20{year}" if int(year) < 50 else f"19{year}"
             return day, month, full_year
@@ -405,9 +625,9 @@ class B3DataDownloader:
         try:
             with open(file_path, 'r', encoding='latin1') as file:
                 first_line = file.readline().strip()
-                # Procurar padrão "IBOV - Carteira do Dia dd/mm/yy"
+                # Procurar padrão "<ÍNDICE> - Carteira do Dia dd/mm/yy"
                 import re
-                date_match = re.search(r'IBOV - Carteira do Dia (\d{2}/\d{2}/\d{2})', first_line)
+                date_match = re.search(r'[A-Z0-9]+ - Carteira do Dia (\d{2}/\d{2}/\d{2})', first_line)
                 if date_match:
                     date_str = date_match.group(1)
                     # Converter dd/mm/yy para dd-mm-yy (formato do nome do arquivo)
@@ -415,27 +635,28 @@ class B3DataDownloader:
                     return f"{day}-{month}-{year}"
                 return None
         except Exception as e:
-            print(f"Erro ao extrair data do CSV {file_path}: {str(e)}")
+            logger.error(f"Erro ao extrair data do CSV {file_path}: {str(e)}")
             return None
             
-    def rename_file_with_date_format(self, file_path):
+    def rename_file_with_date_format(self, file_path, index=DEFAULT_INDEX):
         """
-        Renomeia o arquivo para o formato IBOVDia-yy-mm-dd.csv com base na data extraída do conteúdo.
+        Renomeia o arquivo para o formato <ÍNDICE>Dia-yy-mm-dd.csv com base na data extraída do conteúdo.
         
         Args:
             file_path (str): Caminho completo para o arquivo CSV
+            index (str): Código do índice
             
         Returns:
             str: Novo caminho do arquivo, ou None se falhar
         """
         if not os.path.exists(file_path):
-            print(f"Arquivo não encontrado: {file_path}")
+            logger.warning(f"Arquivo não encontrado: {file_path}")
             return None
             
         # Extrair a data do conteúdo do CSV
         date_str = self.extract_date_from_csv(file_path)
         if not date_str:
-            print(f"Não foi possível extrair a data do arquivo: {file_path}")
+            logger.warning(f"Não foi possível extrair a data do arquivo: {file_path}")
             return None
             
         # Converter formato dd-mm-yy para yy-mm-dd
@@ -443,27 +664,32 @@ class B3DataDownloader:
         new_date_str = f"{year}-{month}-{day}"
         
         # Criar novo nome de arquivo
-        new_filename = f"IBOVDia-{new_date_str}.csv"
+        new_filename = f"{index}Dia-{new_date_str}.csv"
         new_file_path = os.path.join(self.data_folder, new_filename)
         
         # Verificar se o arquivo com o novo nome já existe
         if os.path.exists(new_file_path):
-            print(f"Arquivo já existe com o novo nome: {new_file_path}")
+            logger.warning(f"Arquivo já existe com o novo nome: {new_file_path}")
             return new_file_path
             
         try:
             # Renomear o arquivo
             os.rename(file_path, new_file_path)
-            print(f"Arquivo renomeado: {os.path.basename(file_path)} -> {os.path.basename(new_file_path)}")
+            logger.info(f"Arquivo renomeado: {os.path.basename(file_path)} -> {os.path.basename(new_file_path)}")
             return new_file_path
         except Exception as e:
-            print(f"Erro ao renomear arquivo {file_path}: {str(e)}")
+            logger.error(f"Erro ao renomear arquivo {file_path}: {str(e)}")
             return None
     
-    def download_with_requests(self):
+    def download_with_requests(self, index=DEFAULT_INDEX):
         """
         Método usando requests para tentar download direto
+        
+        Args:
+            index (str): Código do índice
         """
+        import requests
+        
         session = requests.Session()
         
         # Headers para simular um navegador
@@ -477,267 +703,1198 @@ class B3DataDownloader:
         }
         
         try:
-            print("Tentando acessar a página para obter cookies...")
-            response = session.get(self.page_url, headers=headers)
+            logger.debug("Tentando acessar a página para obter cookies...")
+            with METRICS.timer("download"):
+                response = session.get(self.index_page_url(index), headers=headers)
             
             if response.status_code == 200:
-                print("Página acessada com sucesso!")
+                logger.debug("Página acessada com sucesso!")
                 
                 # Tentar algumas URLs possíveis para download
                 download_urls = [
-                    f"{self.base_url}/indexPage/day/IBOV/download?language=pt-br",
-                    f"{self.base_url}/indexPage/day/IBOV.csv?language=pt-br",
-                    f"{self.base_url}/indexPage/day/IBOV?download=true&language=pt-br",
+                    f"{self.base_url}/indexPage/day/{index}/download?language=pt-br",
+                    f"{self.base_url}/indexPage/day/{index}.csv?language=pt-br",
+                    f"{self.base_url}/indexPage/day/{index}?download=true&language=pt-br",
                 ]
                 
                 for url in download_urls:
-                    print(f"Tentando baixar de: {url}")
+                    logger.debug(f"Tentando baixar de: {url}")
                     try:
-                        download_response = session.get(url, headers=headers)
+                        with METRICS.timer("download"):
+                            download_response = session.get(url, headers=headers)
                         
                         if download_response.status_code == 200:
                             content_type = download_response.headers.get('content-type', '')
                             
                             if 'csv' in content_type or 'application/octet-stream' in content_type:
-                                filename = f"IBOV_{datetime.now().strftime('%Y%m%d')}.csv"
+                                filename = f"{index}_{datetime.now().strftime('%Y%m%d')}.csv"
                                 filepath = os.path.join(self.data_folder, filename)
                                 
                                 with open(filepath, 'wb') as f:
                                     f.write(download_response.content)
+                                METRICS.count("download_bytes", len(download_response.content))
                                 
-                                print(f"Arquivo baixado com sucesso: {filepath}")
+                                logger.info(f"Arquivo baixado com sucesso: {filepath}")
                                 
-                                # Primeiro, tentar renomear o arquivo para o formato padrão se necessário
-                                renamed_file = self.rename_file_with_date_format(filepath)
-                                if renamed_file:
-                                    filepath = renamed_file
-                                
-                                # Converter CSV para Parquet
-                                parquet_file = self.convert_csv_to_parquet(filepath)
-                                if parquet_file:
-                                    print(f"Arquivo convertido para Parquet: {parquet_file}")
-                                    
-                                    # Extrair a data do arquivo para o particionamento
-                                    date_part = self.extract_date_from_csv(filepath)
-                                    if not date_part:
-                                        # Fallback: tentar extrair do nome do arquivo
-                                        filename = os.path.basename(parquet_file)
-                                        if filename.startswith("IBOV_") and filename.endswith(".parquet"):
-                                            # Extrair yyyymmdd do nome do arquivo e converter para dd-mm-yy
-                                            date_str = filename[5:-8]  # Remove "IBOV_" e ".parquet"
-                                            if len(date_str) == 8 and date_str.isdigit():
-                                                # Converter yyyymmdd para dd-mm-yy
-                                                year = date_str[2:4]  # Pegar apenas os dois últimos dígitos do ano
-                                                month = date_str[4:6]
-                                                day = date_str[6:8]
-                                                date_part = f"{day}-{month}-{year}"
-                                                print(f"Data extraída e convertida: {date_part}")
-                                    
-                                    if date_part:
-                                        # Upload para S3 com particionamento
-                                        self.upload_to_s3_partitioned(parquet_file, date_part)
-                                        print(f"Data utilizada para particionamento: {date_part}")
-                                    else:
-                                        # Fallback para upload padrão se não conseguir extrair a data
-                                        print("Não foi possível extrair a data, usando upload padrão")
-                                        self.upload_to_s3(parquet_file)
-                                    return parquet_file
-                                else:
-                                    # Se falhar na conversão, fazer upload do CSV original
-                                    print("Falha na conversão, fazendo upload do CSV original")
-                                    self.upload_to_s3(filepath)
-                                    return filepath
+                                # Mesmo pós-processamento do Selenium e da API
+                                return self.process_downloaded_csv(filepath, index)
                             
                     except Exception as e:
-                        print(f"Erro ao tentar URL {url}: {str(e)}")
+                        logger.error(f"Erro ao tentar URL {url}: {str(e)}")
                         continue
                 
-                print("Não foi possível baixar o arquivo com requests.")
+                logger.warning("Não foi possível baixar o arquivo com requests.")
                 return None
             else:
-                print(f"Erro ao acessar a página: {response.status_code}")
+                logger.error(f"Erro ao acessar a página: {response.status_code}")
                 return None
                 
         except Exception as e:
-            print(f"Erro geral no método requests: {str(e)}")
+            logger.error(f"Erro geral no método requests: {str(e)}")
             return None
     
-    def upload_to_s3_partitioned(self, file_path, date_str):
+    def upload_to_s3_partitioned(self, file_path, date_str, skip_unchanged=True, index=None, portfolio="day"):
         """
         Faz upload do arquivo para o bucket S3 com particionamento por data
         
         Args:
             file_path (str): Caminho do arquivo local
             date_str (str): Data no formato dd-mm-yy ou yy-mm-dd
+            skip_unchanged (bool): Se True, não envia se a partição já tem um objeto com o mesmo conteúdo
+            index (str): Código do índice; se None, é identificado pelo nome do arquivo
+            portfolio (str): Tipo de carteira (define o prefixo, ver b3_indices.s3_prefix)
             
         Returns:
-            bool: True se upload bem-sucedido, False caso contrário
+            bool: True se upload bem-sucedido (ou conteúdo já presente), False caso contrário
         """
         if not self.s3_client:
-            print("Cliente S3 não está configurado.")
+            logger.warning("Cliente S3 não está configurado.")
             return False
         
         try:
-            # Extrair componentes da data (pode vir em formato dd-mm-yy ou yy-mm-dd)
-            parts = date_str.split('-')
-            
-            # Se o primeiro componente tem 2 dígitos e é > 31, é ano (formato yy-mm-dd)
-            # Se o primeiro componente tem 2 dígitos e é <= 31, é dia (formato dd-mm-yy)
-            if len(parts[0]) == 2 and int(parts[0]) > 31:
-                # Formato yy-mm-dd
-                year, month, day = parts
-            else:
-                # Formato dd-mm-yy
-                day, month, year = parts
-            
-            # Converter ano para 4 dígitos
-            if len(year) == 2:
-                full_year = f"20{year}" if int(year) < 50 else f"19{year}"
-            else:
-                full_year = year
+            s3_key = self.build_partitioned_s3_key(file_path, date_str, index, portfolio)
+            md5_hex, sha256_hex = self.compute_file_digests(file_path)
             
-            # Garantir que mês e dia tenham 2 dígitos
-            month = month.zfill(2)
-            day = day.zfill(2)
+            if skip_unchanged:
+                existing_key = self.find_identical_object(self.s3_client, s3_key, md5_hex, sha256_hex,
+                                                          os.path.getsize(file_path))
+                if existing_key:
+                    logger.info(f"Conteúdo já presente no S3, upload ignorado: {existing_key}")
+                    METRICS.count("uploads_skipped")
+                    return True
             
-            # Criar chave com particionamento
-            filename = os.path.basename(file_path)
-            s3_key = f"ibov_data/ano={full_year}/mes={month}/dia={day}/{filename}"
-            
-            print(f"Fazendo upload para S3: {s3_key}")
-            self.s3_client.upload_file(file_path, self.aws_bucket, s3_key)
+            logger.info(f"Fazendo upload para S3: {s3_key}")
+            with METRICS.timer("upload"):
+                self.s3_client.upload_file(
+                    file_path, self.aws_bucket, s3_key,
+                    ExtraArgs={'Metadata': {CONTENT_DIGEST_METADATA: sha256_hex}}
+                )
+            METRICS.count("upload_bytes", os.path.getsize(file_path))
+            self.update_s3_partition_index(added=[(s3_key, file_path)])
             
-            print(f"Upload para S3 concluído com sucesso!")
-            print(f"Arquivo particionado por: ano={full_year}/mes={month}/dia={day}")
+            logger.info(f"Upload para S3 concluído com sucesso!")
+            logger.debug(f"Arquivo particionado por: {os.path.dirname(s3_key).split('/', 1)[1]}")
             return True
         except Exception as e:
-            print(f"Erro ao fazer upload para S3: {str(e)}")
+            logger.error(f"Erro ao fazer upload para S3: {str(e)}")
             return False
     
-    def upload_to_s3(self, file_path):
+    def upload_parquet_bytes(self, payload, filename, date_str, index=None, skip_unchanged=True, portfolio="day"):
+        """
+        Envia um Parquet gerado em memória para a partição do S3 com put_object
+        
+        Args:
+            payload (bytes): Conteúdo do arquivo Parquet
+            filename (str): Nome do objeto (ex.: 20250722_183000_IBOVDia_22-07-25.parquet)
+            date_str (str): Data no formato dd-mm-yy ou yy-mm-dd
+            index (str): Código do índice; se None, é identificado pelo nome do arquivo
+            skip_unchanged (bool): Se True, não envia se a partição já tem um objeto com o mesmo conteúdo
+            portfolio (str): Tipo de carteira (define o prefixo, ver b3_indices.s3_prefix)
+            
+        Returns:
+            str: Chave do objeto enviado (ou do objeto idêntico já presente), ou None se falhar
+        """
+        if not self.s3_client:
+            logger.warning("Cliente S3 não está configurado.")
+            return None
+        
+        try:
+            s3_key = self.build_partitioned_s3_key(filename, date_str, index, portfolio)
+            md5_hex = hashlib.md5(payload).hexdigest()
+            sha256_hex = hashlib.sha256(payload).hexdigest()
+            
+            if skip_unchanged:
+                existing_key = self.find_identical_object(self.s3_client, s3_key, md5_hex, sha256_hex, len(payload))
+                if existing_key:
+                    logger.info(f"Conteúdo já presente no S3, upload ignorado: {existing_key}")
+                    METRICS.count("uploads_skipped")
+                    return existing_key
+            
+            logger.info(f"Fazendo upload para S3: {s3_key}")
+            with METRICS.timer("upload"):
+                self.s3_client.put_object(
+                    Bucket=self.aws_bucket, Key=s3_key, Body=payload,
+                    Metadata={CONTENT_DIGEST_METADATA: sha256_hex}
+                )
+            METRICS.count("upload_bytes", len(payload))
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            self.update_s3_partition_index(added=[(s3_key, pq.read_metadata(pa.BufferReader(payload)), len(payload))])
+            return s3_key
+        except Exception as e:
+            logger.error(f"Erro ao fazer upload para S3: {str(e)}")
+            return None
+    
+    def build_partitioned_s3_key(self, file_path, date_str, index=None, portfolio="day"):
+        """
+        Monta a chave S3 particionada <índice>_data/ano=YYYY/mes=MM/dia=DD/<arquivo>
+        
+        Args:
+            file_path (str): Caminho do arquivo local
+            date_str (str): Data no formato dd-mm-yy ou yy-mm-dd
+            index (str): Código do índice; se None, é identificado pelo nome do arquivo (padrão: IBOV)
+            portfolio (str): Tipo de carteira; as que não são a do dia têm prefixo próprio
+                (ex.: ibov_theoretical_data/)
+            
+        Returns:
+            str: Chave do objeto no bucket
+        """
+        # Extrair componentes da data (pode vir em formato dd-mm-yy ou yy-mm-dd)
+        parts = date_str.split('-')
+        
+        # Se o primeiro componente tem 2 dígitos e é > 31, é ano (formato yy-mm-dd)
+        # Se o primeiro componente tem 2 dígitos e é <= 31, é dia (formato dd-mm-yy)
+        if len(parts[0]) == 2 and int(parts[0]) > 31:
+            # Formato yy-mm-dd
+            year, month, day = parts
+        else:
+            # Formato dd-mm-yy
+            day, month, year = parts
+        
+        # Converter ano para 4 dígitos
+        if len(year) == 2:
+            full_year = f"20{year}" if int(year) < 50 else f"19{year}"
+        else:
+            full_year = year
+        
+        # Garantir que mês e dia tenham 2 dígitos
+        month = month.zfill(2)
+        day = day.zfill(2)
+        
+        filename = os.path.basename(file_path)
+        index = index or index_from_filename(filename) or DEFAULT_INDEX
+        return f"{s3_prefix(index, portfolio)}ano={full_year}/mes={month}/dia={day}/{filename}"
+    
+    def compute_file_digests(self, file_path):
+        """
+        Calcula os hashes MD5 (comparável ao ETag de uploads simples) e SHA-256 do arquivo
+        
+        Args:
+            file_path (str): Caminho do arquivo local
+            
+        Returns:
+            tuple: (md5 em hexadecimal, sha256 em hexadecimal)
+        """
+        md5 = hashlib.md5()
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                md5.update(chunk)
+                sha256.update(chunk)
+        return md5.hexdigest(), sha256.hexdigest()
+    
+    def find_identical_object(self, client, s3_key, md5_hex, sha256_hex, size):
+        """
+        Procura na partição do s3_key um objeto com o mesmo conteúdo do arquivo local
+        
+        O ETag é comparado diretamente com o MD5 (uploads simples). Para os demais
+        objetos de mesmo tamanho (ex.: uploads multipart), o hash SHA-256 gravado
+        nos metadados é consultado com head_object.
+        
+        Args:
+            client (boto3.client): Cliente S3
+            s3_key (str): Chave de destino do upload
+            md5_hex (str): MD5 do arquivo local
+            sha256_hex (str): SHA-256 do arquivo local
+            size (int): Tamanho do arquivo local em bytes
+            
+        Returns:
+            str: Chave do objeto idêntico, ou None se não existir
+        """
+        prefix = s3_key.rsplit('/', 1)[0] + '/'
+        candidates = []
+        with METRICS.timer("s3_list"):
+            paginator = client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.aws_bucket, Prefix=prefix):
+                for item in page.get('Contents', []):
+                    if item['ETag'].strip('"') == md5_hex:
+                        return item['Key']
+                    if item['Size'] == size:
+                        candidates.append(item['Key'])
+            
+            for key in candidates:
+                head = client.head_object(Bucket=self.aws_bucket, Key=key)
+                if head.get('Metadata', {}).get(CONTENT_DIGEST_METADATA) == sha256_hex:
+                    return key
+        return None
+    
+    def get_transfer_client(self, max_workers=8, max_attempts=3):
+        """
+        Retorna um cliente S3 compartilhado, com pool de conexões dimensionado para
+        uploads concorrentes. O cliente é criado uma vez e reutilizado entre lotes.
+        
+        Args:
+            max_workers (int): Número de uploads simultâneos
+            max_attempts (int): Tentativas do próprio botocore por requisição
+            
+        Returns:
+            boto3.client: Cliente S3
+        """
+        import boto3
+        from botocore.config import Config as BotoConfig
+        
+        pool_size = max_workers * 2
+        with self._lock:
+            if self._transfer_client is None or self._transfer_pool_size < pool_size:
+                self._transfer_client = boto3.client(
+                    's3',
+                    aws_access_key_id=self.aws_access_key,
+                    aws_secret_access_key=self.aws_secret,
+                    region_name=self.aws_region,
+                    config=BotoConfig(
+                        max_pool_connections=pool_size,
+                        retries={'max_attempts': max_attempts, 'mode': 'adaptive'},
+                    ),
+                )
+                self._transfer_pool_size = pool_size
+            return self._transfer_client
+    
+    def upload_batch_to_s3_partitioned(self, items, max_workers=8, multipart_threshold=8 * 1024 * 1024,
+                                       multipart_chunksize=8 * 1024 * 1024, max_attempts=3,
+                                       retry_backoff=0.5, skip_unchanged=True, index=None, portfolio="day"):
+        """
+        Faz upload concorrente de vários arquivos para o S3 com particionamento por data
+        
+        Args:
+            items (list): Pares (caminho do arquivo, data dd-mm-yy ou yy-mm-dd)
+            max_workers (int): Número de uploads simultâneos
+            multipart_threshold (int): Tamanho a partir do qual o upload é multipart (bytes)
+            multipart_chunksize (int): Tamanho de cada parte do upload multipart (bytes)
+            max_attempts (int): Tentativas por objeto antes de desistir
+            retry_backoff (float): Espera inicial entre tentativas, dobrada a cada falha (segundos)
+            skip_unchanged (bool): Se True, não envia arquivos cujo conteúdo já está na partição
+            index (str): Código do índice; se None, é identificado pelo nome de cada arquivo
+            portfolio (str): Tipo de carteira (define o prefixo, ver b3_indices.s3_prefix)
+            
+        Returns:
+            list: Um dicionário por arquivo, na ordem de entrada, com as chaves
+                  file, key, success, skipped, attempts, seconds e error
+        """
+        items = list(items)
+        if not items:
+            return []
+        
+        if not self.s3_client:
+            logger.warning("Cliente S3 não está configurado.")
+            return [
+                {"file": file_path, "key": None, "success": False, "skipped": False, "attempts": 0,
+                 "seconds": 0.0, "error": "Cliente S3 não está configurado."}
+                for file_path, _ in items
+            ]
+        
+        from boto3.s3.transfer import TransferConfig
+        
+        client = self.get_transfer_client(max_workers, max_attempts)
+        transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=4,
+        )
+        
+        logger.info(f"Enviando {len(items)} arquivo(s) para o S3 com {max_workers} upload(s) simultâneo(s)...")
+        start = time.perf_counter()
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._upload_with_retries, client, file_path, date_str,
+                                transfer_config, max_attempts, retry_backoff, skip_unchanged, index, portfolio)
+                for file_path, date_str in items
+            ]
+            results = [future.result() for future in futures]
+        self.update_s3_partition_index(
+            added=[(result["key"], result["file"]) for result in results if result["success"] and not result["skipped"]]
+        )
+        
+        elapsed = time.perf_counter() - start
+        succeeded = sum(1 for result in results if result["success"])
+        skipped = sum(1 for result in results if result["skipped"])
+        logger.info(f"Upload em lote concluído: {succeeded}/{len(results)} arquivo(s) em {elapsed:.2f}s "
+                    f"({skipped} já presente(s) no S3)")
+        for result in results:
+            if not result["success"]:
+                logger.error(f"  ✗ {os.path.basename(result['file'])}: {result['error']}")
+        return results
+    
+    def _upload_with_retries(self, client, file_path, date_str, transfer_config, max_attempts,
+                             retry_backoff, skip_unchanged, index=None, portfolio="day"):
+        """
+        Envia um arquivo do lote, repetindo com backoff exponencial em caso de falha
+        
+        Returns:
+            dict: Resultado do upload do arquivo
+        """
+        result = {"file": file_path, "key": None, "success": False, "skipped": False, "attempts": 0,
+                  "seconds": 0.0, "error": None}
+        start = time.perf_counter()
+        try:
+            result["key"] = self.build_partitioned_s3_key(file_path, date_str, index, portfolio)
+        except Exception as e:
+            result["error"] = f"Data inválida '{date_str}': {e}"
+            return result
+        
+        digests = None
+        for attempt in range(1, max_attempts + 1):
+            result["attempts"] = attempt
+            try:
+                if digests is None:
+                    digests = self.compute_file_digests(file_path)
+                md5_hex, sha256_hex = digests
+                
+                if skip_unchanged:
+                    existing_key = self.find_identical_object(client, result["key"], md5_hex, sha256_hex,
+                                                              os.path.getsize(file_path))
+                    if existing_key:
+                        result.update(key=existing_key, success=True, skipped=True, error=None)
+                        METRICS.count("uploads_skipped")
+                        break
+                
+                with METRICS.timer("upload"):
+                    client.upload_file(
+                        file_path, self.aws_bucket, result["key"],
+                        ExtraArgs={'Metadata': {CONTENT_DIGEST_METADATA: sha256_hex}},
+                        Config=transfer_config
+                    )
+                METRICS.count("upload_bytes", os.path.getsize(file_path))
+                result["success"] = True
+                result["error"] = None
+                break
+            except FileNotFoundError as e:
+                # Não adianta repetir se o arquivo local não existe
+                result["error"] = str(e)
+                break
+            except Exception as e:
+                result["error"] = str(e)
+                if attempt < max_attempts:
+                    time.sleep(retry_backoff * 2 ** (attempt - 1))
+        
+        result["seconds"] = round(time.perf_counter() - start, 4)
+        return result
+    
+    def upload_local_partitions(self, index=DEFAULT_INDEX, start=None, end=None, max_workers=8):
+        """
+        Envia ao S3 as partições diárias locais do índice (ex.: após converter sem upload)
+        
+        Arquivos cujo conteúdo já está na partição do S3 não são reenviados. Arquivos
+        compactados (mensais/anuais) ficam de fora: são gerados pelo comando "compact".
+        
+        Args:
+            index (str): Código do índice
+            start (date): Primeira data (inclusive); se None, desde o início
+            end (date): Última data (inclusive); se None, até o fim
+            max_workers (int): Número de uploads simultâneos
+            
+        Returns:
+            list: Resultados por arquivo (ver upload_batch_to_s3_partitioned)
+        """
+        from compaction import LocalPartitionStore, classify
+        
+        store = LocalPartitionStore(os.path.join(self.data_folder, local_folder_name(index)))
+        items = []
+        for relative_path in store.list_files():
+            info = classify(relative_path)
+            if not info or not info["day"]:
+                continue
+            day = date(int(info["year"]), int(info["month"]), int(info["day"]))
+            if (start and day < start) or (end and day > end):
+                continue
+            items.append((os.path.join(store.root, relative_path), day.strftime("%d-%m-%y")))
+        if not items:
+            logger.info(f"Nenhuma partição diária do {index} para enviar.")
+            return []
+        return self.upload_batch_to_s3_partitioned(items, max_workers=max_workers, index=index)
+    
+    def upload_to_s3(self, file_path, index=None):
         """
         Faz upload do arquivo para o bucket S3
         
         Args:
             file_path (str): Caminho do arquivo local
+            index (str): Código do índice; se None, é identificado pelo nome do arquivo (padrão: IBOV)
             
         Returns:
             bool: True se upload bem-sucedido, False caso contrário
         """
         if not self.s3_client:
-            print("Cliente S3 não está configurado.")
+            logger.warning("Cliente S3 não está configurado.")
             return False
         
         try:
             filename = os.path.basename(file_path)
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            s3_key = f"ibov_data/{timestamp}_{filename}"
+            index = index or index_from_filename(filename) or DEFAULT_INDEX
+            s3_key = f"{s3_prefix(index)}{timestamp}_{filename}"
             
-            print(f"Fazendo upload para S3: {s3_key}")
-            self.s3_client.upload_file(file_path, self.aws_bucket, s3_key)
+            logger.info(f"Fazendo upload para S3: {s3_key}")
+            with METRICS.timer("upload"):
+                self.s3_client.upload_file(file_path, self.aws_bucket, s3_key)
+            METRICS.count("upload_bytes", os.path.getsize(file_path))
             
-            print(f"Upload para S3 concluído com sucesso!")
-            print(f"Arquivo disponível em: s3://{self.aws_bucket}/{s3_key}")
+            logger.info(f"Upload para S3 concluído com sucesso!")
+            logger.info(f"Arquivo disponível em: s3://{self.aws_bucket}/{s3_key}")
             return True
             
         except Exception as e:
-            print(f"Erro ao fazer upload para S3: {str(e)}")
+            logger.error(f"Erro ao fazer upload para S3: {str(e)}")
             return False
     
-    def clean_s3_bucket(self):
+    def clean_s3_bucket(self, dry_run=False, max_workers=8, prefix=None, index=DEFAULT_INDEX):
         """
         Remove arquivos duplicados do bucket S3.
+        
+        Percorre todo o prefixo de forma paginada (layout particionado e chaves planas
+        antigas), agrupa os objetos por (data do pregão, SHA-256 do conteúdo) e mantém
+        apenas a cópia mais recente de cada grupo. O ETag de uploads multipart depende do
+        tamanho das partes, então ETags diferentes não provam conteúdos diferentes: o
+        SHA-256 gravado no upload (metadado content-sha256) é consultado (HEAD, em
+        paralelo) para objetos de mesma data e tamanho com ETags diferentes. Objetos de
+        mesma data, tamanho e ETag são cópias sem precisar de HEAD, e objetos sem o
+        metadado ficam agrupados por (data, ETag, tamanho). As remoções são feitas em
+        lotes de até 1000 chaves, em paralelo.
+        
+        Args:
+            dry_run (bool): Se True, apenas relata o que seria removido
+            max_workers (int): Número de lotes de remoção simultâneos
+            prefix (str): Prefixo a ser verificado (padrão: prefixo do índice, ex.: ibov_data/)
+            index (str): Código do índice usado para definir o prefixo
+            
+        Returns:
+            dict: Relatório com contagens de objetos e tempos de cada etapa
         """
+        prefix = prefix or s3_prefix(index)
+        report = {"dry_run": dry_run, "scanned": 0, "unrecognized": 0, "heads": 0, "groups": 0,
+                  "duplicates": 0, "deleted": 0, "errors": 0,
+                  "list_seconds": 0.0, "delete_seconds": 0.0}
+        
         if not self.s3_client:
-            print("Cliente S3 não está configurado.")
-            return
+            logger.warning("Cliente S3 não está configurado.")
+            return report
 
-        print("Verificando arquivos duplicados no bucket S3...")
+        logger.info(f"Verificando arquivos duplicados no bucket S3 ({prefix})...")
         
         try:
-            # Listar todos os objetos no bucket
-            response = self.s3_client.list_objects_v2(Bucket=self.aws_bucket, Prefix="ibov_data/")
-            if 'Contents' not in response:
-                print("Nenhum arquivo encontrado no bucket.")
-                return
-
-            all_files = [item['Key'] for item in response['Contents']]
+            start = time.perf_counter()
+            by_size = {}
             
-            # Regex para encontrar o padrão de duplicado
-            duplicate_pattern = re.compile(r"ibov_data/(\d{8}_\d{6})_(IBOVDia_\d{2}-\d{2}-\d{2}) \(\d+\)\.csv")
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.aws_bucket, Prefix=prefix):
+                for item in page.get('Contents', []):
+                    report["scanned"] += 1
+                    trade_date = self.extract_trade_date_from_key(item['Key'])
+                    if not trade_date:
+                        # Nunca remover objetos cuja data não foi reconhecida
+                        report["unrecognized"] += 1
+                        continue
+                    by_size.setdefault((trade_date, item['Size']), []).append(item)
+            
+            # Cópias têm a mesma data e o mesmo tamanho; com ETags iguais já são idênticas, então só
+            # os grupos com ETags diferentes (ex.: uploads multipart com outro tamanho de parte) recebem HEAD
+            candidates = [item for items in by_size.values() if len({item['ETag'] for item in items}) > 1
+                          for item in items]
+            client = self.get_transfer_client(max_workers)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                digests = dict(zip(
+                    (item['Key'] for item in candidates),
+                    executor.map(lambda item: self._content_digest(client, item['Key']), candidates)
+                ))
+            report["heads"] = len(candidates)
             
+            newest = {}
             to_delete = []
-
-            for key in all_files:
-                if duplicate_pattern.match(key):
-                    to_delete.append({'Key': key})
+            for (trade_date, size), items in by_size.items():
+                for item in items:
+                    digest = digests.get(item['Key'])
+                    group = (trade_date, size, digest) if digest else (trade_date, size, item['ETag'])
+                    candidate = (item['LastModified'], item['Key'])
+                    current = newest.get(group)
+                    if current is None:
+                        newest[group] = candidate
+                    elif candidate > current:
+                        newest[group] = candidate
+                        to_delete.append(current[1])
+                    else:
+                        to_delete.append(candidate[1])
+            
+            report["list_seconds"] = round(time.perf_counter() - start, 3)
+            METRICS.observe("s3_list", time.perf_counter() - start)
+            METRICS.count("objects_listed", report["scanned"])
+            report["groups"] = len(newest)
+            report["duplicates"] = len(to_delete)
+            
+            logger.info(f"Objetos verificados: {report['scanned']} em {report['list_seconds']:.2f}s "
+                        f"({report['groups']} únicos, {report['unrecognized']} sem data reconhecida, "
+                        f"{report['heads']} HEAD)")
 
             if not to_delete:
-                print("Nenhum arquivo duplicado encontrado no S3.")
-                return
+                logger.info("Nenhum arquivo duplicado encontrado no S3.")
+                return report
+
+            if dry_run:
+                logger.info(f"[dry-run] {len(to_delete)} arquivos duplicados seriam removidos.")
+                for key in to_delete[:20]:
+                    logger.debug(f"  - {key}")
+                if len(to_delete) > 20:
+                    logger.debug(f"  ... e mais {len(to_delete) - 20}")
+                return report
 
-            print(f"Encontrados {len(to_delete)} arquivos duplicados para remover.")
+            logger.info(f"Encontrados {len(to_delete)} arquivos duplicados para remover.")
             
-            # Remover os arquivos duplicados
-            delete_response = self.s3_client.delete_objects(
-                Bucket=self.aws_bucket,
-                Delete={'Objects': to_delete}
-            )
+            # Remover os arquivos duplicados em lotes de 1000 chaves (limite do delete_objects)
+            start = time.perf_counter()
+            batches = [to_delete[i:i + 1000] for i in range(0, len(to_delete), 1000)]
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                responses = executor.map(
+                    lambda batch: client.delete_objects(
+                        Bucket=self.aws_bucket,
+                        Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+                    ),
+                    batches
+                )
+                for batch, delete_response in zip(batches, responses):
+                    errors = delete_response.get('Errors', [])
+                    report["errors"] += len(errors)
+                    report["deleted"] += len(batch) - len(errors)
+                    for error in errors:
+                        logger.error(f"Erro ao deletar {error['Key']}: {error['Message']}")
+            report["delete_seconds"] = round(time.perf_counter() - start, 3)
+            METRICS.observe("delete", time.perf_counter() - start)
+            METRICS.count("objects_deleted", report["deleted"])
+            self.update_s3_partition_index(removed=to_delete)
+            self.flush_s3_partition_index()
             
-            if 'Errors' in delete_response and delete_response['Errors']:
-                for error in delete_response['Errors']:
-                    print(f"Erro ao deletar {error['Key']}: {error['Message']}")
-            else:
-                print("Arquivos duplicados removidos com sucesso do S3.")
+            logger.info(f"{report['deleted']} arquivos duplicados removidos do S3 em "
+                        f"{report['delete_seconds']:.2f}s ({len(batches)} lote(s)).")
 
         except Exception as e:
-            print(f"Erro ao limpar o bucket S3: {str(e)}")
+            logger.error(f"Erro ao limpar o bucket S3: {str(e)}")
+        
+        return report
+    
+    def _content_digest(self, client, s3_key):
+        """
+        SHA-256 do conteúdo gravado nos metadados do objeto no upload
+        
+        Returns:
+            str: Digest em hexadecimal, ou None se o objeto não tiver o metadado
+        """
+        try:
+            head = client.head_object(Bucket=self.aws_bucket, Key=s3_key)
+        except Exception as e:
+            logger.warning(f"Não foi possível ler os metadados de {s3_key}: {e}")
+            return None
+        return head.get('Metadata', {}).get(CONTENT_DIGEST_METADATA)
+    
+    def extract_trade_date_from_key(self, s3_key):
+        """
+        Extrai a data do pregão de uma chave S3, no layout particionado
+        (ibov_data/ano=YYYY/mes=MM/dia=DD/...) ou no nome do arquivo (<ÍNDICE>Dia_dd-mm-yy)
+        
+        Args:
+            s3_key (str): Chave do objeto
+            
+        Returns:
+            str: Data no formato YYYY-MM-DD, ou None se não reconhecida
+        """
+        match = PARTITION_KEY_PATTERN.search(s3_key)
+        if match:
+            year, month, day = match.groups()
+            return f"{year}-{month}-{day}"
+        
+        filename = s3_key.rsplit('/', 1)[-1]
+        match = FILENAME_PATTERN.search(filename)
+        if match:
+            _, day, month, year = match.groups()
+        else:
+            # Formato gerado por rename_file_with_date_format: <ÍNDICE>Dia-yy-mm-dd
+            match = RENAMED_FILENAME_PATTERN.search(filename)
+            if not match:
+                return None
+            _, year, month, day = match.groups()
+        full_year = f"20{year}" if int(year) < 50 else f"19{year}"
+        return f"{full_year}-{month}-{day}"
+    
+    def backfill(self, start, end, index=DEFAULT_INDEX, portfolio="day", max_workers=4, rate_limit=2.0, upload=True,
+                 changes=False, holidays=()):
+        """
+        Baixa o histórico de carteiras entre duas datas (dias úteis), grava as partições
+        locais e envia ao S3. Pode ser interrompido e executado de novo: os dias já
+        concluídos são ignorados.
+        
+        Args:
+            start (date): Data inicial
+            end (date): Data final
+            index (str): Código do índice
+            portfolio (str): "day", "theoretical" ou "quarterly"
+            max_workers (int): Número de downloads simultâneos
+            rate_limit (float): Requisições por segundo à B3 (0 = sem limite)
+            upload (bool): Se False, apenas grava os Parquet locais
+            changes (bool): Se True, calcula ao final as variações diárias dos pregões que ainda não as têm
+            holidays (iterable): Feriados da B3 (datas que não são pedidas)
+            
+        Returns:
+            dict: Métricas do backfill
+            
+        Raises:
+            ValueError: Se changes=True para uma carteira que não é a do dia
+        """
+        from backfill import BackfillEngine
+        
+        if changes and portfolio != "day":
+            raise ValueError("As variações diárias existem apenas para a carteira do dia")
+        
+        engine = BackfillEngine(
+            self.get_http_client(),
+            self.data_folder,
+            uploader=self if upload and self.s3_client else None,
+            max_workers=max_workers,
+            rate_limit=rate_limit,
+        )
+        metrics = engine.run(start, end, index=index, portfolio=portfolio, holidays=holidays)
+        if changes:
+            from portfolio_changes import PortfolioChanges
+            metrics["changes"] = PortfolioChanges.local(index, self.data_folder,
+                                                        write_options=self.parquet_options).backfill()
+        return metrics
+    
+    def compact_partitions(self, index=DEFAULT_INDEX, period="month", target="local", dry_run=False,
+                           benchmark=False):
+        """
+        Compacta as partições diárias do índice em arquivos mensais ou anuais (ver compaction.py)
+        
+        Args:
+            index (str): Código do índice
+            period (str): "month" ou "year"
+            target (str): "local", "s3" ou "both"
+            dry_run (bool): Se True, apenas relata o que seria feito
+            benchmark (bool): Se True, mede o tempo de leitura completa antes e depois
+            
+        Returns:
+            list: Um relatório por destino compactado
+        """
+        from compaction import PartitionCompactor
+        from partition_index import PartitionIndex
+        from portfolio_cache import PORTFOLIO_CACHE
+        
+        reports = [
+            PartitionCompactor(store, index, period, write_options=self.parquet_options,
+                               partition_index=PartitionIndex.load(store, rebuild_if_missing=False))
+            .run(dry_run=dry_run, benchmark=benchmark)
+            for store in self.partition_stores(index, target)
+        ]
+        if not dry_run:
+            # Os arquivos diários foram substituídos: consultas abertas precisam montar o dataset de novo
+            PORTFOLIO_CACHE.invalidate(index)
+        return reports
     
-    def download_data(self, method="selenium"):
+    def partition_stores(self, index=DEFAULT_INDEX, target="local"):
+        """
+        Árvores de partições do índice no disco local e/ou no S3
+        
+        Args:
+            index (str): Código do índice
+            target (str): "local", "s3" ou "both"
+            
+        Returns:
+            list: LocalPartitionStore e/ou S3PartitionStore
+        """
+        from compaction import LocalPartitionStore, S3PartitionStore
+        
+        stores = []
+        if target in ("local", "both"):
+            stores.append(LocalPartitionStore(os.path.join(self.data_folder, local_folder_name(index))))
+        if target in ("s3", "both"):
+            if self.s3_client:
+                stores.append(S3PartitionStore(self.s3_client, self.aws_bucket, s3_prefix(index),
+                                               CONTENT_DIGEST_METADATA))
+            else:
+                logger.warning("Cliente S3 não está configurado.")
+        return stores
+    
+    def rebuild_partition_index(self, index=DEFAULT_INDEX, target="local"):
+        """
+        Reconstrói o índice de partições e o _metadata/_common_metadata (ver partition_index.py)
+        
+        Args:
+            index (str): Código do índice
+            target (str): "local", "s3" ou "both"
+            
+        Returns:
+            list: Um relatório por árvore (arquivos, linhas, fora do _metadata e tempo)
+        """
+        from partition_index import PartitionIndex
+        
+        reports = []
+        for store in self.partition_stores(index, target):
+            start = time.perf_counter()
+            report = PartitionIndex(store).rebuild()
+            report.update(store=store.describe(), seconds=round(time.perf_counter() - start, 3))
+            logger.info(f"Índice de partições de {report['store']}: {report['files']} arquivo(s), "
+                        f"{report['rows']} linha(s), {report['excluded']} fora do _metadata, "
+                        f"em {report['seconds']:.2f}s")
+            reports.append(report)
+        return reports
+    
+    def update_s3_partition_index(self, added=(), removed=()):
+        """
+        Registra uploads e remoções para o índice de partições do S3
+        
+        As alterações ficam pendentes e são gravadas de uma vez por flush_s3_partition_index
+        (ao fim de um lote de upload, da limpeza e em close), para que cada execução leia
+        e regrave o índice e o _metadata de cada prefixo uma única vez.
+        
+        Args:
+            added (list): Chave S3 e origem: (chave, caminho local) ou (chave, FileMetaData, tamanho)
+            removed (list): Chaves S3 removidas
+        
+        As datas alteradas saem na hora do cache de carteiras decodificadas (portfolio_cache.py).
+        """
+        from portfolio_cache import invalidate_paths
+        
+        with self._partition_index_lock:
+            for key, *source in added:
+                self._pending_index_updates[key] = source
+            for key in removed:
+                self._pending_index_updates[key] = None
+        for key in [key for key, *_ in added] + list(removed):
+            prefix, relative_path = key.split('/', 1)
+            parsed = parse_s3_prefix(prefix)
+            # O cache das consultas (portfolio_query.py) só guarda carteiras do dia
+            if parsed and parsed[1] == "day":
+                invalidate_paths(parsed[0], [relative_path])
+    
+    def flush_s3_partition_index(self):
+        """
+        Grava no S3 as alterações pendentes do índice de partições de cada prefixo
+        
+        O índice de um prefixo só é atualizado se já existir; um prefixo sem índice é
+        indexado pelo comando "index --target s3".
+        """
+        with self._partition_index_lock:
+            pending, self._pending_index_updates = self._pending_index_updates, {}
+            # Sem alterações pendentes, o cliente S3 nem chega a ser criado
+            if not pending or not self.s3_client:
+                return
+            import pyarrow.parquet as pq
+            from compaction import S3PartitionStore
+            from partition_index import PartitionIndex
+            
+            by_prefix = {}
+            for key, source in pending.items():
+                by_prefix.setdefault(key.split('/', 1)[0] + '/', {})[key] = source
+            
+            for prefix, updates in by_prefix.items():
+                store = S3PartitionStore(self.s3_client, self.aws_bucket, prefix, CONTENT_DIGEST_METADATA)
+                try:
+                    partition_index = PartitionIndex.load(store, rebuild_if_missing=False)
+                    if partition_index is None:
+                        logger.debug(f"Sem índice de partições em {store.describe()}")
+                        continue
+                    partition_index.remove([key[len(prefix):] for key, source in updates.items() if source is None])
+                    for key, source in updates.items():
+                        if source is None:
+                            continue
+                        if len(source) == 1:
+                            source = (pq.read_metadata(source[0]), os.path.getsize(source[0]))
+                        partition_index.add(key[len(prefix):], *source)
+                    partition_index.flush()
+                except Exception as e:
+                    logger.error(f"Erro ao atualizar o índice de partições de {store.describe()}: {e}")
+    
+    def download_data(self, method="selenium", index=DEFAULT_INDEX):
         """
         Método principal para baixar os dados
         IMPORTANTE: Os arquivos CSV originais são SEMPRE preservados conforme solicitado.
         
         Args:
-            method (str): "selenium" ou "requests"
+            method (str): "api", "stream" (API sem disco), "selenium" ou "requests"
+            index (str): Código do índice (ex.: IBOV, SMLL)
         """
-        print(f"Iniciando download dos dados do IBOV usando método: {method}")
-        print(f"URL: {self.page_url}")
-        print("NOTA: Arquivos CSV originais serão sempre preservados")
+        logger.info(f"Iniciando download dos dados do {index} usando método: {method}")
+        logger.debug(f"URL: {self.index_page_url(index)}")
+        logger.debug("NOTA: Arquivos CSV originais serão sempre preservados")
         
-        if method == "selenium":
-            return self.download_with_selenium()
+        if method == "api":
+            return self.download_with_api(index)
+        elif method == "stream":
+            return self.download_streaming(index)
+        elif method == "selenium":
+            return self.download_with_selenium(index)
         elif method == "requests":
-            return self.download_with_requests()
+            return self.download_with_requests(index)
         else:
-            print("Método inválido. Use 'selenium' ou 'requests'")
+            logger.warning("Método inválido. Use 'api', 'stream', 'selenium' ou 'requests'")
             return None
+    
+    def download_with_fallback(self, index=DEFAULT_INDEX, methods=("api", "selenium", "requests")):
+        """
+        Tenta os métodos de download em ordem até um deles funcionar
+        
+        Args:
+            index (str): Código do índice
+            methods (tuple): Métodos na ordem de tentativa
+            
+        Returns:
+            dict: Resumo do índice (index, success, method, file, seconds)
+        """
+        start = time.perf_counter()
+        summary = {"index": index, "success": False, "method": None, "file": None, "seconds": 0.0}
+        for attempt, method in enumerate(methods, 1):
+            logger.info(f"=== {index} - Tentativa {attempt}: {method} ===")
+            result = self.download_data(method, index)
+            if result:
+                summary.update(success=True, method=method, file=result)
+                break
+        summary["seconds"] = round(time.perf_counter() - start, 2)
+        return summary
+    
+    def run_pipeline(self, jobs, upload=True, portfolio="day", download_workers=4, parse_workers=2,
+                     write_workers=2, upload_workers=4, queue_size=8, in_memory=False, changes=False,
+                     prefetched=None):
+        """
+        Processa vários índices/datas pelo pipeline assíncrono (download → parse → gravação → upload)
+        
+        Args:
+            jobs (list): Pares (índice, data); data None = carteira mais recente
+            upload (bool): Se False, apenas grava os Parquet locais
+            portfolio (str): "day", "theoretical" ou "quarterly"
+            download_workers, parse_workers, write_workers, upload_workers (int): Workers de cada etapa
+            queue_size (int): Capacidade das filas entre as etapas
+            in_memory (bool): Se True, o Parquet é gerado em memória e enviado com put_object (sem disco)
+            changes (bool): Se True, atualiza as variações diárias dos dias gravados (ver portfolio_changes.py)
+            prefetched (dict): CSV já baixado de alguns jobs, {(índice, data): bytes} (sem novo download)
+            
+        Returns:
+            dict: Resultados por job e métricas por etapa (ver PortfolioPipeline.run)
+        """
+        from pipeline import PortfolioPipeline
+        
+        pipeline = PortfolioPipeline(
+            self.get_http_client(),
+            self.data_folder,
+            uploader=self if upload and self.s3_client else None,
+            download_workers=download_workers,
+            parse_workers=parse_workers,
+            write_workers=write_workers,
+            upload_workers=upload_workers,
+            queue_size=queue_size,
+            portfolio=portfolio,
+            in_memory=in_memory,
+            write_options=self.parquet_options,
+            changes=changes,
+        )
+        return pipeline.run(jobs, prefetched)
+    
+    def download_indices(self, indices, max_workers=4, methods=("api", "selenium", "requests")):
+        """
+        Baixa, converte e envia ao S3 a carteira de vários índices em paralelo
+        
+        Pela API ("api" ou "stream", sem disco), os índices passam pelo pipeline assíncrono
+        (etapas sobrepostas com filas limitadas). Os que falharem seguem para os demais
+        métodos, em paralelo, com a
+        sessão HTTP, o navegador (usado por um índice de cada vez) e os clientes S3
+        compartilhados.
+        
+        Args:
+            indices (list): Códigos dos índices
+            max_workers (int): Número de índices processados simultaneamente
+            methods (tuple): Métodos de download na ordem de tentativa
+            
+        Returns:
+            list: Um resumo por índice (ver download_with_fallback), na ordem de entrada
+        """
+        indices = [normalize_index(index) for index in indices]
+        start = time.perf_counter()
+        summaries = {}
+        pipeline_method = next((method for method in methods if method in ("api", "stream")), None)
+        if pipeline_method:
+            logger.info(f"Baixando {len(indices)} índice(s) pela API com o pipeline assíncrono...")
+            report = self.run_pipeline([(index, None) for index in indices],
+                                       download_workers=max_workers, upload_workers=max_workers,
+                                       in_memory=pipeline_method == "stream")
+            for result in report["results"]:
+                if result["success"]:
+                    summaries[result["index"]] = {
+                        "index": result["index"], "success": True, "method": pipeline_method,
+                        "file": result["parquet"], "seconds": round(sum(result["seconds"].values()), 2),
+                    }
+                else:
+                    logger.error(f"  ✗ {result['index']} ({result['failed_stage']}): {result['error']}")
+        
+        remaining = [index for index in indices if index not in summaries]
+        fallback_methods = tuple(method for method in methods if method not in ("api", "stream"))
+        if remaining and fallback_methods:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(remaining)))) as executor:
+                futures = [executor.submit(self.download_with_fallback, index, fallback_methods)
+                           for index in remaining]
+                for index, future in zip(remaining, futures):
+                    summaries[index] = future.result()
+        
+        summaries = [
+            summaries.get(index, {"index": index, "success": False, "method": None, "file": None, "seconds": 0.0})
+            for index in indices
+        ]
+        elapsed = time.perf_counter() - start
+        
+        succeeded = sum(1 for summary in summaries if summary["success"])
+        logger.info("=" * 50)
+        logger.info(f"RESUMO POR ÍNDICE ({succeeded}/{len(summaries)} com sucesso em {elapsed:.1f}s)")
+        logger.info("=" * 50)
+        for summary in summaries:
+            if summary["success"]:
+                logger.info(f"  ✓ {summary['index']:<6} {summary['method']:<9} {summary['seconds']:>6.2f}s  "
+                            f"{os.path.basename(summary['file'])}")
+            else:
+                logger.warning(f"  ✗ {summary['index']:<6} {'-':<9} {summary['seconds']:>6.2f}s  nenhum método funcionou")
+        return summaries
+
+def add_download_arguments(parser, defaults=True):
+    """
+    Opções do download do dia, aceitas antes dos subcomandos e depois de "download"
+    
+    Args:
+        parser (argparse.ArgumentParser): Parser que recebe as opções
+        defaults (bool): Se False, as opções omitidas não sobrescrevem as informadas antes do subcomando
+    """
+    def default(value):
+        return value if defaults else argparse.SUPPRESS
+    
+    parser.add_argument("--index", type=parse_index_list, default=default([DEFAULT_INDEX]),
+                        help="Índices separados por vírgula, ou 'all' para todos os acompanhados (padrão: IBOV)")
+    parser.add_argument("--workers", type=int, default=default(4),
+                        help="Índices processados simultaneamente (padrão: 4)")
+    parser.add_argument("--stream", action="store_true", default=default(False),
+                        help="Modo sem disco pela API: Parquet gerado em memória e enviado direto ao S3")
+    parser.add_argument("--archive-csv", action="store_true", default=default(False),
+                        help="No modo sem disco, gravar também o CSV baixado em src/data")
+
+def parse_args():
+    """Lê os argumentos de linha de comando (sem subcomando, executa o download do dia)"""
+    parser = argparse.ArgumentParser(description="Download das carteiras de índices da B3")
+    add_download_arguments(parser)
+    parser.add_argument("--check-s3", action="store_true",
+                        help="Confirmar o acesso ao bucket (head_bucket) ao criar o cliente S3 (padrão: S3_CHECK_BUCKET)")
+    add_instrumentation_arguments(parser)
+    subparsers = parser.add_subparsers(dest="command")
+    
+    download_parser = subparsers.add_parser(
+        "download", help="Baixa a carteira do dia, converte e envia ao S3 (o mesmo que sem subcomando)")
+    add_download_arguments(download_parser, defaults=False)
+    
+    convert_parser = subparsers.add_parser("convert", help="Converte os CSV de src/data em Parquet particionado")
+    convert_parser.add_argument("--index", type=parse_index_list, default=[DEFAULT_INDEX],
+                                help="Índices a converter, separados por vírgula, ou 'all' (padrão: IBOV)")
+    convert_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                                help="Processos de conversão em paralelo (padrão: número de CPUs)")
+    convert_parser.add_argument("--force", action="store_true",
+                                help="Reconverter todos os arquivos, ignorando o manifesto de conversões")
+    convert_parser.add_argument("--remove-originals", action="store_true",
+                                help="Remover os CSV após a conversão (padrão: manter)")
+    convert_parser.add_argument("--cdc", action="store_true",
+                                help="Manter também o armazenamento CDC em <índice>-cdc/")
+    convert_parser.add_argument("--changes", action="store_true",
+                                help="Calcular também as variações diárias em <índice>-changes/")
+    add_write_option_arguments(convert_parser)
+    
+    upload_parser = subparsers.add_parser("upload", help="Envia ao S3 as partições diárias locais ainda ausentes")
+    upload_parser.add_argument("--index", type=parse_index_list, default=[DEFAULT_INDEX],
+                               help="Índices separados por vírgula, ou 'all' (padrão: IBOV)")
+    upload_parser.add_argument("--start", type=date.fromisoformat, default=None,
+                               help="Primeira data (YYYY-MM-DD, padrão: todas)")
+    upload_parser.add_argument("--end", type=date.fromisoformat, default=None,
+                               help="Última data (YYYY-MM-DD, padrão: todas)")
+    upload_parser.add_argument("--workers", type=int, default=8, help="Uploads simultâneos (padrão: 8)")
+    
+    clean_parser = subparsers.add_parser("clean", help="Remove objetos duplicados do bucket S3")
+    clean_parser.add_argument("--index", type=parse_index_list, default=[DEFAULT_INDEX],
+                              help="Índices separados por vírgula, ou 'all' (padrão: IBOV)")
+    clean_parser.add_argument("--dry-run", action="store_true", help="Apenas listar o que seria removido")
+    clean_parser.add_argument("--workers", type=int, default=8, help="Lotes de remoção simultâneos (padrão: 8)")
+    
+    backfill_parser = subparsers.add_parser("backfill", help="Baixa o histórico de carteiras de um intervalo de datas")
+    backfill_parser.add_argument("--start", type=date.fromisoformat, required=True, help="Data inicial (YYYY-MM-DD)")
+    backfill_parser.add_argument("--end", type=date.fromisoformat, default=datetime.now().date(),
+                                 help="Data final (YYYY-MM-DD, padrão: hoje)")
+    backfill_parser.add_argument("--index", type=normalize_index, default=DEFAULT_INDEX,
+                                 help="Código do índice (padrão: IBOV)")
+    backfill_parser.add_argument("--portfolio", choices=sorted(PORTFOLIO_OPERATIONS), default="day",
+                                 help="Tipo de carteira (padrão: day)")
+    backfill_parser.add_argument("--workers", type=int, default=4, help="Downloads simultâneos (padrão: 4)")
+    backfill_parser.add_argument("--rate", type=float, default=2.0,
+                                 help="Requisições por segundo à B3, 0 = sem limite (padrão: 2)")
+    backfill_parser.add_argument("--no-upload", action="store_true", help="Não enviar os Parquet ao S3")
+    backfill_parser.add_argument("--changes", action="store_true",
+                                 help="Calcular também as variações diárias (<índice>-changes/) dos pregões baixados")
+    backfill_parser.add_argument("--holidays", default=None,
+                                 help="Feriados da B3: arquivo com uma data YYYY-MM-DD por linha ou lista separada por vírgulas")
+    
+    compact_parser = subparsers.add_parser("compact", help="Compacta as partições diárias em arquivos mensais ou anuais")
+    compact_parser.add_argument("--index", type=normalize_index, default=DEFAULT_INDEX,
+                                help="Código do índice (padrão: IBOV)")
+    # Os mesmos de compaction.PERIODS (importar compaction carregaria o pyarrow na partida)
+    compact_parser.add_argument("--period", choices=("month", "year"), default="month", help="Período de cada arquivo (padrão: month)")
+    compact_parser.add_argument("--target", choices=("local", "s3", "both"), default="local",
+                                help="Partições a compactar (padrão: local)")
+    compact_parser.add_argument("--dry-run", action="store_true", help="Apenas listar os períodos a compactar")
+    compact_parser.add_argument("--benchmark", action="store_true",
+                                help="Medir o tempo de leitura completa antes e depois")
+    
+    daemon_parser = subparsers.add_parser(
+        "daemon", help="Agendador: consulta a B3 na janela de publicação e processa as carteiras novas")
+    daemon_parser.add_argument("--index", type=parse_index_list, default=[DEFAULT_INDEX],
+                               help="Índices separados por vírgula, ou 'all' (padrão: IBOV)")
+    daemon_parser.add_argument("--portfolio", choices=sorted(PORTFOLIO_OPERATIONS), default="day",
+                               help="Tipo de carteira (padrão: day)")
+    daemon_parser.add_argument("--window", default=None,
+                               help=f"Janela de publicação HH:MM-HH:MM, horário de Brasília "
+                                    f"(padrão: SCHEDULER_WINDOW ou {DEFAULT_WINDOW})")
+    daemon_parser.add_argument("--interval", type=float, default=None,
+                               help=f"Segundos entre consultas na janela (padrão: SCHEDULER_INTERVAL ou {DEFAULT_INTERVAL})")
+    daemon_parser.add_argument("--weekdays", default=None,
+                               help=f"Dias da semana, 0 = segunda (padrão: SCHEDULER_WEEKDAYS ou {DEFAULT_WEEKDAYS})")
+    daemon_parser.add_argument("--browser", action="store_true",
+                               help="Manter o navegador aberto e usá-lo quando a API falhar")
+    daemon_parser.add_argument("--no-upload", action="store_true", help="Não enviar os Parquet ao S3")
+    daemon_parser.add_argument("--max-polls", type=int, default=None, help=argparse.SUPPRESS)
+    
+    index_parser = subparsers.add_parser("index", help="Reconstrói o índice de partições e o _metadata")
+    index_parser.add_argument("--index", type=normalize_index, default=DEFAULT_INDEX,
+                              help="Código do índice (padrão: IBOV)")
+    index_parser.add_argument("--target", choices=("local", "s3", "both"), default="local",
+                              help="Árvores a indexar (padrão: local)")
+    return parser.parse_args()
 
 def main():
+    # O .env é lido antes dos argumentos para valer também para LOG_LEVEL, LOG_FORMAT e METRICS_FILE
+    load_dotenv()
+    args = parse_args()
+    configure_from_args(args)
+    try:
+        return run_command(args)
+    finally:
+        if args.metrics_file:
+            write_metrics(args.metrics_file, job="downloader")
+            logger.info(f"Métricas gravadas em {args.metrics_file}")
+
+def open_downloader(args):
+    """B3DataDownloader com as opções globais da linha de comando"""
     downloader = B3DataDownloader()
+    if args.check_s3:
+        downloader.check_s3_bucket = True
+    return downloader
+
+def run_command(args):
+    """Executa o subcomando escolhido (ou o download do dia) e devolve o código de saída"""
+    if args.command == "convert":
+        from csv_to_parquet_converter import CSVToParquetConverter
+        
+        write_options = write_options_from_args(args)
+        with open_downloader(args) as downloader:
+            failed = 0
+            for index in args.index:
+                converter = CSVToParquetConverter(downloader.data_folder, index, write_options,
+                                                  cdc=args.cdc, changes=args.changes)
+                stats = converter.convert_all_csv_files(remove_originals=args.remove_originals,
+                                                        workers=args.workers, skip_unchanged=not args.force)
+                failed += stats["failed"]
+        return 0 if not failed else 1
+    
+    if args.command == "upload":
+        with open_downloader(args) as downloader:
+            results = [result for index in args.index
+                       for result in downloader.upload_local_partitions(index, args.start, args.end, args.workers)]
+        return 0 if all(result["success"] for result in results) else 1
+    
+    if args.command == "clean":
+        with open_downloader(args) as downloader:
+            reports = [downloader.clean_s3_bucket(dry_run=args.dry_run, max_workers=args.workers, index=index)
+                       for index in args.index]
+        return 0 if not any(report["errors"] for report in reports) else 1
     
-    # Limpar o bucket S3 antes de começar
-    downloader.clean_s3_bucket()
-    
-    # Tentar primeiro com Selenium (mais confiável)
-    print("=== Tentativa 1: Selenium ===")
-    result = downloader.download_data("selenium")
-    
-    if not result:
-        print("\n=== Tentativa 2: Requests ===")
-        result = downloader.download_data("requests")
-    
-    if result:
-        print(f"\nDownload concluído com sucesso!")
-        print(f"Arquivo salvo localmente em: {result}")
-        print(f"Arquivo também enviado para o bucket S3: {downloader.aws_bucket}")
-    else:
-        print("\nNão foi possível baixar o arquivo.")
-        print("Possíveis soluções:")
-        print("1. Verificar se o ChromeDriver está instalado")
-        print("2. Verificar se a URL ainda está correta")
-        print("3. O site pode ter proteções anti-bot")
-        print("4. Verificar configurações do S3 no arquivo .env")
+    if args.command == "compact":
+        with open_downloader(args) as downloader:
+            reports = downloader.compact_partitions(args.index, args.period, args.target,
+                                                    dry_run=args.dry_run, benchmark=args.benchmark)
+        return 0 if not any(report["errors"] for report in reports) else 1
+    
+    if args.command == "index":
+        with open_downloader(args) as downloader:
+            reports = downloader.rebuild_partition_index(args.index, args.target)
+        return 0 if reports else 1
+    
+    if args.command == "daemon":
+        from scheduler import PortfolioScheduler, PublishSchedule
+        
+        schedule = PublishSchedule.from_env(window=args.window, interval=args.interval, weekdays=args.weekdays)
+        with open_downloader(args) as downloader:
+            scheduler = PortfolioScheduler(downloader, args.index, schedule, portfolio=args.portfolio,
+                                           upload=not args.no_upload, warm_browser=args.browser)
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, lambda *_: scheduler.stop())
+            stats = scheduler.run(max_polls=args.max_polls)
+        return 0 if not stats["failed"] else 1
+    
+    if args.command == "backfill":
+        from backfill import load_holidays
+        
+        holidays = load_holidays(args.holidays) if args.holidays else ()
+        with open_downloader(args) as downloader:
+            metrics = downloader.backfill(args.start, args.end, index=args.index, portfolio=args.portfolio,
+                                          max_workers=args.workers, rate_limit=args.rate,
+                                          upload=not args.no_upload, changes=args.changes, holidays=holidays)
+        return 0 if not metrics["failed"] else 1
+    
+    # Sem subcomando ou "download": carteira do dia
+    with open_downloader(args) as downloader:
+        # Limpar o bucket S3 antes de começar
+        for index in args.index:
+            downloader.clean_s3_bucket(index=index)
+        
+        if args.archive_csv:
+            downloader.stream_archive_csv = True
+        methods = ("stream" if args.stream else "api", "selenium", "requests")
+        
+        if len(args.index) > 1:
+            # Vários índices em paralelo, com HTTP, navegador e S3 compartilhados
+            summaries = downloader.download_indices(args.index, max_workers=args.workers, methods=methods)
+            return 0 if all(summary["success"] for summary in summaries) else 1
+    
+        # Tentar primeiro pela API (uma única requisição HTTP, sem navegador); depois Selenium e requests
+        result = downloader.download_with_fallback(args.index[0], methods)["file"]
+    
+        if result and result.startswith("s3://"):
+            print("\nDownload concluído com sucesso (sem disco)!")
+            print(f"Arquivo enviado para: {result}")
+        elif result:
+            print("\nDownload concluído com sucesso!")
+            print(f"Arquivo salvo localmente em: {result}")
+            print(f"Arquivo também enviado para o bucket S3: {downloader.aws_bucket}")
+        else:
+            print("\nNão foi possível baixar o arquivo.")
+            print("Possíveis soluções:")
+            print("1. Verificar se o ChromeDriver está instalado")
+            print("2. Verificar se a URL ainda está correta")
+            print("3. O site pode ter proteções anti-bot")
+            print("4. Verificar configurações do S3 no arquivo .env")
+        return 0 if result else 1
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Fixtures comuns dos testes: S3 simulado (moto), B3DataDownloader apontando para ele e
+arquivos Parquet de carteiras sintéticas.
+"""
+
+import contextlib
+import io
+import os
+import sys
+from datetime import date
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src")]
+
+BUCKET = "test-bucket"
+
+
+@pytest.fixture
+def aws_env(monkeypatch):
+    """Credenciais falsas e nenhum endpoint real (o moto intercepta o boto3)"""
+    for name in ("AWS_ENDPOINT_URL", "AWS_PROFILE", "S3_CACHE_FOLDER", "METRICS_FILE"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("AWS_ACCESS_KEY", "test")
+    monkeypatch.setenv("AWS_SECRET", "test")
+    monkeypatch.setenv("AWS_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_BUCKET", BUCKET)
+    monkeypatch.setenv("S3_CHECK_BUCKET", "false")
+
+
+@pytest.fixture
+def s3_downloader(aws_env, tmp_path):
+    """B3DataDownloader com o bucket criado no S3 simulado e a pasta de dados em tmp_path"""
+    from moto import mock_aws
+
+    with mock_aws():
+        from main import B3DataDownloader
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            downloader = B3DataDownloader()
+        downloader.data_folder = str(tmp_path)
+        downloader.s3_client.create_bucket(Bucket=BUCKET)
+        yield downloader
+        downloader.close()
+
+
+@pytest.fixture
+def write_parquet(tmp_path):
+    """Grava a carteira sintética de uma data em Parquet e devolve o caminho"""
+    from b3_csv_parser import parse_ibov_csv
+    from benchmarks.synthetic import make_portfolio, render_ibov_csv
+    from parquet_options import ParquetWriteOptions
+
+    def write(trade_date=date(2024, 1, 2), seed=0, name=None):
+        content = render_ibov_csv(trade_date, make_portfolio(rows=20, seed=seed))
+        date_info = (f"{trade_date.day:02d}", f"{trade_date.month:02d}", str(trade_date.year))
+        table, _ = parse_ibov_csv(content, date_info)
+        path = tmp_path / (name or f"IBOVDia_{trade_date:%d-%m-%y}_{seed}.parquet")
+        ParquetWriteOptions().write_table(table, path)
+        return str(path)
+
+    return write
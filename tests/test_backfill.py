@@ -0,0 +1,139 @@
+"""Backfill histórico (backfill.BackfillEngine) contra o servidor local e o S3 simulado"""
+
+import contextlib
+import io
+import os
+from datetime import date
+
+import pytest
+
+from b3_http_client import B3IndexClient
+from backfill import BackfillEngine, BackfillState, business_days, load_holidays
+from benchmarks.fixture_server import FixtureServer
+from conftest import BUCKET
+
+START, END = date(2024, 1, 1), date(2024, 1, 12)
+
+
+class FailingUploader:
+    """Uploader cujos envios sempre falham (os dias ficam apenas convertidos)"""
+
+    def upload_batch_to_s3_partitioned(self, items, **kwargs):
+        return [{"file": path, "success": False, "error": "S3 indisponível"} for path, _ in items]
+
+
+@pytest.fixture
+def server():
+    with FixtureServer() as server:
+        yield server
+
+
+def run_backfill(server, folder, uploader=None, start=START, end=END, **kwargs):
+    client = B3IndexClient(base_url=server.base_url, backoff_factor=0)
+    engine = BackfillEngine(client, folder, uploader=uploader, max_workers=2, rate_limit=0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        metrics = engine.run(start, end, **kwargs)
+    client.close()
+    return metrics
+
+
+def s3_keys(downloader, prefix):
+    response = downloader.s3_client.list_objects_v2(Bucket=BUCKET, Prefix=prefix)
+    return sorted(item["Key"] for item in response.get("Contents", []) if item["Key"].endswith(".parquet"))
+
+
+def test_resume_skips_done_days_and_uploads_converted_ones(server, s3_downloader, tmp_path):
+    # 1ª execução: primeira semana convertida, mas o upload falhou
+    first = run_backfill(server, tmp_path, FailingUploader(), end=date(2024, 1, 5))
+    assert first["converted"] == 5 and first["uploaded"] == 0
+    state = BackfillState(tmp_path / "ibov-data")
+    assert {state.get("IBOV", "day", day)["status"] for day in business_days(START, date(2024, 1, 5))} == {"converted"}
+
+    # 2ª execução: a primeira semana só é enviada; a segunda é baixada
+    requests_before = server.state.requests
+    second = run_backfill(server, tmp_path, s3_downloader)
+    assert server.state.requests - requests_before == 5
+    assert second["days"] == 10 and second["skipped"] == 0
+    assert second["converted"] == 5 and second["uploaded"] == 10
+    assert len(s3_keys(s3_downloader, "ibov_data/")) == 10
+
+    # 3ª execução: tudo concluído, nenhuma requisição
+    requests_before = server.state.requests
+    third = run_backfill(server, tmp_path, s3_downloader)
+    assert server.state.requests == requests_before
+    assert third["skipped"] == 10 and third["converted"] == 0 and third["uploaded"] == 0
+
+
+def test_local_days_are_uploaded_by_a_later_run(server, s3_downloader, tmp_path):
+    # 1ª execução sem upload (--no-upload): dias gravados apenas no disco
+    first = run_backfill(server, tmp_path, end=date(2024, 1, 5))
+    assert first["converted"] == 5
+    assert BackfillState(tmp_path / "ibov-data").get("IBOV", "day", date(2024, 1, 2))["status"] == "local"
+
+    # Nova execução sem upload: nada a baixar nem a gravar
+    requests_before = server.state.requests
+    second = run_backfill(server, tmp_path, end=date(2024, 1, 5))
+    assert second["skipped"] == 5 and second["converted"] == 0
+    assert server.state.requests == requests_before
+
+    # Execução com upload: os dias locais são só enviados
+    third = run_backfill(server, tmp_path, s3_downloader, end=date(2024, 1, 5))
+    assert third["converted"] == 0 and third["uploaded"] == 5
+    assert server.state.requests == requests_before
+    assert len(s3_keys(s3_downloader, "ibov_data/")) == 5
+    assert len(list((tmp_path / "ibov-data").rglob("*.parquet"))) == 5
+    assert BackfillState(tmp_path / "ibov-data").get("IBOV", "day", date(2024, 1, 2))["status"] == "done"
+
+
+def test_converted_days_are_not_rewritten_without_uploader(server, tmp_path):
+    run_backfill(server, tmp_path, FailingUploader(), end=date(2024, 1, 5))
+
+    requests_before = server.state.requests
+    metrics = run_backfill(server, tmp_path, end=date(2024, 1, 5))
+    assert metrics["skipped"] == 5 and metrics["converted"] == 0
+    assert server.state.requests == requests_before
+    assert len(list((tmp_path / "ibov-data").rglob("*.parquet"))) == 5
+
+
+def test_mismatched_days_are_recorded_and_not_requested_again(server, tmp_path, monkeypatch):
+    # A B3 ignora a data pedida e devolve a carteira mais recente (ex.: feriado)
+    body_for = server.state.body_for
+    monkeypatch.setattr(server.state, "body_for",
+                        lambda params: body_for({key: value for key, value in params.items() if key != "date"}))
+
+    first = run_backfill(server, tmp_path, end=date(2024, 1, 3))
+    assert first["mismatch"] == 3 and first["converted"] == 0
+    assert "22/07/2025" in first["errors"]["2024-01-02"]
+    assert BackfillState(tmp_path / "ibov-data").get("IBOV", "day", date(2024, 1, 2))["status"] == "mismatch"
+
+    requests_before = server.state.requests
+    second = run_backfill(server, tmp_path, end=date(2024, 1, 3))
+    assert server.state.requests == requests_before
+    assert second["skipped"] == 3 and second["mismatch"] == 0
+
+
+def test_holidays_are_not_requested(server, tmp_path):
+    holidays = tmp_path / "feriados.txt"
+    holidays.write_text("# Confraternização\n2024-01-01\n\n2024-01-02  # ponte\n", encoding="utf-8")
+
+    metrics = run_backfill(server, tmp_path, end=date(2024, 1, 5), holidays=load_holidays(str(holidays)))
+
+    assert metrics["days"] == 3 and metrics["converted"] == 3
+    assert server.state.requests == 3
+
+
+def test_load_holidays_from_list():
+    assert load_holidays("2024-01-01, 2024-02-12") == {date(2024, 1, 1), date(2024, 2, 12)}
+    with pytest.raises(ValueError):
+        load_holidays("2024-13-01")
+
+
+def test_other_portfolios_have_their_own_tree(server, s3_downloader, tmp_path):
+    metrics = run_backfill(server, tmp_path, s3_downloader, start=date(2024, 1, 2), end=date(2024, 1, 2),
+                           portfolio="theoretical")
+
+    assert metrics["converted"] == 1 and metrics["uploaded"] == 1
+    assert os.path.isdir(tmp_path / "ibov-theoretical-data" / "ano=2024" / "mes=01" / "dia=02")
+    assert not os.path.exists(tmp_path / "ibov-data")
+    assert len(s3_keys(s3_downloader, "ibov_theoretical_data/")) == 1
+    assert s3_keys(s3_downloader, "ibov_data/") == []
@@ -0,0 +1,67 @@
+"""Compactação das partições (compaction.PartitionCompactor) e o manifesto de conversões"""
+
+import contextlib
+import io
+from datetime import date, timedelta
+
+import pytest
+
+from benchmarks.synthetic import make_portfolio, render_ibov_csv
+from compaction import LocalPartitionStore, PartitionCompactor
+from csv_to_parquet_converter import CSVToParquetConverter
+from partition_index import PartitionIndex
+
+DAYS = [date(2024, 1, 2) + timedelta(days=offset) for offset in range(5)]
+
+
+@pytest.fixture
+def data_folder(tmp_path):
+    for day in DAYS:
+        (tmp_path / f"IBOVDia_{day:%d-%m-%y}.csv").write_bytes(render_ibov_csv(day, make_portfolio(rows=20)))
+    return tmp_path
+
+
+def convert(data_folder):
+    # Um conversor por execução, como em execuções separadas do script
+    with contextlib.redirect_stdout(io.StringIO()):
+        return CSVToParquetConverter(data_folder, "IBOV").convert_all_csv_files()
+
+
+def parquet_files(data_folder):
+    return LocalPartitionStore(data_folder / "ibov-data").list_files()
+
+
+def compact(data_folder, period="month"):
+    store = LocalPartitionStore(data_folder / "ibov-data")
+    return PartitionCompactor(store, "IBOV", period, partition_index=PartitionIndex.load(store)).run()
+
+
+@pytest.mark.parametrize("period", ["month", "year"])
+def test_compacted_days_are_not_converted_again(data_folder, period):
+    assert convert(data_folder)["converted"] == 5
+    assert convert(data_folder)["skipped"] == 5
+
+    report = compact(data_folder, period)
+    assert report["compacted"] == 1 and report["files_after"] == 1
+
+    stats = convert(data_folder)
+    assert stats["converted"] == 0 and stats["skipped"] == 5
+    assert parquet_files(data_folder) == [
+        "ano=2024/mes=01/IBOV_2024-01.parquet" if period == "month" else "ano=2024/IBOV_2024.parquet"]
+
+
+def test_new_and_changed_files_after_compaction_are_converted(data_folder):
+    convert(data_folder)
+    compact(data_folder)
+
+    new_day = date(2024, 1, 8)
+    (data_folder / f"IBOVDia_{new_day:%d-%m-%y}.csv").write_bytes(render_ibov_csv(new_day, make_portfolio(rows=20)))
+    (data_folder / f"IBOVDia_{DAYS[0]:%d-%m-%y}.csv").write_bytes(render_ibov_csv(DAYS[0], make_portfolio(rows=25)))
+
+    stats = convert(data_folder)
+    assert stats["converted"] == 2 and stats["skipped"] == 4
+    # O arquivo compactado fica; a nova carga do dia alterado prevalece na próxima compactação
+    files = parquet_files(data_folder)
+    assert "ano=2024/mes=01/IBOV_2024-01.parquet" in files and len(files) == 3
+    compact(data_folder)
+    assert convert(data_folder)["skipped"] == 6
@@ -0,0 +1,77 @@
+"""Cliente HTTP da API da B3 (b3_http_client) contra o servidor local dos benchmarks"""
+
+import base64
+from datetime import date
+
+import pytest
+import requests
+
+from b3_http_client import B3IndexClient, decode_csv_payload
+from benchmarks.fixture_server import FixtureServer
+from benchmarks.synthetic import make_portfolio, render_ibov_csv
+
+
+def expected_csv(trade_date, index="IBOV"):
+    return render_ibov_csv(trade_date, make_portfolio(rows=90, seed=sum(map(ord, index))), index)
+
+
+def test_download_decodes_base64_payload():
+    with FixtureServer(trade_date=date(2025, 7, 22)) as server:
+        client = B3IndexClient(base_url=server.base_url)
+        content = client.download_portfolio_csv("IBOV")
+        client.close()
+
+    assert content == expected_csv(date(2025, 7, 22))
+    assert content.startswith(b"IBOV - Carteira do Dia 22/07/25")
+
+
+def test_download_of_a_given_date_and_index():
+    with FixtureServer() as server:
+        client = B3IndexClient(base_url=server.base_url)
+        content = client.download_portfolio_csv("SMLL", trade_date=date(2024, 5, 2))
+        client.close()
+
+    assert content == expected_csv(date(2024, 5, 2), "SMLL")
+
+
+def test_retries_on_server_errors():
+    with FixtureServer(fail_first=2) as server:
+        client = B3IndexClient(base_url=server.base_url, retries=3, backoff_factor=0)
+        content = client.download_portfolio_csv("IBOV")
+        client.close()
+        requests_made = server.state.requests
+
+    assert content.startswith(b"IBOV - Carteira do Dia")
+    assert requests_made == 3
+
+
+def test_gives_up_after_retries():
+    with FixtureServer(fail_first=10) as server:
+        client = B3IndexClient(base_url=server.base_url, retries=2, backoff_factor=0)
+        with pytest.raises(requests.RequestException):
+            client.download_portfolio_csv("IBOV")
+        client.close()
+        requests_made = server.state.requests
+
+    assert requests_made == 3
+
+
+def test_invalid_portfolio_is_rejected():
+    client = B3IndexClient(base_url="http://127.0.0.1:9")
+    with pytest.raises(ValueError):
+        client.download_portfolio_csv("IBOV", portfolio="monthly")
+
+
+@pytest.mark.parametrize("wrap", [
+    lambda csv: base64.b64encode(csv),
+    lambda csv: b'"' + base64.b64encode(csv) + b'"\n',
+    lambda csv: csv,
+])
+def test_decode_csv_payload(wrap):
+    csv = expected_csv(date(2024, 1, 2))
+    assert decode_csv_payload(wrap(csv)) == csv
+
+
+def test_decode_rejects_non_portfolio_content():
+    with pytest.raises(ValueError):
+        decode_csv_payload(base64.b64encode(b"<html>manutencao</html>"))
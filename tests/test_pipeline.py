@@ -0,0 +1,47 @@
+"""Pipeline assíncrono (pipeline.PortfolioPipeline) para carteiras sem data no título"""
+
+from datetime import date, datetime
+
+import pytest
+
+from benchmarks.synthetic import make_portfolio, render_ibov_csv
+from pipeline import PortfolioPipeline, parse_portfolio
+
+THEORETICAL_TITLE = b"IBOV - Carteira Te\xf3rica v\xe1lida para o quadrimestre Jan. a Abr. 2024"
+
+
+def theoretical_csv():
+    content = render_ibov_csv(date(2024, 1, 2), make_portfolio(rows=20))
+    return THEORETICAL_TITLE + content[content.index(b"\n"):]
+
+
+def test_parse_portfolio_dates():
+    content = render_ibov_csv(date(2024, 1, 2), make_portfolio(rows=20))
+    assert parse_portfolio(content)[1] == ("02", "01", "2024")
+    assert parse_portfolio(content, fallback_date=("05", "01", "2024"))[1] == ("02", "01", "2024")
+    with pytest.raises(ValueError, match="02/01/2024"):
+        parse_portfolio(content, date(2024, 1, 3))
+
+    assert parse_portfolio(theoretical_csv(), date(2024, 1, 5))[1] == ("05", "01", "2024")
+    assert parse_portfolio(theoretical_csv(), fallback_date=("05", "01", "2024"))[1] == ("05", "01", "2024")
+    with pytest.raises(ValueError, match="não encontrada"):
+        parse_portfolio(theoretical_csv())
+
+
+def test_latest_theoretical_portfolio_uses_the_request_date(tmp_path):
+    pipeline = PortfolioPipeline(None, tmp_path, portfolio="theoretical", parse_workers=1)
+    report = pipeline.run([("IBOV", None)], prefetched={("IBOV", None): theoretical_csv()})
+
+    result = report["results"][0]
+    assert result["success"], result["error"]
+    today = datetime.now()
+    assert result["date_info"] == (today.strftime("%d"), today.strftime("%m"), today.strftime("%Y"))
+    assert f"ibov-theoretical-data/ano={today:%Y}/mes={today:%m}/dia={today:%d}/" in result["parquet"]
+
+
+def test_latest_day_portfolio_without_title_date_fails(tmp_path):
+    pipeline = PortfolioPipeline(None, tmp_path, parse_workers=1)
+    report = pipeline.run([("IBOV", None)], prefetched={("IBOV", None): theoretical_csv()})
+
+    result = report["results"][0]
+    assert not result["success"] and result["failed_stage"] == "parse"
@@ -0,0 +1,97 @@
+"""Limpeza de duplicados no S3 (B3DataDownloader.clean_s3_bucket)"""
+
+import hashlib
+import time
+
+from conftest import BUCKET
+
+PARTITION = "ibov_data/ano=2024/mes=01/dia=02"
+
+
+def put(downloader, key, body, digest=True):
+    metadata = {"content-sha256": hashlib.sha256(body).hexdigest()} if digest else {}
+    downloader.s3_client.put_object(Bucket=BUCKET, Key=key, Body=body, Metadata=metadata)
+
+
+def put_multipart(downloader, key, body):
+    """Upload multipart de uma parte: ETag diferente do put_object para o mesmo conteúdo"""
+    client = downloader.s3_client
+    upload_id = client.create_multipart_upload(
+        Bucket=BUCKET, Key=key, Metadata={"content-sha256": hashlib.sha256(body).hexdigest()})["UploadId"]
+    part = client.upload_part(Bucket=BUCKET, Key=key, UploadId=upload_id, PartNumber=1, Body=body)
+    client.complete_multipart_upload(Bucket=BUCKET, Key=key, UploadId=upload_id,
+                                     MultipartUpload={"Parts": [{"ETag": part["ETag"], "PartNumber": 1}]})
+
+
+def list_keys(downloader):
+    keys = []
+    paginator = downloader.s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=BUCKET, Prefix="ibov_data/"):
+        keys.extend(item["Key"] for item in page.get("Contents", []))
+    return sorted(keys)
+
+
+def test_keeps_newest_copy_of_each_group(s3_downloader):
+    # O nome do mais recente vem antes na ordem alfabética: vale o LastModified, não a chave
+    put(s3_downloader, f"{PARTITION}/20240105_000000_IBOVDia_02-01-24.parquet", b"carteira")
+    time.sleep(1.1)
+    put(s3_downloader, f"{PARTITION}/20240104_000000_IBOVDia_02-01-24.parquet", b"carteira")
+    time.sleep(1.1)
+    put(s3_downloader, f"{PARTITION}/20240103_000000_IBOVDia_02-01-24.parquet", b"carteira")
+    # Conteúdo diferente no mesmo dia, mesmo conteúdo em outro dia e chave sem data: ficam
+    put(s3_downloader, f"{PARTITION}/20240106_000000_IBOVDia_02-01-24.parquet", b"corrigida")
+    put(s3_downloader, "ibov_data/ano=2024/mes=01/dia=03/20240103_000000_IBOVDia_03-01-24.parquet", b"carteira")
+    put(s3_downloader, "ibov_data/_partitions.json", b"{}")
+
+    report = s3_downloader.clean_s3_bucket()
+
+    assert report["scanned"] == 6 and report["unrecognized"] == 1
+    assert report["duplicates"] == 2 and report["deleted"] == 2 and report["errors"] == 0
+    assert list_keys(s3_downloader) == [
+        "ibov_data/_partitions.json",
+        f"{PARTITION}/20240103_000000_IBOVDia_02-01-24.parquet",
+        f"{PARTITION}/20240106_000000_IBOVDia_02-01-24.parquet",
+        "ibov_data/ano=2024/mes=01/dia=03/20240103_000000_IBOVDia_03-01-24.parquet",
+    ]
+
+
+def test_groups_by_content_digest_across_multipart_etags(s3_downloader):
+    put(s3_downloader, f"{PARTITION}/20240103_000000_IBOVDia_02-01-24.parquet", b"carteira")
+    put_multipart(s3_downloader, f"{PARTITION}/20240104_000000_IBOVDia_02-01-24.parquet", b"carteira")
+    # Sem o metadado não há como comparar ETags diferentes: o objeto fica
+    put(s3_downloader, f"{PARTITION}/20240102_000000_IBOVDia_02-01-24.parquet", b"carteiro", digest=False)
+
+    report = s3_downloader.clean_s3_bucket()
+
+    assert report["heads"] == 3 and report["duplicates"] == 1
+    assert len(list_keys(s3_downloader)) == 2
+
+
+def test_dry_run_deletes_nothing(s3_downloader):
+    for copy in range(3):
+        put(s3_downloader, f"{PARTITION}/2024010{copy + 3}_000000_IBOVDia_02-01-24.parquet", b"carteira")
+
+    report = s3_downloader.clean_s3_bucket(dry_run=True)
+
+    assert report["duplicates"] == 2 and report["deleted"] == 0
+    assert len(list_keys(s3_downloader)) == 3
+
+
+def test_deletes_in_batches_of_1000(s3_downloader, monkeypatch):
+    copies = 1203
+    for copy in range(copies):
+        put(s3_downloader, f"{PARTITION}/{copy:06d}_IBOVDia_02-01-24.parquet", b"carteira")
+    client = s3_downloader.get_transfer_client(4)
+    delete_objects = client.delete_objects
+    batches = []
+
+    def record_batch(**kwargs):
+        batches.append(len(kwargs["Delete"]["Objects"]))
+        return delete_objects(**kwargs)
+
+    monkeypatch.setattr(client, "delete_objects", record_batch)
+    report = s3_downloader.clean_s3_bucket(max_workers=4)
+
+    assert sorted(batches) == [202, 1000]
+    assert report["deleted"] == copies - 1 and report["scanned"] == copies
+    assert len(list_keys(s3_downloader)) == 1
@@ -0,0 +1,114 @@
+"""Upload em lote particionado (B3DataDownloader.upload_batch_to_s3_partitioned)"""
+
+from datetime import date
+
+from conftest import BUCKET
+
+
+def list_keys(downloader, prefix="ibov_data/"):
+    response = downloader.s3_client.list_objects_v2(Bucket=BUCKET, Prefix=prefix)
+    return sorted(item["Key"] for item in response.get("Contents", []))
+
+
+def test_results_follow_input_order(s3_downloader, write_parquet):
+    days = [date(2024, 3, 5), date(2024, 1, 2), date(2024, 2, 9), date(2023, 12, 28)]
+    items = [(write_parquet(day), day.strftime("%d-%m-%y")) for day in days]
+
+    results = s3_downloader.upload_batch_to_s3_partitioned(items, max_workers=4)
+
+    assert [result["file"] for result in results] == [path for path, _ in items]
+    assert all(result["success"] and not result["skipped"] for result in results)
+    assert [result["key"] for result in results] == [
+        f"ibov_data/ano={day:%Y}/mes={day:%m}/dia={day:%d}/IBOVDia_{day:%d-%m-%y}_0.parquet" for day in days
+    ]
+    assert list_keys(s3_downloader) == sorted(result["key"] for result in results)
+
+
+def test_failed_upload_is_retried(s3_downloader, write_parquet, monkeypatch):
+    path = write_parquet()
+    client = s3_downloader.get_transfer_client(2)
+    upload_file = client.upload_file
+    calls = []
+
+    def flaky_upload(*args, **kwargs):
+        calls.append(args[2])
+        if len(calls) == 1:
+            raise ConnectionError("conexão encerrada")
+        return upload_file(*args, **kwargs)
+
+    monkeypatch.setattr(client, "upload_file", flaky_upload)
+    [result] = s3_downloader.upload_batch_to_s3_partitioned([(path, "02-01-24")], max_workers=2,
+                                                            retry_backoff=0)
+
+    assert result["success"] and result["attempts"] == 2 and result["error"] is None
+    assert calls == [result["key"], result["key"]]
+    assert list_keys(s3_downloader) == [result["key"]]
+
+
+def test_gives_up_after_max_attempts(s3_downloader, write_parquet, monkeypatch):
+    path = write_parquet()
+    client = s3_downloader.get_transfer_client(2)
+
+    def failing_upload(*args, **kwargs):
+        raise ConnectionError("conexão recusada")
+
+    monkeypatch.setattr(client, "upload_file", failing_upload)
+    [result] = s3_downloader.upload_batch_to_s3_partitioned([(path, "02-01-24")], max_workers=2,
+                                                            max_attempts=3, retry_backoff=0)
+
+    assert not result["success"] and result["attempts"] == 3
+    assert "conexão recusada" in result["error"]
+    assert list_keys(s3_downloader) == []
+
+
+def test_unchanged_objects_are_skipped(s3_downloader, write_parquet, tmp_path):
+    path = write_parquet()
+    [first] = s3_downloader.upload_batch_to_s3_partitioned([(path, "02-01-24")])
+
+    # Mesmo conteúdo com outro nome (nova carga do mesmo arquivo): não é reenviado
+    copy = tmp_path / "20240103_000000_IBOVDia_02-01-24.parquet"
+    copy.write_bytes(open(path, "rb").read())
+    [again, renamed] = s3_downloader.upload_batch_to_s3_partitioned([(path, "02-01-24"), (str(copy), "02-01-24")])
+
+    assert first["success"] and not first["skipped"]
+    assert again["skipped"] and again["key"] == first["key"]
+    assert renamed["skipped"] and renamed["key"] == first["key"]
+    assert list_keys(s3_downloader) == [first["key"]]
+
+    # Conteúdo diferente na mesma partição é enviado
+    changed = write_parquet(date(2024, 1, 2), seed=1)
+    [result] = s3_downloader.upload_batch_to_s3_partitioned([(changed, "02-01-24")])
+    assert result["success"] and not result["skipped"]
+    assert len(list_keys(s3_downloader)) == 2
+
+
+def test_skip_unchanged_false_uploads_again(s3_downloader, write_parquet):
+    path = write_parquet()
+    s3_downloader.upload_batch_to_s3_partitioned([(path, "02-01-24")])
+    [result] = s3_downloader.upload_batch_to_s3_partitioned([(path, "02-01-24")], skip_unchanged=False)
+    assert result["success"] and not result["skipped"]
+
+
+def test_uploads_invalidate_the_query_cache_of_day_portfolios_only(s3_downloader, write_parquet, monkeypatch):
+    import portfolio_cache
+
+    invalidated = []
+    monkeypatch.setattr(portfolio_cache, "invalidate_paths",
+                        lambda index, paths: invalidated.append((index, list(paths))))
+    items = [(write_parquet(date(2024, 1, 2)), "02-01-24")]
+
+    assert s3_downloader.upload_batch_to_s3_partitioned(items, portfolio="theoretical")[0]["success"]
+    assert list_keys(s3_downloader, "ibov_theoretical_data/")
+    assert invalidated == []
+
+    s3_downloader.upload_batch_to_s3_partitioned(items)
+    assert invalidated == [("IBOV", ["ano=2024/mes=01/dia=02/IBOVDia_02-01-24_0.parquet"])]
+
+
+def test_parse_s3_prefix():
+    from b3_indices import parse_s3_prefix, s3_prefix
+
+    for index in ("IBOV", "SMLL"):
+        for portfolio in ("day", "theoretical", "quarterly"):
+            assert parse_s3_prefix(s3_prefix(index, portfolio)) == (index, portfolio)
+    assert parse_s3_prefix("ibov_changes/") is None
@@ -0,0 +1,141 @@
+"""Agendador (scheduler.PortfolioScheduler) contra o servidor local da B3 e o S3 simulado"""
+
+import base64
+import contextlib
+import io
+import os
+from datetime import date, timedelta
+
+import pytest
+
+from b3_http_client import B3IndexClient
+from benchmarks.fixture_server import FixtureServer
+from conftest import BUCKET
+from scheduler import PortfolioScheduler, PublishSchedule
+
+TODAY = date(2025, 7, 22)
+SCHEDULE = PublishSchedule(window="00:00-23:59", interval=0.01, weekdays="0-6")
+
+
+@pytest.fixture
+def server(s3_downloader):
+    with FixtureServer(trade_date=TODAY - timedelta(days=1)) as server:
+        s3_downloader.base_url = server.base_url
+        yield server
+
+
+def poll(scheduler, today=TODAY):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return scheduler.poll_once(today)
+
+
+def s3_keys(downloader, prefix="ibov_data/"):
+    response = downloader.s3_client.list_objects_v2(Bucket=BUCKET, Prefix=prefix)
+    return sorted(item["Key"] for item in response.get("Contents", []) if item["Key"].endswith(".parquet"))
+
+
+def test_not_modified_response_is_not_reprocessed(server, s3_downloader):
+    scheduler = PortfolioScheduler(s3_downloader, ["IBOV"], SCHEDULE)
+
+    assert poll(scheduler) == ["IBOV"]
+    entry = scheduler.state.get("IBOV/day")
+    assert entry["trade_date"] == "2025-07-21" and entry["etag"]
+    assert len(s3_keys(s3_downloader)) == 1
+
+    assert poll(scheduler) == []
+    assert server.state.not_modified == 1
+    assert scheduler.stats["not_modified"] == 1 and scheduler.stats["new"] == 1
+    assert len(s3_keys(s3_downloader)) == 1
+
+
+def test_unchanged_content_without_validators_is_not_reprocessed(server, s3_downloader):
+    server.state.validators = False
+    scheduler = PortfolioScheduler(s3_downloader, ["IBOV"], SCHEDULE)
+
+    assert poll(scheduler) == ["IBOV"]
+    assert poll(scheduler) == []
+    assert server.state.not_modified == 0
+    assert scheduler.stats["unchanged"] == 1 and scheduler.stats["new"] == 1
+
+
+def test_new_portfolio_is_processed_and_survives_restart(server, s3_downloader):
+    scheduler = PortfolioScheduler(s3_downloader, ["IBOV"], SCHEDULE)
+    poll(scheduler)
+
+    server.state.publish(TODAY)
+    assert poll(scheduler) == ["IBOV"]
+    assert scheduler.state.get("IBOV/day")["trade_date"] == TODAY.isoformat()
+    assert scheduler.pending_indices(TODAY) == []
+    assert len(s3_keys(s3_downloader)) == 2
+
+    # Novo processo com o mesmo estado: nada pendente, nenhuma consulta
+    requests_before = server.state.requests
+    restarted = PortfolioScheduler(s3_downloader, ["IBOV"], SCHEDULE)
+    assert len(poll(restarted)) == 0
+    assert server.state.requests == requests_before
+    assert restarted.stats["polls"] == 0
+
+
+def test_failed_request_is_counted(server, s3_downloader):
+    server.state.fail_first = 100
+    s3_downloader.http_client = B3IndexClient(server.base_url, retries=0, backoff_factor=0)
+    scheduler = PortfolioScheduler(s3_downloader, ["IBOV"], SCHEDULE)
+
+    assert poll(scheduler) == []
+    assert scheduler.stats["failed"] == 1
+    assert scheduler.state.get("IBOV/day") == {}
+
+
+def test_theoretical_portfolio_is_detected_by_fingerprint(server, s3_downloader, monkeypatch):
+    # Carteira teórica: título sem "Carteira do Dia"; o quadrimestre muda a cada publicação
+    body_for = server.state.body_for
+
+    def theoretical_body(params):
+        content = base64.b64decode(body_for(params))
+        title = f"IBOV - Carteira Teórica válida a partir de {server.state.trade_date:%d/%m/%Y}".encode("latin1")
+        return base64.b64encode(title + content[content.index(b"\n"):])
+
+    monkeypatch.setattr(server.state, "body_for", theoretical_body)
+    scheduler = PortfolioScheduler(s3_downloader, ["IBOV"], SCHEDULE, portfolio="theoretical")
+
+    assert poll(scheduler) == ["IBOV"]
+    entry = scheduler.state.get("IBOV/theoretical")
+    assert entry["trade_date"] == TODAY.isoformat()
+    assert f"{os.sep}ibov-theoretical-data{os.sep}" in entry["parquet"]
+    assert len(s3_keys(s3_downloader, "ibov_theoretical_data/")) == 1
+    assert poll(scheduler) == []
+
+    tomorrow = TODAY + timedelta(days=1)
+    assert poll(scheduler, tomorrow) == []
+    assert server.state.not_modified == 1
+    server.state.validators = False
+    assert poll(scheduler, tomorrow) == []
+    assert scheduler.stats["unchanged"] == 1
+
+    server.state.publish(tomorrow)
+    assert poll(scheduler, tomorrow) == ["IBOV"]
+    assert scheduler.state.get("IBOV/theoretical")["trade_date"] == tomorrow.isoformat()
+    assert len(s3_keys(s3_downloader, "ibov_theoretical_data/")) == 2
+
+
+def test_failed_upload_is_retried_without_converting_again(server, s3_downloader, monkeypatch, tmp_path):
+    upload = s3_downloader.upload_to_s3_partitioned
+    monkeypatch.setattr(s3_downloader, "upload_to_s3_partitioned", lambda *args, **kwargs: False)
+    scheduler = PortfolioScheduler(s3_downloader, ["IBOV"], SCHEDULE)
+
+    assert poll(scheduler) == []
+    assert scheduler.stats["failed"] == 1
+    pending = scheduler.state.get("IBOV/day")["pending_upload"]
+    assert pending["trade_date"] == "2025-07-21" and os.path.exists(pending["parquet"])
+    assert poll(scheduler) == []
+    assert scheduler.stats["failed"] == 2 and scheduler.stats["not_modified"] == 1
+
+    monkeypatch.setattr(s3_downloader, "upload_to_s3_partitioned", upload)
+    assert poll(scheduler) == ["IBOV"]
+    entry = scheduler.state.get("IBOV/day")
+    assert entry["pending_upload"] is None and entry["parquet"] == pending["parquet"]
+    assert entry["trade_date"] == "2025-07-21"
+    assert len(s3_keys(s3_downloader)) == 1
+    # Um único Parquet local: nenhuma nova conversão
+    assert len(list((tmp_path / "ibov-data").rglob("*.parquet"))) == 1
+    assert server.state.not_modified == 2